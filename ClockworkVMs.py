@@ -1,5 +1,10 @@
 #!/usr/bin/python
 
+#####
+# Before anything else is imported, so every import can be timed
+from lib.import_profiler import installFromEnvironment
+installFromEnvironment()
+
 import os
 import re
 import sys
@@ -13,16 +18,6 @@ from lib.loggers import LogPriority as lp
 from lib.program_options import ProgramOptions
 from lib.CheckApplicable import CheckApplicable
 
-#####
-# import PyQt libraries
-# from PyQt5.QtWidgets import QApplication
-from PyQt5 import QtWidgets
-
-#####
-# Import main gui
-#from ui.Work import Work
-from ui.VirtualMachineBuilder import VirtualMachineBuilder
-
 def main():
     """
     Main program
@@ -31,6 +26,15 @@ def main():
     """
     prog_opts = ProgramOptions()
     conf = prog_opts.returnConf()
+
+    #####
+    # import PyQt libraries and the main gui only now the options are good,
+    # so --help and option errors don't wait for Qt to load
+    # from PyQt5.QtWidgets import QApplication
+    from PyQt5 import QtWidgets
+    #from ui.Work import Work
+    from ui.VirtualMachineBuilder import VirtualMachineBuilder
+
     conf.loggerSelf()
     environ = conf.getEnviron()
 
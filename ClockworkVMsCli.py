@@ -0,0 +1,242 @@
+#!/usr/bin/python
+"""
+Build virtual machines without the GUI, for CI and scheduled rebuilds.
+
+Loads a boxcutter family's varfile and template, applies variable
+overrides, keeps the builders of the selected providers and runs packer,
+then writes the results as JSON - to stdout, or the file given with
+--results.  Logs go to the log file and stderr.  Never imports PyQt.
+
+    ClockworkVMsCli.py -f ubuntu --var-file ubuntu1604.json \\
+                       --provider vmware-iso --var cpus=2 --var memory=2048
+
+Exits 0 if every build succeeded, 1 if one failed, 2 for bad options.
+
+With --select-mirror the varfile's iso_url is first pointed at the fastest
+mirror of its distribution, see lib.mirror_select.
+
+With --check-iso-urls nothing is built - every iso_url of the family, or
+of the whole repo root without -f, is probed and the status and latency
+of each written as the results, exiting 1 if any of them is unreachable.
+"""
+#####
+# Before anything else is imported, so every import can be timed
+from lib.import_profiler import installFromEnvironment
+installFromEnvironment()
+
+import os
+import sys
+import json
+import tempfile
+import traceback
+from optparse import OptionParser
+
+#####
+# app specific files
+from lib.loggers import LogPriority as lp
+from lib.program_options import ProgramOptions
+from lib.output_watcher import OutputWatcher, PACKER_PATTERNS
+from lib.packerJsonHandler import PackerJsonHandler, PROVIDERS
+from lib.packer_runner import PackerRunner, PackerResult
+from lib.build_context import BuildContext, makeBuildId
+
+
+def parseVariables(parser, assignments):
+    """
+    Dictionary from a list of KEY=VALUE strings.
+    """
+    variables = {}
+    for assignment in assignments:
+        if "=" not in assignment or not assignment.split("=", 1)[0]:
+            parser.error("Invalid --var, expected KEY=VALUE: " + str(assignment))
+        key, value = assignment.split("=", 1)
+        variables[key] = value
+    return variables
+
+
+def writeResults(results, destination):
+    """
+    Write the results as JSON to destination, "-" for stdout.
+    """
+    data = json.dumps(results, sort_keys=True, indent=3, default=str)
+    if destination == "-":
+        sys.stdout.write(data + "\n")
+        sys.stdout.flush()
+    else:
+        with open(destination, "w") as resultsFile:
+            resultsFile.write(data + "\n")
+
+
+def selectMirror(pjh, options, logger):
+    """
+    Point the iso_url of the loaded varfile at the fastest mirror.
+
+    @returns: the iso_url to build with
+    """
+    from lib.mirror_select import MirrorSelector, readMirrorsFile
+
+    mirrors = {}
+    if options.mirrorsFile:
+        mirrors = readMirrorsFile(options.mirrorsFile)
+    selector = MirrorSelector(logger, mirrors=mirrors, timeout=options.probeTimeout)
+    try:
+        return selector.applyTo(pjh)
+    finally:
+        selector.close()
+
+
+def checkIsoUrls(conf, options, logger):
+    """
+    Probe the iso_urls under the repo root, or the family's directory.
+
+    @returns: the results to write
+    """
+    from lib.url_probe import UrlProber, findIsoUrls, formatReport
+
+    root = conf.getRepoRoot()
+    if options.family:
+        root = os.path.join(root, options.family)
+    isoUrls = findIsoUrls(root)
+    prober = UrlProber(logger, timeout=options.probeTimeout)
+    try:
+        probed = prober.probeAll(sorted(isoUrls.keys()))
+    finally:
+        prober.close()
+    logger.log(lp.INFO, "iso_url check:\n%s", formatReport(probed))
+
+    results = {"root" : root,
+               "isoUrls" : [],
+               "succeeded" : all([result.ok() for result in probed])}
+    for result in probed:
+        data = result.toDict()
+        data["files"] = isoUrls[result.url]
+        results["isoUrls"].append(data)
+    return results
+
+
+def main():
+    """
+    Main program
+    """
+    parser = OptionParser(usage="  %prog [options] -f FAMILY --var-file VARFILE\n\n" + \
+                          "Build virtual machines with packer, without the GUI.",
+                          version="%prog 0.7.0.25")
+
+    parser.add_option("-f", "--family", action="store", dest="family",
+                      default="", help="OS family - directory of the boxcutter repo under --repo-root, like ubuntu.")
+    parser.add_option("--var-file", action="store", dest="varFile",
+                      default="", help="Varfile in the family's directory, like ubuntu1604.json.")
+    parser.add_option("--template", action="store", dest="template",
+                      default="", help="Template in the family's directory, default worked out from the varfile.")
+    parser.add_option("--var", action="append", dest="variables",
+                      default=[], metavar="KEY=VALUE",
+                      help="Override a template variable.  May be repeated.")
+    parser.add_option("--provider", action="append", dest="providers",
+                      default=[], choices=PROVIDERS,
+                      help="Builder to run: " + ", ".join(PROVIDERS) + ".  May be repeated, default all.")
+    parser.add_option("--results", action="store", dest="results",
+                      default="-", help="File to write the JSON results to, default stdout.")
+    parser.add_option("--dry-run", action="store_true", dest="dryRun",
+                      default=False, help="Write the merged template and report the packer command without running it.")
+    parser.add_option("--select-mirror", action="store_true", dest="selectMirror",
+                      default=False, help="Point iso_url at the fastest mirror of the distribution before building.")
+    parser.add_option("--mirrors-file", action="store", dest="mirrorsFile",
+                      default="", help="JSON file of distribution to list of mirror base URLs, added to the built in ones.")
+    parser.add_option("--check-iso-urls", action="store_true", dest="checkIsoUrls",
+                      default=False, help="Instead of building, check every iso_url of the family, or the whole repo root, is reachable.")
+    parser.add_option("--probe-timeout", action="store", type="float", dest="probeTimeout",
+                      default=10.0, help="Seconds each --check-iso-urls or --select-mirror request may take, default 10.")
+
+    prog_opts = ProgramOptions(parser)
+    options = prog_opts.getOptions()
+    conf = prog_opts.returnConf()
+    logger = conf.getLogger()
+    logger.log(lp.INFO, "#==--- Initializing VmBuilder cli ---==#")
+
+    if options.checkIsoUrls:
+        results = checkIsoUrls(conf, options, logger)
+        writeResults(results, options.results)
+        logger.shutdown()
+        if results["succeeded"]:
+            return 0
+        return 1
+
+    if not options.family or not options.varFile:
+        parser.error("Both --family and --var-file are required.")
+    overrides = parseVariables(parser, options.variables)
+    providers = options.providers or list(PROVIDERS)
+
+    repo = os.path.join(conf.getRepoRoot(), options.family)
+    varFilePath = os.path.join(repo, options.varFile)
+    pjh = PackerJsonHandler(logger)
+
+    results = {"family" : options.family,
+               "varFile" : varFilePath,
+               "template" : "",
+               "providers" : providers,
+               "overrides" : overrides,
+               "dryRun" : options.dryRun,
+               "builds" : [],
+               "error" : None,
+               "succeeded" : False}
+    try:
+        templateName = options.template or pjh.getTemplateNameForVarFile(options.varFile)
+        templateFilePath = os.path.join(repo, templateName)
+        results["template"] = templateFilePath
+
+        data = pjh.readExistingJsonTemplateFile(templateFilePath)
+        if not data:
+            raise ValueError("Can't read template: " + templateFilePath)
+        variables = pjh.readExistingJsonVarfile(varFilePath)
+        if not os.path.isfile(varFilePath):
+            raise ValueError("Can't read varfile: " + varFilePath)
+        if options.selectMirror:
+            if not pjh.getIsoUrl():
+                pjh.setIsoUrl(data["variables"].get("iso_url", ""))
+            results["isoUrl"] = selectMirror(pjh, options, logger)
+        variables = dict(variables or {})
+        variables.update(overrides)
+
+        #####
+        # Same as the GUI - one template with the variables merged in and
+        # only the selected builders.
+        newJson = pjh.mergeTemplate(data, variables, providers)
+        if not newJson["builders"]:
+            raise ValueError("Template has no builders for: " + ", ".join(providers))
+        prefix = os.path.splitext(templateName)[0] + "-"
+        handle, mergedTemplate = tempfile.mkstemp(".json", prefix)
+        os.close(handle)
+        pjh.saveJsonTemplateFile(mergedTemplate, newJson)
+        results["mergedTemplate"] = mergedTemplate
+
+        vmImage = providers[0] if len(providers) == 1 else ""
+        runner = PackerRunner(conf)
+        buildId = makeBuildId(templateFilePath, varFilePath, vmImage)
+        context = BuildContext.create(conf, repo, mergedTemplate, "", vmImage,
+                                      buildId=buildId)
+        if options.dryRun:
+            result = PackerResult(buildId, mergedTemplate, "", vmImage)
+            result.command = runner.buildCommand(context)
+        else:
+            watcher = OutputWatcher()
+            for name, pattern in PACKER_PATTERNS.iteritems():
+                watcher.addTrigger(pattern, name=name)
+            try:
+                result = runner.runBuild(context, watcher)
+            finally:
+                os.unlink(mergedTemplate)
+                del results["mergedTemplate"]
+        results["builds"].append(result.toDict())
+        results["succeeded"] = options.dryRun or result.succeeded()
+    except Exception, err:
+        logger.log(lp.ERROR, traceback.format_exc())
+        results["error"] = str(err)
+
+    writeResults(results, options.results)
+    logger.shutdown()
+    if results["succeeded"]:
+        return 0
+    return 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -38,6 +38,111 @@ from distutils.version import LooseVersion
 #--- non-native python libraries in this source tree
 from .loggers import LogPriority
 
+#####
+# Results of isApplicable, keyed by the frozen applicable dictionary and the
+# OS facts it was checked against, and compiled version ranges keyed by the
+# frozen range list.  Shared by every CheckApplicable, as the key holds all
+# the result depends on.
+applicableCache = {}
+rangeCache = {}
+versionCache = {}
+
+#####
+# Emptied when they grow past this, filtering big template matrices mustn't
+# grow them without bound.
+MAX_CACHED = 4096
+
+
+def freeze(value):
+    """
+    Hashable, order independent form of an applicable dictionary or
+    version list - dictionaries become sorted tuples of items, lists
+    tuples.
+
+    @raises: TypeError if there's something in it that can't be hashed
+    """
+    if isinstance(value, dict):
+        return tuple(sorted([(key, freeze(item)) for key, item in value.items()]))
+    if isinstance(value, (list, tuple)):
+        return tuple([freeze(item) for item in value])
+    hash(value)
+    return value
+
+
+def cacheResult(cache, key, value):
+    if len(cache) >= MAX_CACHED:
+        cache.clear()
+    cache[key] = value
+    return value
+
+
+def looseVersion(version):
+    """
+    LooseVersion of a version string, parsed once.
+    """
+    try:
+        return versionCache[version]
+    except KeyError:
+        return cacheResult(versionCache, version, LooseVersion(version))
+
+
+class VersionRange(object):
+    """
+    A version list of an applicable dictionary's 'os' key, parsed once, see
+    CheckApplicable.isApplicable for the format.
+    """
+    def __init__(self, rangeList):
+        self.low = None
+        self.high = None
+        self.versions = ()
+        # Process version and up
+        if '+' in rangeList:
+            assert len(rangeList) == 2, "Wrong number of entries for a +"
+            self.low = looseVersion(self.baseVersion(rangeList, '+'))
+        # Process version and lower
+        elif '-' in rangeList:
+            assert len(rangeList) == 2, "Wrong number of entries for a -"
+            self.high = looseVersion(self.baseVersion(rangeList, '-'))
+        # Process inclusive range
+        elif 'r' in rangeList:
+            assert len(rangeList) == 3, "Wrong number of entries for a range"
+            vertmp = [version for version in rangeList if version != 'r']
+            first = looseVersion(vertmp[0])
+            second = looseVersion(vertmp[1])
+            if first == second:
+                raise ValueError('Range versions are the same')
+            self.low = min(first, second)
+            self.high = max(first, second)
+        # Process explicit match
+        else:
+            self.versions = tuple(rangeList)
+
+    def baseVersion(self, rangeList, symbol):
+        if rangeList[1] == symbol:
+            return rangeList[0]
+        return rangeList[1]
+
+    def contains(self, version):
+        if self.low is None and self.high is None:
+            return version in self.versions
+        version = looseVersion(version)
+        if self.low is not None and version < self.low:
+            return False
+        if self.high is not None and version > self.high:
+            return False
+        return True
+
+
+def compileRange(rangeList):
+    """
+    The VersionRange of a version list, compiled the first time it's seen.
+    """
+    key = freeze(rangeList)
+    try:
+        return rangeCache[key]
+    except KeyError:
+        return cacheResult(rangeCache, key, VersionRange(rangeList))
+
 
 class CheckApplicable(object):
     '''
@@ -174,21 +279,38 @@ class CheckApplicable(object):
         """
         applies = False
 
-        self.logger.log(LogPriority.DEBUG,
-                        'Dictionary is: ' + str(applicableDict))
+        self.logger.log(LogPriority.DEBUG, 'Dictionary is: %s', applicableDict)
         try:
             default = applicableDict['default']
             if default == 'default':
                 #####
                 # Use self.applicable as is
-                valid = self.isApplicableValid(self.applicable)
-                if valid:
-                    applicable = self.applicable
+                applicable = self.applicable
+            else:
+                return applies
         except KeyError:
-            valid = self.isApplicableValid(applicableDict)
             applicable = applicableDict
 
-        if not valid:
+        #####
+        # The answer only depends on the dictionary and the OS facts, so a
+        # dictionary seen before against the same facts is a lookup.
+        try:
+            key = (freeze(applicable), self.myosfamily, self.myostype,
+                   self.myosversion, self.environ.geteuid())
+        except TypeError:
+            return self.checkApplicable(applicable)
+        try:
+            return applicableCache[key]
+        except KeyError:
+            return cacheResult(applicableCache, key,
+                               self.checkApplicable(applicable))
+
+    def checkApplicable(self, applicable):
+        """
+        isApplicable without the cache.
+        """
+        applies = False
+        if not self.isApplicableValid(applicable):
             self.logger.log(LogPriority.DEBUG, "Passed in 'applicable' has invalid contents...")
             return applies
 
@@ -245,52 +367,7 @@ class CheckApplicable(object):
         """
         if not myversion:
             myversion = self.myosversion
-        # Process version and up
-        if '+' in rangeList:
-            assert len(rangeList) is 2, "Wrong number of entries for a +"
-            if rangeList[1] == '+':
-                baseversion = rangeList[0]
-            else:
-                baseversion = rangeList[1]
-            if LooseVersion(self.myosversion) >= LooseVersion(baseversion):
-                return True
-            else:
-                return False
-        # Process version and lower
-        elif '-' in rangeList:
-            assert len(rangeList) is 2, "Wrong number of entries for a -"
-            if rangeList[1] == '-':
-                baseversion = rangeList[0]
-            else:
-                baseversion = rangeList[1]
-            if LooseVersion(self.myosversion) <= LooseVersion(baseversion):
-                return True
-            else:
-                return False
-        # Process inclusive range
-        elif 'r' in rangeList:
-            assert len(rangeList) is 3, "Wrong number of entries for a range"
-            vertmp = rangeList
-            vertmp.remove('r')
-            if LooseVersion(vertmp[0]) > LooseVersion(vertmp[1]):
-                highver = vertmp[0]
-                lowver = vertmp[1]
-            elif LooseVersion(vertmp[0]) < LooseVersion(vertmp[1]):
-                highver = vertmp[1]
-                lowver = vertmp[0]
-            else:
-                raise ValueError('Range versions are the same')
-            if LooseVersion(self.myosversion) <= LooseVersion(highver) \
-               and LooseVersion(self.myosversion) >= LooseVersion(lowver):
-                return True
-            else:
-                return False
-        # Process explicit match
-        else:
-            if self.myosversion in rangeList:
-                return True
-            else:
-                return False
+        return compileRange(rangeList).contains(myversion)
 
     def fismaApplicable(self, checkLevel=None, systemLevel=None):
         '''
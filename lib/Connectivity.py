@@ -25,14 +25,11 @@
 from __future__ import absolute_import
 #--- Native python libraries
 import re
-import ssl
 import socket
-import httplib
-import urllib
-import urllib2
 
 #--- non-native python libraries in this source tree
 from lib.loggers import LogPriority as lp
+from lib.loggers import getSubsystemLogger
 
 
 class ConnectivityInvalidURL(Exception):
@@ -53,12 +50,13 @@ class Connectivity(object):
         """
         Constructor
         """
-        self.logger = logger
+        self.logger = getSubsystemLogger(logger, "net")
 
         ##########################
-        # Make it so this will only work on the yellow.
-        if not use_proxy:
-            self.set_no_proxy()
+        # Make it so this will only work on the yellow.  urllib2 is only
+        # loaded, and the opener installed, the first time it's needed.
+        self.use_proxy = use_proxy
+        self.no_proxy_installed = False
 
     ############################################################
 
@@ -67,10 +65,13 @@ class Connectivity(object):
             for socket info. If the website gets something in return, 
             we know it's available to DNS.
         """
+        from lib.url_probe import getDnsCache
         retval = False
         try:
-            socket.setdefaulttimeout(5)
-            socket.gethostbyname(host)
+            #####
+            # No socket.setdefaulttimeout here, it changed the timeout of
+            # every socket in the program - and the lookup never used it.
+            getDnsCache().resolve(host)
             retval = True
         except socket.gaierror, err:
             msg = "Can't connect to server, socket problem: " + str(err)
@@ -101,7 +102,10 @@ class Connectivity(object):
             This will only work if the self.set_no_proxy method is used before
             this method is called.
         """
+        import urllib2
         retval = False
+        if not self.use_proxy and not self.no_proxy_installed:
+            self.set_no_proxy()
 
         try:
             page = site + path
@@ -136,6 +140,23 @@ class Connectivity(object):
 
         return retval
 
+    def probeUrls(self, urls, timeout=10, workers=8):
+        """
+        Check many URLs at once, see lib.url_probe.
+
+        @parameter: urls - http:// or https:// urls
+        @parameter: timeout - seconds each request may take
+        @parameter: workers - most URLs checked at the same time
+
+        @returns: a lib.url_probe.ProbeResult per url, in the same order
+        """
+        from lib.url_probe import UrlProber
+        prober = UrlProber(self.logger, workers=workers, timeout=timeout)
+        try:
+            return prober.probeAll(urls)
+        finally:
+            prober.close()
+
     def isPageAvailable(self, url="", timeout=8):
         """
         Check if a specific webpage link is available, using httplib's
@@ -163,6 +184,8 @@ class Connectivity(object):
                 self.logger.log(lp.DEBUG, "page: " + str(page))
                               
                 if host and port:
+                    import ssl
+                    import httplib
                     #####
                     # Revert to unverified context
                     if hasattr(ssl, '_create_unverified_context'):
@@ -318,9 +341,11 @@ class Connectivity(object):
         @author: Roy Nielsen
     
         """
+        import urllib2
         proxy_handler = urllib2.ProxyHandler({})
         opener = urllib2.build_opener(proxy_handler)
         urllib2.install_opener(opener)
+        self.no_proxy_installed = True
 
     ###########################################################################
     
@@ -353,6 +378,8 @@ class Connectivity(object):
  
         @compiler: Roy Nielsen
         '''
+        import httplib
+        import urllib2
         url_opener = False
         try:
             import ssl
@@ -0,0 +1,222 @@
+"""
+Share the uplink between the downloads of concurrent builds and syncs.
+
+Every transfer belongs to a traffic class, and the classes have fixed
+priorities - see CLASSES, most urgent first.  A BandwidthScheduler gives
+them bandwidth two ways:
+
+    - Streams this process copies itself, like the package cache proxy's
+      upstream fetches, call throttle(trafficClass, bytes) for every chunk.
+      Each class can have its own rate cap, and all of them together share
+      the total rate.  When the total is short the most urgent class waiting
+      goes first, so a background class only gets what the urgent ones
+      leave over.
+    - Transfers done by a child process, git or packer, can't be metered.
+      They hold a slot(trafficClass) while they run instead.  A class can be
+      limited to a number of transfers at once, and so can all of them
+      together, and the free slots go to the most urgent class waiting.
+
+    scheduler = conf.getBandwidthScheduler()
+    with scheduler.slot(GIT):
+        runGitClone()
+    for chunk in chunks:
+        scheduler.throttle(PACKAGES, len(chunk))
+
+With no limits set the scheduler never waits, only counting.
+"""
+from __future__ import absolute_import
+#--- Native python libraries
+import time
+import threading
+from contextlib import contextmanager
+
+#####
+# Traffic classes, most urgent first
+BUILD = "build"
+PACKAGES = "packages"
+GIT = "git"
+CLASSES = [BUILD, PACKAGES, GIT]
+
+#####
+# Longest a waiting stream sleeps before looking again, so it notices
+# bandwidth freed by a stream that finished.
+MAX_WAIT = 0.25
+
+
+class TokenBucket(object):
+    """
+    rate bytes a second, with bursts of up to burst bytes.
+
+    A chunk bigger than what is left is allowed as soon as the bucket isn't
+    empty, leaving it in debt, so the average stays at rate whatever the
+    chunk size.
+    """
+    def __init__(self, rate, burst=None, timer=time.time):
+        self.rate = float(rate)
+        self.burst = float(burst or rate)
+        self.timer = timer
+        self.tokens = self.burst
+        self.stamp = timer()
+
+    def refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+
+    def delay(self, now):
+        """
+        Seconds until a chunk may be taken.
+        """
+        self.refill(now)
+        if self.tokens > 0:
+            return 0
+        return -self.tokens / self.rate
+
+    def take(self, nbytes):
+        self.tokens -= nbytes
+
+
+class BandwidthScheduler(object):
+    """
+    Rates and transfer slots by traffic class, see the module docstring.
+    """
+    def __init__(self, totalRate=0, caps=None, limits=None, maxTransfers=0,
+                 timer=time.time):
+        """
+        @param: totalRate - bytes a second all the throttled streams share,
+                            0 for no limit
+        @param: caps - traffic class to most bytes a second it may use
+        @param: limits - traffic class to most transfers it may run at once
+        @param: maxTransfers - most transfers of all classes at once, 0 for
+                               no limit
+        """
+        for trafficClass in (caps or {}).keys() + (limits or {}).keys():
+            if trafficClass not in CLASSES:
+                raise ValueError("Unknown traffic class: " + str(trafficClass))
+        self.timer = timer
+        self.total = None
+        if totalRate:
+            self.total = TokenBucket(totalRate, timer=timer)
+        self.caps = {}
+        for trafficClass, rate in (caps or {}).items():
+            if rate:
+                self.caps[trafficClass] = TokenBucket(rate, timer=timer)
+        self.limits = dict(limits or {})
+        self.maxTransfers = maxTransfers
+        self.condition = threading.Condition()
+        self.waiting = dict((trafficClass, 0) for trafficClass in CLASSES)
+        self.queued = dict((trafficClass, 0) for trafficClass in CLASSES)
+        self.active = dict((trafficClass, 0) for trafficClass in CLASSES)
+        self.bytes = dict((trafficClass, 0) for trafficClass in CLASSES)
+        self.waited = dict((trafficClass, 0.0) for trafficClass in CLASSES)
+
+    def isLimited(self):
+        """
+        Whether throttle ever waits.
+        """
+        return self.total is not None or bool(self.caps)
+
+    def getPriority(self, trafficClass):
+        if trafficClass not in CLASSES:
+            raise ValueError("Unknown traffic class: " + str(trafficClass))
+        return CLASSES.index(trafficClass)
+
+    def throttle(self, trafficClass, nbytes):
+        """
+        Wait until trafficClass may send or receive nbytes more, and count
+        them against its rates.
+        """
+        priority = self.getPriority(trafficClass)
+        if not self.isLimited():
+            with self.condition:
+                self.bytes[trafficClass] += nbytes
+            return
+        start = self.timer()
+        cap = self.caps.get(trafficClass)
+        with self.condition:
+            self.waiting[trafficClass] += 1
+            try:
+                while True:
+                    now = self.timer()
+                    wait = cap.delay(now) if cap is not None else 0
+                    if self.total is not None and wait <= 0:
+                        if self.hasUrgentWaiter(priority, now):
+                            wait = MAX_WAIT
+                        else:
+                            wait = self.total.delay(now)
+                    if wait <= 0:
+                        break
+                    self.condition.wait(min(wait, MAX_WAIT))
+                if cap is not None:
+                    cap.take(nbytes)
+                if self.total is not None:
+                    self.total.take(nbytes)
+                self.bytes[trafficClass] += nbytes
+                self.waited[trafficClass] += self.timer() - start
+            finally:
+                self.waiting[trafficClass] -= 1
+                self.condition.notify_all()
+
+    def hasUrgentWaiter(self, priority, now):
+        """
+        Whether a more urgent class is waiting for the total rate only, not
+        for its own cap.
+        """
+        for trafficClass in CLASSES[:priority]:
+            if self.waiting[trafficClass]:
+                cap = self.caps.get(trafficClass)
+                if cap is None or cap.delay(now) <= 0:
+                    return True
+        return False
+
+    def canStart(self, trafficClass):
+        """
+        Whether a transfer of trafficClass may start now.  Called holding
+        the condition.
+        """
+        limit = self.limits.get(trafficClass)
+        if limit and self.active[trafficClass] >= limit:
+            return False
+        if self.maxTransfers and sum(self.active.values()) >= self.maxTransfers:
+            return False
+        for other in CLASSES[:self.getPriority(trafficClass)]:
+            otherLimit = self.limits.get(other)
+            if self.queued[other] and \
+               not (otherLimit and self.active[other] >= otherLimit):
+                return False
+        return True
+
+    @contextmanager
+    def slot(self, trafficClass):
+        """
+        Hold one of trafficClass's transfer slots for the with block,
+        waiting for one to be free.
+        """
+        self.getPriority(trafficClass)
+        start = self.timer()
+        with self.condition:
+            self.queued[trafficClass] += 1
+            try:
+                while not self.canStart(trafficClass):
+                    self.condition.wait(MAX_WAIT)
+            finally:
+                self.queued[trafficClass] -= 1
+            self.active[trafficClass] += 1
+            self.waited[trafficClass] += self.timer() - start
+            self.condition.notify_all()
+        try:
+            yield
+        finally:
+            with self.condition:
+                self.active[trafficClass] -= 1
+                self.condition.notify_all()
+
+    def getStats(self):
+        """
+        Per traffic class, the bytes throttled, seconds spent waiting and
+        transfers running.
+        """
+        with self.condition:
+            return dict((trafficClass, {"bytes" : self.bytes[trafficClass],
+                                        "waited" : round(self.waited[trafficClass], 3),
+                                        "active" : self.active[trafficClass]})
+                        for trafficClass in CLASSES)
@@ -0,0 +1,119 @@
+"""
+Everything one packer build needs to know, fixed when it starts.
+
+A build used to read its repo, template and varfile from setters on the
+shared Conf, and PackerRunner and VirtualMachineSettings os.chdir'ed into
+the repo to run it.  Packer then wrote to output-<builder> in the repo,
+the same directories for every build of a template.  Two builds in one
+process overwrote each other's settings, working directory and output.
+
+A BuildContext is immutable and handed explicitly to whatever takes part
+in a build.  Each build gets:
+
+    - repo - the directory packer runs in, passed as the child's cwd, so
+      the template's scripts and http directory resolve as before
+    - a copy of its template of its own, see getBuildTemplatePath, written
+      next to the template so {{template_dir}} and paths relative to the
+      template still point where they did, and removed when it ends
+    - outputDir - where each builder's output_directory is put, as
+      outputDir/<builder name>
+
+    context = BuildContext.create(conf, repo, "ubuntu.json", "ubuntu1604.json",
+                                  vmImage="vmware-iso")
+    PackerRunner(conf).runBuild(context)
+
+A changed copy is made with replace(), like namedtuple's _replace.
+"""
+from __future__ import absolute_import
+#--- Native python libraries
+import os
+import time
+from collections import namedtuple
+
+#####
+# Directory under the repo each build's output goes in, by build id
+OUTPUT_DIR = "output"
+
+FIELDS = ["buildId", "repo", "templateFile", "varFile", "vmImage",
+          "outputDir", "buildLogDir"]
+
+
+def makeBuildId(templateFile="", varFile="", vmImage=""):
+    """
+    Build id from the varFile (or templateFile), the vmImage and the
+    current time, for example ubuntu1604-vmware-iso-20170301.101500
+    """
+    name = os.path.splitext(os.path.basename(varFile or templateFile))[0]
+    parts = [part for part in [name, vmImage] if part]
+    parts.append(time.strftime("%Y%m%d.%H%M%S"))
+    return "-".join(parts)
+
+
+class BuildContext(namedtuple("BuildContext", FIELDS)):
+    """
+    The immutable settings of one build, see the module docstring.
+
+    @param: buildId - id the build's logs and directories are named by
+    @param: repo - directory packer runs in
+    @param: templateFile - packer template, absolute or relative to repo
+    @param: varFile - optional variables file, absolute or relative to repo
+    @param: vmImage - the one builder to run, "" for all
+    @param: outputDir - directory the builders' output goes in
+    @param: buildLogDir - directory of the per-build output logs, "" for none
+    """
+    __slots__ = ()
+
+    @classmethod
+    def create(cls, conf, repo, templateFile, varFile="", vmImage="",
+               buildId="", outputRoot=""):
+        """
+        A context with the build id, directories and log directory filled
+        in from the arguments and conf.
+
+        @param: outputRoot - directory the build's outputDir is made in,
+                             default OUTPUT_DIR in the repo
+        """
+        repo = os.path.abspath(os.path.expanduser(repo))
+        if not buildId:
+            buildId = makeBuildId(templateFile, varFile, vmImage)
+        outputDir = os.path.join(outputRoot or os.path.join(repo, OUTPUT_DIR), buildId)
+        return cls(buildId, repo, templateFile, varFile or "", vmImage or "",
+                   outputDir, conf.getBuildLogDir())
+
+    def replace(self, **changes):
+        """
+        A copy with the given fields changed.
+        """
+        return self._replace(**changes)
+
+    def resolve(self, path):
+        """
+        path made absolute against the repo, as packer will see it.
+        """
+        if not path:
+            return path
+        return os.path.join(self.repo, path)
+
+    def getTemplatePath(self):
+        return self.resolve(self.templateFile)
+
+    def getVarFilePath(self):
+        return self.resolve(self.varFile)
+
+    def getBuildTemplatePath(self):
+        """
+        Where the build's copy of its template goes - a hidden file named
+        for the build, in the template's directory.
+        """
+        templatePath = self.getTemplatePath()
+        return os.path.join(os.path.dirname(templatePath),
+                            "." + self.buildId + "-" + os.path.basename(templatePath))
+
+    def getBuilderOutputDir(self, builderName):
+        """
+        The output_directory of one of the template's builders.
+        """
+        return os.path.join(self.outputDir, builderName)
+
+    def toDict(self):
+        return dict(self._asdict())
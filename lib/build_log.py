@@ -0,0 +1,278 @@
+"""
+Per-build raw output logs with a seekable line index.
+
+A BuildLog is two files: <name>.log holding a build's output byte for byte
+as it was read from the pipes, carriage return redraws included, and
+<name>.idx holding one fixed size record per line - the byte offset in the
+.log the line starts at and the time it started, packed as struct "<Qd".
+A line is indexed once its newline arrives, and a last unfinished line when
+the log is closed.  As the index is sorted by time and every record is the same
+size, BuildLogReader can find the lines for a time range, the last few
+lines, or a line number with a handful of small reads, however large the
+log gets.
+
+    buildLog = BuildLog("/tmp/builds/ubuntu1604-vmware-iso-20170301.101500")
+    runWith.setBuildLog(buildLog)
+    ...
+    buildLog.close()
+
+    reader = BuildLogReader("/tmp/builds/ubuntu1604-vmware-iso-20170301.101500")
+    for number, stamp, line in reader.grep("error", start=t0, end=t0 + 600):
+        ...
+"""
+from __future__ import absolute_import
+#--- Native python libraries
+import os
+import re
+import time
+import struct
+import threading
+
+INDEX_RECORD = struct.Struct("<Qd")
+
+#####
+# Lines read from the log at once when scanning
+SCAN_LINES = 4096
+
+
+def buildLogPaths(path):
+    """
+    The .log and .idx files for a build log path, with or without an
+    extension.
+    """
+    base = re.sub(r"\.(log|idx)$", "", path)
+    return base + ".log", base + ".idx"
+
+
+class BuildLog(object):
+    """
+    Writer for a build's raw output and its line index.
+    """
+    def __init__(self, path):
+        """
+        @param: path - path of the log, the .log and .idx extensions are
+                       added as needed.  Existing logs are appended to.
+        """
+        self.logPath, self.indexPath = buildLogPaths(path)
+        directory = os.path.dirname(self.logPath)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        self.logFile = open(self.logPath, "ab")
+        self.indexFile = open(self.indexPath, "ab")
+        self.logFile.seek(0, os.SEEK_END)
+        self.offset = self.logFile.tell()
+        self.lineStart = None
+        self.lock = threading.Lock()
+
+    def getPath(self):
+        """
+        Path of the raw .log file.
+        """
+        return self.logPath
+
+    def write(self, data, stamp=None):
+        """
+        Append output exactly as read, indexing the lines it finishes.
+        Flushes both files once so readers following the log see it.
+        """
+        if not data:
+            return
+        if stamp is None:
+            stamp = time.time()
+        if isinstance(data, unicode):
+            data = data.encode("utf-8")
+        index = []
+        with self.lock:
+            position = 0
+            while True:
+                end = data.find("\n", position)
+                if end < 0:
+                    break
+                if self.lineStart is None:
+                    self.lineStart = (self.offset + position, stamp)
+                index.append(INDEX_RECORD.pack(*self.lineStart))
+                self.lineStart = None
+                position = end + 1
+            if position < len(data) and self.lineStart is None:
+                self.lineStart = (self.offset + position, stamp)
+            #####
+            # Write the log before the index, so an index record never
+            # points past the end of the log.
+            self.logFile.write(data)
+            self.logFile.flush()
+            self.indexFile.write("".join(index))
+            self.indexFile.flush()
+            self.offset += len(data)
+
+    def writeLine(self, line, stamp=None):
+        """
+        Append one line of output.
+        """
+        self.writeLines([line], stamp)
+
+    def writeLines(self, lines, stamp=None):
+        """
+        Append lines of output, each ended with a newline, all with the
+        same time stamp.
+        """
+        data = []
+        for line in lines:
+            if isinstance(line, unicode):
+                line = line.encode("utf-8")
+            data.append(line.rstrip("\r\n") + "\n")
+        self.write("".join(data), stamp)
+
+    def close(self):
+        with self.lock:
+            if self.lineStart is not None and not self.indexFile.closed:
+                self.indexFile.write(INDEX_RECORD.pack(*self.lineStart))
+                self.lineStart = None
+            self.logFile.close()
+            self.indexFile.close()
+
+###############################################################################
+
+class BuildLogReader(object):
+    """
+    Random access to a build log through its index.
+    """
+    def __init__(self, path):
+        self.logPath, self.indexPath = buildLogPaths(path)
+
+    def getLineCount(self):
+        """
+        Number of lines indexed so far.
+        """
+        try:
+            return os.path.getsize(self.indexPath) // INDEX_RECORD.size
+        except OSError:
+            return 0
+
+    def getEntries(self, start, end):
+        """
+        (offset, time stamp) index records for lines start up to end.
+        """
+        if end <= start:
+            return []
+        indexFile = open(self.indexPath, "rb")
+        try:
+            indexFile.seek(start * INDEX_RECORD.size)
+            data = indexFile.read((end - start) * INDEX_RECORD.size)
+        finally:
+            indexFile.close()
+        count = len(data) // INDEX_RECORD.size
+        return [INDEX_RECORD.unpack_from(data, number * INDEX_RECORD.size) \
+                for number in range(count)]
+
+    def getEntry(self, number):
+        entries = self.getEntries(number, number + 1)
+        if not entries:
+            raise IndexError("No line " + str(number) + " in " + self.logPath)
+        return entries[0]
+
+    def seekTime(self, stamp):
+        """
+        Number of the first line written at or after stamp - the line count
+        if there is none.  A binary search over the index.
+        """
+        low = 0
+        high = self.getLineCount()
+        while low < high:
+            middle = (low + high) // 2
+            if self.getEntry(middle)[1] < stamp:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def readLines(self, start=0, end=None):
+        """
+        Lines start up to end, as (line number, time stamp, line) tuples,
+        without their newline or carriage return and newline.
+        """
+        count = self.getLineCount()
+        if end is None or end > count:
+            end = count
+        if start < 0:
+            start = max(0, count + start)
+        if start >= end:
+            return []
+        entries = self.getEntries(start, end)
+        logFile = open(self.logPath, "rb")
+        try:
+            logFile.seek(entries[0][0])
+            if end < count:
+                data = logFile.read(self.getEntry(end)[0] - entries[0][0])
+            else:
+                data = logFile.read()
+        finally:
+            logFile.close()
+        lines = []
+        first = entries[0][0]
+        for position, (offset, stamp) in enumerate(entries):
+            lineEnd = data.find("\n", offset - first)
+            if lineEnd < 0:
+                #####
+                # Only the last line of a closed log has no newline
+                if end < count:
+                    break
+                lineEnd = len(data)
+            line = data[offset - first:lineEnd]
+            if line.endswith("\r"):
+                line = line[:-1]
+            lines.append((start + position, stamp, line))
+        return lines
+
+    def readTimeRange(self, start=None, end=None):
+        """
+        Lines written from time start up to, but not including, time end.
+        """
+        first = 0 if start is None else self.seekTime(start)
+        last = None if end is None else self.seekTime(end)
+        return self.readLines(first, last)
+
+    def tail(self, count=20):
+        """
+        The last count lines.
+        """
+        return self.readLines(-count)
+
+    def follow(self, start=None, interval=0.5, keepGoing=None):
+        """
+        Generator yielding lines as they are written, like tail -f.
+
+        @param: start - line number to start from, default the current end
+        @param: interval - seconds between checks for new lines
+        @param: keepGoing - callable returning False to stop following once
+                            no new lines are left, for example when the
+                            build has finished.  Default follows forever.
+        """
+        number = self.getLineCount() if start is None else start
+        while True:
+            lines = self.readLines(number, number + SCAN_LINES)
+            for line in lines:
+                yield line
+            number += len(lines)
+            if not lines:
+                if keepGoing is not None and not keepGoing():
+                    if number >= self.getLineCount():
+                        return
+                    continue
+                time.sleep(interval)
+
+    def grep(self, pattern, start=None, end=None):
+        """
+        Lines matching a regular expression, optionally limited to a time
+        range, read a block of lines at a time.
+        """
+        matcher = re.compile(pattern)
+        number = 0 if start is None else self.seekTime(start)
+        last = self.getLineCount() if end is None else self.seekTime(end)
+        while number < last:
+            block = self.readLines(number, min(last, number + SCAN_LINES))
+            if not block:
+                break
+            for line in block:
+                if matcher.search(line[2]):
+                    yield line
+            number += len(block)
@@ -0,0 +1,372 @@
+"""
+Pooled, concurrent execution of python callables and command lines.
+
+RunWith and runMyThreadCommand run a single command and block until it is
+done.  The classes here keep a fixed set of worker threads around so batches
+of independent commands (git operations on several repos, discovery probes,
+dscl lookups) can be fired off at once and collected later via futures.
+
+    pool = CommandPool(logger, workers=4)
+    batch = pool.runBatch([["/usr/bin/git", "pull"],
+                           {"command" : ["/usr/bin/git", "pull"],
+                            "cwd" : "/opt/tools/src/boxcutter/debian"}],
+                          timeout=600)
+    for result in batch.getResults():
+        print result.label, result.returncode
+
+"""
+from __future__ import absolute_import
+#--- Native python libraries
+import time
+import Queue
+import threading
+import traceback
+
+#--- non-native python libraries in this source tree
+from .loggers import CyLogger
+from .loggers import LogPriority as lp
+from .watchdog import getDeadlineWatchdog
+from .launcher import launch
+from .log_context import logContext, getLogContext, setLogContext, newCommandId
+
+
+class FutureTimeoutError(Exception):
+    """
+    Thrown when a result is not available within the requested time.
+    """
+    def __init__(self, *args, **kwargs):
+        Exception.__init__(self, *args, **kwargs)
+
+
+class PoolShutdownError(Exception):
+    """
+    Thrown when work is submitted to a pool that has been shut down.
+    """
+    def __init__(self, *args, **kwargs):
+        Exception.__init__(self, *args, **kwargs)
+
+###############################################################################
+
+class CommandFuture(object):
+    """
+    Handle on the eventual result of work submitted to a WorkerPool.
+    """
+    def __init__(self, label=""):
+        self.label = label
+        self._done = threading.Event()
+        self._lock = threading.Lock()
+        self._result = None
+        self._exception = None
+        self._callbacks = []
+
+    def isDone(self):
+        """
+        True once the work has finished, successfully or not.
+        """
+        return self._done.isSet()
+
+    def getResult(self, timeout=None):
+        """
+        Block until the work is done and return its result, re-raising any
+        exception the work raised.
+
+        @param: timeout - seconds to wait, None waits forever.
+        """
+        if not self._done.wait(timeout):
+            raise FutureTimeoutError("No result for '" + str(self.label) + \
+                                     "' after " + str(timeout) + " seconds")
+        if self._exception is not None:
+            raise self._exception
+        return self._result
+
+    def getException(self, timeout=None):
+        """
+        Block until the work is done and return the exception it raised, or
+        None if it completed normally.
+        """
+        if not self._done.wait(timeout):
+            raise FutureTimeoutError("No result for '" + str(self.label) + \
+                                     "' after " + str(timeout) + " seconds")
+        return self._exception
+
+    def addDoneCallback(self, callback):
+        """
+        Call callback(future) when the work finishes.  Called immediately if
+        the work is already done.
+        """
+        with self._lock:
+            if not self._done.isSet():
+                self._callbacks.append(callback)
+                return
+        callback(self)
+
+    def _setResult(self, result):
+        self._result = result
+        self._finish()
+
+    def _setException(self, exception):
+        self._exception = exception
+        self._finish()
+
+    def _finish(self):
+        with self._lock:
+            self._done.set()
+            callbacks = self._callbacks
+            self._callbacks = []
+        for callback in callbacks:
+            try:
+                callback(self)
+            except Exception:
+                pass
+
+###############################################################################
+
+class WorkerPool(object):
+    """
+    Fixed size pool of daemon threads running submitted callables.
+
+    Threads are started on the first submit, so creating a pool is cheap.
+    """
+    def __init__(self, logger, workers=4):
+        if not isinstance(logger, CyLogger):
+            raise ValueError("Passed in value for logger is invalid, try again.")
+        self.logger = logger
+        try:
+            self.workers = max(1, int(workers))
+        except (TypeError, ValueError):
+            self.workers = 4
+        self.queue = Queue.Queue()
+        self.threads = []
+        self.lock = threading.Lock()
+        self.shutdownRequested = False
+
+    def getWorkerCount(self):
+        """
+        Getter for the number of worker threads.
+        """
+        return self.workers
+
+    def submit(self, func, *args, **kwargs):
+        """
+        Queue func(*args, **kwargs) to run on a worker thread.
+
+        @returns: a CommandFuture for the return value of func.
+        """
+        label = kwargs.pop("futureLabel", getattr(func, "__name__", str(func)))
+        future = CommandFuture(label)
+        with self.lock:
+            if self.shutdownRequested:
+                raise PoolShutdownError("Cannot submit work to a pool " + \
+                                        "that has been shut down.")
+            self._startWorkers()
+            #####
+            # Run the job with the submitter's log context, so its records
+            # still carry the build and command ids.
+            self.queue.put((future, func, args, kwargs, getLogContext()))
+        return future
+
+    def map(self, func, items, timeout=None):
+        """
+        Run func on each item concurrently and return the results in order.
+        """
+        futures = [self.submit(func, item) for item in items]
+        return [future.getResult(timeout) for future in futures]
+
+    def shutdown(self, wait=True):
+        """
+        Stop accepting work, let queued work finish and stop the threads.
+        """
+        with self.lock:
+            if self.shutdownRequested:
+                threads = []
+            else:
+                self.shutdownRequested = True
+                threads = list(self.threads)
+                for _ in threads:
+                    self.queue.put(None)
+        if wait:
+            for thread in threads:
+                thread.join()
+
+    def _startWorkers(self):
+        while len(self.threads) < self.workers:
+            thread = threading.Thread(target=self._work,
+                                      name="WorkerPool-" + \
+                                           str(len(self.threads)))
+            thread.daemon = True
+            thread.start()
+            self.threads.append(thread)
+
+    def _work(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            future, func, args, kwargs, context = item
+            setLogContext(context)
+            try:
+                result = func(*args, **kwargs)
+            except Exception, err:
+                self.logger.log(lp.DEBUG, traceback.format_exc())
+                future._setException(err)
+            else:
+                future._setResult(result)
+            finally:
+                setLogContext({})
+
+###############################################################################
+
+class CommandResult(object):
+    """
+    Outcome of one command run by the CommandPool.
+    """
+    def __init__(self, command, label=""):
+        self.command = command
+        self.label = label
+        self.output = ""
+        self.error = ""
+        self.returncode = None
+        self.timedOut = False
+        self.elapsed = 0.0
+
+    def getReturns(self):
+        """
+        Same shape as RunWith.getReturns - stdout, stderr and return code.
+        """
+        return self.output, self.error, self.returncode
+
+    def succeeded(self):
+        """
+        True if the command ran to completion with a zero return code.
+        """
+        return not self.timedOut and self.returncode == 0
+
+
+class BatchResult(object):
+    """
+    Aggregated results of a batch of commands, in submission order.
+    """
+    def __init__(self, futures):
+        self.futures = futures
+
+    def getResults(self, timeout=None):
+        """
+        Wait for every command and return the list of CommandResults.
+
+        @param: timeout - total seconds to wait for the whole batch.
+        """
+        results = []
+        deadline = None
+        if timeout is not None:
+            deadline = time.time() + timeout
+        for future in self.futures:
+            remaining = None
+            if deadline is not None:
+                remaining = max(0, deadline - time.time())
+            results.append(future.getResult(remaining))
+        return results
+
+    def getFailed(self, timeout=None):
+        """
+        Results that timed out or returned non-zero.
+        """
+        return [result for result in self.getResults(timeout) \
+                if not result.succeeded()]
+
+    def getTimedOut(self, timeout=None):
+        """
+        Results that were killed because they ran past their timeout.
+        """
+        return [result for result in self.getResults(timeout) \
+                if result.timedOut]
+
+    def allSucceeded(self, timeout=None):
+        """
+        True if every command in the batch succeeded.
+        """
+        return not self.getFailed(timeout)
+
+###############################################################################
+
+class CommandPool(WorkerPool):
+    """
+    WorkerPool that knows how to run command lines.
+    """
+    def submitCommand(self, command, env=None, myshell=False, cwd=None,
+                      timeout=None, label="", gate=None):
+        """
+        Queue a command to run on a worker thread.
+
+        @param: command - list or string, as with RunWith.setCommand
+        @param: env - environment dictionary for the child
+        @param: myshell - run through the shell
+        @param: cwd - directory to run the command in
+        @param: timeout - seconds before the command is killed, None for none
+        @param: label - name used in logs and results, defaults to the command
+        @param: gate - context manager held while the command runs, like a
+                       BandwidthScheduler slot
+
+        @returns: CommandFuture whose result is a CommandResult
+        """
+        if not label:
+            label = self._printable(command)
+        return self.submit(self._runCommand, command, env, myshell, cwd,
+                           timeout, label, gate, futureLabel=label)
+
+    def runBatch(self, commands, timeout=None):
+        """
+        Submit several commands at once.
+
+        @param: commands - list of commands, each either a command list/string
+                           or a dictionary of submitCommand keyword arguments.
+        @param: timeout - default per-command timeout.
+
+        @returns: BatchResult
+        """
+        futures = []
+        for command in commands:
+            if isinstance(command, dict):
+                kwargs = dict(command)
+                kwargs.setdefault("timeout", timeout)
+                futures.append(self.submitCommand(**kwargs))
+            else:
+                futures.append(self.submitCommand(command, timeout=timeout))
+        return BatchResult(futures)
+
+    def _printable(self, command):
+        if isinstance(command, list):
+            return " ".join(command)
+        return str(command)
+
+    def _runCommand(self, command, env, myshell, cwd, timeout, label, gate=None):
+        with logContext(commandId=newCommandId()):
+            if gate is None:
+                return self._runCommandInContext(command, env, myshell, cwd,
+                                                 timeout, label)
+            with gate:
+                return self._runCommandInContext(command, env, myshell, cwd,
+                                                 timeout, label)
+
+    def _runCommandInContext(self, command, env, myshell, cwd, timeout, label):
+        result = CommandResult(command, label)
+        start = time.time()
+        proc = launch(command, shell=myshell, env=env, cwd=cwd,
+                      newProcessGroup=True)
+        handle = None
+        if timeout:
+            handle = getDeadlineWatchdog(self.logger).watch(proc, timeout,
+                                                            label=label)
+        try:
+            result.output, result.error = proc.communicate()
+        finally:
+            if handle is not None:
+                handle.cancel()
+        result.returncode = proc.returncode
+        result.timedOut = handle is not None and handle.fired
+        result.elapsed = time.time() - start
+        if result.timedOut:
+            self.logger.log(lp.WARNING, "Timed out after " + str(timeout) + \
+                                        " seconds: " + label)
+        self.logger.log(lp.DEBUG, label + " Returned with returncode: " + \
+                                  str(result.returncode))
+        return result
@@ -19,18 +19,29 @@ class Conf(object) :
         self.version = "0.0.0.0"
         self.options = []
         self.logger = CyLogger()
-        self.currentRepoPath = "~/"
         psudopath = os.path.abspath(os.path.dirname(__file__))
         partialpath = psudopath.split("/")
         self.appPath = os.path.join("/", "/".join(partialpath[:-1]))
-        self.currentVarFilePath = ""
-        self.currentTemplateFilePath = ""
-        self.onlyVmImage = ""
         self.proxy = ""
         self.httpProxy = ""
         self.httpsProxy = ""
         self.ftpProxy = ""
+        self.rsyncProxy = ""
+        self.noProxy = ""
+        self.compareProxies = False
+        self.proxyManager = None
+        self.packageCache = False
+        self.packageCacheDir = ""
+        self.packageCacheSize = 10240
+        self.packageCacheClients = []
+        self.packageCacheProxy = None
+        self.bandwidthLimit = 0
+        self.bandwidthCaps = {}
+        self.transferLimits = {}
+        self.bandwidthScheduler = None
+        self.portLeaseManager = None
         self.repoRoot = ""
+        self.buildLogDir = ""
 
     def getVersion(self) :
         """
@@ -72,66 +83,6 @@ class Conf(object) :
         """
         return self.environ
 
-    def setCurrentRepo(self, repoPath=""):
-        """
-        Setter for the password
-        """
-        self.currentRepoPath = repoPath
-
-    def getCurrentRepo(self):
-        """
-        Getter for the password
-        """
-        return self.currentRepoPath
-
-    def setCurrentVarFilePath(self, varFilePath):
-        '''
-        Getter for the full packer json file path
-
-        @author: Roy Nielsen
-        '''
-        self.currentVarFilePath = varFilePath
-    
-    def getCurrentVarFilePath(self):
-        '''
-        Getter for the full packer json file path
-
-        @author: Roy Nielsen
-        '''
-        return self.currentVarFilePath
-    
-    def setCurrentTemplateFilePath(self, templateFilePath):
-        '''
-        Getter for the full packer json file path
-
-        @author: Roy Nielsen
-        '''
-        self.currentTemplateFilePath = templateFilePath
-    
-    def getCurrentTemplateFilePath(self):
-        '''
-        Getter for the full packer json file path
-
-        @author: Roy Nielsen
-        '''
-        return self.currentTemplateFilePath
-    
-    def setOnlyVmImage(self, onlyVmImage):
-        '''
-        Getter for the full packer json file path
-
-        @author: Roy Nielsen
-        '''
-        self.onlyVmImage = onlyVmImage
-    
-    def getOnlyVmImage(self):
-        '''
-        Getter for the full packer json file path
-
-        @author: Roy Nielsen
-        '''
-        return self.onlyVmImage
-    
     def setProxy(self, proxy):
         '''
         Getter for the full packer json file path
@@ -228,6 +179,170 @@ class Conf(object) :
         '''
         return self.noProxy
     
+    def setCompareProxies(self, compareProxies=False):
+        '''
+        Setter for whether to time each host through the proxy and directly
+        '''
+        self.compareProxies = compareProxies
+
+    def getCompareProxies(self):
+        '''
+        Getter for whether to time each host through the proxy and directly
+        '''
+        return self.compareProxies
+
+    def getProxyManager(self):
+        '''
+        The ProxyManager choosing between the configured proxies, made on
+        first use so its health checks and routes are shared
+        '''
+        if self.proxyManager is None:
+            from .proxy_manager import ProxyManager
+            self.proxyManager = ProxyManager(self, compare=self.compareProxies)
+        return self.proxyManager
+
+    def setPackageCache(self, packageCache=False):
+        '''
+        Setter for whether builds fetch their packages through the local
+        caching proxy
+        '''
+        self.packageCache = packageCache
+
+    def getPackageCache(self):
+        '''
+        Getter for whether builds fetch their packages through the local
+        caching proxy
+        '''
+        return self.packageCache
+
+    def setPackageCacheDir(self, packageCacheDir=""):
+        '''
+        Setter for the directory cached packages are kept in, empty for
+        the user's cache directory
+        '''
+        self.packageCacheDir = packageCacheDir
+
+    def getPackageCacheDir(self):
+        '''
+        Getter for the directory cached packages are kept in
+        '''
+        if not self.packageCacheDir:
+            from .facts_cache import getDefaultCachePath
+            return getDefaultCachePath("packages")
+        return self.packageCacheDir
+
+    def setPackageCacheSize(self, packageCacheSize=10240):
+        '''
+        Setter for the megabytes of packages to keep
+        '''
+        self.packageCacheSize = packageCacheSize
+
+    def getPackageCacheSize(self):
+        '''
+        Getter for the megabytes of packages to keep
+        '''
+        return self.packageCacheSize
+
+    def setPackageCacheClients(self, packageCacheClients=None):
+        '''
+        Setter for the networks, besides the VM networks found, allowed to
+        use the package cache
+        '''
+        self.packageCacheClients = list(packageCacheClients or [])
+
+    def getPackageCacheClients(self):
+        '''
+        Getter for the extra networks allowed to use the package cache
+        '''
+        return self.packageCacheClients
+
+    def getPackageCacheProxy(self):
+        '''
+        The running PackageCacheProxy, started on first use, or None if
+        packages aren't to be cached, or the VM networks can't be found
+        '''
+        if not self.packageCache:
+            return None
+        if self.packageCacheProxy is None:
+            import atexit
+            from .package_cache_proxy import PackageCacheProxy, PackageStore
+            from .package_cache_proxy import NoGuestNetworkError
+            store = PackageStore(self.getPackageCacheDir(),
+                                 self.packageCacheSize * 1024 * 1024)
+            try:
+                self.packageCacheProxy = PackageCacheProxy(self.logger, store,
+                                                           self.getProxyManager(),
+                                                           scheduler=self.getBandwidthScheduler(),
+                                                           extraClients=self.packageCacheClients)
+            except NoGuestNetworkError, err:
+                self.logger.log(lp.WARNING, "Package cache not started: " + str(err))
+                self.packageCache = False
+                return None
+            self.packageCacheProxy.start()
+            atexit.register(self.packageCacheProxy.stop)
+        return self.packageCacheProxy
+
+    def setBandwidthLimit(self, bandwidthLimit=0):
+        '''
+        Setter for the kilobytes a second all throttled downloads share, 0
+        for no limit
+        '''
+        self.bandwidthLimit = bandwidthLimit
+
+    def getBandwidthLimit(self):
+        '''
+        Getter for the kilobytes a second all throttled downloads share
+        '''
+        return self.bandwidthLimit
+
+    def setBandwidthCaps(self, bandwidthCaps=None):
+        '''
+        Setter for the kilobytes a second each traffic class may use, see
+        lib.bandwidth.CLASSES
+        '''
+        self.bandwidthCaps = dict(bandwidthCaps or {})
+
+    def getBandwidthCaps(self):
+        '''
+        Getter for the kilobytes a second each traffic class may use
+        '''
+        return self.bandwidthCaps
+
+    def setTransferLimits(self, transferLimits=None):
+        '''
+        Setter for the transfers each traffic class may run at once
+        '''
+        self.transferLimits = dict(transferLimits or {})
+
+    def getTransferLimits(self):
+        '''
+        Getter for the transfers each traffic class may run at once
+        '''
+        return self.transferLimits
+
+    def getBandwidthScheduler(self):
+        '''
+        The BandwidthScheduler every download shares, made on first use
+        from the limits set
+        '''
+        if self.bandwidthScheduler is None:
+            from .bandwidth import BandwidthScheduler
+            caps = dict((trafficClass, rate * 1024)
+                        for trafficClass, rate in self.bandwidthCaps.items())
+            self.bandwidthScheduler = BandwidthScheduler(self.bandwidthLimit * 1024,
+                                                         caps, self.transferLimits)
+        return self.bandwidthScheduler
+
+    def getPortLeaseManager(self):
+        '''
+        The PortLeaseManager handing each build its own ports, made on first
+        use
+        '''
+        if self.portLeaseManager is None:
+            from .port_leases import PortLeaseManager
+            self.portLeaseManager = PortLeaseManager(self.logger)
+        return self.portLeaseManager
+
     def setRepoRoot(self, repo):
         '''
         Setter for the full path to the boxcutter repo
@@ -271,3 +386,16 @@ class Conf(object) :
         self.logger.log(lp.DEBUG, "---==# #==---")
         self.logger.log(lp.DEBUG, "script version:  " + str(self.version))
         self.logger.log(lp.DEBUG, "---==# #==---")
+
+    def setBuildLogDir(self, buildLogDir=""):
+        '''
+        Setter for the directory holding per-build output logs
+        '''
+        self.buildLogDir = buildLogDir
+
+    def getBuildLogDir(self):
+        '''
+        Getter for the directory holding per-build output logs, an empty
+        string if builds don't get their own logs
+        '''
+        return self.buildLogDir
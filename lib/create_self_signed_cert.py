@@ -1,5 +1,4 @@
 
-from OpenSSL import crypto, SSL
 from socket import gethostname
 from pprint import pprint
 from time import gmtime, mktime
@@ -13,6 +12,10 @@ def create_self_signed_cert(cert_dir="cert", data={}, certFile="myapp.crt", keyF
     If datacard.crt and datacard.key don't exist in cert_dir, create a new
     self-signed cert and keypair and write them into that directory.
     """
+    #####
+    # pyOpenSSL is slow to load and only needed here
+    from OpenSSL import crypto
+
     if not exists(join(cert_dir, CERT_FILE)) \
             or not exists(join(cert_dir, KEY_FILE)):
 
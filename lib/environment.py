@@ -53,6 +53,11 @@ import types
 import platform
 import pwd
 import time
+import threading
+
+#--- non-native python libraries in this source tree
+from .facts_cache import FactsCache
+from . import netinfo
 
 try:
     from localize import VERSION
@@ -75,33 +80,104 @@ else:
     DMI = False
 
 
+#####
+# Probes collecting each group of facts, run on first access to one of the
+# group's facts.  The groups don't depend on each other.
+FACT_PROBES = {"os" : ["discoveros", "setosfamily"],
+               "network" : ["guessnetwork"],
+               "hardware" : ["collecthardware"],
+               "paths" : ["collectpaths"]}
+
+#####
+# Groups kept in the FactsCache between runs - the paths depend on how the
+# program was started, so they are always collected.
+CACHED_GROUPS = ["os", "network", "hardware"]
+
+
+class LazyFact(object):
+    """
+    Environment attribute whose group of facts is collected the first time
+    any of them is read.  Assigning to it - as the probes do - just stores
+    the value.
+    """
+    def __init__(self, group, default=''):
+        self.group = group
+        self.default = default
+        self.name = None
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        instance.collectfacts(self.group)
+        return instance.facts.get(self.name, self.default)
+
+    def __set__(self, instance, value):
+        instance.facts[self.name] = value
+
+
+class LazyFacts(type):
+    """
+    Metaclass telling each LazyFact the name it was assigned to, and
+    listing the facts of each group in factNames.
+    """
+    def __init__(cls, name, bases, attributes):
+        super(LazyFacts, cls).__init__(name, bases, attributes)
+        cls.factNames = {}
+        for key, value in attributes.iteritems():
+            if isinstance(value, LazyFact):
+                value.name = key
+                cls.factNames.setdefault(value.group, []).append(key)
+
+
 class Environment(object):
     """
     The Environment class collects commonly used information about the
     execution platform and makes it available to the rules.
+
+    Facts are collected on first use - creating an Environment runs no
+    probes, and reading the OS type never looks at the network.
+    collectinfo() collects everything at once, running the probes
+    concurrently.  Facts that don't change while the machine is up are
+    kept in a FactsCache, so later runs don't probe at all.
     :version: 1.0
     :author: D. Kennel
     """
-
-    def __init__(self):
-        self.operatingsystem = ''
-        self.osreportstring = ''
-        self.osfamily = ''
-        self.hostname = ''
-        self.ipaddress = ''
-        self.macaddress = ''
-        self.osversion = ''
+    __metaclass__ = LazyFacts
+
+    operatingsystem = LazyFact("os")
+    osreportstring = LazyFact("os")
+    osfamily = LazyFact("os")
+    osversion = LazyFact("os")
+    hostname = LazyFact("network")
+    ipaddress = LazyFact("network")
+    macaddress = LazyFact("network")
+    test_mode = LazyFact("paths")
+    script_path = LazyFact("paths")
+    resources_path = LazyFact("paths")
+    rules_path = LazyFact("paths")
+    log_path = LazyFact("paths")
+    icon_path = LazyFact("paths")
+    conf_path = LazyFact("paths")
+    systemserial = LazyFact("hardware")
+    chassisserial = LazyFact("hardware")
+    sysuuid = LazyFact("hardware")
+
+    def __init__(self, factsCache=None):
+        """
+        @param: factsCache - FactsCache to use, default the user's cache,
+                             False to always probe
+        """
+        if factsCache is None:
+            factsCache = FactsCache()
+        self.factsCache = factsCache
+        self.facts = {}
+        self.factLocks = dict((group, threading.RLock()) for group in FACT_PROBES)
+        self.factsCollected = set()
+        self.factsCollecting = set()
         self.numrules = 0
         self.version = VERSION
         self.euid = os.geteuid()
         currpwd = pwd.getpwuid(self.euid)
-        self.test_mode = ""
-        self.script_path = ""
-        self.resources_path = ""
-        self.rules_path = ""
-        self.log_path = ""
-        self.icon_path = ""
-        self.conf_path = ""
         try:
             self.homedir = currpwd[5]
         except IndexError:
@@ -112,7 +188,6 @@ class Environment(object):
         self.runtime = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())
         self.systemfismacat = 'low'
         self.determinefismacat()
-        self.collectinfo()
 
     def setverbosemode(self, verbosemode):
         """
@@ -257,20 +332,65 @@ class Environment(object):
 
     def collectinfo(self):
         """
-        Private method to populate data.
+        Collect every group of facts not collected yet, running the groups'
+        probes concurrently.
 
         @return: void
         @author D. Kennel
         """
-        # print 'Environment Running discoveros'
-        self.discoveros()
-        # print 'Environment running setosfamily'
-        self.setosfamily()
-        # print 'Environment running guessnetwork'
-        self.guessnetwork()
-        self.collectpaths()
+        #####
+        # Imported here so creating an Environment doesn't pull in the
+        # command pool and its dependencies
+        from .command_pool import WorkerPool
+        from .loggers import CyLogger
+
+        groups = [group for group in sorted(FACT_PROBES) \
+                  if group not in self.factsCollected]
+        if not groups:
+            return
+        pool = WorkerPool(CyLogger(), workers=len(groups))
+        try:
+            pool.map(self.collectfacts, groups)
+        finally:
+            pool.shutdown()
         self.determinefismacat()
 
+    def collectfacts(self, group):
+        """
+        Run the probes for one group of facts, unless they already ran.
+        Threads reading the group's facts while it is being collected wait
+        for it.
+
+        @param: group - one of the keys of FACT_PROBES
+        """
+        if group in self.factsCollected:
+            return
+        with self.factLocks[group]:
+            #####
+            # A probe reading a fact of its own group, like collectpaths
+            # does, gets the value set so far.
+            if group in self.factsCollected or group in self.factsCollecting:
+                return
+            cached = group in CACHED_GROUPS and self.factsCache
+            if cached:
+                facts = self.factsCache.get(group)
+                if facts is not None:
+                    for name in self.factNames[group]:
+                        if name in facts:
+                            self.facts[name] = facts[name]
+                    self.factsCollected.add(group)
+                    return
+            self.factsCollecting.add(group)
+            try:
+                for probe in FACT_PROBES[group]:
+                    getattr(self, probe)()
+                self.factsCollected.add(group)
+            finally:
+                self.factsCollecting.discard(group)
+            if cached:
+                self.factsCache.put(group, dict((name, self.facts.get(name, "")) \
+                                                for name in self.factNames[group]))
+
     def discoveros(self):
         """
         Discover the operating system type and version
@@ -401,6 +521,16 @@ class Environment(object):
             # a valid hostname and gethostbyname errored.
             ipaddress = self.getdefaultip()
 
+        #####
+        # Ask the kernel first, ifconfig is the fallback
+        interface = netinfo.getInterfaceFor(ipaddress)
+        nativemac = interface and netinfo.getMacAddress(interface)
+        if nativemac:
+            self.hostname = hostname
+            self.ipaddress = ipaddress
+            self.macaddress = nativemac
+            return
+
         # In ifconfig output macaddresses are always one line before the ip
         # address.
         if sys.platform == 'linux2':
@@ -437,7 +567,18 @@ class Environment(object):
         """
         ipaddr = '127.0.0.1'
         gateway = ''
-        if sys.platform == 'linux2':
+        route = netinfo.getDefaultRoute()
+        if route is not None:
+            #####
+            # Read from /proc/net/route - the address of the default route's
+            # interface, no need to guess it from the gateway.
+            interface, gateway = route
+            if interface is None:
+                return ipaddr
+            address = netinfo.getInterfaceAddress(interface)
+            if address:
+                return address
+        elif sys.platform == 'linux2':
             try:
                 routecmd = subprocess.Popen('/sbin/route -n', shell=True,
                                             stdout=subprocess.PIPE,
@@ -518,6 +659,9 @@ class Environment(object):
         @author: dkennel
         """
         iplist = []
+        addresses = netinfo.getAllAddresses()
+        if addresses is not None:
+            return [address for interface, address in addresses]
         if sys.platform == 'linux2':
             try:
                 ifcmd = subprocess.Popen('/sbin/ifconfig', shell=True,
@@ -558,6 +702,40 @@ class Environment(object):
                         continue
         return iplist
 
+    def collecthardware(self):
+        """
+        Private method collecting the serial numbers and UUID of the
+        machine, read through getsystemserial, getchassisserial and
+        getsysuuid.
+        """
+        self.systemserial = self.get_system_serial_number()
+        self.chassisserial = self.get_chassis_serial_number()
+        self.sysuuid = self.get_sys_uuid()
+
+    def getsystemserial(self):
+        """
+        Return the system serial number, probed once and cached.
+
+        @return: string
+        """
+        return self.systemserial
+
+    def getchassisserial(self):
+        """
+        Return the chassis serial number, probed once and cached.
+
+        @return: string
+        """
+        return self.chassisserial
+
+    def getsysuuid(self):
+        """
+        Return the system UUID, probed once and cached.
+
+        @return: string
+        """
+        return self.sysuuid
+
     def get_system_serial_number(self):
         """
         Find and return the
@@ -0,0 +1,198 @@
+"""
+On-disk cache of the host facts Environment collects.
+
+Facts like the OS version, the network addresses or the system UUID come
+from subprocesses - lsb_release, ifconfig, dmidecode - and don't change
+while the machine is up.  FactsCache keeps them in a small JSON file, so
+every launch and test run after the first reads them instead of probing
+again.  The whole cache is thrown away when the machine has rebooted (its
+boot id changed) or its hostname changed, and a group of facts once it is
+older than the TTL.
+
+    cache = FactsCache()
+    facts = cache.get("os")
+    if facts is None:
+        facts = probe()
+        cache.put("os", facts)
+"""
+from __future__ import absolute_import
+#--- Native python libraries
+import os
+import json
+import time
+import socket
+import tempfile
+import threading
+import subprocess
+
+#####
+# Seconds cached facts are trusted, even within one boot
+DEFAULT_TTL = 24 * 60 * 60
+
+CACHE_VERSION = 1
+
+BOOT_ID_FILE = "/proc/sys/kernel/random/boot_id"
+
+
+def getBootId():
+    """
+    Identifier changing every time the machine boots - the kernel's boot id
+    on Linux, the boot time on macOS.  None if neither is available.
+    """
+    try:
+        with open(BOOT_ID_FILE) as bootIdFile:
+            return bootIdFile.read().strip()
+    except (IOError, OSError):
+        pass
+    if os.path.exists("/usr/sbin/sysctl"):
+        try:
+            proc = subprocess.Popen(["/usr/sbin/sysctl", "-n", "kern.boottime"],
+                                    stdout=subprocess.PIPE,
+                                    stderr=subprocess.PIPE, close_fds=True)
+            output = proc.communicate()[0].strip()
+            if proc.returncode == 0 and output:
+                return output
+        except OSError:
+            pass
+    return None
+
+
+def getDefaultCachePath(name="facts.json"):
+    """
+    A file, by default facts.json, in the user's cache directory.
+    """
+    cacheDir = os.environ.get("XDG_CACHE_HOME") or \
+               os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(cacheDir, "vmbuilder", name)
+
+
+class FactsCache(object):
+    """
+    Groups of facts, each a dictionary, saved as one JSON file.
+    """
+    def __init__(self, path=None, ttl=DEFAULT_TTL):
+        """
+        @param: path - cache file, default getDefaultCachePath()
+        @param: ttl - seconds before cached facts expire, 0 for never
+        """
+        self.path = path or getDefaultCachePath()
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.stamp = None
+        self.groups = None
+
+    def getPath(self):
+        """
+        Getter for the cache file path.
+        """
+        return self.path
+
+    def getStamp(self):
+        """
+        What the cache must have been written on to still be valid - the
+        boot id and hostname, worked out once.
+        """
+        if self.stamp is None:
+            self.stamp = {"version" : CACHE_VERSION,
+                          "bootId" : getBootId(),
+                          "hostname" : socket.gethostname()}
+        return self.stamp
+
+    def isValid(self, data):
+        """
+        Whether data read from the cache file still applies to this boot and
+        host.
+        """
+        if not isinstance(data, dict) or \
+           not isinstance(data.get("groups"), dict):
+            return False
+        for key, value in self.getStamp().iteritems():
+            if data.get(key) != value:
+                return False
+        return True
+
+    def isFresh(self, entry, now=None):
+        """
+        Whether a cached group is well formed and younger than the TTL.
+        """
+        if not isinstance(entry, dict) or \
+           not isinstance(entry.get("facts"), dict):
+            return False
+        if not self.ttl:
+            return True
+        if now is None:
+            now = time.time()
+        written = entry.get("written")
+        return isinstance(written, (int, float)) and \
+               0 <= now - written < self.ttl
+
+    def load(self):
+        """
+        Read the cache file, returning its groups, or an empty dictionary
+        if it is missing, unreadable or stale.
+        """
+        try:
+            with open(self.path) as cacheFile:
+                data = json.load(cacheFile)
+        except (IOError, OSError, ValueError):
+            return {}
+        if not self.isValid(data):
+            return {}
+        return data["groups"]
+
+    def get(self, group):
+        """
+        Cached facts of one group, None when they need to be collected.
+        """
+        with self.lock:
+            if self.groups is None:
+                self.groups = self.load()
+            entry = self.groups.get(group)
+        if not self.isFresh(entry):
+            return None
+        return dict(entry["facts"])
+
+    def put(self, group, facts):
+        """
+        Save the facts of one group.  Failing to write the cache is not an
+        error - the facts are just collected again next time.
+        """
+        with self.lock:
+            if self.groups is None:
+                self.groups = self.load()
+            self.groups[group] = {"written" : time.time(),
+                                  "facts" : dict(facts)}
+            data = dict(self.getStamp())
+            data["groups"] = self.groups
+            try:
+                self.write(data)
+            except (IOError, OSError, TypeError, ValueError):
+                pass
+
+    def write(self, data):
+        """
+        Replace the cache file atomically, so another process never reads a
+        partial file.
+        """
+        directory = os.path.dirname(self.path)
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        handle, temporary = tempfile.mkstemp(prefix=".facts-", dir=directory)
+        try:
+            with os.fdopen(handle, "w") as cacheFile:
+                json.dump(data, cacheFile, sort_keys=True)
+            os.rename(temporary, self.path)
+        except:
+            os.unlink(temporary)
+            raise
+
+    def clear(self):
+        """
+        Forget every cached group.
+        """
+        with self.lock:
+            self.groups = {}
+            try:
+                os.unlink(self.path)
+            except OSError:
+                pass
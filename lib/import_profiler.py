@@ -0,0 +1,159 @@
+"""
+Report how long each module takes to import, to find what slows startup.
+
+Python 2 has no -X importtime, so this wraps __builtin__.__import__ and
+times every import that actually loads something - imports of modules
+already in sys.modules are free and not recorded.  Each module gets its
+cumulative time, including what it imports in turn, and its self time,
+excluding that.
+
+Turned on by the VMBUILDER_IMPORT_PROFILE environment variable, before the
+entry points import anything else:
+
+    VMBUILDER_IMPORT_PROFILE=1 ./ClockworkVMsCli.py --help
+    VMBUILDER_IMPORT_PROFILE=/tmp/imports.txt ./ClockworkVMs.py
+
+The report goes to stderr, or the file named by the variable, at exit.
+"""
+from __future__ import absolute_import
+#--- Native python libraries
+import os
+import sys
+import time
+import atexit
+import __builtin__
+
+ENV_VAR = "VMBUILDER_IMPORT_PROFILE"
+
+#####
+# Values of the environment variable meaning "report to stderr"
+TO_STDERR = ["1", "-", "stderr", "true", "yes"]
+
+
+class ImportProfiler(object):
+    """
+    Times imports while installed.
+    """
+    def __init__(self, timer=time.time):
+        """
+        @param: timer - function returning the current time in seconds
+        """
+        self.timer = timer
+        self.timings = {}
+        self.order = []
+        self.stack = []
+        self.realImport = None
+
+    def install(self):
+        """
+        Start timing imports.
+        """
+        if self.realImport is None:
+            self.realImport = __builtin__.__import__
+            __builtin__.__import__ = self.profiledImport
+
+    def uninstall(self):
+        """
+        Stop timing imports, keeping what was recorded.
+        """
+        if self.realImport is not None:
+            __builtin__.__import__ = self.realImport
+            self.realImport = None
+
+    def isInstalled(self):
+        return self.realImport is not None
+
+    def profiledImport(self, name, *args, **kwargs):
+        """
+        Replacement for __import__.
+        """
+        loaded = len(sys.modules)
+        #####
+        # Time spent in nested imports is added to the slot pushed here, so
+        # it can be taken off this import's self time.
+        self.stack.append(0.0)
+        start = self.timer()
+        try:
+            return self.realImport(name, *args, **kwargs)
+        finally:
+            elapsed = self.timer() - start
+            nested = self.stack.pop()
+            if len(sys.modules) != loaded:
+                self.record(name, elapsed, elapsed - nested)
+                if self.stack:
+                    self.stack[-1] += elapsed
+
+    def record(self, name, cumulative, own):
+        if name not in self.timings:
+            self.order.append(name)
+            self.timings[name] = [0.0, 0.0]
+        self.timings[name][0] += cumulative
+        self.timings[name][1] += own
+
+    def getTimings(self):
+        """
+        List of (module, cumulative seconds, self seconds), in the order
+        the modules were first imported.
+        """
+        return [(name, self.timings[name][0], self.timings[name][1])
+                for name in self.order]
+
+    def isLoaded(self, name):
+        """
+        Whether the module, or a module of the package, was imported while
+        profiling.
+        """
+        for recorded in self.order:
+            if recorded == name or recorded.startswith(name + "."):
+                return True
+        return False
+
+    def report(self, stream, limit=None):
+        """
+        Write the timings to stream, slowest cumulative first.
+
+        @param: limit - only report this many modules
+        """
+        timings = sorted(self.getTimings(), key=lambda timing: -timing[1])
+        total = sum([timing[2] for timing in timings])
+        stream.write("%10s %10s  %s\n" % ("self ms", "cumul ms", "module"))
+        for name, cumulative, own in timings[:limit]:
+            stream.write("%10.1f %10.1f  %s\n" % (own * 1000, cumulative * 1000, name))
+        stream.write("%10.1f %10s  total for %d modules\n" % (total * 1000, "", len(timings)))
+
+
+profiler = None
+
+
+def reportAtExit(destination):
+    """
+    Write the profiler's report to destination when the program exits.
+    """
+    if destination.lower() in TO_STDERR:
+        profiler.report(sys.stderr)
+        return
+    try:
+        with open(destination, "w") as reportFile:
+            profiler.report(reportFile)
+    except IOError, err:
+        sys.stderr.write("Can't write import profile to " + destination + \
+                         ": " + str(err) + "\n")
+
+
+def installFromEnvironment(environ=None):
+    """
+    Install the module's profiler if the environment asks for it.
+
+    @returns: the profiler, or None if profiling isn't turned on
+    """
+    global profiler
+    if environ is None:
+        environ = os.environ
+    destination = environ.get(ENV_VAR, "")
+    if not destination or destination.lower() in ["0", "no", "false"]:
+        return None
+    if profiler is None:
+        profiler = ImportProfiler()
+        profiler.install()
+        atexit.register(reportAtExit, destination)
+    return profiler
@@ -0,0 +1,109 @@
+"""
+Per-thread log context and a JSON formatter using it.
+
+When several builds or repo operations run at once their output lines end
+up interleaved in one log.  Code running on behalf of a build sets the
+build's identifiers in the log context, CyLogger.log copies the current
+context onto each record, and JsonFormatter writes every record as one
+JSON object, so lines can be split per build without parsing free-form
+prefixes.
+
+    with logContext(buildId="ubuntu1604-vmware-iso-20170301", provider="vmware-iso"):
+        runner.runBuild(context)
+
+The context is thread local.  WorkerPool copies the submitting thread's
+context to the worker running the job.
+"""
+from __future__ import absolute_import
+#--- Native python libraries
+import json
+import time
+import logging
+import itertools
+import threading
+from contextlib import contextmanager
+
+#####
+# Context fields written by JsonFormatter, in output order
+CONTEXT_FIELDS = ["buildId", "provider", "commandId"]
+
+LEVEL_NAMES = {10 : "DEBUG", 20 : "INFO", 30 : "WARNING", 40 : "ERROR",
+               50 : "CRITICAL"}
+
+localContext = threading.local()
+commandCounter = itertools.count(1)
+
+
+def getLogContext():
+    """
+    Copy of the current thread's log context.
+    """
+    return dict(getattr(localContext, "fields", {}))
+
+
+def setLogContext(fields):
+    """
+    Replace the current thread's log context.
+    """
+    localContext.fields = dict(fields)
+
+
+@contextmanager
+def logContext(**fields):
+    """
+    Add fields to the log context for the duration of a with block.
+    Fields set to None are removed.
+    """
+    previous = getLogContext()
+    current = dict(previous)
+    for key, value in fields.iteritems():
+        if value is None:
+            current.pop(key, None)
+        else:
+            current[key] = value
+    localContext.fields = current
+    try:
+        yield current
+    finally:
+        localContext.fields = previous
+
+
+def newCommandId():
+    """
+    Process-wide unique id for a command run.
+    """
+    return "cmd-" + str(commandCounter.next())
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Format each record as a single line JSON object with the fields:
+    timestamp, level, module, function, line, buildId, provider, commandId
+    and message.
+
+    Records logged through CyLogger.log carry the caller's module, function
+    and line, and the message without CyLogger's text prefix.  Other
+    records fall back to the standard record attributes.
+    """
+    def format(self, record):
+        fields = {}
+        fields["timestamp"] = time.strftime("%Y-%m-%dT%H:%M:%S",
+                                            time.localtime(record.created)) + \
+                              ".%03d" % record.msecs
+        fields["level"] = LEVEL_NAMES.get(record.levelno, record.levelname)
+        fields["module"] = getattr(record, "cyModule", record.module)
+        fields["function"] = getattr(record, "cyFunction", record.funcName)
+        fields["line"] = getattr(record, "cyLine", record.lineno)
+        context = getattr(record, "cyContext", {})
+        for key in CONTEXT_FIELDS:
+            fields[key] = context.get(key)
+        fields["message"] = getattr(record, "cyMessage", None)
+        if fields["message"] is None:
+            fields["message"] = record.getMessage()
+        if hasattr(record, "cySuppressed"):
+            fields["suppressed"] = record.cySuppressed
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            fields["exception"] = record.exc_text
+        return json.dumps(fields, sort_keys=True, default=str)
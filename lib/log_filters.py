@@ -0,0 +1,189 @@
+"""
+Filters keeping high volume log sources from flooding the handlers.
+
+Some build phases print thousands of near identical lines a second -
+download progress, yum and apt output, guest additions compiles.
+RateLimitFilter gives every source its own token bucket.  Once a source
+runs out of tokens, only one record in sampleEvery gets through, and the
+next record passed for that source reports how many were dropped in
+between.  Records above maxLevel (warnings and errors by default) are never
+dropped.  When no later record of the source is coming to report them -
+its bucket was swept after it went quiet, or the source was closed with
+closeSource - the drops get a summary record of their own.
+
+A source is the command a record was logged for, when there is one, or
+otherwise the module, function and line that logged it.
+
+CyLogger.initializeLogs(rateLimit=...) attaches the filter to the logger,
+so dropped records are never formatted, queued or written.  Only the logs
+are thinned out - the full output of a command is still captured by
+RunWith.
+"""
+from __future__ import absolute_import
+#--- Native python libraries
+import copy
+import time
+import logging
+import threading
+
+#--- non-native python libraries in this source tree
+from .log_context import getLogContext
+
+#####
+# Seconds a source may be idle before its bucket is forgotten
+IDLE_SECONDS = 300
+
+
+class SourceBucket(object):
+    """
+    Token bucket and suppression count for one source.
+    """
+    def __init__(self, burst, now):
+        self.tokens = float(burst)
+        self.updated = now
+        self.suppressed = 0
+        self.lastSuppressed = None
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Per-source rate limiting with sampling and suppression summaries.
+    """
+    def __init__(self, rate=50.0, burst=200, sampleEvery=100,
+                 maxLevel=logging.INFO):
+        """
+        @param: rate - records per second a source may log on average
+        @param: burst - records a source may log at once before limiting
+        @param: sampleEvery - while limited, let one record in this many
+                              through, 0 to drop them all
+        @param: maxLevel - records above this level always pass
+        """
+        logging.Filter.__init__(self)
+        self.rate = float(rate)
+        self.burst = max(1, int(burst))
+        self.sampleEvery = int(sampleEvery)
+        self.maxLevel = maxLevel
+        self.buckets = {}
+        self.lock = threading.Lock()
+        self.lastSweep = time.time()
+        self.totalSuppressed = 0
+
+    def getSource(self, record):
+        """
+        Key a record is rate limited by.
+        """
+        context = getattr(record, "cyContext", None)
+        if context is None:
+            #####
+            # Not logged through CyLogger - the filter runs on the thread
+            # that logged the record, so its context still applies.
+            context = getLogContext()
+        if context.get("commandId"):
+            return context["commandId"]
+        return (getattr(record, "cyModule", record.module),
+                getattr(record, "cyFunction", record.funcName),
+                getattr(record, "cyLine", record.lineno))
+
+    def getTotalSuppressed(self):
+        """
+        Number of records dropped since the filter was created.
+        """
+        return self.totalSuppressed
+
+    def filter(self, record):
+        if record.levelno > self.maxLevel:
+            return True
+        now = time.time()
+        source = self.getSource(record)
+        with self.lock:
+            swept = self.sweep(now)
+        #####
+        # Summaries are emitted outside the lock, as the handlers take
+        # locks of their own.
+        for bucket in swept:
+            self.emitSummary(bucket)
+        with self.lock:
+            bucket = self.buckets.get(source)
+            if bucket is None:
+                bucket = self.buckets[source] = SourceBucket(self.burst, now)
+            bucket.tokens = min(self.burst, bucket.tokens + \
+                                (now - bucket.updated) * self.rate)
+            bucket.updated = now
+            if bucket.tokens >= 1:
+                bucket.tokens -= 1
+            elif self.sampleEvery > 0 and \
+                 (bucket.suppressed + 1) % self.sampleEvery == 0:
+                #####
+                # Sampled record while limited
+                pass
+            else:
+                bucket.suppressed += 1
+                bucket.lastSuppressed = record
+                self.totalSuppressed += 1
+                return False
+            suppressed = bucket.suppressed
+            bucket.suppressed = 0
+        if suppressed:
+            self.summarize(record, suppressed)
+        return True
+
+    def summarize(self, record, suppressed):
+        """
+        Note on a record how many records of its source were dropped
+        before it.
+        """
+        summary = " [" + str(suppressed) + " lines suppressed]"
+        record.msg = str(record.msg) + summary
+        if hasattr(record, "cyMessage"):
+            record.cyMessage = record.cyMessage + summary
+        record.cySuppressed = suppressed
+
+    def closeSource(self, source):
+        """
+        Forget the bucket of a source that won't log again, like a command
+        that has finished, reporting the records it still had dropped.
+        """
+        with self.lock:
+            bucket = self.buckets.pop(source, None)
+        if bucket is not None:
+            self.emitSummary(bucket)
+
+    def emitSummary(self, bucket):
+        """
+        Log a record reporting the records of a bucket dropped since the
+        last one that got through.  The record goes straight to the
+        handlers of the logger the dropped records were logged to, so it
+        isn't filtered itself.
+        """
+        if not bucket.suppressed or bucket.lastSuppressed is None:
+            return
+        record = copy.copy(bucket.lastSuppressed)
+        record.msg = "[" + str(bucket.suppressed) + " lines suppressed]"
+        record.args = None
+        record.exc_info = None
+        record.exc_text = None
+        record.created = time.time()
+        record.msecs = (record.created - int(record.created)) * 1000
+        if hasattr(record, "cyMessage"):
+            record.cyMessage = record.msg
+        record.cySuppressed = bucket.suppressed
+        bucket.suppressed = 0
+        bucket.lastSuppressed = None
+        logging.getLogger(record.name).callHandlers(record)
+
+    def sweep(self, now):
+        """
+        Forget buckets of sources that have gone quiet.
+
+        @returns: the forgotten buckets with dropped records to report
+        """
+        if now - self.lastSweep < IDLE_SECONDS:
+            return []
+        self.lastSweep = now
+        swept = []
+        for source, bucket in self.buckets.items():
+            if now - bucket.updated > IDLE_SECONDS:
+                del self.buckets[source]
+                if bucket.suppressed:
+                    swept.append(bucket)
+        return swept
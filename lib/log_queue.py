@@ -0,0 +1,143 @@
+"""
+Queue backed logging, so the thread producing log records never waits on
+file, terminal or syslog I/O.
+
+python 2's logging module lacks the QueueHandler and QueueListener added in
+python 3.2, so minimal versions live here.  The QueueHandler attached to the
+logger only puts records on a bounded queue.  The QueueListener drains it
+on a background thread, handing records to the real handlers in batches:
+stream handlers are flushed once per batch rather than once per record.
+When the queue is full the producer blocks until the listener catches up,
+so a slow sink slows logging down rather than growing memory without bound.
+
+    listener = QueueListener(logQueue)
+    listener.addHandler(logging.FileHandler("/tmp/vmbuilder.log"))
+    listener.start()
+    logging.getLogger("").addHandler(QueueHandler(logQueue))
+    ...
+    listener.stop()
+
+"""
+from __future__ import absolute_import
+#--- Native python libraries
+import Queue
+import logging
+import threading
+
+#####
+# Most records the listener hands to the handlers before flushing
+BATCH_SIZE = 256
+
+
+class QueueHandler(logging.Handler):
+    """
+    Handler putting records on a queue for a QueueListener.
+    """
+    def __init__(self, logQueue):
+        logging.Handler.__init__(self)
+        self.queue = logQueue
+
+    def prepare(self, record):
+        """
+        Merge the message and its arguments, and render any traceback, so
+        the record no longer refers to objects that may change before the
+        listener gets to it.
+        """
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def emit(self, record):
+        try:
+            self.queue.put(self.prepare(record))
+        except (KeyboardInterrupt, SystemExit):
+            raise
+        except Exception:
+            self.handleError(record)
+
+
+class QueueListener(object):
+    """
+    Background thread passing queued records to a set of handlers.
+    """
+    def __init__(self, logQueue, batchSize=BATCH_SIZE):
+        self.queue = logQueue
+        self.batchSize = batchSize
+        self.handlers = []
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def addHandler(self, handler):
+        """
+        Same interface as logging.Logger.addHandler.
+        """
+        with self.lock:
+            if handler not in self.handlers:
+                self.handlers.append(handler)
+
+    def removeHandler(self, handler):
+        """
+        Same interface as logging.Logger.removeHandler.
+        """
+        with self.lock:
+            if handler in self.handlers:
+                self.handlers.remove(handler)
+
+    def start(self):
+        """
+        Start the listener thread.
+        """
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._monitor,
+                                           name="QueueListener")
+            self.thread.daemon = True
+            self.thread.start()
+
+    def stop(self):
+        """
+        Handle everything already queued, flush the handlers and stop the
+        thread.
+        """
+        if self.thread is not None:
+            self.queue.put(None)
+            self.thread.join()
+            self.thread = None
+
+    def _monitor(self):
+        while True:
+            batch = [self.queue.get()]
+            while len(batch) < self.batchSize:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except Queue.Empty:
+                    break
+            stop = None in batch
+            self.handleBatch([record for record in batch if record is not None])
+            if stop:
+                break
+
+    def handleBatch(self, records):
+        """
+        Hand a batch of records to every handler, flushing each handler once
+        at the end instead of after every record.
+        """
+        if not records:
+            return
+        with self.lock:
+            handlers = list(self.handlers)
+        for handler in handlers:
+            #####
+            # StreamHandler.emit flushes after each record - put a no-op in
+            # front of it for the duration of the batch.
+            handler.flush = lambda: None
+            try:
+                for record in records:
+                    if record.levelno >= handler.level:
+                        handler.handle(record)
+            finally:
+                del handler.flush
+                handler.flush()
@@ -0,0 +1,233 @@
+"""
+Size based log rotation that gzips finished segments in the background.
+
+RotatingFileHandler keeps a fixed number of uncompressed backups and
+renames every one of them on each rollover, so a verbose build can rotate
+its own beginning away.  CompressingRotatingFileHandler instead moves a
+full log aside under a time stamped name and hands it to a background
+thread, which gzips it and then deletes the oldest segments until all of
+them together fit in a total size budget.  The thread doing the logging
+only pays for a rename.
+
+    handler = CompressingRotatingFileHandler("/tmp/ClockworkVMs.log",
+                                             maxBytes=10000000,
+                                             totalBytes=100000000)
+
+Segments are named <log file>.<YYYYmmdd-HHMMSS>.<pid>.<sequence>.gz, so
+processes rolling the same log over in the same second don't take each
+other's names.  A segment that can't be compressed stays as it is, and the
+first such failure is reported on stderr.  Plain segments count against the
+budget like compressed ones, unless they are still waiting to be compressed
+by this process or by another one that is running.  Plain segments left
+behind by processes that have exited, or named without a pid by older
+versions, are compressed when the handler is created.
+"""
+from __future__ import absolute_import
+#--- Native python libraries
+import os
+import re
+import sys
+import gzip
+import errno
+import time
+import Queue
+import shutil
+import threading
+import logging.handlers
+
+
+class CompressingRotatingFileHandler(logging.handlers.RotatingFileHandler):
+    """
+    RotatingFileHandler compressing rotated segments on a background
+    thread, keeping them within a total size budget.
+    """
+    def __init__(self, filename, mode="a", maxBytes=10000000,
+                 totalBytes=100000000, encoding=None, delay=0,
+                 compressLevel=6):
+        """
+        @param: filename - log file to write
+        @param: maxBytes - size at which the log is rotated
+        @param: totalBytes - budget for all rotated segments together,
+                             0 for no limit
+        @param: compressLevel - gzip compression level, 1 to 9
+        """
+        logging.handlers.RotatingFileHandler.__init__(self, filename, mode,
+                                                      maxBytes, 0, encoding,
+                                                      delay)
+        self.totalBytes = totalBytes
+        self.compressLevel = compressLevel
+        self.sequence = 0
+        self.segments = Queue.Queue()
+        self.pending = set()
+        self.pendingLock = threading.Lock()
+        self.compressor = None
+        self.reported = False
+        self.segmentPattern = re.compile("^" + \
+                                         re.escape(os.path.basename(self.baseFilename)) + \
+                                         r"\.\d{8}-\d{6}(\.\d+)?\.\d+(\.gz)?$")
+        for segment in self.getSegments():
+            if not segment.endswith(".gz") and self.isOrphaned(segment):
+                self.queueSegment(segment)
+
+    def doRollover(self):
+        """
+        Move the full log aside and hand it to the compressor thread.
+        """
+        if self.stream:
+            self.stream.close()
+            self.stream = None
+        if os.path.exists(self.baseFilename):
+            stamp = time.strftime("%Y%m%d-%H%M%S")
+            while True:
+                self.sequence += 1
+                segment = "%s.%s.%d.%d" % (self.baseFilename, stamp,
+                                           os.getpid(), self.sequence)
+                if not os.path.exists(segment) and \
+                   not os.path.exists(segment + ".gz"):
+                    break
+            os.rename(self.baseFilename, segment)
+            self.queueSegment(segment)
+        if not self.delay:
+            self.stream = self._open()
+
+    def queueSegment(self, segment):
+        """
+        Hand a plain segment to the compressor thread.
+        """
+        with self.pendingLock:
+            self.pending.add(segment)
+        self.startCompressor()
+        self.segments.put(segment)
+
+    def startCompressor(self):
+        if self.compressor is None or not self.compressor.isAlive():
+            self.compressor = threading.Thread(target=self._compressSegments,
+                                               name="LogCompressor")
+            self.compressor.daemon = True
+            self.compressor.start()
+
+    def close(self):
+        """
+        Close the log, waiting for segments still being compressed.
+        """
+        compressor = self.compressor
+        if compressor is not None:
+            self.segments.put(None)
+            compressor.join(60)
+            self.compressor = None
+        logging.handlers.RotatingFileHandler.close(self)
+
+    def getSegments(self):
+        """
+        Rotated segments, oldest first.
+        """
+        directory = os.path.dirname(self.baseFilename)
+        segments = [os.path.join(directory, name) \
+                    for name in os.listdir(directory) \
+                    if self.segmentPattern.match(name)]
+        return sorted(segments, key=self.segmentOrder)
+
+    def segmentOrder(self, segment):
+        fields = segment[len(self.baseFilename) + 1:].split(".")
+        if fields[-1] == "gz":
+            fields.pop()
+        return (fields[0], int(fields[-1]), int(fields[1]) if len(fields) > 2 else 0)
+
+    def segmentPid(self, segment):
+        """
+        Pid of the process that rotated a segment, None for names without
+        one.
+        """
+        fields = segment[len(self.baseFilename) + 1:].split(".")
+        if fields[-1] == "gz":
+            fields.pop()
+        if len(fields) > 2:
+            return int(fields[1])
+        return None
+
+    def isOrphaned(self, segment):
+        """
+        Whether a plain segment isn't waiting to be compressed by anyone -
+        neither by this handler, nor by another process that is running.
+        """
+        with self.pendingLock:
+            if segment in self.pending:
+                return False
+        pid = self.segmentPid(segment)
+        if pid is None or pid == os.getpid():
+            return True
+        try:
+            os.kill(pid, 0)
+        except OSError, err:
+            return err.errno == errno.ESRCH
+        return False
+
+    def _compressSegments(self):
+        while True:
+            segment = self.segments.get()
+            if segment is None:
+                break
+            try:
+                try:
+                    self.compress(segment)
+                finally:
+                    with self.pendingLock:
+                        self.pending.discard(segment)
+                self.enforceBudget()
+            except (IOError, OSError), err:
+                #####
+                # Never let a failed compression take logging down - the
+                # plain segment stays where it is.
+                self.report("Log segment " + segment + " not compressed: " + str(err))
+
+    def report(self, message):
+        """
+        Write the first failure on stderr, the log itself may be what fails.
+        """
+        if self.reported:
+            return
+        self.reported = True
+        try:
+            sys.stderr.write(message + " (further failures not reported)\n")
+        except IOError:
+            pass
+
+    def compress(self, segment):
+        """
+        gzip one segment, removing the plain file once done.
+        """
+        source = open(segment, "rb")
+        try:
+            target = gzip.open(segment + ".gz", "wb", self.compressLevel)
+            try:
+                shutil.copyfileobj(source, target, 1024 * 1024)
+            finally:
+                target.close()
+        except (IOError, OSError):
+            #####
+            # No partial .gz left to be counted against the budget
+            try:
+                os.unlink(segment + ".gz")
+            except OSError:
+                pass
+            raise
+        finally:
+            source.close()
+        os.unlink(segment)
+
+    def enforceBudget(self):
+        """
+        Delete the oldest segments until the rest fit in totalBytes.  Plain
+        segments still waiting to be compressed are left alone.
+        """
+        if not self.totalBytes:
+            return
+        segments = [(segment, os.path.getsize(segment)) \
+                    for segment in self.getSegments() \
+                    if segment.endswith(".gz") or self.isOrphaned(segment)]
+        total = sum(size for segment, size in segments)
+        for segment, size in segments:
+            if total <= self.totalBytes:
+                break
+            os.unlink(segment)
+            total -= size
@@ -17,8 +17,10 @@ import os
 import re
 import sys
 import time
+import Queue
+import atexit
 import socket
-import inspect
+import threading
 #import calendar
 import datetime
 import traceback
@@ -26,6 +28,10 @@ import logging
 import logging.handlers
 #from logging.handlers import RotatingFileHandler
 #sys.path.append("..")
+from .log_queue import QueueHandler, QueueListener
+from .log_context import JsonFormatter, getLogContext
+from .log_filters import RateLimitFilter
+from .log_rotation import CompressingRotatingFileHandler
 ###############################################################################
 # Exception setup
 
@@ -50,6 +56,25 @@ def EnvironmentError(Exception):
     def __init__(self,*args,**kwargs):
         Exception.__init__(self,*args,**kwargs)
 
+#####
+# Priorities known to be valid, mapped to their integer value, so log()
+# doesn't need a regex to check them.
+validPriorities = dict((priority, priority) for priority in range(10, 100))
+
+#####
+# Level used unless debug, verbose or a level is asked for - everything is
+# logged, without the caller prefix.
+DEFAULT_LEVEL = 5
+
+#####
+# Handlers added by initializeLogs, keyed by what they write to
+handlerRegistry = {}
+handlerRegistryLock = threading.Lock()
+
+#####
+# Subsystems with their own child logger, see CyLogger.getChild
+SUBSYSTEMS = ["packer", "git", "dscl", "ui", "net"]
+
 ###############################################################################
 # Setting up a function for a singleton
 
@@ -73,6 +98,10 @@ class SingletonCyLogger(type):
     """
     _instances = {}
     def __call__(cls, *args, **kwargs):
+        #####
+        # Classes can opt out, like the per-subsystem ChildCyLogger
+        if not getattr(cls, "singleton", True):
+            return super(SingletonCyLogger, cls).__call__(*args, **kwargs)
         if cls not in cls._instances:
             cls._instances[cls] = super(SingletonCyLogger, cls).__call__(*args, **kwargs)
         return cls._instances[cls]
@@ -92,10 +121,9 @@ class CyLogger(object):
     
     instanciatedLoggers = {}
 
-    def __init__(self, environ=False, debug_mode=False, verbose_mode=False, level=30, *args, **kwargs):
+    def __init__(self, environ=False, debug_mode=False, verbose_mode=False, level=DEFAULT_LEVEL, *args, **kwargs):
         """
         """
-        print ".............Level: " + str(level)
         self.lvl = int(level)
         '''
         if environ:
@@ -123,12 +151,17 @@ class CyLogger(object):
             self.validateLevel(self.lvl)
         else:
             self.lvl = 30
-        self.lvl = 5
 
+        self.loggerName = ""
+        self.children = {}
         self.filename = ""
         self.syslog = False
         self.logr = None
         self.logrs = {"root" : ""}
+        self.timestampCache = (None, "")
+        self.logQueue = None
+        self.listener = None
+        self.rateLimitFilter = None
 
     #############################################
 
@@ -136,13 +169,82 @@ class CyLogger(object):
         """
         """
         success = False
-        if self.validateLevel():
+        if self.validateLevel(level):
             self.lvl = level
             success = True
         return success
 
     #############################################
 
+    def setLevel(self, level=30):
+        """
+        Change the level this logger logs at, after initializeLogs.
+
+        @param: level - one of the LogPriority values
+        """
+        self.validateLevel(level)
+        self.lvl = int(level)
+        if self.logr is not None:
+            self.logr.setLevel(self.lvl)
+
+    #############################################
+
+    def getLevel(self):
+        """
+        Getter for the level this logger logs at.
+        """
+        return self.lvl
+
+    #############################################
+
+    def getChild(self, name, level=None):
+        """
+        Logger for one subsystem of the program - one of SUBSYSTEMS, like
+        "packer" or "git".  Its records go to the handlers set up by
+        initializeLogs, but it has its own level, and may have handlers of
+        its own.  Asking for the same name again returns the same child.
+
+        @param: name - name of the subsystem
+        @param: level - level of the child, defaults to this logger's
+
+        @returns: a ChildCyLogger
+        """
+        child = self.children.get(name)
+        if child is None:
+            child = ChildCyLogger(self, name)
+            self.children[name] = child
+        if level is not None:
+            child.setLevel(level)
+        return child
+
+    #############################################
+
+    def registerHandler(self, owner, key, factory, formatter=None):
+        """
+        Add a handler to owner unless a handler writing to the same place
+        was already added by any CyLogger, so initializing the logs more
+        than once - from another module, or a test - doesn't duplicate
+        every line.
+
+        @param: owner - logger, or QueueListener, to add the handler to
+        @param: key - what the handler writes to, like ("file", path)
+        @param: factory - callable creating the handler
+        @param: formatter - optional formatter for the new handler
+
+        @returns: the new handler, or None if there already was one
+        """
+        with handlerRegistryLock:
+            if key in handlerRegistry:
+                return None
+            handler = factory()
+            if formatter is not None:
+                handler.setFormatter(formatter)
+            handlerRegistry[key] = handler
+        owner.addHandler(handler)
+        return handler
+
+    #############################################
+
     def validateLevel(self, level=30):
         """
         Input validation for the logging level
@@ -181,7 +283,15 @@ class CyLogger(object):
                        logCount=10,
                        size=10000000,
                        syslog=True,
-                       myconsole=True):
+                       myconsole=True,
+                       queued=False,
+                       queueSize=10000,
+                       logFormat="text",
+                       rateLimit=0,
+                       rateBurst=200,
+                       sampleEvery=100,
+                       compress=False,
+                       totalSize=0):
         """
         Sets up some basic logging.  For more configurable logging, use the
         setUpLogger & setUpHandler methods.
@@ -205,6 +315,36 @@ class CyLogger(object):
 
         @param: console: Whether or not to log to the console. Bool
 
+        @param: queued : Hand records to the handlers on a background thread,
+                         so callers never wait on log I/O. Bool
+
+        @param: queueSize: records that may be waiting in queued mode before
+                           callers block. Int
+
+        @param: logFormat: format of the log file, "text" or "json".  With
+                           "json" each record is one JSON object carrying
+                           the build, provider and command ids from
+                           lib.log_context. String
+
+        @param: rateLimit: records per second each source (command, or
+                           logging call site) may log before lines are
+                           sampled and dropped, see
+                           lib.log_filters.RateLimitFilter.  Warnings and
+                           errors are never dropped.  0 turns it off. Float
+
+        @param: rateBurst: records a source may log at once before it is
+                           limited. Int
+
+        @param: sampleEvery: while a source is limited, one record in this
+                             many is still logged. Int
+
+        @param: compress: if "inc", gzip rotated logs on a background thread
+                          and keep them within totalSize instead of
+                          keeping log_count of them. Bool
+
+        @param: totalSize: if compress, the budget in bytes for all rotated
+                           logs together.  Defaults to size * log_count. Int
+
         @NOTE: This only sets up the root logger.
 
         @note: Interface borrowed from Stonix's LogDispatcher.initializeLogs
@@ -251,58 +391,112 @@ class CyLogger(object):
         # self.filename the intended full path
         self.filename = os.path.join(logdir, self.filename)
 
+        if logFormat not in ["text", "json"]:
+            raise ValueError("Cannot use this log format: " + str(logFormat))
+        fileFormatter = None
+        if logFormat == "json":
+            fileFormatter = JsonFormatter()
+
         #####
-        # Initialize the root logger
-        self.logr = logging.getLogger("")
+        # Initialize the logger - the root logger, or a subsystem's child
+        self.logr = logging.getLogger(self.loggerName)
 
         #####
-        # Set logging level for the root logger
+        # In queued mode the handlers belong to the listener, and the logger
+        # only gets the handler feeding its queue.
+        handlerOwner = self.logr
+        if queued:
+            if self.listener is None:
+                self.logQueue = Queue.Queue(maxsize=queueSize)
+                self.listener = QueueListener(self.logQueue)
+                self.listener.start()
+                self.logr.addHandler(QueueHandler(self.logQueue))
+                atexit.register(self.shutdown)
+            handlerOwner = self.listener
+
+        #####
+        # Add applicable handlers to the logger
         if not self.rotate:
             #####
             # Set up a regular root log handler
-            fileHandler = logging.FileHandler(self.filename)
-            self.fileHandler = True
+            if self.registerHandler(handlerOwner, ("file", os.path.abspath(self.filename)),
+                                    lambda: logging.FileHandler(self.filename),
+                                    fileFormatter):
+                self.fileHandler = True
+                self.logr.log(LogPriority.DEBUG,"Added FileHandler")
         else:
             #####
             # Set up the RotatingFileHandler
-            rotHandler = logging.handlers.RotatingFileHandler(self.filename,
-                                                              maxBytes=size,
-                                                              backupCount=logCount)
+            if compress:
+                #####
+                # Rotated segments are gzipped in the background and kept
+                # within a total size budget instead of a count.
+                makeRotHandler = lambda: CompressingRotatingFileHandler(self.filename,
+                                                                        maxBytes=size,
+                                                                        totalBytes=totalSize or size * logCount)
+            else:
+                makeRotHandler = lambda: logging.handlers.RotatingFileHandler(self.filename,
+                                                                              maxBytes=size,
+                                                                              backupCount=logCount)
+            if self.registerHandler(handlerOwner, ("file", os.path.abspath(self.filename)),
+                                    makeRotHandler, fileFormatter):
+                self.logr.log(LogPriority.DEBUG,"Added RotatingFileHandler")
+                #self.doRollover(rotHandler)
+
         if myconsole:
             #####
             # Set up StreamHandler to log to the console
-            conHandler = logging.StreamHandler()
+            if self.registerHandler(handlerOwner, ("console", "stderr"),
+                                    logging.StreamHandler):
+                self.logr.log(LogPriority.DEBUG,"Added StreamHandler")
         if self.syslog:
             #####
             # Set up the SysLogHandler
-            sysHandler = logging.handlers.SysLogHandler()
-
-        #####
-        # Add applicable handlers to the logger
-        if not self.rotate and self.fileHandler:
-            self.logr.addHandler(fileHandler)
-            self.logr.log(LogPriority.DEBUG,"Added FileHandler")
-        elif self.rotate:
-            self.logr.addHandler(rotHandler)
-            self.logr.log(LogPriority.DEBUG,"Added RotatingFileHandler")
-            #self.doRollover(rotHandler)
-
-        if myconsole:
-            self.logr.addHandler(conHandler)
-            self.logr.log(LogPriority.DEBUG,"Added StreamHandler")
-        if self.syslog:
             try:
-                self.logr.addHandler(sysHandler)
-                self.logr.log(LogPriority.DEBUG,"Added SyslogHanlder")
+                if self.registerHandler(handlerOwner, ("syslog", "default"),
+                                        logging.handlers.SysLogHandler):
+                    self.logr.log(LogPriority.DEBUG,"Added SyslogHanlder")
             except socket.error:
                 self.log(40, "Syslog not accepting connections!")
 
+        #####
+        # Rate limit on the logger rather than each handler, so dropped
+        # records are never formatted or queued.
+        if self.rateLimitFilter is not None:
+            self.logr.removeFilter(self.rateLimitFilter)
+            self.rateLimitFilter = None
+        if rateLimit:
+            self.rateLimitFilter = RateLimitFilter(rateLimit, rateBurst,
+                                                   sampleEvery)
+            self.logr.addFilter(self.rateLimitFilter)
+        for child in self.children.values():
+            child.useRateLimitFilter(self.rateLimitFilter)
+
         #####
         # Set the log level
         self.logr.setLevel(self.lvl)
 
     #############################################
 
+    def shutdown(self):
+        """
+        Write out everything still queued and stop the background listener
+        when logging in queued mode.  Called at exit.
+        """
+        listener = self.listener
+        if listener is not None:
+            self.listener = None
+            listener.stop()
+            #####
+            # Anything logged from here on goes straight to the handlers
+            for handler in self.logr.handlers[:]:
+                if isinstance(handler, QueueHandler):
+                    self.logr.removeHandler(handler)
+            for handler in listener.handlers:
+                self.logr.addHandler(handler)
+
+    #############################################
+
     def setUpHandler(self, *args, **kwargs):
         """
         Template/interface for children to use for setting up specific handlers.
@@ -328,58 +522,60 @@ class CyLogger(object):
 
     #############################################
 
-    def log(self, priority, msg):
+    def log(self, priority, msg, *args):
         """
         Interface to work similar to Stonix's LogDispatcher.py
 
+        Returns before doing any formatting when the priority is not enabled,
+        so expensive messages can be deferred by passing either a callable
+        returning the message, or a format string and its arguments:
+
+            self.logger.log(lp.DEBUG, "JSON data: %s", self.jsonData)
+            self.logger.log(lp.DEBUG, lambda: json.dumps(self.jsonData))
+
         @note: Stonix's LogDispatcher.py authored by: scmcleni
 
         @author: Roy Nielsen
         """
-        pri = str(priority)
-        if re.match("^\d\d$", pri) and self.validateLevel():
-            validatedLvl = int(pri)
-        else:
-            raise IllegalLoggingLevelError("Cannot log at this priority level: " + pri)
-        
-        ####
-        # Use the datetime library to get the time for a timestamp
-        # using format YYYYi-MM-DD-HH-MM-SS
-        # Only dash separators are used to make for easy numeric processing
-        # using local time so the time stamp can be correlated with 
-        # system logs...
-        datestamp = datetime.datetime.now()
-        timestamp = datestamp.strftime("%Y-%m-%d-%H-%M-%S")
+        try:
+            validatedLvl = validPriorities[priority]
+        except (KeyError, TypeError):
+            validatedLvl = self.validatePriority(priority)
 
         #####
-        # Get the name of the program using this library
-        prog = sys.argv[0].split("/")[-1]
+        # Fast path - nothing below is worth doing for a record the root
+        # logger would throw away.
+        logr = self.logr
+        if logr is not None and not logr.isEnabledFor(validatedLvl):
+            return
+        pri = str(validatedLvl)
+
+        if callable(msg):
+            msg = msg()
+        if args:
+            msg = msg % args
 
         #####
-        # Get the filename of the code calling CrazyLogger.log()
-        # members = inspect.getmembers(inspect.stack(), inspect.iscode)
-        # print "Members: " + str(members)
-        # co_filename = members[1][3]
+        # Get the filename of the code calling CrazyLogger.log() - only the
+        # caller's frame is needed, without reading any source
+        caller = sys._getframe(1)
+        filename = caller.f_code.co_filename.split("/")[-1]
+        function_name = caller.f_code.co_name
+        line_number = caller.f_lineno
 
-        (frame, fullLengthFilename, line_number, function_name, lines, index) = inspect.getouterframes(inspect.currentframe())[1]
-        filename = fullLengthFilename.split("/")[-1]
+        #####
+        # Get the name of the program using this library
+        prog = sys.argv[0].split("/")[-1]
 
         if not self.syslog:
             #####
             # longPrefix message to be in the format: 
             # <timestamp> <calling_script_name> : <filename_of_calling_function>, <name_of_calling_function> (<line number of calling function>)
-            longPrefix = '{} {} : {}, {} ({}) '.format(str(timestamp),
+            longPrefix = '{} {} : {}, {} ({}) '.format(self.getTimestamp(),
                                                        str(prog), 
                                                        str(filename), 
                                                        str(function_name), 
                                                        str(line_number))
-            #####
-            # shorterFormat message to be in the format: 
-            # <timestamp> <calling_script_name> : <name_of_calling_function> (<line number of calling function>)
-            shortFormat = '{} {} : {} ({}) '.format(str(timestamp),
-                                                    str(prog),
-                                                    str(function_name),
-                                                    str(line_number))
         else:
             #####
             # longPrefix message to be in the format: 
@@ -388,54 +584,148 @@ class CyLogger(object):
                                                     str(filename), 
                                                     str(function_name), 
                                                     str(line_number))
-            #####
-            # shorterFormat message to be in the format: 
-            # <calling_script_name> : <name_of_calling_function> (<line number of calling function>)
-            shortFormat = '{} : {} ({}) '.format(str(prog),
-                                                 str(function_name), 
-                                                 str(line_number))
         msg_list = []
-        if not isinstance(msg, list):
-            msg_list = msg.split("\n")
-        elif isinstance(msg, dict):
-            for key, value in msg.iteritems(msg):
+        if isinstance(msg, dict):
+            for key, value in msg.iteritems():
                 msg_list.append(str(key) + " : " + str(value))
+        elif not isinstance(msg, list):
+            msg_list = msg.split("\n")
         else:
             msg_list = msg
 
-        for line in msg_list:
+        lvl = int(self.lvl)
+        if lvl > 0 and lvl < 10:
             #####
-            # Process via logging level
-            if int(self.lvl) > 0 and int(self.lvl) < 10:
-                # Quiet, no prefix or formatting...
-                self.logr.log(validatedLvl, str(line))
-    
-            elif int(self.lvl) >= 10 and int(self.lvl) < 20:
-                #####
-                # Debug
-                self.logr.log(validatedLvl, longPrefix + "DEBUG: (" + pri + ") " + str(line))
-            elif int(self.lvl) >= 20 and int(self.lvl) < 30:
-                #####
-                # Info
-                self.logr.log(validatedLvl, longPrefix + "DEBUG: (" + pri + ") " + str(line))
-            elif int(self.lvl) >=30 and int(self.lvl) < 40:
-                #####
-                # Warning
-                try:
-                    self.logr.log(validatedLvl, longPrefix + "DEBUG: (" + str(pri) + ") " + str(line))
-                except Exception, err:
-                    self.logr.log(LogPriority.DEBUG, str(traceback.format_exc()))
-                    self.logr.log(LogPriority.DEBUG, str(err))
-            elif int(self.lvl) >= 40 and int(self.lvl) < 50:
-                #####
-                # Error
-                self.logr.log(validatedLvl, longPrefix + "DEBUG: (" + pri + ") " + str(line))
-            elif int(self.lvl) >= 50 and int(self.lvl) < 60:
-                #####
-                # Critical
-                self.logr.log(validatedLvl, longPrefix + "DEBUG: (" + pri + ") " + str(line))
-            else:
-                raise IllegalLoggingLevelError("Not a valid value for a logging level.")
+            # Quiet, no prefix or formatting...
+            prefix = ""
+        elif lvl >= 10 and lvl < 60:
+            prefix = longPrefix + "DEBUG: (" + pri + ") "
+        else:
+            raise IllegalLoggingLevelError("Not a valid value for a logging level.")
+
+        #####
+        # Caller and context for structured formatters like JsonFormatter
+        extra = {"cyModule" : os.path.splitext(filename)[0],
+                 "cyFunction" : function_name,
+                 "cyLine" : line_number,
+                 "cyContext" : getLogContext()}
+
+        for line in msg_list:
+            extra["cyMessage"] = str(line)
+            try:
+                logr.log(validatedLvl, prefix + str(line), extra=extra)
+            except Exception, err:
+                logr.log(LogPriority.DEBUG, str(traceback.format_exc()))
+                logr.log(LogPriority.DEBUG, str(err))
+
+    #############################################
+
+    def validatePriority(self, priority):
+        """
+        Slow path of priority validation, for priorities that are not plain
+        integers, like "20".  Valid ones are remembered.
+
+        @returns: the priority as an integer
+        """
+        pri = str(priority)
+        if not re.match("^\d\d$", pri):
+            raise IllegalLoggingLevelError("Cannot log at this priority level: " + pri)
+        validPriorities[priority] = int(pri)
+        return int(pri)
+
+    #############################################
+
+    def closeLogSource(self, source):
+        """
+        Tell the rate limiting a source, like a command id, is done logging,
+        so records it had dropped are reported right away.
+        """
+        if self.rateLimitFilter is not None:
+            self.rateLimitFilter.closeSource(source)
+
+    #############################################
+
+    def getTimestamp(self):
+        """
+        Time stamp in format YYYY-MM-DD-HH-MM-SS.  Only dash separators are
+        used to make for easy numeric processing, using local time so the
+        time stamp can be correlated with system logs.  The string is only
+        rebuilt when the second changes.
+        """
+        now = int(time.time())
+        cached = self.timestampCache
+        if cached[0] != now:
+            cached = (now, time.strftime("%Y-%m-%d-%H-%M-%S",
+                                         time.localtime(now)))
+            self.timestampCache = cached
+        return cached[1]
+
+###############################################################################
+# Per-subsystem loggers
+
+def getSubsystemLogger(logger, name):
+    """
+    Child logger for a subsystem, for code that may be handed either the
+    program's logger or another subsystem's child.  Always a child of the
+    top level CyLogger, so the name - and so the level from --log-level -
+    doesn't depend on who created the object.
+
+    @param: logger - a CyLogger
+    @param: name - name of the subsystem, one of SUBSYSTEMS
+
+    @returns: the subsystem's ChildCyLogger
+    """
+    while isinstance(logger, ChildCyLogger):
+        logger = logger.parent
+    return logger.getChild(name)
+
+
+class ChildCyLogger(CyLogger):
+    """
+    Logger for one subsystem, created by CyLogger.getChild.  It logs to a
+    child of the parent's python logger, so records reach the parent's
+    handlers, while its level is its own.
+    """
+    singleton = False
+
+    def __init__(self, parent, name):
+        self.parent = parent
+        self.lvl = parent.lvl
+        #####
+        # Children of the root logger get a common prefix, so their python
+        # logger names can't clash with those of other libraries.
+        self.loggerName = (parent.loggerName or "vmbuilder") + "." + name
+        self.children = {}
+        self.filename = ""
+        self.syslog = parent.syslog
+        self.logr = logging.getLogger(self.loggerName)
+        self.logrs = {self.loggerName : ""}
+        self.timestampCache = (None, "")
+        self.logQueue = None
+        self.listener = None
+        self.rateLimitFilter = None
+        self.useRateLimitFilter(parent.rateLimitFilter)
+
+    def useRateLimitFilter(self, rateLimitFilter):
+        """
+        Share the parent's rate limiting - logger filters don't apply to
+        records propagated from children.
+        """
+        if self.rateLimitFilter is not None:
+            self.logr.removeFilter(self.rateLimitFilter)
+        self.rateLimitFilter = rateLimitFilter
+        if rateLimitFilter is not None:
+            self.logr.addFilter(rateLimitFilter)
+        for child in self.children.values():
+            child.useRateLimitFilter(rateLimitFilter)
+
+    def getLevel(self):
+        """
+        Level of the child, or the parent's if it has none of its own.
+        """
+        if self.logr.level:
+            return self.logr.level
+        return self.parent.getLevel()
 
 ###############################################################################
 # Helper class
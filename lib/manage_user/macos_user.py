@@ -25,6 +25,7 @@ from ..manage_user.manage_user_template import BadUserInfoError
 from ..run_commands import RunWith
 from ..loggers import CyLogger
 from ..loggers import LogPriority as lp
+from ..loggers import getSubsystemLogger
 from ..libHelperFunctions import waitnoecho
 
 
@@ -101,6 +102,7 @@ class MacOSUser(ManageUserTemplate):
         if 'logDispatcher' not in kwargs:
             raise ValueError("Variable 'logDispatcher' a required parameter for " + str(self.__class__.__name__))
         super(MacOSUser, self).__init__(**kwargs)
+        self.logger = getSubsystemLogger(self.logger, "dscl")
 
         self.module_version = '20160225.125554.540679'
 
@@ -0,0 +1,280 @@
+"""
+Pick the fastest mirror for a varfile's iso_url before building.
+
+The iso_urls in the boxcutter varfiles point at one fixed mirror, often far
+away from us.  The same ISO is at the same relative path on every mirror of
+a distribution, so for an iso_url under one of a distribution's mirrors the
+selector builds the URL on each of the others and:
+
+    - drops the mirrors that don't answer, with Connectivity.probeUrls
+    - measures the rest one after the other with a short ranged GET -
+      latency to the first byte and throughput of the first few hundred
+      kilobytes, never the whole ISO
+    - keeps the one with the best throughput
+
+The choice is cached, by default for six hours, in mirrors.json in the user's
+cache directory, and thrown away when the hostname or default gateway
+changes - a laptop on another network has other fast mirrors.
+
+    selector = MirrorSelector(logger)
+    pjh.readExistingJsonVarfile(varFilePath)
+    selector.applyTo(pjh)
+
+Mirrors besides the built in MIRRORS are read from a JSON file of
+distribution to list of base URLs, with readMirrorsFile.
+"""
+from __future__ import absolute_import
+#--- Native python libraries
+import json
+import time
+import socket
+import httplib
+import urlparse
+
+#--- non-native python libraries in this source tree
+from .loggers import LogPriority as lp
+from .loggers import getSubsystemLogger
+from .facts_cache import FactsCache, getDefaultCachePath
+from .url_probe import ConnectionPool, ProbeResult, DEFAULT_PORTS
+from . import netinfo
+
+#####
+# Base URLs of the release mirrors of each distribution, an ISO is at the
+# same path under each of them.
+MIRRORS = {"ubuntu" : ["http://releases.ubuntu.com/",
+                       "http://mirrors.kernel.org/ubuntu-releases/"],
+           "centos" : ["http://mirror.centos.org/centos/",
+                       "http://mirrors.kernel.org/centos/",
+                       "http://mirrors.sonic.net/centos/"],
+           "debian" : ["http://cdimage.debian.org/cdimage/release/",
+                       "http://mirrors.kernel.org/debian-cd/"],
+           "fedora" : ["http://download.fedoraproject.org/pub/fedora/linux/",
+                       "http://mirrors.kernel.org/fedora/"]}
+
+DEFAULT_TTL = 6 * 60 * 60
+
+#####
+# Bytes of the ISO fetched to measure a mirror's throughput
+SAMPLE_SIZE = 512 * 1024
+
+MAX_REDIRECTS = 3
+
+REDIRECTS = [301, 302, 303, 307, 308]
+
+
+def readMirrorsFile(path):
+    """
+    Mirrors from a JSON file like MIRRORS.
+
+    @raises: ValueError if the file isn't a dictionary of lists of URLs
+    """
+    with open(path) as mirrorsFile:
+        mirrors = json.load(mirrorsFile)
+    if not isinstance(mirrors, dict):
+        raise ValueError("Mirrors file must hold a dictionary: " + str(path))
+    for distribution, bases in mirrors.iteritems():
+        if not isinstance(bases, list) or \
+           not all([isinstance(base, basestring) for base in bases]):
+            raise ValueError("Mirrors of " + str(distribution) + \
+                             " must be a list of URLs in " + str(path))
+    return mirrors
+
+
+class MirrorCache(FactsCache):
+    """
+    Mirror choices, per original iso_url, valid on this host and network.
+    """
+    def __init__(self, path=None, ttl=DEFAULT_TTL):
+        FactsCache.__init__(self, path or getDefaultCachePath("mirrors.json"), ttl)
+
+    def getStamp(self):
+        if self.stamp is None:
+            route = netinfo.getDefaultRoute() or (None, None)
+            self.stamp = {"version" : 1,
+                          "hostname" : socket.gethostname(),
+                          "gateway" : route[1]}
+        return self.stamp
+
+
+class MirrorMeasurement(ProbeResult):
+    """
+    What a ranged GET of a candidate URL found.
+    """
+    def __init__(self, url):
+        ProbeResult.__init__(self, url)
+        self.bytes = 0
+        self.throughput = None
+
+    def ok(self):
+        return self.status in (200, 206) and bool(self.throughput)
+
+    def toDict(self):
+        data = ProbeResult.toDict(self)
+        data["bytes"] = self.bytes
+        data["throughput"] = self.throughput
+        return data
+
+
+class MirrorSelector(object):
+    """
+    Measures the mirrors of an iso_url and picks the fastest.
+    """
+    def __init__(self, logger, mirrors=None, cache=None, timeout=10,
+                 sampleSize=SAMPLE_SIZE, timer=time.time):
+        """
+        @param: mirrors - distribution to list of base URLs, added to MIRRORS
+        @param: cache - a MirrorCache, default one in the user's cache
+                        directory, False for no caching
+        @param: timeout - seconds each request may take
+        @param: sampleSize - bytes fetched from each mirror
+        """
+        self.logger = getSubsystemLogger(logger, "net")
+        self.mirrors = dict(MIRRORS)
+        self.mirrors.update(mirrors or {})
+        if cache is None:
+            cache = MirrorCache()
+        self.cache = cache
+        self.timeout = timeout
+        self.sampleSize = sampleSize
+        self.timer = timer
+        self.pool = ConnectionPool(maxPerHost=1)
+
+    def getCandidates(self, isoUrl):
+        """
+        The iso_url on every mirror of its distribution, itself first, or
+        just itself if it isn't under a known mirror.
+        """
+        for bases in self.mirrors.values():
+            for base in bases:
+                if isoUrl.startswith(base):
+                    path = isoUrl[len(base):]
+                    return [isoUrl] + [other + path for other in bases if other != base]
+        return [isoUrl]
+
+    def measure(self, url):
+        """
+        Fetch the first sampleSize bytes of url, following redirects.
+
+        @returns: a MirrorMeasurement
+        """
+        result = MirrorMeasurement(url)
+        headers = {"User-Agent" : "VmBuilder mirror select",
+                   "Range" : "bytes=0-" + str(self.sampleSize - 1)}
+        start = self.timer()
+        target = url
+        for _ in range(MAX_REDIRECTS + 1):
+            parts = urlparse.urlsplit(target)
+            if parts.scheme not in DEFAULT_PORTS or not parts.hostname:
+                result.error = "Not an http or https url: " + str(target)
+                break
+            key = (parts.scheme, parts.hostname, parts.port or DEFAULT_PORTS[parts.scheme])
+            path = (parts.path or "/") + ("?" + parts.query if parts.query else "")
+            conn, _ = self.pool.acquire(key, self.timeout)
+            reusable = False
+            try:
+                conn.request("GET", path, headers=headers)
+                response = conn.getresponse()
+                result.status = response.status
+                result.reason = response.reason
+                if response.status in REDIRECTS and response.getheader("location"):
+                    response.read()
+                    reusable = not response.will_close
+                    target = urlparse.urljoin(target, response.getheader("location"))
+                    result.location = target
+                    continue
+                result.latency = self.timer() - start
+                if response.status in (200, 206):
+                    self.readSample(response, result)
+                reusable = response.isclosed() and not response.will_close
+            except (httplib.HTTPException, socket.error), err:
+                result.error = str(err) or err.__class__.__name__
+            finally:
+                self.pool.release(key, conn, reusable)
+            break
+        else:
+            result.error = "Too many redirects"
+
+        self.logger.log(lp.DEBUG, "Measured %s: %s, %s bytes/s, %s",
+                        url, result.status, result.throughput, result.error)
+        return result
+
+    def readSample(self, response, result):
+        """
+        Read up to sampleSize bytes of the response, timing them.  A server
+        ignoring the Range header is still only read that far.
+        """
+        begin = self.timer()
+        while result.bytes < self.sampleSize:
+            chunk = response.read(min(64 * 1024, self.sampleSize - result.bytes))
+            if not chunk:
+                break
+            result.bytes += len(chunk)
+        elapsed = max(self.timer() - begin, 0.000001)
+        if result.bytes:
+            result.throughput = result.bytes / elapsed
+
+    def rank(self, measurements):
+        """
+        The usable measurements, best first - highest throughput, then
+        lowest latency.
+        """
+        usable = [measurement for measurement in measurements if measurement.ok()]
+        return sorted(usable, key=lambda measurement: (-measurement.throughput,
+                                                       measurement.latency))
+
+    def select(self, isoUrl, refresh=False):
+        """
+        The fastest URL for isoUrl, isoUrl itself if it has no other mirrors
+        or none of them could be measured.
+
+        @param: refresh - measure again even if there is a cached choice
+        """
+        candidates = self.getCandidates(isoUrl)
+        if len(candidates) < 2:
+            return isoUrl
+        if self.cache and not refresh:
+            cached = self.cache.get(isoUrl)
+            if cached and cached.get("url") in candidates:
+                self.logger.log(lp.DEBUG, "Cached mirror for %s: %s", isoUrl, cached["url"])
+                return cached["url"]
+
+        #####
+        # Weed out the dead mirrors concurrently, but measure throughput one
+        # mirror at a time so they don't share the bandwidth.
+        from .Connectivity import Connectivity
+        probed = Connectivity(self.logger).probeUrls(candidates, timeout=self.timeout)
+        alive = [result.url for result in probed if result.ok()]
+        measurements = [self.measure(url) for url in alive]
+        ranked = self.rank(measurements)
+        if not ranked:
+            self.logger.log(lp.WARNING, "No mirror of " + str(isoUrl) + " could be measured")
+            return isoUrl
+
+        best = ranked[0].url
+        if self.cache:
+            self.cache.put(isoUrl, {"url" : best,
+                                    "measurements" : [measurement.toDict()
+                                                      for measurement in measurements]})
+        return best
+
+    def applyTo(self, pjh, refresh=False):
+        """
+        Point the iso_url of the varfile loaded in a PackerJsonHandler at
+        the fastest mirror.
+
+        @returns: the iso_url now in pjh
+        """
+        isoUrl = pjh.getIsoUrl()
+        if not isoUrl:
+            return isoUrl
+        best = self.select(isoUrl, refresh)
+        if best != isoUrl:
+            self.logger.log(lp.INFO, "Using mirror " + best + " for " + isoUrl)
+            pjh.setIsoUrl(best)
+        return best
+
+    def close(self):
+        """
+        Close the kept-alive connections.
+        """
+        self.pool.close()
@@ -0,0 +1,175 @@
+"""
+Network interface discovery on Linux without ifconfig or route.
+
+Everything comes straight from the kernel: interface names and MAC
+addresses from /sys/class/net, IPv4 addresses from the SIOCGIFADDR ioctl on
+a datagram socket, and the default route from /proc/net/route.  No process
+is started and no command output parsed, and it works in minimal containers
+without net-tools.
+
+Each function returns None when the information isn't available this way -
+on other platforms, or without /proc and /sys - so callers can fall back to
+the ifconfig and route commands:
+
+    addresses = getAllAddresses()
+    if addresses is None:
+        ... run ifconfig ...
+"""
+from __future__ import absolute_import
+#--- Native python libraries
+import os
+import sys
+import errno
+import fcntl
+import socket
+import struct
+
+SYS_CLASS_NET = "/sys/class/net"
+PROC_NET_ROUTE = "/proc/net/route"
+
+#####
+# From linux/sockios.h and linux/route.h
+SIOCGIFADDR = 0x8915
+SIOCGIFNETMASK = 0x891b
+RTF_UP = 0x0001
+RTF_GATEWAY = 0x0002
+
+#####
+# struct ifreq is 40 bytes on 64 bit Linux, 32 on 32 bit, the name taking
+# the first 16.
+IFREQ_SIZE = 40
+IFNAMSIZ = 16
+
+
+def isAvailable():
+    """
+    Whether this platform has what the native discovery reads.
+    """
+    return sys.platform.startswith("linux") and \
+           os.path.isdir(SYS_CLASS_NET) and \
+           os.path.exists(PROC_NET_ROUTE)
+
+
+def getInterfaces():
+    """
+    Names of the network interfaces, sorted, or None if unavailable.
+    """
+    if not isAvailable():
+        return None
+    try:
+        return sorted(os.listdir(SYS_CLASS_NET))
+    except OSError:
+        return None
+
+
+def getMacAddress(interface):
+    """
+    MAC address of an interface as aa:bb:cc:dd:ee:ff, or None.
+    """
+    try:
+        with open(os.path.join(SYS_CLASS_NET, interface, "address")) as addressFile:
+            address = addressFile.read().strip()
+    except (IOError, OSError):
+        return None
+    return address or None
+
+
+def getInterfaceAddress(interface, sock=None, request=SIOCGIFADDR):
+    """
+    IPv4 address of an interface, or None if it has none.
+
+    @param: sock - datagram socket to use for the ioctl, one is opened if
+                   not given
+    @param: request - the ioctl, SIOCGIFNETMASK for the netmask
+    """
+    if len(interface) >= IFNAMSIZ:
+        return None
+    ownSocket = sock is None
+    if ownSocket:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        ifreq = struct.pack("16s", interface) + "\0" * (IFREQ_SIZE - IFNAMSIZ)
+        try:
+            result = fcntl.ioctl(sock.fileno(), request, ifreq)
+        except IOError, err:
+            if err.errno in (errno.EADDRNOTAVAIL, errno.ENODEV, errno.ENXIO):
+                return None
+            raise
+        #####
+        # The answer is a struct sockaddr_in after the name - family, port,
+        # then the address.
+        return socket.inet_ntoa(result[20:24])
+    finally:
+        if ownSocket:
+            sock.close()
+
+
+def getInterfaceNetmask(interface, sock=None):
+    """
+    IPv4 netmask of an interface, like 255.255.255.0, or None.
+    """
+    return getInterfaceAddress(interface, sock, SIOCGIFNETMASK)
+
+
+def getAllAddresses():
+    """
+    (interface, IPv4 address) for every interface with an address, or None
+    if unavailable.
+    """
+    interfaces = getInterfaces()
+    if interfaces is None:
+        return None
+    addresses = []
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        for interface in interfaces:
+            try:
+                address = getInterfaceAddress(interface, sock)
+            except IOError:
+                continue
+            if address:
+                addresses.append((interface, address))
+    finally:
+        sock.close()
+    return addresses
+
+
+def getDefaultRoute():
+    """
+    (interface, gateway) of the default route, (None, None) if there is
+    none, or None if the routing table can't be read.
+    """
+    if not isAvailable():
+        return None
+    try:
+        with open(PROC_NET_ROUTE) as routeFile:
+            lines = routeFile.readlines()
+    except (IOError, OSError):
+        return None
+    for line in lines[1:]:
+        fields = line.split()
+        if len(fields) < 8:
+            continue
+        try:
+            destination = int(fields[1], 16)
+            gateway = int(fields[2], 16)
+            flags = int(fields[3], 16)
+            mask = int(fields[7], 16)
+        except ValueError:
+            continue
+        if destination == 0 and mask == 0 and flags & RTF_UP and \
+           flags & RTF_GATEWAY:
+            #####
+            # Addresses in /proc/net/route are in host byte order
+            return fields[0], socket.inet_ntoa(struct.pack("=L", gateway))
+    return None, None
+
+
+def getInterfaceFor(address):
+    """
+    Name of the interface with the given IPv4 address, or None.
+    """
+    for interface, interfaceAddress in getAllAddresses() or []:
+        if interfaceAddress == address:
+            return interface
+    return None
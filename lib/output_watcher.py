@@ -0,0 +1,144 @@
+"""
+Watch command output for many patterns at once.
+
+All registered patterns are compiled into a single alternation, so checking a
+line costs one regex scan no matter how many triggers are registered.  When a
+pattern matches, its callback is run with the trigger name, the line and the
+match object.
+
+    watcher = OutputWatcher()
+    watcher.addTrigger(PACKER_PATTERNS["ssh_wait"], onSshWait, name="ssh_wait")
+    watcher.addTrigger(PACKER_PATTERNS["errored"], onError, name="errored",
+                       stop=True)
+    rw.setCommand(cmd)
+    rw.waitNpassThruStdout(watcher=watcher)
+
+@note: At most one trigger fires per line - the one matching furthest to the
+       left, with earlier registered triggers winning a tie.  Patterns may not
+       use numbered back references or global inline flags, and named groups
+       must be unique across triggers, as they are combined into one
+       expression.
+"""
+from __future__ import absolute_import
+#--- Native python libraries
+import re
+import threading
+
+#####
+# Commonly interesting lines in packer build output
+PACKER_PATTERNS = {"ssh_wait" : r"Waiting for SSH",
+                   "ssh_connected" : r"Connected to SSH",
+                   "provisioning" : r"Provisioning with (?P<provisioner>\S+)",
+                   "build_finished" : r"Build '(?P<build>[^']+)' finished",
+                   "builds_finished" : r"Builds finished",
+                   "errored" : r"Build '(?P<failed>[^']+)' errored",
+                   "incomplete" : r"Some builds didn't complete successfully",
+                   "iso_download" : r"(Downloading or copying|Retrieving) ISO"}
+
+
+class OutputWatcher(object):
+    """
+    Dispatch callbacks for lines that match any of a set of patterns.
+    """
+    def __init__(self):
+        self.triggers = []
+        self.compiled = None
+        self.hits = {}
+        self.lock = threading.Lock()
+
+    def addTrigger(self, pattern, callback=None, name="", stop=False):
+        """
+        Register a pattern.
+
+        @param: pattern - regular expression string
+        @param: callback - called as callback(name, line, match), optional.
+                           Returning True asks the reader to stop, like stop.
+        @param: name - name of the trigger, defaults to the pattern
+        @param: stop - stop reading output when this trigger fires.  The
+                       command being read is aborted.
+
+        @returns: the name of the trigger
+        """
+        #####
+        # Fail early, with a useful message, on a bad pattern rather than
+        # when the combined expression is compiled.
+        re.compile(pattern)
+        if not name:
+            name = pattern
+        with self.lock:
+            self.triggers.append({"name" : name,
+                                  "pattern" : pattern,
+                                  "callback" : callback,
+                                  "stop" : stop})
+            self.hits.setdefault(name, 0)
+            self.compiled = None
+        return name
+
+    def removeTrigger(self, name):
+        """
+        Remove every trigger registered with name.
+        """
+        with self.lock:
+            self.triggers = [trigger for trigger in self.triggers \
+                             if trigger["name"] != name]
+            self.compiled = None
+
+    def getHits(self, name=None):
+        """
+        Number of times a trigger fired, or a dictionary of all counts.
+        """
+        if name is None:
+            return dict(self.hits)
+        return self.hits.get(name, 0)
+
+    def copy(self):
+        """
+        Return a new watcher with the same triggers.
+        """
+        watcher = OutputWatcher()
+        for trigger in self.triggers:
+            watcher.addTrigger(trigger["pattern"], trigger["callback"],
+                               trigger["name"], trigger["stop"])
+        return watcher
+
+    def compile(self):
+        """
+        Compile all triggers into one expression.  Called automatically on
+        the first scan after the triggers change.
+        """
+        with self.lock:
+            parts = []
+            byGroup = {}
+            for index, trigger in enumerate(self.triggers):
+                group = "_t" + str(index)
+                parts.append("(?P<" + group + ">" + trigger["pattern"] + ")")
+                byGroup[group] = trigger
+            if parts:
+                self.compiled = (re.compile("|".join(parts)), byGroup)
+            else:
+                self.compiled = None
+            return self.compiled
+
+    def scan(self, line):
+        """
+        Check one line of output and run the callback of the trigger that
+        matched.
+
+        @returns: True if the reader should stop, False otherwise
+        """
+        compiled = self.compiled
+        if compiled is None:
+            compiled = self.compile()
+            if compiled is None:
+                return False
+        matcher, byGroup = compiled
+        match = matcher.search(line)
+        if match is None:
+            return False
+        trigger = byGroup[match.lastgroup]
+        self.hits[trigger["name"]] = self.hits.get(trigger["name"], 0) + 1
+        stop = trigger["stop"]
+        if trigger["callback"] is not None:
+            if trigger["callback"](trigger["name"], line, match):
+                stop = True
+        return stop
@@ -0,0 +1,771 @@
+"""
+Local caching http proxy for the package downloads of provisioning.
+
+With update set, or provisioners installing packages, every build fetched
+the same .deb and .rpm files from the internet again.  PackageCacheProxy is
+an http proxy the builder starts on demand and puts in packer's environment
+and template variables, so apt and yum in the guest fetch through it.
+
+    - GETs of package files (see PACKAGE_EXTENSIONS) are answered from a
+      PackageStore on disk, and fetched and saved on a miss.  A package
+      file of a given name and version never changes, so nothing cached
+      needs revalidating.
+    - Everything else, the repository metadata included, is passed through
+      uncached, so the guest always sees the current package lists.
+    - CONNECT is tunnelled untouched, https can't be cached, to the ports
+      in CONNECT_PORTS only.
+
+It is not an open proxy.  It listens on the address VMs reach the host at,
+not on every interface, only serves clients from the VM networks (see
+getVmNetworks), and refuses to fetch from or tunnel to loopback, link-local
+and this host's own addresses, so a client can't reach the host's services
+through it.  Bridged VMs on the LAN need their network allowed explicitly,
+see --package-cache-client.  The interfaces are read from the kernel on
+Linux and from ifconfig elsewhere; where neither works the proxy refuses
+to start with NoGuestNetworkError rather than turn every guest away.
+
+Only the guests use the proxy, through the template's http_proxy and
+https_proxy variables.  Packer's own downloads, the ISOs, go as the
+ProxyManager routes them.
+
+The store keeps to a size budget, dropping the least recently used
+packages.  Upstream requests go through whatever the ProxyManager routes
+them to, so a site proxy keeps working behind the cache, and are throttled
+as the packages traffic class of a BandwidthScheduler.  Cache hits never
+touch the uplink and aren't throttled.
+
+    store = PackageStore(cacheDir, maxBytes=10 * 1024 ** 3)
+    proxy = PackageCacheProxy(logger, store, conf.getProxyManager())
+    proxy.start()
+    environ["http_proxy"] = proxy.getUrl()
+"""
+from __future__ import absolute_import
+#--- Native python libraries
+import os
+import re
+import errno
+import select
+import socket
+import struct
+import hashlib
+import httplib
+import urlparse
+import tempfile
+import threading
+import SocketServer
+import BaseHTTPServer
+import subprocess
+from collections import OrderedDict
+
+#--- non-native python libraries in this source tree
+from .loggers import LogPriority as lp
+from .loggers import getSubsystemLogger
+from .url_probe import ConnectionPool, CachedHTTPSConnection, DEFAULT_PORTS
+from .proxy_manager import parseProxy
+from .bandwidth import PACKAGES
+from . import netinfo
+
+#####
+# Files that never change once published under a name, so are safe to
+# cache without revalidating.
+PACKAGE_EXTENSIONS = (".deb", ".udeb", ".ddeb", ".rpm", ".drpm", ".apk",
+                      ".pkg.tar.xz", ".pkg.tar.zst")
+
+DEFAULT_MAX_BYTES = 10 * 1024 * 1024 * 1024
+
+#####
+# Headers that only concern one connection, never passed on
+HOP_BY_HOP = ["connection", "keep-alive", "proxy-connection", "proxy-authenticate",
+              "proxy-authorization", "te", "trailer", "transfer-encoding", "upgrade"]
+
+CHUNK = 64 * 1024
+
+#####
+# Ports a client may CONNECT to
+CONNECT_PORTS = (443,)
+
+#####
+# Destinations never fetched from or tunnelled to - this host, link-local
+# (cloud metadata services among them), unspecified and multicast.
+BLOCKED_NETWORKS = ["0.0.0.0/8", "127.0.0.0/8", "169.254.0.0/16", "224.0.0.0/4"]
+BLOCKED_NETWORKS6 = ["::", "::1"]
+
+#####
+# Prefixes of the interfaces hypervisors make for host-only and NAT networks
+VM_INTERFACES = ("vmnet", "vboxnet", "virbr", "prl", "bridge", "vnic")
+
+
+#####
+# An IPv4 address line of ifconfig - macOS and BSD "inet 10.0.0.1 netmask
+# 0xffffff00", net-tools "inet 10.0.0.1  netmask 255.255.255.0" or
+# "inet addr:10.0.0.1  Bcast:...  Mask:255.255.255.0"
+IFCONFIG_INET = re.compile(r"^\s+inet (?:addr:)?(\d+\.\d+\.\d+\.\d+)" + \
+                           r"(?:.*?(?:netmask |Mask:)(0x[0-9a-fA-F]{8}|\d+\.\d+\.\d+\.\d+))?")
+IFCONFIG_NAME = re.compile(r"^([^\s:]+)")
+
+
+class NoGuestNetworkError(Exception):
+    """
+    Meant to be thrown when the address VMs reach the host at, or the
+    networks they come from, can't be found.
+    """
+    def __init__(self, *args, **kwargs):
+        Exception.__init__(self, *args, **kwargs)
+
+
+def isPackageUrl(url):
+    """
+    Whether url is of a package file, which can be cached.
+    """
+    path = urlparse.urlsplit(url).path
+    return path.endswith(PACKAGE_EXTENSIONS)
+
+
+def runCommand(cmd):
+    """
+    Output of a command, "" if it can't be run.
+    """
+    try:
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                close_fds=True)
+    except OSError:
+        return ""
+    output, _ = proc.communicate()
+    return output
+
+
+def parseIfconfig(output):
+    """
+    (interface, address, netmask) for each IPv4 address in ifconfig output,
+    the netmask dotted, or None when not shown.
+    """
+    found = []
+    interface = None
+    for line in output.splitlines():
+        match = IFCONFIG_NAME.match(line)
+        if match:
+            interface = match.group(1)
+            continue
+        match = IFCONFIG_INET.match(line)
+        if match and interface:
+            address, netmask = match.groups()
+            if netmask and netmask.startswith("0x"):
+                netmask = socket.inet_ntoa(struct.pack("!L", int(netmask, 16)))
+            found.append((interface, address, netmask))
+    return found
+
+
+def getInterfaceAddresses():
+    """
+    (interface, address, netmask) for every IPv4 address of this host, from
+    the kernel on Linux, else from ifconfig.  None if neither works.
+    """
+    addresses = netinfo.getAllAddresses()
+    if addresses is not None:
+        return [(interface, address, netinfo.getInterfaceNetmask(interface))
+                for interface, address in addresses]
+    for ifconfig in ["/sbin/ifconfig", "/usr/sbin/ifconfig"]:
+        if os.path.exists(ifconfig):
+            return parseIfconfig(runCommand([ifconfig, "-a"])) or None
+    return None
+
+
+def getDefaultInterface():
+    """
+    Name of the interface of the default route, or None.
+    """
+    route = netinfo.getDefaultRoute()
+    if route is not None:
+        return route[0]
+    for routeCmd in ["/sbin/route", "/usr/sbin/route"]:
+        if os.path.exists(routeCmd):
+            for line in runCommand([routeCmd, "-n", "get", "default"]).splitlines():
+                fields = line.split()
+                if len(fields) == 2 and fields[0] == "interface:":
+                    return fields[1]
+    return None
+
+
+def getGuestAddress():
+    """
+    Address of this host a VM can reach it at - the one on the interface
+    of the default route, else the one its name resolves to.  None if
+    there is none but loopback.
+    """
+    interface = getDefaultInterface()
+    for name, address, _ in getInterfaceAddresses() or []:
+        if name == interface:
+            return address
+    try:
+        address = socket.gethostbyname(socket.gethostname())
+    except socket.error:
+        return None
+    if inNetworks(address, ["127.0.0.0/8"]):
+        return None
+    return address
+
+
+def parseNetwork(network):
+    """
+    (address, mask) as integers of an IPv4 network like 10.0.2.0/24, or of
+    a single address.
+
+    @raises: ValueError if network isn't one
+    """
+    address, _, bits = network.partition("/")
+    try:
+        value = struct.unpack("!L", socket.inet_aton(address.strip()))[0]
+        bits = int(bits) if bits else 32
+    except (socket.error, ValueError):
+        raise ValueError("Not an IPv4 network: " + str(network))
+    if not 0 <= bits <= 32:
+        raise ValueError("Not an IPv4 network: " + str(network))
+    mask = (0xffffffff << (32 - bits)) & 0xffffffff
+    return value & mask, mask
+
+
+def inNetworks(address, networks):
+    """
+    Whether an IPv4 address is in any of the networks, see parseNetwork.
+    """
+    try:
+        value = struct.unpack("!L", socket.inet_aton(address))[0]
+    except socket.error:
+        return False
+    for network in networks:
+        base, mask = parseNetwork(network)
+        if value & mask == base:
+            return True
+    return False
+
+
+def getHostAddresses():
+    """
+    The IPv4 addresses of this host's interfaces.
+    """
+    addresses = set(address for _, address, _ in getInterfaceAddresses() or [])
+    try:
+        addresses.update(socket.gethostbyname_ex(socket.gethostname())[2])
+    except socket.error:
+        pass
+    return sorted(addresses)
+
+
+def getVmNetworks():
+    """
+    Networks VMs reach the host from - loopback and this host's own
+    addresses, which guests behind a NAT appear as, and the networks of the
+    hypervisors' host-only and NAT interfaces.
+
+    @returns: the networks, or None if the interfaces can't be listed
+    """
+    interfaces = getInterfaceAddresses()
+    if interfaces is None:
+        return None
+    networks = ["127.0.0.0/8"]
+    networks.extend(getHostAddresses())
+    for interface, address, netmask in interfaces:
+        if interface.startswith(VM_INTERFACES):
+            bits = bin(parseNetwork(netmask or "255.255.255.0")[0]).count("1")
+            networks.append(address + "/" + str(bits))
+    return networks
+
+
+class PackageStore(object):
+    """
+    Package files on disk, named after the sha1 of their URL, kept under
+    maxBytes by dropping the least recently used.
+    """
+    def __init__(self, root, maxBytes=DEFAULT_MAX_BYTES):
+        """
+        @param: root - directory the packages are kept in, made if missing
+        @param: maxBytes - most bytes of packages to keep
+        """
+        self.root = root
+        self.maxBytes = maxBytes
+        self.entries = OrderedDict()
+        self.total = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        if not os.path.isdir(root):
+            os.makedirs(root)
+        self.load()
+
+    def load(self):
+        """
+        Pick up the packages already on disk, oldest used first.
+        """
+        found = []
+        for dirpath, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                if filename.startswith("."):
+                    #####
+                    # Left over from a download that never finished
+                    os.remove(path)
+                    continue
+                info = os.stat(path)
+                found.append((info.st_mtime, filename, info.st_size))
+        with self.lock:
+            self.entries = OrderedDict()
+            self.total = 0
+            for _, key, size in sorted(found):
+                self.entries[key] = size
+                self.total += size
+        self.evict()
+
+    def getKey(self, url):
+        return hashlib.sha1(url).hexdigest()
+
+    def getPath(self, key):
+        return os.path.join(self.root, key[:2], key)
+
+    def open(self, url):
+        """
+        (open file, size) of the cached url, or None if it isn't cached.
+        """
+        key = self.getKey(url)
+        with self.lock:
+            if key not in self.entries:
+                self.misses += 1
+                return None
+            size = self.entries.pop(key)
+            self.entries[key] = size
+            self.hits += 1
+        path = self.getPath(key)
+        try:
+            cached = open(path, "rb")
+        except IOError:
+            with self.lock:
+                if self.entries.pop(key, None) is not None:
+                    self.total -= size
+            return None
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+        return cached, size
+
+    def create(self, url):
+        """
+        A PackageWriter to save url's body with, kept once committed.
+        """
+        return PackageWriter(self, self.getKey(url))
+
+    def add(self, key, tmpPath):
+        """
+        Move a finished download in and make room for it.
+        """
+        path = self.getPath(key)
+        size = os.path.getsize(tmpPath)
+        if size > self.maxBytes:
+            os.remove(tmpPath)
+            return
+        os.rename(tmpPath, path)
+        with self.lock:
+            self.total -= self.entries.pop(key, 0)
+            self.entries[key] = size
+            self.total += size
+        self.evict()
+
+    def evict(self):
+        """
+        Drop the least recently used packages until under maxBytes.
+        """
+        dropped = []
+        with self.lock:
+            while self.total > self.maxBytes and self.entries:
+                key, size = self.entries.popitem(last=False)
+                self.total -= size
+                dropped.append(key)
+        for key in dropped:
+            try:
+                os.remove(self.getPath(key))
+            except OSError:
+                pass
+
+    def getStats(self):
+        """
+        Dictionary of hits, misses, packages and bytes held.
+        """
+        with self.lock:
+            return {"hits" : self.hits,
+                    "misses" : self.misses,
+                    "packages" : len(self.entries),
+                    "bytes" : self.total}
+
+
+class PackageWriter(object):
+    """
+    A download into the store, only kept if committed.
+    """
+    def __init__(self, store, key):
+        self.store = store
+        self.key = key
+        directory = os.path.dirname(store.getPath(key))
+        try:
+            os.makedirs(directory)
+        except OSError, err:
+            if err.errno != errno.EEXIST:
+                raise
+        fd, self.tmpPath = tempfile.mkstemp(prefix=".", dir=directory)
+        self.tmpFile = os.fdopen(fd, "wb")
+        self.bytes = 0
+
+    def write(self, data):
+        self.tmpFile.write(data)
+        self.bytes += len(data)
+
+    def commit(self):
+        self.tmpFile.close()
+        self.store.add(self.key, self.tmpPath)
+
+    def abort(self):
+        self.tmpFile.close()
+        try:
+            os.remove(self.tmpPath)
+        except OSError:
+            pass
+
+
+class PackageCacheHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """
+    Proxies one client connection, see the module docstring.
+    """
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self.forward()
+
+    def do_HEAD(self):
+        self.forward()
+
+    def do_CONNECT(self):
+        self.server.tunnel(self)
+
+    def forward(self):
+        """
+        Answer a proxied request from the store, or from upstream.
+        """
+        url = self.path
+        parts = urlparse.urlsplit(url)
+        if parts.scheme not in DEFAULT_PORTS or not parts.hostname:
+            self.send_error(400, "Only absolute http URLs can be proxied")
+            return
+        if self.server.isBlocked(parts.hostname, parts.port or DEFAULT_PORTS[parts.scheme]):
+            self.send_error(403, "Destination not allowed")
+            return
+        cacheable = self.command == "GET" and isPackageUrl(url) and \
+                    not self.headers.getheader("Range")
+        if cacheable:
+            cached = self.server.store.open(url)
+            if cached is not None:
+                self.sendCached(*cached)
+                return
+        self.server.fetch(self, url, cacheable)
+
+    def sendCached(self, cached, size):
+        try:
+            self.send_response(200)
+            self.send_header("Content-Type", "application/octet-stream")
+            self.send_header("Content-Length", str(size))
+            self.send_header("X-Cache", "HIT")
+            self.end_headers()
+            while True:
+                data = cached.read(CHUNK)
+                if not data:
+                    break
+                self.wfile.write(data)
+        finally:
+            cached.close()
+
+    def log_message(self, fmt, *args):
+        self.server.logger.log(lp.DEBUG, "%s " + fmt, self.client_address[0], *args)
+
+
+class PackageCacheProxy(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    """
+    The caching proxy, served from a background thread once started.
+    """
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, logger, store, proxyManager=None, host=None, port=0,
+                 guestAddress=None, timeout=60, scheduler=None, allowedClients=None,
+                 connectPorts=CONNECT_PORTS, blockedNetworks=None, extraClients=None):
+        """
+        @param: store - the PackageStore packages are kept in
+        @param: proxyManager - routes the upstream requests, default direct
+        @param: host, port - to listen on, default the guestAddress, port 0
+                             for any free one
+        @param: guestAddress - address VMs reach this host at, for getUrl,
+                               default from getGuestAddress
+        @param: timeout - seconds upstream and clients may stall
+        @param: scheduler - BandwidthScheduler the upstream traffic is
+                            throttled by, default none
+        @param: allowedClients - IPv4 networks clients may connect from,
+                                 default getVmNetworks()
+        @param: extraClients - networks allowed besides allowedClients
+        @param: connectPorts - ports clients may CONNECT to
+        @param: blockedNetworks - IPv4 networks never fetched from or
+                                  tunnelled to, default BLOCKED_NETWORKS and
+                                  this host's addresses
+
+        @raises: NoGuestNetworkError if the guestAddress or allowedClients
+                 defaults can't be found
+        """
+        if not guestAddress:
+            guestAddress = getGuestAddress()
+            if not guestAddress:
+                raise NoGuestNetworkError("No address VMs can reach this host at")
+        if allowedClients is None:
+            allowedClients = getVmNetworks()
+            if allowedClients is None:
+                raise NoGuestNetworkError("Can't list the network interfaces VMs come from")
+        if blockedNetworks is None:
+            blockedNetworks = BLOCKED_NETWORKS + getHostAddresses()
+        for network in list(allowedClients) + list(extraClients or []) + list(blockedNetworks):
+            parseNetwork(network)
+        BaseHTTPServer.HTTPServer.__init__(self, (host or guestAddress, port),
+                                           PackageCacheHandler)
+        self.logger = getSubsystemLogger(logger, "net")
+        self.store = store
+        self.proxyManager = proxyManager
+        self.guestAddress = guestAddress
+        self.allowedClients = list(allowedClients) + list(extraClients or [])
+        self.connectPorts = list(connectPorts or [])
+        self.blockedNetworks = list(blockedNetworks)
+        self.timeout = timeout
+        self.scheduler = scheduler
+        self.pool = ConnectionPool(maxPerHost=8)
+        self.thread = None
+
+    def start(self):
+        """
+        Serve from a daemon thread.
+        """
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.serve_forever,
+                                           name="package-cache-proxy")
+            self.thread.daemon = True
+            self.thread.start()
+            self.logger.log(lp.INFO, "Package cache proxy listening at " + self.getUrl())
+
+    def stop(self):
+        """
+        Stop serving and close the listening socket.
+        """
+        if self.thread is not None:
+            self.shutdown()
+            self.thread = None
+            self.logger.log(lp.INFO, "Package cache: %s", self.store.getStats())
+        self.server_close()
+        self.pool.close()
+
+    def getUrl(self):
+        """
+        The proxy's URL as a VM sees it.
+        """
+        return "http://" + self.guestAddress + ":" + str(self.server_address[1])
+
+    def verify_request(self, request, client_address):
+        """
+        Only serve clients from the allowed networks.
+        """
+        if inNetworks(client_address[0], self.allowedClients):
+            return True
+        self.logger.log(lp.WARNING, "Package cache refused a client at %s", client_address[0])
+        return False
+
+    def isBlocked(self, host, port):
+        """
+        Whether host, or any address it resolves to, is a destination the
+        proxy must not reach.  Hosts that don't resolve here are left to
+        fail upstream.
+        """
+        try:
+            addresses = self.pool.dnsCache.resolve(host.strip("[]"), port)
+        except socket.error:
+            return False
+        for family, sockaddr in addresses:
+            if family == socket.AF_INET6:
+                address = sockaddr[0].split("%")[0].lower()
+                if address in BLOCKED_NETWORKS6 or address.startswith("fe80:") or \
+                   address.startswith("::ffff:") and \
+                   inNetworks(address[7:], self.blockedNetworks):
+                    return True
+            elif inNetworks(sockaddr[0], self.blockedNetworks):
+                return True
+        return False
+
+    def handle_error(self, request, client_address):
+        """
+        Clients hanging up mid download are normal, only log it.
+        """
+        self.logger.log(lp.DEBUG, "Connection from %s ended with an error", client_address[0])
+
+    def throttle(self, nbytes):
+        if self.scheduler is not None:
+            self.scheduler.throttle(PACKAGES, nbytes)
+
+    def getUpstream(self, url):
+        """
+        Upstream proxy for url, "" to go direct.
+        """
+        if self.proxyManager is None:
+            return ""
+        return self.proxyManager.route(url)
+
+    def fetch(self, handler, url, cacheable):
+        """
+        Relay url from upstream to the client, saving it to the store if
+        cacheable and complete.
+        """
+        parts = urlparse.urlsplit(url)
+        upstream = self.getUpstream(url)
+        if upstream and parts.scheme == "http":
+            proxyHost, proxyPort = parseProxy(upstream)
+            key = ("http", proxyHost, proxyPort)
+            target = url
+        else:
+            key = (parts.scheme, parts.hostname, parts.port or DEFAULT_PORTS[parts.scheme])
+            target = (parts.path or "/") + ("?" + parts.query if parts.query else "")
+        headers = dict((name, value) for name, value in handler.headers.items()
+                       if name.lower() not in HOP_BY_HOP + ["host"])
+
+        #####
+        # A kept-alive connection may have been closed by the server
+        # meanwhile, a request on it is tried once more on a new one.
+        for attempt in range(2):
+            conn, reused = self.pool.acquire(key, self.timeout)
+            if upstream and parts.scheme == "https" and not reused:
+                proxyHost, proxyPort = parseProxy(upstream)
+                conn = CachedHTTPSConnection(proxyHost, proxyPort, timeout=self.timeout,
+                                             context=self.pool.context)
+                conn.dnsCache = self.pool.dnsCache
+                conn.set_tunnel(key[1], key[2])
+            reusable = False
+            try:
+                conn.putrequest(handler.command, target, skip_accept_encoding=True)
+                for name, value in headers.items():
+                    conn.putheader(name, value)
+                conn.endheaders()
+                response = conn.getresponse()
+            except (httplib.HTTPException, socket.error), err:
+                self.pool.release(key, conn, False)
+                if reused and attempt == 0:
+                    continue
+                self.logger.log(lp.WARNING, "Fetching " + url + " failed: " + str(err))
+                handler.send_error(502, "Upstream failed: " + str(err))
+                return
+            try:
+                reusable = self.relay(handler, response, url, cacheable)
+            finally:
+                self.pool.release(key, conn, reusable)
+            return
+
+    def relay(self, handler, response, url, cacheable):
+        """
+        Pass the response on, teeing it into the store if cacheable.
+
+        @returns: whether the upstream connection can be used again
+        """
+        length = response.getheader("content-length")
+        handler.send_response(response.status, response.reason)
+        for name, value in response.getheaders():
+            if name.lower() not in HOP_BY_HOP + ["date", "server"]:
+                handler.send_header(name, value)
+        if length is None and handler.command != "HEAD":
+            #####
+            # Without a length the end of the body is the end of the
+            # connection.
+            handler.send_header("Connection", "close")
+            handler.close_connection = 1
+        handler.end_headers()
+        if handler.command == "HEAD":
+            response.read()
+            return not response.will_close
+
+        writer = None
+        if cacheable and response.status == 200:
+            writer = self.store.create(url)
+        try:
+            while True:
+                data = response.read(CHUNK)
+                if not data:
+                    break
+                self.throttle(len(data))
+                if writer is not None:
+                    writer.write(data)
+                handler.wfile.write(data)
+        except Exception:
+            if writer is not None:
+                writer.abort()
+            raise
+        if writer is not None:
+            if length is None or writer.bytes == int(length):
+                writer.commit()
+                self.logger.log(lp.DEBUG, "Cached %s, %d bytes", url, writer.bytes)
+            else:
+                writer.abort()
+        return response.isclosed() and not response.will_close
+
+    def tunnel(self, handler):
+        """
+        Relay the bytes of a CONNECT both ways, through the upstream https
+        proxy if there is one.
+        """
+        host, _, port = handler.path.rpartition(":")
+        try:
+            port = int(port)
+        except ValueError:
+            handler.send_error(400, "CONNECT needs host:port")
+            return
+        if port not in self.connectPorts or self.isBlocked(host, port):
+            self.logger.log(lp.WARNING, "Package cache refused CONNECT to %s", handler.path)
+            handler.send_error(403, "Destination not allowed")
+            return
+        upstream = self.getUpstream("https://" + handler.path + "/")
+        try:
+            if upstream:
+                proxyHost, proxyPort = parseProxy(upstream)
+                remote = self.pool.dnsCache.connect(proxyHost, proxyPort, self.timeout)
+                remote.sendall("CONNECT %s HTTP/1.1\r\nHost: %s\r\n\r\n" %
+                               (handler.path, handler.path))
+                answer = ""
+                while "\r\n\r\n" not in answer:
+                    data = remote.recv(4096)
+                    if not data:
+                        raise socket.error("Upstream proxy closed the connection")
+                    answer += data
+                if answer.split(" ", 2)[1:2] != ["200"]:
+                    remote.close()
+                    raise socket.error("Upstream proxy answered " + answer.split("\r\n")[0])
+            else:
+                remote = self.pool.dnsCache.connect(host.strip("[]"), port, self.timeout)
+        except socket.error, err:
+            handler.send_error(502, "Upstream failed: " + str(err))
+            return
+        handler.send_response(200, "Connection established")
+        handler.end_headers()
+        handler.wfile.flush()
+        handler.close_connection = 1
+
+        client = handler.connection
+        sockets = [client, remote]
+        try:
+            while True:
+                readable, _, failed = select.select(sockets, [], sockets, self.timeout)
+                if failed or not readable:
+                    break
+                for sock in readable:
+                    data = sock.recv(CHUNK)
+                    if not data:
+                        return
+                    self.throttle(len(data))
+                    (remote if sock is client else client).sendall(data)
+        except socket.error:
+            pass
+        finally:
+            remote.close()
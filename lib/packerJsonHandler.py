@@ -1,10 +1,15 @@
 #!/usr/bin/python
 import re
+import copy
 import json
 import traceback
 from libHelperFunctions import isSaneFilePath
 from loggers import LogPriority as lp
 
+#####
+# Builder types of the virtualization providers
+PROVIDERS = ['vmware-iso', 'virtualbox-iso', 'parallels-iso']
+
 #jfp = open("macos1010.json", "r")
 #jstuff = json.load(jfp)
 #print str(jstuff)
@@ -52,7 +57,7 @@ class PackerJsonHandler():
                 self.logger.log(lp.INFO, str(trace))
             else:
                 self.variables = jstuff
-                print str(jstuff)
+                self.logger.log(lp.DEBUG, "Variables: %s", jstuff)
                 '''
                 try:
                     self.logger.log(lp.DEBUG, "jstuff: " + str(jstuff))
@@ -629,7 +634,7 @@ class PackerJsonHandler():
         @author: Roy Nielsen
         '''
         if isoName and isinstance(isoName, basestring):
-            self.variables["iso"] = isoName
+            self.variables["iso_name"] = isoName
 
     def setIsoPath(self, isoPath=""):
         '''
@@ -638,7 +643,7 @@ class PackerJsonHandler():
         @author: Roy Nielsen
         '''
         if isoPath and isinstance(isoPath, basestring):
-            self.variables["iso-path"] = isoPath
+            self.variables["iso_path"] = isoPath
 
     def setIsoUrl(self, isoUrl=""):
         '''
@@ -647,7 +652,7 @@ class PackerJsonHandler():
         @author: Roy Nielsen
         '''
         if isoUrl and isinstance(isoUrl, basestring):
-            self.variables["iso-url"] = isoUrl
+            self.variables["iso_url"] = isoUrl
 
     def setIsoChecksum(self, isoChecksum=""):
         '''
@@ -656,7 +661,7 @@ class PackerJsonHandler():
         @author: Roy Nielsen
         '''
         if isoChecksum and isinstance(isoChecksum, basestring):
-            self.variables["iso-checksum"] = isoChecksum
+            self.variables["iso_checksum"] = isoChecksum
 
     def setIsoChecksumType(self, isoChecksumType=""):
         '''
@@ -665,7 +670,7 @@ class PackerJsonHandler():
         @author: Roy Nielsen
         '''
         if isoChecksumType and isinstance(isoChecksumType, basestring):
-            self.variables["iso"] = isoChecksumType
+            self.variables["iso_checksum_type"] = isoChecksumType
 
     def setHttpProxy(self, httpProxy=''):
         '''
@@ -748,6 +753,58 @@ class PackerJsonHandler():
         if virtualboxType and isinstance(virtualboxType, basestring):
             self.variables['virtualbox_guest_os_type'] = virtualboxType
 
+    def getTemplateNameForVarFile(self, varFile=""):
+        '''
+        Name of the template a boxcutter varfile goes with - ubuntu.json for
+        ubuntu1604-desktop.json.  Oracle linux varfiles all use
+        oraclelinux.json.
+
+        @param: varFile - name or path of the varfile
+        '''
+        varFile = str(varFile).split("/")[-1]
+        if re.match("^ol", varFile):
+            return "oraclelinux.json"
+        templateFileRegex = re.match("^([A-Za-z_\-]+)\d+.*\.json$", varFile)
+        if not templateFileRegex:
+            raise ValueError("Can't tell the template for varfile: " + str(varFile))
+        return templateFileRegex.group(1) + ".json"
+
+    def mergeTemplate(self, data=None, variables=None, vmTypes=None):
+        '''
+        Build the template packer is run with: the variables, provisioners
+        and post-processors of a template, its variables overridden by the
+        passed in ones, and only the builders of the requested types.
+
+        @param: data - template as read by readExistingJsonTemplateFile
+        @param: variables - dictionary of variables overriding the template's
+        @param: vmTypes - builder types to keep, default all of PROVIDERS
+
+        @returns: the new template, data is left untouched
+        '''
+        if vmTypes is None:
+            vmTypes = PROVIDERS
+        newJson = {}
+        try:
+            newJson['_comment'] = data["_comment"]
+        except KeyError:
+            try:
+                newJson['_comment'] = data['_command']
+            except KeyError:
+                pass
+
+        newJson['variables'] = copy.deepcopy(data['variables'])
+        for key, value in (variables or {}).iteritems():
+            newJson['variables'][key] = value
+
+        newJson['provisioners'] = copy.deepcopy(data['provisioners'])
+        newJson['post-processors'] = copy.deepcopy(data['post-processors'])
+        if newJson['post-processors']:
+            newJson['post-processors'][0]['keep_input_artifact'] = True
+        newJson['builders'] = [copy.deepcopy(item) for item in data['builders'] \
+                               if item['type'] in vmTypes]
+        self.logger.log(lp.DEBUG, "Merged template: %s", newJson)
+        return newJson
+
     def saveJsonVarFile(self, fname="", data=None):
         '''
         Save a boxcutter varfile
@@ -755,7 +812,7 @@ class PackerJsonHandler():
         @author: Roy Nielsen
         '''
         self.logger.log(lp.DEBUG, "fname: " + str(fname))
-        self.logger.log(lp.DEBUG, "jsonData: " + str(data))
+        self.logger.log(lp.DEBUG, "jsonData: %s", data)
         if fname and isSaneFilePath(fname):
             with open(fname, 'w') as outfile:
                 if data:
@@ -777,7 +834,7 @@ class PackerJsonHandler():
             data['provisioners'] = self.provisioners
             data['_comment'] = self._comment
         else:
-            print str(json.dumps(data, ensure_ascii=False, indent=3))
+            self.logger.log(lp.DEBUG, lambda: json.dumps(data, ensure_ascii=False, indent=3))
 
         cleanData = self.cleanUserVars(data)
         with open(fname, 'w') as outfile:
@@ -1,9 +1,15 @@
 import os
 import re
+import json
+import time
 import traceback
 
 from run_commands import RunWith
+from log_context import logContext
+from build_log import BuildLog
 from loggers import LogPriority as lp
+from loggers import getSubsystemLogger
+from bandwidth import BUILD
 
 class MissingParameterError(Exception):
     """
@@ -15,93 +21,160 @@ class MissingParameterError(Exception):
         Exception.__init__(self, *args, **kwargs)
 
 
+class PackerResult(object):
+    """
+    Outcome of one packer run.
+    """
+    def __init__(self, buildId="", templateFile="", varFile="", vmImage=""):
+        self.buildId = buildId
+        self.templateFile = templateFile
+        self.varFile = varFile
+        self.vmImage = vmImage
+        self.command = []
+        self.returncode = None
+        self.buildLogPath = ""
+        self.started = None
+        self.finished = None
+        self.hits = {}
+
+    def succeeded(self):
+        """
+        True if packer ran and returned 0.
+        """
+        return str(self.returncode) == "0"
+
+    def toDict(self):
+        """
+        The result as a dictionary of plain values, for JSON output.
+        """
+        elapsed = None
+        if self.started is not None and self.finished is not None:
+            elapsed = round(self.finished - self.started, 3)
+        return {"buildId" : self.buildId,
+                "templateFile" : self.templateFile,
+                "varFile" : self.varFile,
+                "vmImage" : self.vmImage,
+                "command" : self.command,
+                "returncode" : self.returncode,
+                "succeeded" : self.succeeded(),
+                "buildLog" : self.buildLogPath,
+                "elapsed" : elapsed,
+                "hits" : self.hits}
+
+
 class PackerRunner(object):
     """
+    Runs packer builds, each described by a lib.build_context.BuildContext.
+    Nothing of a build is kept on the runner or changed in the process, so
+    one runner can run several builds at the same time.
     """
     def __init__(self, conf):
         """
         """
         self.conf = conf
-        self.logger = self.conf.getLogger()
-        self.rw = RunWith(self.logger)
+        self.logger = getSubsystemLogger(self.conf.getLogger(), "packer")
 
-    def runPackerBoxcutter(self, templateFile="", varFile="", vmImage=""):
+    def runBuild(self, context, watcher=None):
         """
-        Run packer on a boxcutter repo
+        Run packer for one build
 
-        @param: templateFile - Name of the packer template to process
-        @param: varFile - Name of optional variables file
-        @param: vmImage - Will create only this type of image, one of:
+        @param: context - BuildContext of the build.  Its vmImage, if set,
+                          creates only this type of image, one of:
                           parallels-iso - Parallels desktop virtualization (requires the Pro Edition - Desktop edition won't work)
                           virtualbox-iso - VirtualBox desktop virtualization
                           vmware-iso - VMware Fusion or VMware Workstation desktop virtualization
+        @param: watcher - optional OutputWatcher run against packer's output,
+                          see lib.output_watcher.PACKER_PATTERNS
+
+        @returns: a PackerResult
 
         examples:
 
-            templateFile = "ubuntu.json"
-            varFile = "ubuntu1604.json"
-            vmImage = "vmware-iso"
+            context = BuildContext.create(conf, "/opt/tools/src/boxcutter/ubuntu",
+                                          "ubuntu.json", "ubuntu1604.json",
+                                          vmImage="vmware-iso")
+        """
+        result = PackerResult(context.buildId, context.templateFile,
+                              context.varFile, context.vmImage)
+
+        with logContext(buildId=context.buildId, provider=context.vmImage or None):
+            self.logger.log(lp.DEBUG, "Build context: %s", context.toDict())
+
+            if not os.path.isdir(context.outputDir):
+                os.makedirs(context.outputDir)
+            #####
+            # Ports of our own, so builds running side by side don't collide
+            with self.conf.getPortLeaseManager().lease(context.buildId) as lease:
+                buildContext = self.prepareTemplate(context, lease)
+                try:
+                    cmd = self.buildCommand(buildContext, lease)
+                    self.runCommand(buildContext, result, cmd, watcher)
+                finally:
+                    if buildContext.templateFile != context.templateFile:
+                        try:
+                            os.unlink(buildContext.templateFile)
+                        except OSError:
+                            pass
+        return result
 
+    def runCommand(self, context, result, cmd, watcher=None):
         """
+        Run a packer command in the build's repo, filling in result.
+        """
+        rw = RunWith(self.logger)
+        rw.setCommand(cmd, env=self.buildEnviron(context), cwd=context.repo)
+        result.command = cmd
 
-        self.logger.log(lp.DEBUG, "templateFile: " + str(templateFile))
-        self.logger.log(lp.DEBUG, "varFile: " + str(varFile))
-        self.logger.log(lp.DEBUG, "vmImage: " + str(vmImage))
+        #####
+        # Every line of the build's output goes to its own indexed log
+        buildLog = None
+        if context.buildLogDir:
+            buildLog = BuildLog(os.path.join(context.buildLogDir, context.buildId))
+            result.buildLogPath = buildLog.getPath()
+            self.logger.log(lp.INFO, "Build log: " + result.buildLogPath)
+        rw.setBuildLog(buildLog)
+        result.started = time.time()
+        try:
+            #####
+            # Packer's own downloads can't be throttled, the build holds a
+            # transfer slot instead, see lib.bandwidth
+            with self.conf.getBandwidthScheduler().slot(BUILD):
+                _, _, result.returncode = rw.waitNpassThruStdout(watcher=watcher)
+        finally:
+            result.finished = time.time()
+            rw.setBuildLog(None)
+            if buildLog is not None:
+                buildLog.close()
+        if watcher is not None:
+            result.hits = watcher.getHits()
+
+    def buildCommand(self, context, lease=None):
+        """
+        The packer build command for a build's template, optional varfile
+        and optional single builder.
 
-        returnDir = os.getcwd()
-        os.chdir(self.conf.getCurrentRepo())
-        
-        
+        @param: lease - PortLease whose ranges are passed to the template's
+                        port variables
+        """
+        templateFile = context.templateFile
+        varFile = context.varFile
         cmd = ["/usr/local/bin/packer", "build"]
-        
-        #####
-        # Get and set the proxy if there is one
-        shellEnviron = os.environ.copy()
-        self.logger.log(lp.DEBUG, "Env: " + str(shellEnviron))
-        proxy = self.conf.getProxy()
-        httpsProxy = self.conf.getHttpsProxy()
-        httpProxy = self.conf.getHttpProxy()
-        ftpProxy = self.conf.getFtpProxy()
-        rsyncProxy = self.conf.getRsyncProxy()
-        noProxy = self.conf.getNoProxy()
-
-        if proxy and isinstance(proxy, basestring):
-            shellEnviron['http_proxy'] = proxy
-            shellEnviron['https_proxy'] = proxy
-            shellEnviron['ftp_proxy'] = proxy
-            shellEnviron['rsync_proxy'] = proxy
-            shellEnviron['HTTP_PROXY'] = proxy
-            shellEnviron['HTTPS_PROXY'] = proxy
-            shellEnviron['FTP_PROXY'] = proxy
-            shellEnviron['RSYNC_PROXY'] = proxy
-        if httpProxy and isinstance(httpProxy, basestring):
-            shellEnviron['http_proxy'] = httpProxy
-            shellEnviron['HTTP_PROXY'] = httpProxy
-        if httpsProxy and isinstance(httpsProxy, basestring):
-            shellEnviron['https_proxy'] = httpsProxy
-            shellEnviron['HTTPS_PROXY'] = httpsProxy
-        if ftpProxy and isinstance(ftpProxy, basestring):
-            shellEnviron['ftp_proxy'] = ftpProxy
-            shellEnviron['FTP_PROXY'] = ftpProxy
-        if rsyncProxy and isinstance(rsyncProxy, basestring):
-            shellEnviron['rsync_proxy'] = rsyncProxy
-            shellEnviron['RSYNC_PROXY'] = rsyncProxy
-        if noProxy and isinstance(noProxy, basestring):
-            shellEnviron['no_proxy'] = noProxy
-            shellEnviron['NO_PROXY'] = noProxy
-
-        self.logger.log(lp.DEBUG, "Env With Proxies: " + str(shellEnviron))
 
         #####
         # Add specific VM if requested
-        if vmImage and isinstance(vmImage, basestring):
-            cmd.append("-only=" + vmImage)
+        if context.vmImage and isinstance(context.vmImage, basestring):
+            cmd.append("-only=" + context.vmImage)
 
         #####
         # Add the varFile
         if varFile and isinstance(varFile, basestring):
             cmd.append("-var-file=" + str(varFile))
 
+        #####
+        # Point the guest at the package cache and pass the leased ports, for
+        # the templates that take those variables
+        cmd.extend(self.buildTemplateVars(context, lease))
+
         self.logger.log(lp.DEBUG, "CMD so far: " + str(cmd))
         self.logger.log(lp.DEBUG, "templateFile: " + str(templateFile))
 
@@ -115,9 +188,100 @@ class PackerRunner(object):
             cmd.append(str(templateFile))
 
         self.logger.log(lp.DEBUG, "CMD to run: " + str(cmd))
+        return cmd
+
+    def buildEnviron(self, context=None):
+        """
+        Environment to run packer with - ours, with the configured proxies
+        that are up, see lib.proxy_manager.  The package cache is only for
+        the guests, see buildTemplateVars, packer's own ISO downloads
+        aren't cached and don't go through it.
+
+        @param: context - the build, whose ISO hosts the proxy manager
+                          routes direct are put in no_proxy
+        """
+        urls = self.getIsoUrls(context) if context is not None else []
+        shellEnviron = self.conf.getProxyManager().buildEnviron(urls=urls)
+        self.logger.log(lp.DEBUG, "Env With Proxies: %s", shellEnviron)
+        return shellEnviron
+
+    def readTemplate(self, context):
+        """
+        The data of a build's template, None if it can't be read.
+        """
+        if not context.templateFile or not isinstance(context.templateFile, basestring):
+            return None
+        try:
+            with open(context.getTemplatePath()) as jsonFile:
+                data = json.load(jsonFile)
+        except (IOError, ValueError), err:
+            self.logger.log(lp.DEBUG, "Template %s not read: %s", context.templateFile, err)
+            return None
+        if not isinstance(data, dict):
+            return None
+        return data
+
+    def getIsoUrls(self, context):
+        """
+        The http and https ISO URLs a build downloads, from its template
+        and varfile.
+        """
+        #####
+        # url_probe brings in httplib, not wanted at startup
+        from url_probe import getIsoUrls
+        data = self.readTemplate(context)
+        values = {}
+        if context.varFile:
+            try:
+                with open(context.getVarFilePath()) as jsonFile:
+                    values = json.load(jsonFile)
+            except (IOError, ValueError), err:
+                self.logger.log(lp.DEBUG, "Varfile %s not read: %s", context.varFile, err)
+            if not isinstance(values, dict):
+                values = {}
+        return getIsoUrls(data or {"variables" : values}, values)
 
-        self.rw.setCommand(cmd, env=shellEnviron)
+    def buildTemplateVars(self, context, lease=None):
+        """
+        -var arguments setting the template's http_proxy and https_proxy
+        variables to the package cache, if it is on, and its port variables
+        to the lease's ranges.  Only variables the template declares are
+        set, packer rejects any others.
+        """
+        values = {}
+        packageCache = self.conf.getPackageCacheProxy()
+        if packageCache is not None:
+            values["http_proxy"] = packageCache.getUrl()
+            values["https_proxy"] = packageCache.getUrl()
+        if lease is not None:
+            values.update(lease.getVariables())
+        if not values:
+            return []
+        data = self.readTemplate(context) or {}
+        variables = data.get("variables") or {}
+        return ["-var=" + name + "=" + str(values[name])
+                for name in sorted(values.keys()) if name in variables]
 
-        self.rw.waitNpassThruStdout()
+    def prepareTemplate(self, context, lease=None):
+        """
+        Write the template the build runs next to the original, see
+        BuildContext.getBuildTemplatePath - the builders' output_directory
+        in the build's outputDir, and the leased ports.
 
-        os.chdir(returnDir)
+        @returns: the context with templateFile the copy, or context itself
+                  if the template can't be read
+        """
+        data = self.readTemplate(context)
+        if data is None:
+            return context
+        for builder in data.get("builders", []):
+            name = builder.get("name") or builder.get("type")
+            if name:
+                builder["output_directory"] = context.getBuilderOutputDir(name)
+        if lease is not None:
+            lease.applyToTemplate(data)
+        buildTemplate = context.getBuildTemplatePath()
+        with open(buildTemplate, "w") as jsonFile:
+            jsonFile.write(json.dumps(data, indent=3))
+        self.logger.log(lp.DEBUG, "Template for the build: %s", buildTemplate)
+        return context.replace(templateFile=buildTemplate)
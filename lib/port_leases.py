@@ -0,0 +1,276 @@
+"""
+Disjoint host port ranges for packer builds running at the same time.
+
+Each packer build opens an http server for its kickstart and preseed files,
+and depending on the builder a VNC port and an ssh forwarding port, each
+picked at random from packer's default ranges.  Builds running side by side
+picked the same ports and had to retry, or failed.
+
+A PortLeaseManager gives each build a block of blockSize ports of every
+kind in PORT_RANGES, no two live builds on the host sharing one, and skips
+blocks with a port some other program already holds.  The leases are kept
+in a JSON file under a lock, so builds run from separate processes don't
+collide either, and the leases of processes that died are taken back.
+
+    with conf.getPortLeaseManager().lease(buildId) as lease:
+        lease.getVariables()       # {"http_port_min" : 8010, ...}
+        lease.applyToTemplate(templateData)
+"""
+from __future__ import absolute_import
+#--- Native python libraries
+import os
+import json
+import time
+import errno
+import fcntl
+import socket
+import threading
+
+#--- non-native python libraries in this source tree
+from .loggers import LogPriority as lp
+from .facts_cache import getDefaultCachePath
+
+#####
+# Ports packer picks from for each kind, min and max included
+PORT_RANGES = {"http" : (8000, 9000),
+               "vnc" : (5900, 6000),
+               "ssh" : (2222, 4444)}
+
+#####
+# Template variable and builder field names for each kind
+FIELDS = {"http" : ("http_port_min", "http_port_max"),
+          "vnc" : ("vnc_port_min", "vnc_port_max"),
+          "ssh" : ("ssh_host_port_min", "ssh_host_port_max")}
+
+#####
+# The kinds of port each builder type opens
+BUILDER_PORTS = {"vmware-iso" : ["http", "vnc"],
+                 "virtualbox-iso" : ["http", "ssh"],
+                 "parallels-iso" : ["http"],
+                 "qemu" : ["http", "vnc", "ssh"]}
+
+DEFAULT_BLOCK = 10
+
+
+class NoFreePortsError(Exception):
+    """
+    Meant to be thrown when every block of a kind of port is taken.
+    """
+    def __init__(self, *args, **kwargs):
+        Exception.__init__(self, *args, **kwargs)
+
+
+def isPortFree(port):
+    """
+    Whether nothing on this host is listening on port.  Ports only held by
+    connections in TIME_WAIT count as free - packer's listeners set
+    SO_REUSEADDR, so can use them.
+    """
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    try:
+        sock.bind(("", port))
+        return True
+    except socket.error:
+        return False
+    finally:
+        sock.close()
+
+
+def isProcessAlive(pid):
+    """
+    Whether a process with this pid exists.
+    """
+    try:
+        os.kill(pid, 0)
+    except OSError, err:
+        return err.errno == errno.EPERM
+    return True
+
+
+class PortLease(object):
+    """
+    The port ranges leased to one build, released by release() or at the
+    end of a with block.
+    """
+    def __init__(self, manager, leaseId, ranges):
+        """
+        @param: ranges - kind to (first port, last port)
+        """
+        self.manager = manager
+        self.leaseId = leaseId
+        self.ranges = ranges
+
+    def getRange(self, kind):
+        return self.ranges[kind]
+
+    def getVariables(self):
+        """
+        Template variable name to port, for every kind leased.
+        """
+        variables = {}
+        for kind, (first, last) in self.ranges.items():
+            minName, maxName = FIELDS[kind]
+            variables[minName] = first
+            variables[maxName] = last
+        return variables
+
+    def applyToTemplate(self, data):
+        """
+        Set the port fields of each builder in packer template data to the
+        leased ranges, for the kinds of port its type opens.
+
+        @returns: True if anything was changed
+        """
+        changed = False
+        for builder in (data or {}).get("builders", []):
+            for kind in BUILDER_PORTS.get(builder.get("type"), []):
+                if kind not in self.ranges:
+                    continue
+                for name, port in zip(FIELDS[kind], self.ranges[kind]):
+                    if builder.get(name) != port:
+                        builder[name] = port
+                        changed = True
+        return changed
+
+    def release(self):
+        self.manager.release(self.leaseId)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.release()
+
+
+class PortLeaseManager(object):
+    """
+    Hands out PortLeases, see the module docstring.
+    """
+    def __init__(self, logger, path=None, blockSize=DEFAULT_BLOCK,
+                 ranges=None, checkPorts=True):
+        """
+        @param: path - JSON file the leases are kept in, default
+                       port_leases.json in the user's cache directory
+        @param: blockSize - ports of each kind leased to a build
+        @param: ranges - kind to (min, max) to lease from, default PORT_RANGES
+        @param: checkPorts - skip blocks with a port already in use
+        """
+        self.logger = logger
+        self.path = path or getDefaultCachePath("port_leases.json")
+        self.blockSize = blockSize
+        self.ranges = dict(ranges or PORT_RANGES)
+        self.checkPorts = checkPorts
+        self.hostname = socket.gethostname()
+        self.lock = threading.Lock()
+
+    def locked(self, update):
+        """
+        Run update(leases) holding both the thread and file locks, saving
+        the leases if it returns True.
+        """
+        directory = os.path.dirname(self.path)
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        with self.lock:
+            with open(self.path + ".lock", "a") as lockFile:
+                fcntl.flock(lockFile, fcntl.LOCK_EX)
+                try:
+                    leases = self.load()
+                    if update(leases):
+                        tmpPath = self.path + "." + str(os.getpid()) + ".tmp"
+                        with open(tmpPath, "w") as jsonFile:
+                            json.dump(leases, jsonFile, indent=4, sort_keys=True)
+                        os.rename(tmpPath, self.path)
+                finally:
+                    fcntl.flock(lockFile, fcntl.LOCK_UN)
+
+    def load(self):
+        """
+        The leases in the file, without the ones of processes that are gone.
+        """
+        try:
+            with open(self.path) as jsonFile:
+                leases = json.load(jsonFile)
+        except (IOError, ValueError):
+            return {}
+        if not isinstance(leases, dict):
+            return {}
+        for leaseId, entry in leases.items():
+            if not isinstance(entry, dict) or \
+               entry.get("hostname") == self.hostname and \
+               not isProcessAlive(entry.get("pid", 0)):
+                self.logger.log(lp.DEBUG, "Taking back the ports of lease %s", leaseId)
+                del leases[leaseId]
+        return leases
+
+    def lease(self, leaseId, kinds=None):
+        """
+        Lease a block of ports of each kind to leaseId.
+
+        @param: leaseId - name of the lease, like the build id
+        @param: kinds - kinds of port needed, default all of ranges
+
+        @returns: a PortLease
+        @raises: NoFreePortsError if a kind has no free block
+        """
+        kinds = kinds or sorted(self.ranges.keys())
+        ranges = {}
+
+        def update(leases):
+            for kind in kinds:
+                taken = set()
+                for entry in leases.values():
+                    if entry.get("hostname") == self.hostname:
+                        block = entry.get("ranges", {}).get(kind)
+                        if block:
+                            taken.add(block[0])
+                ranges[kind] = self.findBlock(kind, taken)
+            leases[leaseId] = {"hostname" : self.hostname,
+                               "pid" : os.getpid(),
+                               "started" : time.time(),
+                               "ranges" : ranges}
+            return True
+
+        self.locked(update)
+        self.logger.log(lp.DEBUG, "Ports of %s: %s", leaseId, ranges)
+        return PortLease(self, leaseId, ranges)
+
+    def findBlock(self, kind, taken):
+        """
+        (first, last) of the lowest block of kind not taken and, if
+        checking, with all its ports free.
+        """
+        low, high = self.ranges[kind]
+        for first in range(low, high - self.blockSize + 2, self.blockSize):
+            if first in taken:
+                continue
+            last = first + self.blockSize - 1
+            if self.checkPorts and \
+               not all([isPortFree(port) for port in range(first, last + 1)]):
+                continue
+            return [first, last]
+        raise NoFreePortsError("No free block of " + str(self.blockSize) + \
+                               " " + kind + " ports between " + str(low) + \
+                               " and " + str(high))
+
+    def release(self, leaseId):
+        """
+        Give back the ports of leaseId.
+        """
+        def update(leases):
+            return leases.pop(leaseId, None) is not None
+        self.locked(update)
+
+    def getLeases(self):
+        """
+        Lease id to its entry, for the live leases.
+        """
+        found = {}
+
+        def update(leases):
+            found.update(leases)
+            return False
+
+        self.locked(update)
+        return found
@@ -30,6 +30,9 @@ from optparse import OptionParser, SUPPRESS_HELP
 from .conf import Conf
 from .loggers import CyLogger
 from .loggers import LogPriority as lp
+from .loggers import SUBSYSTEMS
+from .loggers import DEFAULT_LEVEL
+from .bandwidth import CLASSES
 from .libHelperFunctions import get_console_user
 from .libMacOSHelperFunctions import getResourcesDir
 
@@ -43,11 +46,15 @@ class ProgramOptions(object) :
     """
     Class for holding the command line options
     """
-    def __init__(self):
+    def __init__(self, parser=None, args=None):
         """
         Initialization routine for our program options
 
         Acquiring command line arguments with OptionParser
+
+        @param: parser - OptionParser already holding options of the calling
+                         program, the common options are added to it
+        @param: args - arguments to parse, default sys.argv[1:]
         """
         self.version = ""
         self.environ = Environment()
@@ -66,9 +73,10 @@ class ProgramOptions(object) :
         #####
         # Collect the passed in parameters, or define them as default.
 
-        parser = OptionParser(usage="  %prog [options]\n\n"  + \
-             "Only options are to change the logging level of the application.", \
-             version="%prog 0.7.0.25")
+        if parser is None:
+            parser = OptionParser(usage="  %prog [options]\n\n"  + \
+                 "Only options are to change the logging level of the application.", \
+                 version="%prog 0.7.0.25")
 
         #####
         # Logging level lp.VERBOSE
@@ -116,13 +124,107 @@ class ProgramOptions(object) :
         parser.add_option("--no-proxy", action="store", dest="noProxy", \
                           default="", help="Sets the no_proxy.")
 
+        #####
+        # Time each destination through the proxy and directly, using the
+        # faster
+        parser.add_option("--compare-proxies", action="store_true", dest="compareProxies", \
+                          default=False, help="Reach each host through the proxy or directly, whichever answers faster.")
+
+        #####
+        # Serve the packages builds install from a local cache
+        parser.add_option("--package-cache", action="store_true", dest="packageCache", \
+                          default=False, help="Fetch the packages builds install through a local caching proxy.")
+
+        parser.add_option("--package-cache-dir", action="store", dest="packageCacheDir", \
+                          default="", help="Directory to keep cached packages in, default ~/.cache/vmbuilder/packages.")
+
+        parser.add_option("--package-cache-size", action="store", dest="packageCacheSize", \
+                          type="int", default=10240, \
+                          help="Megabytes of cached packages to keep.")
+
+        parser.add_option("--package-cache-client", action="append", dest="packageCacheClients", \
+                          default=[], metavar="NETWORK", \
+                          help="IPv4 network, like 192.168.1.0/24, allowed to use the package cache besides the VM networks, for bridged VMs.  May be repeated.")
+
+        #####
+        # Share the uplink between concurrent downloads
+        parser.add_option("--bandwidth-limit", action="store", dest="bandwidthLimit", \
+                          type="int", default=0, \
+                          help="Kilobytes a second all throttled downloads share, 0 for no limit.")
+
+        parser.add_option("--bandwidth-cap", action="append", dest="bandwidthCaps", \
+                          default=[], metavar="CLASS=KBPS", \
+                          help="Kilobytes a second one traffic class may use, like packages=512.  Classes: " + \
+                          ", ".join(CLASSES) + ".  May be repeated.")
+
+        parser.add_option("--transfer-limit", action="append", dest="transferLimits", \
+                          default=[], metavar="CLASS=COUNT", \
+                          help="Transfers one traffic class may run at once, like git=2.  May be repeated.")
+
         #####
         # Where to put the logs.
         parser.add_option("--repo-root", action="store", dest="repoRoot", \
                           default="/opt/tools/src/boxcutter", help="Path to put the logs")
 
-        (self.options, self.args) = parser.parse_args()
+        #####
+        # Write logs on a background thread rather than the calling thread
+        parser.add_option("--queued-logs", action="store_true", dest="queuedLogs", \
+                          default=False, help="Write log output on a background thread, instead of the thread that logs it.")
+
+        #####
+        # Format of the log file
+        parser.add_option("--log-format", action="store", dest="logFormat", \
+                          default="text", choices=["text", "json"], \
+                          help="Log file format, text or json (one JSON object per line).")
+
+        #####
+        # Limit how fast one source may fill the logs
+        parser.add_option("--log-rate", action="store", dest="logRate", \
+                          type="float", default=0.0, \
+                          help="Lines per second one command may log before its output is sampled, 0 for no limit.")
 
+        #####
+        # Disk space rotated logs may use
+        parser.add_option("--log-budget", action="store", dest="logBudget", \
+                          type="int", default=0, \
+                          help="Compress rotated logs, keeping this many megabytes of them.  0 keeps them uncompressed.")
+
+        #####
+        # Level of one subsystem's logs
+        parser.add_option("--log-level", action="append", dest="logLevels", \
+                          default=[], metavar="SUBSYSTEM=LEVEL", \
+                          help="Log level of one subsystem, like packer=DEBUG.  Subsystems: " + \
+                          ", ".join(SUBSYSTEMS) + ".  May be repeated.")
+
+        #####
+        # Probe the host again rather than using the cached facts
+        parser.add_option("--refresh-facts", action="store_true", dest="refreshFacts", \
+                          default=False, help="Ignore the cached host facts, collecting them again.")
+
+        (self.options, self.args) = parser.parse_args(args)
+
+        if self.options.refreshFacts and self.environ.factsCache:
+            self.environ.factsCache.clear()
+
+        for logLevel in self.options.logLevels:
+            if not re.match(r"^(" + "|".join(SUBSYSTEMS) + r")=(\d+|[A-Za-z]+)$", logLevel) or \
+               self.parseLogLevel(logLevel) is None:
+                parser.error("Invalid --log-level: " + str(logLevel))
+
+        for option, values in [("--bandwidth-cap", self.options.bandwidthCaps),
+                               ("--transfer-limit", self.options.transferLimits)]:
+            for value in values:
+                if not re.match(r"^(" + "|".join(CLASSES) + r")=\d+$", value):
+                    parser.error("Invalid " + option + ": " + str(value))
+
+        for network in self.options.packageCacheClients:
+            from .package_cache_proxy import parseNetwork
+            try:
+                parseNetwork(network)
+            except ValueError:
+                parser.error("Invalid --package-cache-client: " + str(network))
+
+        self.parser = parser
         programVersion = parser.get_version()
         programVersion = programVersion.split(' ')
         self.version = programVersion[1]
@@ -132,10 +234,13 @@ class ProgramOptions(object) :
         elif self.getVerboseMode():
             loglevel = lp.VERBOSE
         else:
-            loglevel = lp.WARNING
+            loglevel = DEFAULT_LEVEL
 
-        # self.logger = CyLogger(level=loglevel)
-        self.logger = CyLogger(debug_mode=lp.DEBUG)
+        self.logger = CyLogger(level=loglevel)
+        #####
+        # CyLogger is a singleton, modules imported above may have created
+        # it already with the default level.
+        self.logger.setInitialLoggingLevel(loglevel)
 
         #####
         # Instanciate a configuration object and initialize its
@@ -144,8 +249,16 @@ class ProgramOptions(object) :
         # much like the Environment in Stonix.
         self.conf = Conf()
         #programLogDir = self.get_log_path()
-        self.logger.initializeLogs(logdir=self.options.logPath)
+        self.logger.initializeLogs(logdir=self.options.logPath,
+                                   queued=self.getQueuedLogging(),
+                                   logFormat=self.getLogFormat(),
+                                   rateLimit=self.getLogRate(),
+                                   compress=self.getLogBudget() > 0,
+                                   totalSize=self.getLogBudget() * 1024 * 1024)
+        for subsystem, level in self.getSubsystemLogLevels().iteritems():
+            self.logger.getChild(subsystem, level)
         self.conf.setLogger(self.logger)
+        self.conf.setBuildLogDir(os.path.join(self.options.logPath, "builds"))
 
         self.conf.setVersion(self.getVersion())
         self.conf.setEnviron(self.getEnviron())
@@ -155,6 +268,14 @@ class ProgramOptions(object) :
         self.conf.setFtpProxy(self.getFtpProxy())
         self.conf.setRsyncProxy(self.getRsyncProxy())
         self.conf.setNoProxy(self.getNoProxy())
+        self.conf.setCompareProxies(self.options.compareProxies)
+        self.conf.setPackageCache(self.options.packageCache)
+        self.conf.setPackageCacheDir(self.options.packageCacheDir)
+        self.conf.setPackageCacheSize(self.options.packageCacheSize)
+        self.conf.setPackageCacheClients(self.options.packageCacheClients)
+        self.conf.setBandwidthLimit(self.options.bandwidthLimit)
+        self.conf.setBandwidthCaps(self.parseClassValues(self.options.bandwidthCaps))
+        self.conf.setTransferLimits(self.parseClassValues(self.options.transferLimits))
 
         if self.options.proxy and isinstance(self.options.proxy, basestring):
             #####
@@ -178,6 +299,65 @@ class ProgramOptions(object) :
         """
         return self.options.verbose
 
+    def getQueuedLogging(self):
+        """
+        Return whether logs are written from a background thread
+        """
+        return self.options.queuedLogs
+
+    def getLogFormat(self):
+        """
+        Return the log file format, text or json
+        """
+        return self.options.logFormat
+
+    def getLogRate(self):
+        """
+        Return the lines per second one source may log, 0 for no limit
+        """
+        return self.options.logRate
+
+    def getLogBudget(self):
+        """
+        Return the megabytes of compressed, rotated logs to keep, 0 for
+        no compression
+        """
+        return self.options.logBudget
+
+    def getSubsystemLogLevels(self):
+        """
+        Return a dictionary of subsystem names and their log levels
+        """
+        levels = {}
+        for logLevel in self.options.logLevels:
+            subsystem, level = self.parseLogLevel(logLevel)
+            levels[subsystem] = level
+        return levels
+
+    def parseClassValues(self, values):
+        """
+        Dictionary of traffic class to number from CLASS=NUMBER options
+        """
+        parsed = {}
+        for value in values:
+            trafficClass, number = value.split("=", 1)
+            parsed[trafficClass] = int(number)
+        return parsed
+
+    def parseLogLevel(self, logLevel):
+        """
+        Split a SUBSYSTEM=LEVEL option into the subsystem and a numeric
+        level, None if the level isn't valid
+        """
+        subsystem, level = logLevel.split("=", 1)
+        if level.isdigit():
+            level = int(level)
+        else:
+            level = getattr(lp, level.upper(), None)
+        if level not in [lp.DEBUG, lp.INFO, lp.WARNING, lp.ERROR, lp.CRITICAL]:
+            return None
+        return subsystem, level
+
     def getEnviron(self):
         """
         Return the environment object
@@ -196,6 +376,18 @@ class ProgramOptions(object) :
         """
         return self.options.logPath
 
+    def getParser(self):
+        """
+        Return the OptionParser, for reporting errors in the options
+        """
+        return self.parser
+
+    def getOptions(self):
+        """
+        Return the parsed options, including those of the calling program
+        """
+        return self.options
+
     def returnConf(self):
         """
         Return a "Conf" class with valid configuration information..
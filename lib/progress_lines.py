@@ -0,0 +1,209 @@
+"""
+Split raw command output into lines the way a terminal would display them.
+
+Download progress from packer, git and curl is drawn by writing a carriage
+return and redrawing the same line, often thousands of times.  Read as plain
+text that is one enormous "line" holding every redraw.  ProgressLineSplitter
+keeps only the latest state of a line that is being redrawn, strips terminal
+control sequences, and reports each redraw that looks like progress as a
+ProgressEvent so a caller can drive a progress bar instead of logging it.
+
+    splitter = ProgressLineSplitter(onProgress=showProgress)
+    for chunk in chunks:
+        for line in splitter.feed(chunk):
+            handle(line)
+    for line in splitter.flush():
+        handle(line)
+
+"""
+from __future__ import absolute_import
+#--- Native python libraries
+import re
+
+#####
+# CSI escape sequences (colours, erase line, cursor movement) and lone
+# escapes that terminal-aware programs mix into their output.
+ANSI_ESCAPE = re.compile(r"\x1b\[[0-9;?]*[ -/]*[@-~]|\x1b[@-Z\\-_]")
+
+PERCENT = re.compile(r"(\d{1,3}(?:\.\d+)?)\s?%")
+
+SIZE = r"(\d+(?:\.\d+)?)\s?([kKMGT]i?B|B|bytes)"
+
+#####
+# "12.3 MiB / 600.0 MiB" - amount done and total
+BYTES_OF_TOTAL = re.compile(SIZE + r"\s*/\s*" + SIZE)
+
+#####
+# "600.00 KiB/s" - transfer rate
+RATE = re.compile(SIZE + r"\s?/s\b")
+
+#####
+# A size on its own, as in git's "Receiving objects: 45% (450/1000), 1.20 MiB"
+BYTES = re.compile(SIZE + r"(?!\s?/)")
+
+UNITS = {"b" : 1, "bytes" : 1,
+         "kb" : 1000, "mb" : 1000 ** 2, "gb" : 1000 ** 3, "tb" : 1000 ** 4,
+         "kib" : 1024, "mib" : 1024 ** 2, "gib" : 1024 ** 3, "tib" : 1024 ** 4}
+
+
+def toBytes(number, unit):
+    """
+    Convert a number and unit as printed by download tools to bytes.
+    """
+    return int(float(number) * UNITS.get(unit.lower(), 1))
+
+
+class ProgressEvent(object):
+    """
+    State of one progress redraw.  Fields that could not be found in the
+    line are None.
+
+    @param: percent - percent complete, as a float
+    @param: bytes - bytes transferred so far
+    @param: total - total bytes expected
+    @param: rate - transfer rate in bytes per second
+    @param: line - the text the event was parsed from
+    """
+    def __init__(self, percent=None, bytes=None, total=None, rate=None,
+                 line=""):
+        self.percent = percent
+        self.bytes = bytes
+        self.total = total
+        self.rate = rate
+        self.line = line
+
+    def __repr__(self):
+        return "ProgressEvent(percent=%r, bytes=%r, total=%r, rate=%r)" % \
+               (self.percent, self.bytes, self.total, self.rate)
+
+
+def parseProgress(line):
+    """
+    Find progress information in a line of output.
+
+    @returns: a ProgressEvent, or None if the line holds no progress.
+    """
+    percent = bytes = total = rate = None
+
+    match = PERCENT.search(line)
+    if match:
+        percent = float(match.group(1))
+
+    match = RATE.search(line)
+    if match:
+        rate = toBytes(match.group(1), match.group(2))
+        #####
+        # Keep the rate from being read as an amount below
+        line = line[:match.start()] + line[match.end():]
+
+    match = BYTES_OF_TOTAL.search(line)
+    if match:
+        bytes = toBytes(match.group(1), match.group(2))
+        total = toBytes(match.group(3), match.group(4))
+    else:
+        match = BYTES.search(line)
+        if match:
+            bytes = toBytes(match.group(1), match.group(2))
+
+    if percent is None and total and bytes is not None:
+        percent = round(100.0 * bytes / total, 2)
+
+    if percent is None and bytes is None:
+        return None
+    return ProgressEvent(percent, bytes, total, rate)
+
+
+class ProgressLineSplitter(object):
+    """
+    Incremental splitter that collapses carriage return redraws.
+    """
+    def __init__(self, onProgress=None):
+        """
+        @param: onProgress - optional callback(ProgressEvent), called for
+                             every redraw that contains progress information
+        """
+        self.onProgress = onProgress
+        self.buffer = ""
+        self.pending = ""
+        self.redraws = 0
+
+    def feed(self, data):
+        """
+        Add a chunk of raw output.
+
+        @returns: list of lines completed by this chunk, without line endings
+        """
+        lines = []
+        self.buffer += data
+        while True:
+            index = self._nextBreak()
+            if index < 0:
+                break
+            segment = self.buffer[:index]
+            ending = self.buffer[index]
+            if ending == "\r" and self.buffer[index + 1:index + 2] == "\n":
+                #####
+                # \r\n is an ordinary line ending
+                ending = "\n"
+                index += 1
+            elif ending == "\r" and index + 1 == len(self.buffer):
+                #####
+                # Can't tell yet whether this is \r\n split across chunks
+                break
+            self.buffer = self.buffer[index + 1:]
+            segment = self._clean(segment)
+            if ending == "\n":
+                if segment and self.pending:
+                    #####
+                    # Last redraw of a progress line
+                    self.redraw(segment)
+                elif segment:
+                    self.pending = segment
+                lines.append(self.pending)
+                self.pending = ""
+            else:
+                self.redraw(segment)
+        return lines
+
+    def flush(self):
+        """
+        Finish the stream, returning whatever line is left over.
+        """
+        lines = []
+        if self.buffer.endswith("\r"):
+            self.redraw(self._clean(self.buffer[:-1]))
+        elif self.buffer:
+            self.pending = self._clean(self.buffer)
+        self.buffer = ""
+        if self.pending:
+            lines.append(self.pending)
+        self.pending = ""
+        return lines
+
+    def redraw(self, segment):
+        """
+        Replace the line being drawn with segment.
+        """
+        if not segment:
+            return
+        self.pending = segment
+        self.redraws += 1
+        if self.onProgress is not None:
+            event = parseProgress(segment)
+            if event is not None:
+                event.line = segment
+                self.onProgress(event)
+
+    def _nextBreak(self):
+        newline = self.buffer.find("\n")
+        carriage = self.buffer.find("\r")
+        if newline < 0:
+            return carriage
+        if carriage < 0:
+            return newline
+        return min(newline, carriage)
+
+    def _clean(self, segment):
+        if "\x1b" in segment:
+            segment = ANSI_ESCAPE.sub("", segment)
+        return segment
@@ -0,0 +1,270 @@
+"""
+Choose, per destination, between the configured proxies and going direct.
+
+Conf holds a general proxy and per protocol ones, which used to be put in
+the environment of packer and git as they were.  With a dead proxy every
+download then stalled until packer's or git's own long timeouts.
+
+ProxyManager checks a proxy is up - a TCP connection within a few seconds -
+before handing it out, and fails over to the general proxy when a per
+protocol one is down, then to going direct.  Asked about a destination it
+can also time a HEAD request through the proxy and directly and use the
+faster.  Both the health of each proxy and the decision for each host are
+cached for a while, so only the first request pays for the checks.
+
+    manager = conf.getProxyManager()
+    shellEnviron = manager.buildEnviron(urls=["https://github.com/"])
+    proxy = manager.route(isoUrl)       # "" means go direct
+"""
+from __future__ import absolute_import
+#--- Native python libraries
+import os
+import ssl
+import time
+import socket
+import httplib
+import urlparse
+import threading
+
+#--- non-native python libraries in this source tree
+from .loggers import LogPriority as lp
+from .loggers import getSubsystemLogger
+from .url_probe import CachedHTTPConnection, CachedHTTPSConnection, \
+                       DEFAULT_PORTS, HEADERS, getDnsCache
+
+#####
+# Protocols there are proxy settings and environment variables for
+SCHEMES = ["http", "https", "ftp", "rsync"]
+
+#####
+# Port of a proxy given without a scheme or port, as curl assumes
+DEFAULT_PROXY_PORT = 1080
+
+
+def parseProxy(proxy):
+    """
+    (host, port) of a proxy setting like http://proxy.example.com:8080 or
+    proxy.example.com:8080.
+    """
+    if "://" not in proxy:
+        parts = urlparse.urlsplit("//" + proxy)
+        return parts.hostname, parts.port or DEFAULT_PROXY_PORT
+    parts = urlparse.urlsplit(proxy)
+    return parts.hostname, parts.port or DEFAULT_PORTS.get(parts.scheme, DEFAULT_PROXY_PORT)
+
+
+def isNoProxy(host, noProxy):
+    """
+    Whether no_proxy, a comma separated list of domains, says to reach host
+    directly.
+    """
+    for entry in (noProxy or "").split(","):
+        entry = entry.strip().lstrip(".")
+        if entry == "*":
+            return True
+        if entry and (host == entry or host.endswith("." + entry)):
+            return True
+    return False
+
+
+class ProxyManager(object):
+    """
+    Health checked proxies and per host routing decisions.
+    """
+    def __init__(self, conf, checkTimeout=3, healthTtl=30, routeTtl=300,
+                 compare=False, dnsCache=None, timer=time.time):
+        """
+        @param: conf - the Conf holding the proxy settings
+        @param: checkTimeout - seconds a proxy has to accept a connection,
+                               and each timed request has
+        @param: healthTtl - seconds a proxy's health is trusted
+        @param: routeTtl - seconds the decision for a host is kept
+        @param: compare - have route time the proxy against going direct,
+                          instead of always using a working proxy
+        @param: timer - clock the health and routes expire by
+        """
+        self.conf = conf
+        self.logger = getSubsystemLogger(conf.getLogger(), "net")
+        self.checkTimeout = checkTimeout
+        self.healthTtl = healthTtl
+        self.routeTtl = routeTtl
+        self.compare = compare
+        self.dnsCache = dnsCache or getDnsCache()
+        self.timer = timer
+        self.health = {}
+        self.routes = {}
+        self.lock = threading.Lock()
+
+    def getConfiguredProxies(self):
+        """
+        Dictionary of scheme to the proxy configured for it, the protocol's
+        own proxy or else the general one.
+        """
+        proxies = {}
+        for scheme in SCHEMES:
+            candidates = self.getCandidates(scheme)
+            if candidates:
+                proxies[scheme] = candidates[0]
+        return proxies
+
+    def getCandidates(self, scheme):
+        """
+        The proxies to try for a scheme, in order - its own, then the
+        general one.
+        """
+        getters = {"http" : self.conf.getHttpProxy,
+                   "https" : self.conf.getHttpsProxy,
+                   "ftp" : self.conf.getFtpProxy,
+                   "rsync" : self.conf.getRsyncProxy}
+        if scheme not in getters:
+            return []
+        candidates = []
+        for proxy in [getters[scheme](), self.conf.getProxy()]:
+            if proxy and isinstance(proxy, basestring) and proxy not in candidates:
+                candidates.append(proxy)
+        return candidates
+
+    def isProxyAlive(self, proxy, refresh=False):
+        """
+        Whether the proxy accepts a connection within checkTimeout seconds,
+        cached for healthTtl seconds.
+        """
+        now = self.timer()
+        with self.lock:
+            entry = self.health.get(proxy)
+        if entry is not None and entry[0] > now and not refresh:
+            return entry[1]
+        alive = False
+        try:
+            host, port = parseProxy(proxy)
+            if host:
+                sock = self.dnsCache.connect(host, port, self.checkTimeout)
+                sock.close()
+                alive = True
+        except (socket.error, ValueError), err:
+            self.logger.log(lp.WARNING, "Proxy " + str(proxy) + " is not responding: " + str(err))
+        with self.lock:
+            self.health[proxy] = (now + self.healthTtl, alive)
+        return alive
+
+    def markDead(self, proxy):
+        """
+        Stop handing out a proxy a caller found not working, until its
+        health is checked again.
+        """
+        with self.lock:
+            self.health[proxy] = (self.timer() + self.healthTtl, False)
+            for key, route in self.routes.items():
+                if route[1] == proxy:
+                    del self.routes[key]
+
+    def getProxy(self, scheme):
+        """
+        The first working proxy for a scheme, "" if none are configured or
+        none are up.
+        """
+        for proxy in self.getCandidates(scheme):
+            if self.isProxyAlive(proxy):
+                return proxy
+        return ""
+
+    def route(self, url):
+        """
+        The proxy to reach url through, "" to go direct.
+        """
+        parts = urlparse.urlsplit(url)
+        scheme, host = parts.scheme, parts.hostname
+        if scheme not in SCHEMES or not host:
+            return ""
+        key = (scheme, host)
+        now = self.timer()
+        with self.lock:
+            entry = self.routes.get(key)
+        if entry is not None and entry[0] > now:
+            return entry[1]
+
+        proxy = ""
+        if not isNoProxy(host, self.conf.getNoProxy()):
+            proxy = self.getProxy(scheme)
+        if proxy and self.compare and scheme in DEFAULT_PORTS:
+            proxied = self.timeRequest(url, proxy)
+            direct = self.timeRequest(url)
+            self.logger.log(lp.DEBUG, "%s through %s: %s, direct: %s",
+                            host, proxy, proxied, direct)
+            if direct is not None and (proxied is None or direct < proxied):
+                proxy = ""
+        self.logger.log(lp.DEBUG, "Route for %s: %s", host, proxy or "direct")
+        with self.lock:
+            self.routes[key] = (now + self.routeTtl, proxy)
+        return proxy
+
+    def timeRequest(self, url, proxy=""):
+        """
+        Seconds a HEAD of url takes, through proxy if given, or None if it
+        failed.
+        """
+        parts = urlparse.urlsplit(url)
+        port = parts.port or DEFAULT_PORTS[parts.scheme]
+        target = (parts.path or "/") + ("?" + parts.query if parts.query else "")
+        context = ssl._create_unverified_context()
+        if proxy:
+            proxyHost, proxyPort = parseProxy(proxy)
+            if parts.scheme == "https":
+                conn = CachedHTTPSConnection(proxyHost, proxyPort,
+                                             timeout=self.checkTimeout, context=context)
+                conn.set_tunnel(parts.hostname, port)
+            else:
+                conn = CachedHTTPConnection(proxyHost, proxyPort, timeout=self.checkTimeout)
+                target = url
+        elif parts.scheme == "https":
+            conn = CachedHTTPSConnection(parts.hostname, port,
+                                         timeout=self.checkTimeout, context=context)
+        else:
+            conn = CachedHTTPConnection(parts.hostname, port, timeout=self.checkTimeout)
+        conn.dnsCache = self.dnsCache
+        start = time.time()
+        try:
+            conn.request("HEAD", target, headers=HEADERS)
+            response = conn.getresponse()
+            response.read()
+            return time.time() - start
+        except (httplib.HTTPException, socket.error, ValueError):
+            return None
+        finally:
+            conn.close()
+
+    def buildEnviron(self, environ=None, urls=None):
+        """
+        Environment for a child process, with the working proxies set and
+        the configured but dead ones left out.
+
+        @param: environ - environment to start from, default ours
+        @param: urls - destinations the child will use, the hosts route
+                       sends direct are added to no_proxy
+        """
+        if environ is None:
+            environ = os.environ
+        shellEnviron = dict(environ)
+        noProxy = [entry for entry in (self.conf.getNoProxy() or "").split(",") if entry]
+
+        for scheme in SCHEMES:
+            candidates = self.getCandidates(scheme)
+            if not candidates:
+                continue
+            proxy = self.getProxy(scheme)
+            for name in [scheme + "_proxy", scheme.upper() + "_PROXY"]:
+                if proxy:
+                    shellEnviron[name] = proxy
+                elif shellEnviron.get(name) in candidates:
+                    del shellEnviron[name]
+
+        for url in urls or []:
+            parts = urlparse.urlsplit(url)
+            if parts.hostname and self.getCandidates(parts.scheme) and \
+               not self.route(url) and parts.hostname not in noProxy:
+                noProxy.append(parts.hostname)
+
+        if noProxy:
+            shellEnviron["no_proxy"] = ",".join(noProxy)
+            shellEnviron["NO_PROXY"] = shellEnviron["no_proxy"]
+        return shellEnviron
@@ -13,15 +13,20 @@ import sys
 import time
 import types
 import ctypes
+import functools
 import select
 import termios
 import threading
 import traceback
-from subprocess import Popen, PIPE
 
 from .loggers import CyLogger
 from .loggers import LogPriority as lp
 from .get_libc import getLibc
+from .output_watcher import OutputWatcher
+from .watchdog import getDeadlineWatchdog
+from .progress_lines import ProgressLineSplitter
+from .launcher import launch
+from .log_context import logContext, newCommandId
 
 def OSNotValidForRunWith(BaseException):
     """
@@ -37,6 +42,24 @@ def NotACyLoggerError(BaseException):
     def __init__(self, *args, **kwargs):
         Exception.__init__(self, *args, **kwargs)
 
+def inCommandContext(method):
+    """
+    Decorator for RunWith methods that run the current command, so every
+    line logged while it runs carries the command's id.  Once it is done,
+    lines of its output dropped by rate limiting are reported.
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        try:
+            with logContext(commandId=self.commandId):
+                return method(self, *args, **kwargs)
+        finally:
+            if self.commandId:
+                self.logger.closeLogSource(self.commandId)
+    return wrapper
+
+###############################################################################
+
 class RunWith(object):
     """
     Class that will run commands in various ways.
@@ -76,19 +99,26 @@ class RunWith(object):
         self.returncode = None
         self.printcmd = None
         self.myshell = None
+        self.cwd = None
+        self.commandId = None
+        self.buildLog = None
         #####
         # setting up to call ctypes to do a filesystem sync
         self.libc = getLibc()
 
-    def setCommand(self, command, env=None, myshell=False, close_fds=False):
+    def setCommand(self, command, env=None, myshell=False, close_fds=False,
+                   cwd=None):
         """
         initialize a command to run
 
+        @param: cwd - directory to run the command in, None for ours
+
         @author: Roy Nielsen
         """
         success = False
         if command:
             self.command = command
+            self.commandId = newCommandId()
         #####
         # Handle Popen's shell, or "myshell"...
         if isinstance(command, list):
@@ -109,6 +139,19 @@ class RunWith(object):
             self.cfds = close_fds
         else:
             self.cfds = False
+        if cwd and isinstance(cwd, basestring):
+            self.cwd = cwd
+        else:
+            self.cwd = None
+
+    ############################################################################
+
+    def setBuildLog(self, buildLog=None):
+        """
+        Copy the output of waitNpassThruStdout, byte for byte as read from
+        both pipes, to a lib.build_log.BuildLog, None to stop.
+        """
+        self.buildLog = buildLog
 
     ############################################################################
 
@@ -182,6 +225,7 @@ class RunWith(object):
 
     ############################################################################
 
+    @inCommandContext
     def communicate(self) :
         """
         Use the subprocess module to execute a command, returning
@@ -194,10 +238,8 @@ class RunWith(object):
         self.returncode = 999
         if self.command:
             try:
-                proc = Popen(self.command, stdout=PIPE, stderr=PIPE,
-                             shell=self.myshell, 
-                             env=self.environ,
-                             close_fds=self.cfds)
+                proc = launch(self.command, shell=self.myshell,
+                              env=self.environ, cwd=self.cwd, closeFds=self.cfds)
                 self.libc.sync()
                 self.output, self.error = proc.communicate()
                 self.libc.sync()
@@ -224,6 +266,7 @@ class RunWith(object):
 
     ############################################################################
 
+    @inCommandContext
     def wait(self) :
         """
         Use subprocess to call a command and wait until it is finished before
@@ -235,11 +278,8 @@ class RunWith(object):
         self.error = ''
         if self.command :
             try:
-                proc = Popen(self.command,
-                             stdout=PIPE, stderr=PIPE,
-                             shell=self.myshell,
-                             env=self.environ,
-                             close_fds=self.cfds)
+                proc = launch(self.command, shell=self.myshell,
+                              env=self.environ, cwd=self.cwd, closeFds=self.cfds)
                 proc.wait()
                 for line in proc.stdout.readline():
                     if line:
@@ -275,74 +315,105 @@ class RunWith(object):
 
     ############################################################################
 
-    def waitNpassThruStdout(self, chk_string=None, respawn=False):
+    @inCommandContext
+    def waitNpassThruStdout(self, chk_string=None, respawn=False, watcher=None,
+                            progress=None):
         """
         Use the subprocess module to execute a command, returning
         the output of the command
-        
+
+        @param: chk_string - regex string, or list of regex strings.  Reading
+                             output stops when one of them is found.
+        @param: respawn - don't log when chk_string is found
+        @param: watcher - OutputWatcher whose triggers are run against every
+                          line of stdout and stderr.
+        @param: progress - callback(ProgressEvent) for download progress
+                           redrawn with carriage returns.  Only the final
+                           state of such lines is captured and logged.
+
+        @note: When a chk_string or a stopping trigger matches, the command
+               is aborted: its process group is sent SIGTERM, then SIGKILL
+               after the watchdog's grace period.  Output written after the
+               match still goes to the build log, but is not captured or
+               logged, and the return code is that of the killed command.
+
         Author: Roy Nielsen
         """
         self.output = ''
         self.error = ''
         self.retcode = 999
         if self.command:
+            watcher = self.buildOutputWatcher(chk_string, respawn, watcher)
+            stopHandle = None
             try:
-                proc = Popen(self.command, stdout=PIPE, stderr=PIPE,
-                             shell=self.myshell, 
-                             env=self.environ,
-                             close_fds=self.cfds)
+                #####
+                # A command that may be stopped by its output leads its own
+                # process group, so stopping it takes down its helpers too.
+                proc = launch(self.command, shell=self.myshell,
+                              env=self.environ, cwd=self.cwd, closeFds=self.cfds,
+                              newProcessGroup=watcher is not None)
                 if proc:
-                    while True:
-                        myout = proc.stdout.readline()
-                        if myout == '' and proc.poll() != None: 
-                            break
-                        tmpline = myout.strip()
-                        self.output += tmpline + "\n"
-
-                        if tmpline:
-                            self.logger.log(lp.DEBUG, str(tmpline))
-                        
-                        if isinstance(chk_string, str) :
-                            if not chk_string:
-                                continue
+                    #####
+                    # Read both pipes as they fill, through splitters that
+                    # collapse carriage return redraws into the final state
+                    # of each line.
+                    streams = {proc.stdout.fileno() : ([], ProgressLineSplitter(progress)),
+                               proc.stderr.fileno() : ([], ProgressLineSplitter(progress))}
+                    reading = streams.keys()
+                    stop = False
+                    while reading and not stop:
+                        ready, _, _ = select.select(reading, [], [])
+                        for fd in ready:
+                            captured, splitter = streams[fd]
+                            data = os.read(fd, 4096)
+                            if self.buildLog is not None:
+                                #####
+                                # The bytes exactly as read, before any
+                                # collapsing or rate limiting in the logs
+                                self.buildLog.write(data)
+                            if data:
+                                lines = splitter.feed(data)
                             else:
-                                if re.search(chk_string, tmpline):
-                                    #proc.stdout.close()
-                                    if respawn:
-                                        pass
-                                    else:
-                                        self.logger.log(lp.INFO, "chk_string found... exiting process.")
+                                reading.remove(fd)
+                                lines = splitter.flush()
+                            for line in lines:
+                                tmpline = line.strip()
+                                captured.append(tmpline + "\n")
+
+                                if tmpline:
+                                    self.logger.log(lp.DEBUG, str(tmpline))
+
+                                if watcher is not None and watcher.scan(tmpline):
+                                    stop = True
                                     break
-                    while True:
-                        myerr = proc.stderr.readline()
-                        if myerr == '' and proc.poll() != None: 
-                            break
-                        tmpline = myerr.strip()
-                        self.error += tmpline + "\n"
-
-                        if tmpline:
-                            self.logger.log(lp.DEBUG, str(tmpline))
-                        
-                        if isinstance(chk_string, list) :
-                            if not chk_string:
-                                continue
-                            else:
-                                for mystring in chk_string :
-                                    if chk_string(chk_string, tmpline):
-                                        #proc.stdout.close()
-                                        if respawn:
-                                            pass
-                                        else:
-                                            self.logger.log(lp.INFO, "chk_string found... exiting process.")
-                                            break
-                            
-                    #self.error = "\n".join(proc.stderr.readlines())
+                            if stop:
+                                break
+
+                    #####
+                    # Once stopped, abort the command, and keep reading and
+                    # dropping what is left until it is gone, so a child
+                    # still writing doesn't block on a full pipe.
+                    if stop:
+                        stopHandle = getDeadlineWatchdog(self.logger).terminate(
+                                                     proc, label=self.printcmd)
+                    while reading:
+                        ready, _, _ = select.select(reading, [], [])
+                        for fd in ready:
+                            data = os.read(fd, 4096)
+                            if self.buildLog is not None:
+                                self.buildLog.write(data)
+                            if not data:
+                                reading.remove(fd)
+                    self.output = "".join(streams[proc.stdout.fileno()][0])
+                    self.error = "".join(streams[proc.stderr.fileno()][0])
+
                 proc.wait()
                 proc.stdout.close()
+                if stopHandle is not None:
+                    stopHandle.cancel()
 
             except Exception, err:
-                print "DANGER WILL ROBINSON!"
-                print str(err)
+                self.logger.log(lp.WARNING, "DANGER WILL ROBINSON! " + str(err))
 
                 self.libc.sync()
 
@@ -355,8 +426,8 @@ class RunWith(object):
                 raise
             else :
                 self.logger.log(lp.DEBUG, self.printcmd + " Returned with error/returncode: " + str(proc.returncode))
-                self.logger.log(lp.DEBUG, self.printcmd + " Returned with error/returncode: " + str(self.output))
-                self.logger.log(lp.DEBUG, self.printcmd + " Returned with error/returncode: " + str(self.error))
+                self.logger.log(lp.DEBUG, "%s Returned with error/returncode: %s", self.printcmd, self.output)
+                self.logger.log(lp.DEBUG, "%s Returned with error/returncode: %s", self.printcmd, self.error)
                 self.retcode = str(proc.returncode)
             finally:
                 self.logger.log(lp.DEBUG, "Done with command: " + self.printcmd)
@@ -370,6 +441,37 @@ class RunWith(object):
 
     ############################################################################
 
+    def buildOutputWatcher(self, chk_string=None, respawn=False, watcher=None):
+        """
+        Combine the legacy chk_string argument with an optional OutputWatcher,
+        so every line of output is checked with a single regex scan.
+
+        @returns: an OutputWatcher, or None if there is nothing to watch for.
+        """
+        if isinstance(chk_string, basestring):
+            chk_string = [chk_string]
+        if not isinstance(chk_string, list):
+            chk_string = []
+        chk_string = [pattern for pattern in chk_string if pattern]
+        if not chk_string:
+            return watcher
+
+        if watcher is None:
+            watcher = OutputWatcher()
+        else:
+            watcher = watcher.copy()
+
+        def chkStringFound(name, line, match):
+            if not respawn:
+                self.logger.log(lp.INFO, "chk_string found... exiting process.")
+            return True
+
+        for pattern in chk_string:
+            watcher.addTrigger(pattern, chkStringFound, name="chk_string")
+        return watcher
+
+    ############################################################################
+
     def killProc(self, proc, timeout) :
         """
         Support function for the "runWithTimeout" function below
@@ -381,6 +483,7 @@ class RunWith(object):
 
     ############################################################################
 
+    @inCommandContext
     def timeout(self, timout_sec) :
         """
         Run a command with a timeout - return:
@@ -392,17 +495,23 @@ class RunWith(object):
 
         @author: Roy Nielsen
         """
+        timeout = {"value" : False}
         if self.command:
             try:
-                proc = Popen(self.command,
-                             stdout=PIPE, stderr=PIPE, shell=self.myshell)
-
-                timeout = {"value" : False}
-                timer = threading.Timer(timout_sec, self.killProc,
-                                        [proc, timeout])
-                timer.start()
-                self.output, self.error = proc.communicate()
-                timer.cancel()
+                #####
+                # Start the command as the leader of its own process group
+                # so the watchdog can take down anything it spawned.
+                proc = launch(self.command, shell=self.myshell, cwd=self.cwd,
+                              closeFds=self.cfds, newProcessGroup=True)
+
+                handle = getDeadlineWatchdog(self.logger).watch(proc,
+                                                 timout_sec,
+                                                 label=self.printcmd)
+                try:
+                    self.output, self.error = proc.communicate()
+                finally:
+                    handle.cancel()
+                timeout["value"] = handle.fired
                 self.returncode = proc.returncode
             except Exception, err:
                 self.logger.log(lp.WARNING, "system_call_retval - Unexpected " + \
@@ -428,6 +537,7 @@ class RunWith(object):
 
     ############################################################################
 
+    @inCommandContext
     def runAs(self, user="", password="") :
         """
         Use pexpect to run "su" to run a command as another user...
@@ -465,9 +575,9 @@ class RunWith(object):
 
             (master, slave) = pty.openpty()
 
-            proc = Popen(internal_command,
-                         stdin=slave, stdout=slave, stderr=slave,
-                         close_fds=True)
+            proc = launch(internal_command,
+                          stdin=slave, stdout=slave, stderr=slave,
+                          closeFds=True)
 
             prompt = os.read(master, 10)
 
@@ -510,6 +620,7 @@ class RunWith(object):
 
     ############################################################################
 
+    @inCommandContext
     def liftDown(self, user="", target_dir="") :
         """
         Use the lift (elevator) to execute a command from privileged mode
@@ -617,6 +728,7 @@ class RunWith(object):
 
     ############################################################################
 
+    @inCommandContext
     def runAsWithSudo(self, user="", password="") :
         """
         Use pty method to run "su" to run a command as another user...
@@ -672,9 +784,9 @@ class RunWith(object):
                 raise err
             else:
                 try:
-                    proc = Popen(internal_command,
-                                 stdin=slave, stdout=slave, stderr=slave,
-                                 close_fds=True)
+                    proc = launch(internal_command,
+                                  stdin=slave, stdout=slave, stderr=slave,
+                                  closeFds=True)
                 except Exception, err:
                     self.logger.log(lp.WARNING, "Error opening process to pty: " + \
                                 str(err))
@@ -748,6 +860,7 @@ class RunWith(object):
 
     ############################################################################
 
+    @inCommandContext
     def runWithSudo(self, password="") :
         """
         Use pty method to run "sudo" to run a command with elevated privilege.
@@ -783,8 +896,8 @@ class RunWith(object):
                 raise err
             else:
                 try:
-                    proc = Popen(cmd, stdin=slave, stdout=slave, stderr=slave,
-                                 close_fds=True)
+                    proc = launch(cmd, stdin=slave, stdout=slave, stderr=slave,
+                                  closeFds=True)
                 except Exception, err:
                     self.logger.log(lp.WARNING, "Error opening process to pty: " + \
                                 str(err))
@@ -885,9 +998,7 @@ class RunThread(threading.Thread) :
     def run(self):
         if self.command :
             try :
-                p = Popen(self.command, stdout=PIPE,
-                                        stderr=PIPE,
-                                        shell=self.shell)
+                p = launch(self.command, shell=self.shell)
                 self.retout, self.reterr = p.communicate()
                 self.logger.log(lp.WARNING, "Finished \"run\" of: " + \
                             str(self.command))
@@ -0,0 +1,424 @@
+"""
+Check many URLs at once - which mirrors are up, and how fast they answer.
+
+Connectivity checks one URL at a time.  UrlProber sends a HEAD request to
+each URL on a WorkerPool, reusing keep-alive connections to the same host
+and resolving each host once through a shared DnsCache.  Every request
+has its own timeout, nothing changes the process wide socket timeout.
+
+    prober = UrlProber(logger, timeout=10)
+    results = prober.probeAll(findIsoUrls("/opt/tools/src/boxcutter").keys())
+    logger.log(lp.INFO, formatReport(results))
+    dead = [result.url for result in results if not result.ok()]
+
+Proxies are not used, as with Connectivity's default.
+"""
+from __future__ import absolute_import
+#--- Native python libraries
+import os
+import re
+import ssl
+import json
+import time
+import socket
+import httplib
+import urlparse
+import threading
+
+#--- non-native python libraries in this source tree
+from .loggers import LogPriority as lp
+from .loggers import getSubsystemLogger
+from .command_pool import WorkerPool
+
+DEFAULT_PORTS = {"http" : 80, "https" : 443}
+
+#####
+# A template value that is just a user variable, like {{user `iso_url`}}
+USER_VARIABLE = re.compile(r"^\{\{\s*user\s+`([^`]+)`\s*\}\}$")
+
+HEADERS = {"User-Agent" : "VmBuilder url probe",
+           "Connection" : "keep-alive"}
+
+
+class DnsCache(object):
+    """
+    Thread safe cache of getaddrinfo answers.  Failures are cached too, for
+    a shorter time, so a dead host isn't looked up for every URL on it.
+    """
+    def __init__(self, ttl=300, negativeTtl=30, timer=time.time):
+        self.ttl = ttl
+        self.negativeTtl = negativeTtl
+        self.timer = timer
+        self.entries = {}
+        self.lock = threading.Lock()
+
+    def resolve(self, host, port=80):
+        """
+        List of (family, sockaddr) for host and port.
+
+        @raises: socket.gaierror if the host can't be resolved
+        """
+        key = (host, port)
+        now = self.timer()
+        with self.lock:
+            entry = self.entries.get(key)
+        if entry is not None and entry[0] > now:
+            if isinstance(entry[1], Exception):
+                raise entry[1]
+            return entry[1]
+        try:
+            infos = socket.getaddrinfo(host, port, 0, socket.SOCK_STREAM)
+        except socket.gaierror, err:
+            with self.lock:
+                self.entries[key] = (now + self.negativeTtl, err)
+            raise
+        addresses = [(info[0], info[4]) for info in infos]
+        with self.lock:
+            self.entries[key] = (now + self.ttl, addresses)
+        return addresses
+
+    def connect(self, host, port, timeout=None):
+        """
+        Socket connected to the first address of host that answers.
+        """
+        error = socket.error("No addresses for " + str(host))
+        for family, sockaddr in self.resolve(host, port):
+            sock = socket.socket(family, socket.SOCK_STREAM)
+            sock.settimeout(timeout)
+            try:
+                sock.connect(sockaddr)
+            except socket.error, err:
+                sock.close()
+                error = err
+                continue
+            return sock
+        raise error
+
+    def clear(self):
+        with self.lock:
+            self.entries = {}
+
+dnsCache = DnsCache()
+
+
+def getDnsCache():
+    """
+    The DnsCache shared by the whole program.
+    """
+    return dnsCache
+
+###############################################################################
+
+class CachedHTTPConnection(httplib.HTTPConnection):
+    """
+    HTTPConnection resolving its host through a DnsCache.
+    """
+    dnsCache = dnsCache
+
+    def connect(self):
+        self.sock = self.dnsCache.connect(self.host, self.port, self.timeout)
+        if self._tunnel_host:
+            self._tunnel()
+
+
+class CachedHTTPSConnection(httplib.HTTPSConnection):
+    """
+    HTTPSConnection resolving its host through a DnsCache.
+    """
+    dnsCache = dnsCache
+
+    def connect(self):
+        sock = self.dnsCache.connect(self.host, self.port, self.timeout)
+        serverName = self.host
+        if self._tunnel_host:
+            self.sock = sock
+            self._tunnel()
+            serverName = self._tunnel_host
+        self.sock = self._context.wrap_socket(sock, server_hostname=serverName)
+
+
+class ConnectionPool(object):
+    """
+    Idle keep-alive connections per (scheme, host, port), and a limit on
+    how many connections are open to one host at a time.
+    """
+    def __init__(self, dnsCache=None, maxPerHost=2, verify=True):
+        """
+        @param: maxPerHost - most requests in flight to one host
+        @param: verify - check https certificates
+        """
+        self.dnsCache = dnsCache or getDnsCache()
+        self.maxPerHost = max(1, int(maxPerHost))
+        if verify:
+            self.context = ssl.create_default_context()
+        else:
+            self.context = ssl._create_unverified_context()
+        self.idle = {}
+        self.slots = {}
+        self.lock = threading.Lock()
+
+    def acquire(self, key, timeout):
+        """
+        A connection for key, blocking while the host has maxPerHost in
+        use.
+
+        @returns: (connection, True if it was used before)
+        """
+        with self.lock:
+            slot = self.slots.setdefault(key, threading.BoundedSemaphore(self.maxPerHost))
+        slot.acquire()
+        with self.lock:
+            idle = self.idle.get(key)
+            conn = idle.pop() if idle else None
+        if conn is not None:
+            conn.timeout = timeout
+            if conn.sock is not None:
+                conn.sock.settimeout(timeout)
+            return conn, True
+        scheme, host, port = key
+        if scheme == "https":
+            conn = CachedHTTPSConnection(host, port, timeout=timeout,
+                                         context=self.context)
+        else:
+            conn = CachedHTTPConnection(host, port, timeout=timeout)
+        conn.dnsCache = self.dnsCache
+        return conn, False
+
+    def release(self, key, conn, reusable):
+        """
+        Give back a connection from acquire, keeping it if reusable.
+        """
+        if reusable:
+            with self.lock:
+                self.idle.setdefault(key, []).append(conn)
+        else:
+            conn.close()
+        self.slots[key].release()
+
+    def close(self):
+        """
+        Close every idle connection.
+        """
+        with self.lock:
+            idle = self.idle
+            self.idle = {}
+        for connections in idle.values():
+            for conn in connections:
+                conn.close()
+
+###############################################################################
+
+class ProbeResult(object):
+    """
+    What probing one URL found.
+    """
+    def __init__(self, url):
+        self.url = url
+        self.status = None
+        self.reason = ""
+        self.location = None
+        self.latency = None
+        self.error = None
+
+    def ok(self):
+        """
+        True if the server answered with a success or a redirect.
+        """
+        return self.status is not None and 200 <= self.status < 400
+
+    def toDict(self):
+        """
+        The result as a dictionary of plain values, for JSON output.
+        """
+        latency = None
+        if self.latency is not None:
+            latency = round(self.latency, 3)
+        return {"url" : self.url,
+                "status" : self.status,
+                "reason" : self.reason,
+                "location" : self.location,
+                "latency" : latency,
+                "error" : self.error,
+                "ok" : self.ok()}
+
+
+class UrlProber(object):
+    """
+    Probes URLs concurrently over pooled connections.
+    """
+    def __init__(self, logger, workers=8, timeout=10, maxPerHost=2,
+                 verify=True, dnsCache=None, timer=time.time):
+        """
+        @param: workers - most URLs probed at once
+        @param: timeout - seconds each request may take to connect and to
+                          answer
+        @param: maxPerHost - most requests in flight to one host
+        @param: verify - check https certificates
+        """
+        self.logger = getSubsystemLogger(logger, "net")
+        self.workers = max(1, int(workers))
+        self.timeout = timeout
+        self.timer = timer
+        self.pool = ConnectionPool(dnsCache, maxPerHost, verify)
+
+    def probe(self, url):
+        """
+        HEAD one URL.
+
+        @returns: a ProbeResult
+        """
+        result = ProbeResult(url)
+        parts = urlparse.urlsplit(url)
+        if parts.scheme not in DEFAULT_PORTS or not parts.hostname:
+            result.error = "Not an http or https url"
+            return result
+        key = (parts.scheme, parts.hostname, parts.port or DEFAULT_PORTS[parts.scheme])
+        path = parts.path or "/"
+        if parts.query:
+            path += "?" + parts.query
+
+        start = self.timer()
+        for attempt in range(2):
+            conn, reused = self.pool.acquire(key, self.timeout)
+            reusable = False
+            try:
+                conn.request("HEAD", path, headers=HEADERS)
+                response = conn.getresponse()
+                response.read()
+                reusable = not response.will_close
+                result.status = response.status
+                result.reason = response.reason
+                result.location = response.getheader("location")
+                break
+            except (httplib.HTTPException, socket.error), err:
+                #####
+                # The server may have closed a kept-alive connection while
+                # it was idle, so try once more on a new one.
+                if reused and attempt == 0 and not isinstance(err, socket.timeout):
+                    continue
+                result.error = str(err) or err.__class__.__name__
+                break
+            finally:
+                self.pool.release(key, conn, reusable)
+        result.latency = self.timer() - start
+
+        self.logger.log(lp.DEBUG, "Probed %s: %s %s in %.3fs",
+                        url, result.status, result.error or result.reason,
+                        result.latency)
+        return result
+
+    def probeAll(self, urls):
+        """
+        Probe every URL concurrently, each one only once.
+
+        @returns: a ProbeResult per URL, in the order given
+        """
+        unique = []
+        for url in urls:
+            if url not in unique:
+                unique.append(url)
+        if not unique:
+            return []
+        pool = WorkerPool(self.logger, workers=min(self.workers, len(unique)))
+        try:
+            futures = [(url, pool.submit(self.probe, url, futureLabel=url))
+                       for url in unique]
+            results = dict([(url, future.getResult()) for url, future in futures])
+        finally:
+            pool.shutdown()
+        return [results[url] for url in urls]
+
+    def close(self):
+        """
+        Close the kept-alive connections.
+        """
+        self.pool.close()
+
+
+def formatReport(results):
+    """
+    The results as a table, failures first then slowest first.
+    """
+    def order(result):
+        return (result.ok(), -(result.latency or 0))
+
+    lines = ["%-6s %10s  %s" % ("status", "latency ms", "url")]
+    for result in sorted(results, key=order):
+        status = result.status if result.status is not None else "-"
+        latency = "%.1f" % (result.latency * 1000) if result.latency is not None else "-"
+        line = "%-6s %10s  %s" % (status, latency, result.url)
+        if result.error:
+            line += "  (" + result.error + ")"
+        elif result.location:
+            line += "  -> " + result.location
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def getIsoUrls(data, values=None):
+    """
+    The http and https ISO URLs one packer template downloads - its iso_url
+    variable and each builder's iso_url and iso_urls, with {{user `name`}}
+    values looked up in the variables.
+
+    @param: data - the template, or a varfile
+    @param: values - variables overriding the template's, like a varfile's
+
+    @returns: list of URLs, without duplicates
+    """
+    if not isinstance(data, dict):
+        return []
+    variables = data.get("variables", data)
+    variables = dict(variables) if isinstance(variables, dict) else {}
+    variables.update(values or {})
+
+    def resolve(value):
+        match = USER_VARIABLE.match(value) if isinstance(value, basestring) else None
+        if match:
+            value = variables.get(match.group(1))
+        return value
+
+    candidates = [variables.get("iso_url")]
+    for builder in data.get("builders") or []:
+        if isinstance(builder, dict):
+            candidates.append(builder.get("iso_url"))
+            isoUrls = builder.get("iso_urls")
+            if isinstance(isoUrls, list):
+                candidates.extend(isoUrls)
+    urls = []
+    for url in [resolve(value) for value in candidates]:
+        if isinstance(url, basestring) and url not in urls and \
+           urlparse.urlsplit(url).scheme in DEFAULT_PORTS:
+            urls.append(url)
+    return urls
+
+
+def findIsoUrls(root):
+    """
+    Every http and https iso_url in the json files under root - boxcutter
+    varfiles, and the variables of templates.
+
+    @returns: dictionary of url to the list of files it's in
+    """
+    urls = {}
+    for directory, dirs, files in os.walk(root):
+        dirs[:] = [name for name in dirs if not name.startswith(".")]
+        for name in sorted(files):
+            if not name.endswith(".json"):
+                continue
+            path = os.path.join(directory, name)
+            try:
+                with open(path) as jsonFile:
+                    data = json.load(jsonFile)
+            except (IOError, ValueError):
+                continue
+            if not isinstance(data, dict):
+                continue
+            variables = data.get("variables", data)
+            if not isinstance(variables, dict):
+                continue
+            url = variables.get("iso_url")
+            if isinstance(url, basestring) and \
+               urlparse.urlsplit(url).scheme in DEFAULT_PORTS:
+                urls.setdefault(url, []).append(path)
+    return urls
@@ -0,0 +1,245 @@
+"""
+One thread enforcing timeouts for any number of running processes.
+
+Rather than a threading.Timer per command, every deadline goes into a heap
+serviced by a single daemon thread.  When a deadline passes, the process
+group of the command is sent SIGTERM, and if the command hasn't been reaped
+after a grace period, SIGKILL.  Commands should be started as the
+leader of their own process group (preexec_fn=os.setsid) so helpers they
+spawn - packer plugins, VM tools, ssh - go down with them.
+
+    proc = Popen(cmd, stdout=PIPE, stderr=PIPE, preexec_fn=os.setsid)
+    handle = getDeadlineWatchdog(logger).watch(proc, 600, label="packer")
+    try:
+        output, error = proc.communicate()
+    finally:
+        handle.cancel()
+    if handle.fired:
+        ...
+
+"""
+from __future__ import absolute_import
+#--- Native python libraries
+import os
+import time
+import atexit
+import heapq
+import errno
+import signal
+import itertools
+import threading
+import traceback
+
+#--- non-native python libraries in this source tree
+from .loggers import CyLogger
+from .loggers import LogPriority as lp
+
+
+class WatchHandle(object):
+    """
+    A deadline registered with the DeadlineWatchdog.
+    """
+    def __init__(self, proc, seconds, label=""):
+        self.proc = proc
+        self.seconds = seconds
+        self.label = label
+        self.deadline = time.time() + seconds
+        self.cancelled = False
+        self.fired = False
+        self.firedAt = None
+        self.signals = []
+
+    def cancel(self):
+        """
+        Stop the deadline from firing.  Normally called once the process has
+        exited.  Escalation of a deadline that already fired is not stopped,
+        so helpers that ignored SIGTERM are still killed.
+        """
+        self.cancelled = True
+
+    def getSignals(self):
+        """
+        Signals sent so far, in order.
+        """
+        return list(self.signals)
+
+###############################################################################
+
+class DeadlineWatchdog(object):
+    """
+    Heap of process deadlines serviced by a single daemon thread.
+    """
+    def __init__(self, logger, grace=5.0):
+        """
+        @param: logger - CyLogger instance
+        @param: grace - seconds between SIGTERM and SIGKILL
+        """
+        if not isinstance(logger, CyLogger):
+            raise ValueError("Passed in value for logger is invalid, try again.")
+        self.logger = logger
+        self.grace = grace
+        self.heap = []
+        self.counter = itertools.count()
+        self.condition = threading.Condition()
+        self.thread = None
+        self.stopped = False
+
+    def watch(self, proc, seconds, label="", onExpire=None):
+        """
+        Register a deadline for a running process.
+
+        @param: proc - subprocess.Popen instance
+        @param: seconds - time the process is allowed to run
+        @param: label - name reported when the deadline fires
+        @param: onExpire - optional callback(handle), run when the deadline
+                           fires, before any signal is sent
+
+        @returns: WatchHandle
+        """
+        if not label:
+            label = "pid " + str(proc.pid)
+        handle = WatchHandle(proc, seconds, label)
+        handle.onExpire = onExpire
+        self._push(handle.deadline, handle, signal.SIGTERM)
+        return handle
+
+    def terminate(self, proc, label=""):
+        """
+        Send SIGTERM to a running process now, escalating to SIGKILL after
+        the grace period just as an expired deadline does.
+
+        @param: proc - subprocess.Popen instance
+        @param: label - name reported in the log
+
+        @returns: WatchHandle, already fired
+        """
+        if not label:
+            label = "pid " + str(proc.pid)
+        handle = WatchHandle(proc, 0, label)
+        handle.onExpire = None
+        handle.fired = True
+        handle.firedAt = time.time()
+        self.logger.log(lp.DEBUG, "Terminating: " + str(label))
+        if self._signal(handle, signal.SIGTERM):
+            self._push(time.time() + self.grace, handle, signal.SIGKILL)
+        return handle
+
+    def getPending(self):
+        """
+        Number of deadlines that are waiting to fire.
+        """
+        with self.condition:
+            return len([entry for entry in self.heap if not entry[2].cancelled])
+
+    def stop(self):
+        """
+        Stop the watchdog thread.  Pending deadlines no longer fire.
+        """
+        with self.condition:
+            self.stopped = True
+            thread = self.thread
+            self.condition.notify()
+        if thread is not None and thread is not threading.currentThread():
+            thread.join(1)
+
+    def _push(self, deadline, handle, sig):
+        with self.condition:
+            heapq.heappush(self.heap, (deadline, self.counter.next(), handle, sig))
+            if self.thread is None or not self.thread.isAlive():
+                self.thread = threading.Thread(target=self._run,
+                                               name="DeadlineWatchdog")
+                self.thread.daemon = True
+                self.thread.start()
+            self.condition.notify()
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while not self.stopped:
+                    #####
+                    # Cancelled deadlines are dropped lazily as they reach
+                    # the top of the heap.
+                    while self.heap and self.heap[0][3] == signal.SIGTERM and \
+                          self.heap[0][2].cancelled:
+                        heapq.heappop(self.heap)
+                    if not self.heap:
+                        self.condition.wait()
+                        continue
+                    wait = self.heap[0][0] - time.time()
+                    if wait <= 0:
+                        break
+                    self.condition.wait(wait)
+                if self.stopped:
+                    return
+                deadline, _, handle, sig = heapq.heappop(self.heap)
+            try:
+                self._expire(handle, sig)
+            except Exception:
+                self.logger.log(lp.WARNING, traceback.format_exc())
+
+    def _expire(self, handle, sig):
+        if sig == signal.SIGTERM:
+            handle.fired = True
+            handle.firedAt = time.time()
+            self.logger.log(lp.WARNING, "Deadline of " + str(handle.seconds) + \
+                                        " seconds fired for: " + \
+                                        str(handle.label))
+            if handle.onExpire is not None:
+                handle.onExpire(handle)
+        if self._signal(handle, sig) and sig == signal.SIGTERM:
+            self._push(time.time() + self.grace, handle, signal.SIGKILL)
+
+    def _signal(self, handle, sig):
+        """
+        Signal the process group the process leads, or just the process if
+        it was not started in its own group.
+
+        Nothing is sent once the owner of the process has reaped it: its pid,
+        and so the id of its group, may have been reused by then.  Until it
+        is reaped, even as a zombie, the pid can't be reused.  Only the
+        returncode is checked - polling here would reap the process under
+        its owner, which would then see the wrong exit status.
+
+        @returns: True if something received the signal
+        """
+        proc = handle.proc
+        if proc.returncode is not None:
+            return False
+        try:
+            if os.getpgid(proc.pid) == proc.pid:
+                os.killpg(proc.pid, sig)
+            else:
+                os.kill(proc.pid, sig)
+        except OSError, err:
+            if err.errno == errno.ESRCH:
+                #####
+                # Leader exited but isn't reaped yet - the ids are still
+                # its own, and its group may still have members.
+                try:
+                    os.killpg(proc.pid, sig)
+                except OSError:
+                    return False
+            else:
+                raise
+        handle.signals.append(sig)
+        self.logger.log(lp.DEBUG, "Sent signal " + str(sig) + " to " + \
+                                  str(handle.label))
+        return True
+
+###############################################################################
+
+watchdogLock = threading.Lock()
+sharedWatchdog = {}
+
+def getDeadlineWatchdog(logger, grace=5.0):
+    """
+    Return the process wide watchdog, creating it on first use.
+    """
+    with watchdogLock:
+        if "watchdog" not in sharedWatchdog:
+            sharedWatchdog["watchdog"] = DeadlineWatchdog(logger, grace)
+            #####
+            # Stop the thread before the interpreter starts tearing down
+            # modules underneath it.
+            atexit.register(sharedWatchdog["watchdog"].stop)
+        return sharedWatchdog["watchdog"]
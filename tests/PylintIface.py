@@ -9,10 +9,6 @@ import contextlib
 from StringIO import StringIO
 from optparse import OptionParser, SUPPRESS_HELP
 
-#####
-# 3rd party libraries
-from pylint.lint import Run
-from pylint.reporters.json import JSONReporter
 #####
 # cds libraries
 from lib.loggers import CyLogger
@@ -31,11 +27,25 @@ def _patch_streams(out):
         sys.stderr = old_stdout
         sys.stdout = old_stderr
 
-class AjsonReporter(JSONReporter):
-    """ Add a getter for messages..."""
-    def get_messages(self):
-        """ Getter for messages """
-        return self.messages
+#####
+# pylint is imported the first time a file is checked, not when the tests
+# are collected.
+_reporterClass = None
+
+def makeReporter(out):
+    """ A json reporter with a getter for messages, writing to out """
+    global _reporterClass
+    if _reporterClass is None:
+        from pylint.reporters.json import JSONReporter
+
+        class AjsonReporter(JSONReporter):
+            """ Add a getter for messages..."""
+            def get_messages(self):
+                """ Getter for messages """
+                return self.messages
+
+        _reporterClass = AjsonReporter
+    return _reporterClass(out)
 
 '''
 The variable below - compiledPackage:
@@ -51,8 +61,9 @@ def processFile(filename, compiledPackages="PyQt5,PyQt4"):
 
     #####
     # Set up reporting for pylint functionality
+    from pylint.lint import Run
     out = StringIO(None)
-    reporter = AjsonReporter(out)
+    reporter = makeReporter(out)
 
     with _patch_streams(out):
         Run([filename, "--extension-pkg-whitelist="+compiledPackages], reporter=reporter)
@@ -96,12 +107,6 @@ class PylintIface():
             sys.stderr = old_stdout
             sys.stdout = old_stderr
 
-    class AjsonReporter(JSONReporter):
-        """ Add a getter for messages..."""
-        def get_messages(self):
-            """ Getter for messages """
-            return self.messages
-
     def processFile(self, filename):
         '''
         Process a file and aquire data from the pylint parser
@@ -112,8 +117,9 @@ class PylintIface():
 
         #####
         # Set up reporting for pylint functionality
+        from pylint.lint import Run
         out = StringIO(None)
-        reporter = self.AjsonReporter(out)
+        reporter = makeReporter(out)
 
         with self._patch_streams(out):
             Run([filename]+self.args, reporter=reporter)
@@ -0,0 +1,69 @@
+#!/usr/bin/python -u
+"""
+Compare process spawn latency of the stock Popen and lib.launcher.
+
+Run from the top of the source tree:
+
+    python tests/benchmark_spawn.py [-n COUNT] [-f EXTRA_OPEN_FDS]
+
+Extra descriptors are opened first to mimic a long running UI holding many
+files and sockets, and the soft fd limit is raised as far as allowed, which
+is where closing every possible descriptor hurts.
+"""
+from __future__ import absolute_import
+#--- Native python libraries
+import os
+import sys
+import time
+import resource
+from optparse import OptionParser
+from subprocess import Popen, PIPE
+
+#--- non-native python libraries in this source tree
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from lib.launcher import launch, BACKEND
+
+COMMAND = ["/bin/true"]
+
+
+def timeSpawns(start, count):
+    """
+    Average seconds to start and reap one command.
+    """
+    begin = time.time()
+    for _ in range(count):
+        proc = start()
+        proc.communicate()
+    return (time.time() - begin) / count
+
+
+def main():
+    parser = OptionParser(usage="%prog [-n COUNT] [-f EXTRA_OPEN_FDS]")
+    parser.add_option("-n", "--count", type="int", default=200,
+                      help="spawns per case")
+    parser.add_option("-f", "--fds", type="int", default=100,
+                      help="extra descriptors to hold open")
+    options, _ = parser.parse_args()
+
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if hard != resource.RLIM_INFINITY and soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    held = [os.open(os.devnull, os.O_RDONLY) for _ in range(options.fds)]
+
+    cases = [("Popen", lambda: Popen(COMMAND, stdout=PIPE, stderr=PIPE)),
+             ("Popen close_fds", lambda: Popen(COMMAND, stdout=PIPE,
+                                                stderr=PIPE, close_fds=True)),
+             ("launch", lambda: launch(COMMAND)),
+             ("launch closeFds", lambda: launch(COMMAND, closeFds=True))]
+
+    print "backend: " + BACKEND + ", fd limit: " + \
+          str(resource.getrlimit(resource.RLIMIT_NOFILE)[0]) + \
+          ", open fds: " + str(len(held) + 3)
+    for name, start in cases:
+        print "%-16s %8.3f ms" % (name, timeSpawns(start, options.count) * 1000)
+
+    for fd in held:
+        os.close(fd)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+#!/usr/bin/python -u
+"""
+Measure how long the entry points take to start, failing past a threshold.
+
+Run from the top of the source tree:
+
+    python tests/benchmark_startup.py [-n COUNT] [-t THRESHOLD_MS] [-p]
+
+Each command is started COUNT times with --help, so only imports and option
+parsing are timed, and the median compared with the bare interpreter's.  The
+exit status is 1 if any entry point takes more than THRESHOLD_MS longer than
+the interpreter does, so it can guard against startup regressions in CI.
+With -p the slowest imports of each entry point are shown, from
+lib.import_profiler.
+"""
+from __future__ import absolute_import
+#--- Native python libraries
+import os
+import sys
+import time
+from optparse import OptionParser
+from subprocess import Popen, PIPE
+
+#--- non-native python libraries in this source tree
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from lib.import_profiler import ENV_VAR
+
+TOP = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+ENTRY_POINTS = [("ClockworkVMsCli", ["ClockworkVMsCli.py", "--help"]),
+                ("ClockworkVMs", ["ClockworkVMs.py", "--help"])]
+
+
+def timeStartup(args, count):
+    """
+    Median seconds to run python with args to completion.
+    """
+    times = []
+    for _ in range(count):
+        begin = time.time()
+        proc = Popen([sys.executable] + args, cwd=TOP, stdout=PIPE, stderr=PIPE)
+        proc.communicate()
+        times.append(time.time() - begin)
+    times.sort()
+    return times[len(times) // 2]
+
+
+def showProfile(args, limit):
+    environ = os.environ.copy()
+    environ[ENV_VAR] = "stderr"
+    proc = Popen([sys.executable] + args, cwd=TOP, env=environ,
+                 stdout=PIPE, stderr=PIPE)
+    _, report = proc.communicate()
+    lines = [line for line in report.splitlines() if line.strip()]
+    #####
+    # Header, the slowest modules and the total
+    for line in lines[:limit + 1] + lines[-1:]:
+        print "    " + line
+
+
+def main():
+    parser = OptionParser(usage="%prog [-n COUNT] [-t THRESHOLD_MS] [-p]")
+    parser.add_option("-n", "--count", type="int", default=10,
+                      help="starts per entry point")
+    parser.add_option("-t", "--threshold", type="float", default=300.0,
+                      help="most milliseconds an entry point may take over the bare interpreter")
+    parser.add_option("-p", "--profile", action="store_true", default=False,
+                      help="show the slowest imports of each entry point")
+    options, _ = parser.parse_args()
+
+    baseline = timeStartup(["-c", "pass"], options.count)
+    print "%-16s %8.1f ms" % ("python", baseline * 1000)
+
+    failed = False
+    for name, args in ENTRY_POINTS:
+        overhead = (timeStartup(args, options.count) - baseline) * 1000
+        status = "ok"
+        if overhead > options.threshold:
+            status = "SLOW, over %.0f ms" % options.threshold
+            failed = True
+        print "%-16s %+8.1f ms  %s" % (name, overhead, status)
+        if options.profile:
+            showProfile(args, 10)
+
+    if failed:
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
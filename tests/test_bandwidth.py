@@ -0,0 +1,186 @@
+#!/usr/bin/python -u
+"""
+Test of the bandwidth scheduler's rates, priorities and transfer slots.
+
+"""
+from __future__ import absolute_import
+#--- Native python libraries
+import sys
+import time
+import unittest
+import threading
+from datetime import datetime
+
+#--- non-native python libraries in this source tree
+sys.path.append("..")
+from lib.loggers import CyLogger
+from lib.loggers import LogPriority as lp
+from lib.command_pool import CommandPool
+from lib.bandwidth import BandwidthScheduler, TokenBucket, \
+                          BUILD, PACKAGES, GIT
+
+
+class test_bandwidth(unittest.TestCase):
+    """
+    """
+
+    @classmethod
+    def setUpClass(self):
+        """
+        Runs once before any tests start
+        """
+        self.test_start_time = datetime.now()
+        self.logger = CyLogger()
+        self.logger.initializeLogs(syslog=False, myconsole=False)
+
+    def runThreads(self, targets):
+        threads = [threading.Thread(target=target) for target in targets]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+        return threads
+
+###############################################################################
+##### Method Tests
+
+    def test_token_bucket(self):
+        """
+        """
+        now = [0.0]
+        bucket = TokenBucket(1000, timer=lambda: now[0])
+        self.assertEqual(bucket.delay(now[0]), 0)
+        bucket.take(2500)
+        self.assertAlmostEqual(bucket.delay(now[0]), 1.5)
+        now[0] = 1.0
+        self.assertAlmostEqual(bucket.delay(now[0]), 0.5)
+        now[0] = 10.0
+        self.assertEqual(bucket.delay(now[0]), 0)
+        self.assertEqual(bucket.tokens, 1000)
+
+    def test_unknown_class(self):
+        """
+        """
+        self.assertRaises(ValueError, BandwidthScheduler, caps={"video" : 10})
+        self.assertRaises(ValueError, BandwidthScheduler().throttle, "video", 10)
+
+    def test_unlimited_counts(self):
+        """
+        """
+        scheduler = BandwidthScheduler()
+        self.assertFalse(scheduler.isLimited())
+        start = time.time()
+        for _ in range(1000):
+            scheduler.throttle(GIT, 1024 * 1024)
+        self.assertTrue(time.time() - start < 1)
+        self.assertEqual(scheduler.getStats()[GIT]["bytes"], 1000 * 1024 * 1024)
+
+    def test_cap(self):
+        """
+        """
+        scheduler = BandwidthScheduler(caps={GIT : 100000})
+        start = time.time()
+        for _ in range(15):
+            scheduler.throttle(GIT, 10000)
+        elapsed = time.time() - start
+        self.assertTrue(0.3 < elapsed < 1.5, elapsed)
+
+        #####
+        # Other classes aren't held back by the cap
+        start = time.time()
+        scheduler.throttle(BUILD, 10 * 1024 * 1024)
+        self.assertTrue(time.time() - start < 0.1)
+
+###############################################################################
+##### Functional Tests
+
+    def test_urgent_class_first(self):
+        """
+        """
+        scheduler = BandwidthScheduler(totalRate=200000)
+        scheduler.throttle(GIT, 200000)
+        stop = time.time() + 1
+        sent = {BUILD : 0, GIT : 0}
+
+        def send(trafficClass):
+            while time.time() < stop:
+                scheduler.throttle(trafficClass, 10000)
+                sent[trafficClass] += 10000
+
+        threads = self.runThreads([lambda: send(BUILD), lambda: send(GIT)])
+        for thread in threads:
+            thread.join(5)
+        self.assertTrue(sent[BUILD] >= 150000, sent)
+        self.assertTrue(sent[GIT] <= sent[BUILD] / 3, sent)
+
+    def test_slot_limit(self):
+        """
+        """
+        scheduler = BandwidthScheduler(limits={GIT : 1})
+        order = []
+        first = scheduler.slot(GIT)
+        first.__enter__()
+
+        def sync():
+            with scheduler.slot(GIT):
+                order.append("second")
+
+        threads = self.runThreads([sync])
+        time.sleep(0.3)
+        self.assertEqual(order, [])
+        self.assertEqual(scheduler.getStats()[GIT]["active"], 1)
+        order.append("first")
+        first.__exit__(None, None, None)
+        threads[0].join(5)
+        self.assertEqual(order, ["first", "second"])
+        self.assertEqual(scheduler.getStats()[GIT]["active"], 0)
+
+    def test_slot_priority(self):
+        """
+        """
+        scheduler = BandwidthScheduler(maxTransfers=1)
+        order = []
+        holding = scheduler.slot(PACKAGES)
+        holding.__enter__()
+
+        def transfer(trafficClass):
+            with scheduler.slot(trafficClass):
+                order.append(trafficClass)
+                time.sleep(0.05)
+
+        threads = self.runThreads([lambda: transfer(GIT)])
+        time.sleep(0.2)
+        threads += self.runThreads([lambda: transfer(BUILD)])
+        time.sleep(0.2)
+        holding.__exit__(None, None, None)
+        for thread in threads:
+            thread.join(5)
+        self.assertEqual(order, [BUILD, GIT])
+
+    def test_command_pool_gate(self):
+        """
+        """
+        scheduler = BandwidthScheduler(limits={GIT : 1})
+        pool = CommandPool(self.logger, workers=3)
+        commands = [{"command" : ["/bin/sh", "-c", "sleep 0.2"],
+                     "gate" : scheduler.slot(GIT)} for _ in range(3)]
+        start = time.time()
+        batch = pool.runBatch(commands)
+        self.assertTrue(batch.allSucceeded(10))
+        pool.shutdown()
+        self.assertTrue(time.time() - start >= 0.6)
+
+###############################################################################
+##### unittest Tear down
+    @classmethod
+    def tearDownClass(self):
+        """
+        Final cleanup actions...
+        """
+        test_time = (datetime.now() - self.test_start_time)
+        self.logger.log(lp.INFO, self.__module__ + " took " + str(test_time) + " time to complete...")
+
+###############################################################################
+
+
+if __name__ == "__main__":
+    unittest.main()
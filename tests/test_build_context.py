@@ -0,0 +1,172 @@
+#!/usr/bin/python -u
+"""
+Test of BuildContext, and of PackerRunner running builds side by side from
+their contexts.
+
+"""
+from __future__ import absolute_import
+#--- Native python libraries
+import os
+import sys
+import json
+import shutil
+import tempfile
+import unittest
+import threading
+from datetime import datetime
+
+#--- non-native python libraries in this source tree
+sys.path.append("..")
+from lib.conf import Conf
+from lib.loggers import CyLogger
+from lib.loggers import LogPriority as lp
+from lib.packer_runner import PackerRunner
+from lib.port_leases import PortLeaseManager
+from lib.build_context import BuildContext, makeBuildId, OUTPUT_DIR
+
+
+class CopyingRunner(PackerRunner):
+    """
+    Runs a shell command in place of packer, copying the template the build
+    was given into the repo.
+    """
+    def buildCommand(self, context, lease=None):
+        return ["/bin/sh", "-c", "cat " + context.templateFile + " > seen-" + \
+                context.buildId + ".json"]
+
+
+class test_build_context(unittest.TestCase):
+    """
+    """
+
+    @classmethod
+    def setUpClass(self):
+        """
+        Runs once before any tests start
+        """
+        self.test_start_time = datetime.now()
+        self.logger = CyLogger()
+        self.logger.initializeLogs(syslog=False, myconsole=False)
+
+    def setUp(self):
+        """
+        This method runs before each test run.
+        """
+        self.tmpdir = tempfile.mkdtemp(prefix="build_context_test_")
+        self.conf = Conf()
+        self.conf.setLogger(self.logger)
+        self.conf.portLeaseManager = PortLeaseManager(self.logger,
+                                                      os.path.join(self.tmpdir, "port_leases.json"))
+        with open(os.path.join(self.tmpdir, "ubuntu.json"), "w") as jsonFile:
+            json.dump({"builders" : [{"type" : "vmware-iso"},
+                                     {"type" : "virtualbox-iso", "name" : "vbox"}]},
+                      jsonFile)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+###############################################################################
+##### Method Tests
+
+    def test_create(self):
+        """
+        """
+        context = BuildContext.create(self.conf, self.tmpdir, "ubuntu.json",
+                                      "ubuntu1604.json", "vmware-iso", buildId="build1")
+        outputDir = os.path.join(self.tmpdir, OUTPUT_DIR, "build1")
+        self.assertEqual(context.repo, self.tmpdir)
+        self.assertEqual(context.outputDir, outputDir)
+        self.assertEqual(context.getBuildTemplatePath(),
+                         os.path.join(self.tmpdir, ".build1-ubuntu.json"))
+        self.assertEqual(context.getTemplatePath(), os.path.join(self.tmpdir, "ubuntu.json"))
+        self.assertEqual(context.getVarFilePath(), os.path.join(self.tmpdir, "ubuntu1604.json"))
+        self.assertEqual(context.resolve("/abs/path.json"), "/abs/path.json")
+        self.assertEqual(context.getBuilderOutputDir("vbox"), os.path.join(outputDir, "vbox"))
+        self.assertEqual(context.buildLogDir, "")
+
+        self.assertTrue(makeBuildId("ubuntu.json", "ubuntu1604.json", "vmware-iso")
+                        .startswith("ubuntu1604-vmware-iso-"))
+        self.assertTrue(BuildContext.create(self.conf, self.tmpdir, "ubuntu.json")
+                        .buildId.startswith("ubuntu-"))
+
+    def test_immutable(self):
+        """
+        """
+        context = BuildContext.create(self.conf, self.tmpdir, "ubuntu.json", buildId="build1")
+        try:
+            context.templateFile = "other.json"
+            self.fail("Expected the context to be read only")
+        except AttributeError:
+            pass
+        changed = context.replace(templateFile="other.json")
+        self.assertEqual(changed.templateFile, "other.json")
+        self.assertEqual(context.templateFile, "ubuntu.json")
+        self.assertEqual(changed.outputDir, context.outputDir)
+
+    def test_prepare_template(self):
+        """
+        """
+        os.makedirs(os.path.join(self.tmpdir, "templates"))
+        os.rename(os.path.join(self.tmpdir, "ubuntu.json"),
+                  os.path.join(self.tmpdir, "templates", "ubuntu.json"))
+        context = BuildContext.create(self.conf, self.tmpdir, "templates/ubuntu.json",
+                                      buildId="build1")
+        buildContext = PackerRunner(self.conf).prepareTemplate(context)
+        self.assertEqual(buildContext.templateFile,
+                         os.path.join(self.tmpdir, "templates", ".build1-ubuntu.json"))
+        with open(buildContext.templateFile) as jsonFile:
+            builders = json.load(jsonFile)["builders"]
+        self.assertEqual([builder["output_directory"] for builder in builders],
+                         [context.getBuilderOutputDir("vmware-iso"),
+                          context.getBuilderOutputDir("vbox")])
+
+        missing = context.replace(templateFile="missing.json")
+        self.assertEqual(PackerRunner(self.conf).prepareTemplate(missing), missing)
+
+###############################################################################
+##### Functional Tests
+
+    def test_concurrent_builds(self):
+        """
+        """
+        cwd = os.getcwd()
+        runner = CopyingRunner(self.conf)
+        contexts = [BuildContext.create(self.conf, self.tmpdir, "ubuntu.json",
+                                        buildId="build" + str(index))
+                    for index in range(3)]
+        results = {}
+
+        def run(context):
+            results[context.buildId] = runner.runBuild(context)
+
+        threads = [threading.Thread(target=run, args=(context,)) for context in contexts]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(30)
+
+        self.assertEqual(os.getcwd(), cwd)
+        for context in contexts:
+            self.assertTrue(results[context.buildId].succeeded())
+            self.assertFalse(os.path.exists(context.getBuildTemplatePath()))
+            with open(os.path.join(self.tmpdir, "seen-" + context.buildId + ".json")) as jsonFile:
+                builder = json.load(jsonFile)["builders"][0]
+            self.assertEqual(builder["output_directory"],
+                             context.getBuilderOutputDir("vmware-iso"))
+        self.assertEqual(self.conf.getPortLeaseManager().getLeases(), {})
+
+###############################################################################
+##### unittest Tear down
+    @classmethod
+    def tearDownClass(self):
+        """
+        Final cleanup actions...
+        """
+        test_time = (datetime.now() - self.test_start_time)
+        self.logger.log(lp.INFO, self.__module__ + " took " + str(test_time) + " time to complete...")
+
+###############################################################################
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,142 @@
+#!/usr/bin/python -u
+"""
+BuildLog test.
+
+"""
+from __future__ import absolute_import
+#--- Native python libraries
+import os
+import sys
+import shutil
+import unittest
+import tempfile
+from datetime import datetime
+
+#--- non-native python libraries in this source tree
+sys.path.append("..")
+from lib.loggers import CyLogger
+from lib.loggers import LogPriority as lp
+from lib.run_commands import RunWith
+from lib.build_log import BuildLog, BuildLogReader
+
+
+class test_build_log(unittest.TestCase):
+    """
+    """
+
+    @classmethod
+    def setUpClass(self):
+        """
+        Runs once before any tests start
+        """
+        self.test_start_time = datetime.now()
+        self.logger = CyLogger()
+        self.logger.initializeLogs(syslog=False, myconsole=False)
+
+    def setUp(self):
+        """
+        This method runs before each test run.
+        """
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, "builds", "ubuntu-vmware-iso")
+        self.buildLog = BuildLog(self.path)
+        #####
+        # One line a second, starting at t=1000
+        for number in range(100):
+            self.buildLog.writeLine("line %02d%s" % (number,
+                                    " error" if number % 25 == 0 else ""),
+                                    stamp=1000 + number)
+        self.reader = BuildLogReader(self.path)
+
+    def tearDown(self):
+        self.buildLog.close()
+        shutil.rmtree(self.tmpdir)
+
+###############################################################################
+##### Method Tests
+
+    def test_index_matches_log(self):
+        """
+        """
+        self.assertEqual(self.reader.getLineCount(), 100)
+        self.assertEqual(os.path.getsize(self.path + ".idx"), 100 * 16)
+        self.assertEqual(self.reader.readLines(10, 12),
+                         [(10, 1010.0, "line 10"), (11, 1011.0, "line 11")])
+
+    def test_seek_time_range(self):
+        """
+        """
+        self.assertEqual(self.reader.seekTime(1042.5), 43)
+        self.assertEqual(self.reader.seekTime(0), 0)
+        self.assertEqual(self.reader.seekTime(5000), 100)
+        lines = self.reader.readTimeRange(1050, 1053)
+        self.assertEqual([line[2] for line in lines],
+                         ["line 50 error", "line 51", "line 52"])
+
+    def test_tail(self):
+        """
+        """
+        self.assertEqual([line[2] for line in self.reader.tail(2)],
+                         ["line 98", "line 99"])
+
+    def test_grep_in_time_range(self):
+        """
+        """
+        found = list(self.reader.grep("error", start=1010, end=1080))
+        self.assertEqual([line[0] for line in found], [25, 50, 75])
+
+    def test_follow(self):
+        """
+        """
+        follower = self.reader.follow(start=98, interval=0.01,
+                                      keepGoing=lambda: False)
+        self.assertEqual([line[2] for line in follower],
+                         ["line 98", "line 99"])
+
+###############################################################################
+##### Functional Tests
+
+    def test_runwith_writes_build_log(self):
+        """
+        """
+        path = os.path.join(self.tmpdir, "command")
+        buildLog = BuildLog(path)
+        rw = RunWith(self.logger)
+        rw.setBuildLog(buildLog)
+        rw.setCommand(["/usr/bin/printf", "a\\nb\\r\\nc"])
+        rw.waitNpassThruStdout()
+        buildLog.close()
+        self.assertEqual([line[2] for line in BuildLogReader(path).readLines()],
+                         ["a", "b", "c"])
+
+    def test_runwith_writes_raw_output(self):
+        """
+        """
+        path = os.path.join(self.tmpdir, "download")
+        buildLog = BuildLog(path)
+        rw = RunWith(self.logger)
+        rw.setBuildLog(buildLog)
+        rw.setCommand(["/usr/bin/printf", "start\\n10%%\\r50%%\\r100%%\\ndone"])
+        output, _, _ = rw.waitNpassThruStdout()
+        buildLog.close()
+        self.assertEqual(output, "start\n100%\ndone\n")
+        with open(buildLog.getPath(), "rb") as logFile:
+            self.assertEqual(logFile.read(), "start\n10%\r50%\r100%\ndone")
+        self.assertEqual([line[2] for line in BuildLogReader(path).readLines()],
+                         ["start", "10%\r50%\r100%", "done"])
+
+###############################################################################
+##### unittest Tear down
+    @classmethod
+    def tearDownClass(self):
+        """
+        Final cleanup actions...
+        """
+        test_time = (datetime.now() - self.test_start_time)
+        self.logger.log(lp.INFO, self.__module__ + " took " + str(test_time) + " time to complete...")
+
+###############################################################################
+
+
+if __name__ == "__main__":
+    unittest.main()
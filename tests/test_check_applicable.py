@@ -0,0 +1,123 @@
+#!/usr/bin/python -u
+"""
+Test of the applicability checks and their caches.
+
+"""
+from __future__ import absolute_import
+#--- Native python libraries
+import sys
+import unittest
+from datetime import datetime
+
+#--- non-native python libraries in this source tree
+sys.path.append("..")
+from lib.loggers import CyLogger
+from lib.loggers import LogPriority as lp
+from lib.environment import Environment
+from lib import CheckApplicable as checkApplicableModule
+from lib.CheckApplicable import CheckApplicable, compileRange, freeze
+
+
+class test_check_applicable(unittest.TestCase):
+    """
+    """
+
+    @classmethod
+    def setUpClass(self):
+        """
+        Runs once before any tests start
+        """
+        self.test_start_time = datetime.now()
+        self.logger = CyLogger()
+        self.logger.initializeLogs(syslog=False, myconsole=False)
+        self.environ = Environment(factsCache=False)
+
+    def setUp(self):
+        """
+        This method runs before each test run.
+        """
+        checkApplicableModule.applicableCache.clear()
+        self.chkApp = CheckApplicable(self.environ, self.logger)
+        self.chkApp.setOsFamily("darwin")
+        self.chkApp.setOsType("Mac OS X")
+        self.chkApp.setOsVer("10.12.6")
+
+###############################################################################
+##### Method Tests
+
+    def test_freeze(self):
+        """
+        """
+        self.assertEqual(freeze({"type" : "black", "os" : {"Mac OS X" : ["10.9", "+"]}}),
+                         freeze({"os" : {"Mac OS X" : ["10.9", "+"]}, "type" : "black"}))
+        self.assertNotEqual(freeze({"os" : {"Mac OS X" : ["10.9", "+"]}}),
+                            freeze({"os" : {"Mac OS X" : ["10.9", "-"]}}))
+        self.assertRaises(TypeError, freeze, {"family" : [set()]})
+
+    def test_in_range(self):
+        """
+        """
+        self.assertTrue(self.chkApp.isInRange(["10.9", "+"]))
+        self.assertFalse(self.chkApp.isInRange(["10.9", "-"]))
+        self.assertTrue(self.chkApp.isInRange(["-", "10.12.6"]))
+        self.assertTrue(self.chkApp.isInRange(["10.13", "r", "10.12"]))
+        self.assertFalse(self.chkApp.isInRange(["10.13", "r", "10.14"]))
+        self.assertTrue(self.chkApp.isInRange(["10.11", "10.12.6"]))
+        self.assertFalse(self.chkApp.isInRange(["10.12"]))
+        self.assertTrue(self.chkApp.isInRange(["10.9", "+"], "10.9.1"))
+        self.assertFalse(self.chkApp.isInRange(["10.9", "+"], "10.8"))
+        self.assertRaises(ValueError, self.chkApp.isInRange, ["10.9", "r", "10.9"])
+        self.assertRaises(AssertionError, self.chkApp.isInRange, ["10.9", "10.10", "+"])
+
+    def test_range_compiled_once(self):
+        """
+        """
+        rangeList = ["10.0.0", "r", "20.12.10"]
+        self.assertTrue(compileRange(rangeList) is compileRange(list(rangeList)))
+        self.assertTrue(self.chkApp.isInRange(rangeList))
+        self.assertTrue(self.chkApp.isInRange(rangeList))
+        self.assertEqual(rangeList, ["10.0.0", "r", "20.12.10"])
+
+    def test_is_applicable(self):
+        """
+        """
+        blackList = {"type" : "black", "os" : {"Mac OS X" : ["10.0.0", "r", "20.12.10"]}}
+        whiteList = {"type" : "white", "family" : ["linux"]}
+        self.assertFalse(self.chkApp.isApplicable(blackList))
+        self.assertFalse(self.chkApp.isApplicable(blackList))
+        self.assertFalse(self.chkApp.isApplicable(whiteList))
+        self.assertFalse(self.chkApp.isApplicable({"type" : "grey"}))
+        self.assertFalse(self.chkApp.isApplicable({"default" : "other"}))
+
+        self.chkApp.setOsFamily("linux")
+        self.chkApp.setOsType("Ubuntu")
+        self.chkApp.setOsVer("16.04")
+        self.assertTrue(self.chkApp.isApplicable(blackList))
+        self.assertTrue(self.chkApp.isApplicable(whiteList))
+
+    def test_is_applicable_cached(self):
+        """
+        """
+        applicable = {"type" : "white", "os" : {"Mac OS X" : ["10.9", "+"]}}
+        self.assertTrue(self.chkApp.isApplicable(applicable))
+        self.assertEqual(len(checkApplicableModule.applicableCache), 1)
+        calls = []
+        self.chkApp.checkApplicable = lambda applicable: calls.append(applicable)
+        self.assertTrue(self.chkApp.isApplicable(dict(applicable)))
+        self.assertEqual(calls, [])
+
+###############################################################################
+##### unittest Tear down
+    @classmethod
+    def tearDownClass(self):
+        """
+        Final cleanup actions...
+        """
+        test_time = (datetime.now() - self.test_start_time)
+        self.logger.log(lp.INFO, self.__module__ + " took " + str(test_time) + " time to complete...")
+
+###############################################################################
+
+
+if __name__ == "__main__":
+    unittest.main()
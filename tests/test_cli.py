@@ -0,0 +1,144 @@
+#!/usr/bin/python -u
+"""
+Test of the headless build entry point and the template merging it uses.
+
+"""
+from __future__ import absolute_import
+#--- Native python libraries
+import os
+import sys
+import json
+import shutil
+import tempfile
+import unittest
+import subprocess
+from datetime import datetime
+
+#--- non-native python libraries in this source tree
+sys.path.append("..")
+from lib.loggers import CyLogger
+from lib.loggers import LogPriority as lp
+from lib.packerJsonHandler import PackerJsonHandler
+
+TEMPLATE = {"_comment" : "test",
+            "variables" : {"cpus" : "1", "memory" : "512", "vm_name" : "ubuntu"},
+            "builders" : [{"type" : "vmware-iso"}, {"type" : "virtualbox-iso"},
+                          {"type" : "parallels-iso"}],
+            "provisioners" : [{"type" : "shell", "scripts" : ["script/update.sh"]}],
+            "post-processors" : [{"type" : "vagrant"}]}
+
+CLI = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                   "ClockworkVMsCli.py")
+
+
+class test_cli(unittest.TestCase):
+    """
+    """
+
+    @classmethod
+    def setUpClass(self):
+        """
+        Runs once before any tests start
+        """
+        self.test_start_time = datetime.now()
+        self.logger = CyLogger()
+        self.logger.initializeLogs(syslog=False, myconsole=False)
+
+    def setUp(self):
+        """
+        This method runs before each test run.
+        """
+        self.tmpdir = tempfile.mkdtemp(prefix="cli_test_")
+        os.mkdir(os.path.join(self.tmpdir, "ubuntu"))
+        os.mkdir(os.path.join(self.tmpdir, "logs"))
+        with open(os.path.join(self.tmpdir, "ubuntu", "ubuntu.json"), "w") as templateFile:
+            json.dump(TEMPLATE, templateFile)
+        with open(os.path.join(self.tmpdir, "ubuntu", "ubuntu1604.json"), "w") as varFile:
+            json.dump({"vm_name" : "ubuntu1604", "memory" : "1024"}, varFile)
+        self.pjh = PackerJsonHandler(self.logger)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def runCli(self, *args):
+        """
+        Run the cli, returning its exit code and parsed stdout.
+        """
+        cmd = [sys.executable, CLI, "--repo-root", self.tmpdir,
+               "-l", os.path.join(self.tmpdir, "logs")] + list(args)
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE,
+                                stderr=subprocess.PIPE)
+        output, _ = proc.communicate()
+        return proc.returncode, output
+
+###############################################################################
+##### Method Tests
+
+    def test_template_name_for_varfile(self):
+        """
+        """
+        self.assertEqual(self.pjh.getTemplateNameForVarFile("ubuntu1604-desktop.json"),
+                         "ubuntu.json")
+        self.assertEqual(self.pjh.getTemplateNameForVarFile("/repo/ol7.json"),
+                         "oraclelinux.json")
+        self.assertRaises(ValueError, self.pjh.getTemplateNameForVarFile, "README")
+
+    def test_merge_template(self):
+        """
+        """
+        merged = self.pjh.mergeTemplate(TEMPLATE, {"cpus" : "4"}, ["vmware-iso"])
+        self.assertEqual(merged["variables"]["cpus"], "4")
+        self.assertEqual(merged["variables"]["memory"], "512")
+        self.assertEqual([builder["type"] for builder in merged["builders"]],
+                         ["vmware-iso"])
+        self.assertTrue(merged["post-processors"][0]["keep_input_artifact"])
+        self.assertEqual(TEMPLATE["variables"]["cpus"], "1")
+        self.assertFalse("keep_input_artifact" in TEMPLATE["post-processors"][0])
+
+###############################################################################
+##### Functional Tests
+
+    def test_dry_run(self):
+        """
+        """
+        returncode, output = self.runCli("-f", "ubuntu", "--var-file", "ubuntu1604.json",
+                                         "--provider", "virtualbox-iso",
+                                         "--var", "cpus=2", "--dry-run")
+        self.assertEqual(returncode, 0)
+        results = json.loads(output)
+        self.assertTrue(results["succeeded"])
+        self.assertEqual(results["overrides"], {"cpus" : "2"})
+        build = results["builds"][0]
+        self.assertEqual(build["vmImage"], "virtualbox-iso")
+        self.assertTrue("-only=virtualbox-iso" in build["command"])
+        with open(results["mergedTemplate"]) as mergedFile:
+            merged = json.load(mergedFile)
+        os.unlink(results["mergedTemplate"])
+        self.assertEqual(merged["variables"]["cpus"], "2")
+        self.assertEqual(merged["variables"]["memory"], "1024")
+
+    def test_missing_varfile(self):
+        """
+        """
+        returncode, output = self.runCli("-f", "ubuntu", "--var-file", "ubuntu1404.json",
+                                         "--dry-run")
+        self.assertEqual(returncode, 1)
+        results = json.loads(output)
+        self.assertFalse(results["succeeded"])
+        self.assertTrue("ubuntu1404.json" in results["error"])
+
+###############################################################################
+##### unittest Tear down
+    @classmethod
+    def tearDownClass(self):
+        """
+        Final cleanup actions...
+        """
+        test_time = (datetime.now() - self.test_start_time)
+        self.logger.log(lp.INFO, self.__module__ + " took " + str(test_time) + " time to complete...")
+
+###############################################################################
+
+
+if __name__ == "__main__":
+    unittest.main()
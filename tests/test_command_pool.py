@@ -0,0 +1,131 @@
+#!/usr/bin/python -u
+"""
+CommandPool test.
+
+"""
+from __future__ import absolute_import
+#--- Native python libraries
+import os
+import sys
+import time
+import unittest
+import tempfile
+from datetime import datetime
+
+#--- non-native python libraries in this source tree
+sys.path.append("..")
+from lib.loggers import CyLogger
+from lib.loggers import LogPriority as lp
+from lib.command_pool import CommandPool, WorkerPool, FutureTimeoutError
+
+
+class test_command_pool(unittest.TestCase):
+    """
+    """
+
+    @classmethod
+    def setUpClass(self):
+        """
+        Runs once before any tests start
+        """
+        self.test_start_time = datetime.now()
+        self.logger = CyLogger()
+        self.logger.initializeLogs(syslog=False, myconsole=False)
+
+    def setUp(self):
+        """
+        This method runs before each test run.
+        """
+        self.pool = CommandPool(self.logger, workers=4)
+
+    def tearDown(self):
+        self.pool.shutdown()
+
+###############################################################################
+##### Method Tests
+
+    def test_submit_callable(self):
+        """
+        """
+        future = self.pool.submit(lambda x, y: x + y, 2, 3)
+        self.assertEqual(future.getResult(5), 5)
+        self.assertTrue(future.isDone())
+
+    def test_exception_is_reraised(self):
+        """
+        """
+        def boom():
+            raise ValueError("boom")
+        future = self.pool.submit(boom)
+        self.assertRaises(ValueError, future.getResult, 5)
+        self.assertTrue(isinstance(future.getException(), ValueError))
+
+    def test_result_timeout(self):
+        """
+        """
+        future = self.pool.submit(time.sleep, 0.5)
+        self.assertRaises(FutureTimeoutError, future.getResult, 0.01)
+        future.getResult(5)
+
+    def test_map_keeps_order(self):
+        """
+        """
+        pool = WorkerPool(self.logger, workers=3)
+        try:
+            self.assertEqual(pool.map(lambda x: x * x, range(10)),
+                             [x * x for x in range(10)])
+        finally:
+            pool.shutdown()
+
+###############################################################################
+##### Functional Tests
+
+    def test_batch_runs_concurrently(self):
+        """
+        """
+        start = time.time()
+        batch = self.pool.runBatch([["/bin/sleep", "0.5"]] * 4)
+        self.assertTrue(batch.allSucceeded(10))
+        self.assertTrue(time.time() - start < 1.5)
+
+    def test_batch_cwd_and_returncodes(self):
+        """
+        """
+        tmpdir = os.path.realpath(tempfile.mkdtemp())
+        batch = self.pool.runBatch([{"command" : ["/bin/pwd"],
+                                     "cwd" : tmpdir,
+                                     "label" : "pwd"},
+                                    ["/bin/sh", "-c", "exit 3"]])
+        pwd, failing = batch.getResults(10)
+        os.rmdir(tmpdir)
+        self.assertEqual(pwd.label, "pwd")
+        self.assertEqual(pwd.output.strip(), tmpdir)
+        self.assertEqual(failing.returncode, 3)
+        self.assertEqual(batch.getFailed(), [failing])
+
+    def test_per_task_timeout(self):
+        """
+        """
+        batch = self.pool.runBatch([["/bin/sleep", "10"], ["/bin/true"]],
+                                   timeout=0.5)
+        slow, fast = batch.getResults(10)
+        self.assertTrue(slow.timedOut)
+        self.assertFalse(slow.succeeded())
+        self.assertTrue(fast.succeeded())
+        self.assertEqual(batch.getTimedOut(), [slow])
+
+###############################################################################
+##### unittest Tear down
+    @classmethod
+    def tearDownClass(self):
+        """
+        Final cleanup actions...
+        """
+        test_time = (datetime.now() - self.test_start_time)
+        self.logger.log(lp.INFO, self.__module__ + " took " + str(test_time) + " time to complete...")
+
+###############################################################################
+
+
+if __name__ == "__main__":
+    unittest.main()
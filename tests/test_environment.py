@@ -0,0 +1,106 @@
+#!/usr/bin/python -u
+"""
+Environment test, for the lazily collected facts.
+
+"""
+from __future__ import absolute_import
+#--- Native python libraries
+import sys
+import threading
+import unittest
+from datetime import datetime
+
+#--- non-native python libraries in this source tree
+sys.path.append("..")
+from lib.loggers import CyLogger
+from lib.loggers import LogPriority as lp
+from lib.environment import Environment
+
+
+class test_environment(unittest.TestCase):
+    """
+    """
+
+    @classmethod
+    def setUpClass(self):
+        """
+        Runs once before any tests start
+        """
+        self.test_start_time = datetime.now()
+        self.logger = CyLogger()
+        self.logger.initializeLogs(syslog=False, myconsole=False)
+
+###############################################################################
+##### Method Tests
+
+    def test_no_probes_at_creation(self):
+        """
+        """
+        environ = Environment(factsCache=False)
+        self.assertEqual(environ.factsCollected, set())
+        self.assertEqual(environ.facts, {})
+
+    def test_only_the_group_read_is_collected(self):
+        """
+        """
+        environ = Environment(factsCache=False)
+        environ.discoveros = lambda: None
+        environ.setosfamily = lambda: setattr(environ, "osfamily", "testos")
+        self.assertEqual(environ.getosfamily(), "testos")
+        self.assertEqual(environ.factsCollected, set(["os"]))
+
+    def test_assigned_fact_is_kept(self):
+        """
+        """
+        environ = Environment(factsCache=False)
+        environ.collectfacts("network")
+        environ.hostname = "builder.example.com"
+        self.assertEqual(environ.gethostname(), "builder.example.com")
+
+###############################################################################
+##### Functional Tests
+
+    def test_collectinfo(self):
+        """
+        """
+        environ = Environment(factsCache=False)
+        environ.collectinfo()
+        self.assertEqual(environ.factsCollected, set(["os", "network", "hardware", "paths"]))
+        self.assertTrue(environ.gethostname())
+        self.assertTrue(environ.get_log_path())
+
+    def test_concurrent_readers_collect_once(self):
+        """
+        """
+        environ = Environment(factsCache=False)
+        calls = []
+        probe = environ.collectpaths
+        def countingProbe():
+            calls.append(1)
+            probe()
+        environ.collectpaths = countingProbe
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(environ.get_log_path())) \
+                   for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(len(set(results)), 1)
+
+###############################################################################
+##### unittest Tear down
+    @classmethod
+    def tearDownClass(self):
+        """
+        Final cleanup actions...
+        """
+        test_time = (datetime.now() - self.test_start_time)
+        self.logger.log(lp.INFO, self.__module__ + " took " + str(test_time) + " time to complete...")
+
+###############################################################################
+
+
+if __name__ == "__main__":
+    unittest.main()
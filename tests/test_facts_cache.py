@@ -0,0 +1,139 @@
+#!/usr/bin/python -u
+"""
+FactsCache test.
+
+"""
+from __future__ import absolute_import
+#--- Native python libraries
+import os
+import sys
+import json
+import time
+import shutil
+import tempfile
+import unittest
+from datetime import datetime
+
+#--- non-native python libraries in this source tree
+sys.path.append("..")
+from lib.loggers import CyLogger
+from lib.loggers import LogPriority as lp
+from lib.facts_cache import FactsCache
+from lib.environment import Environment
+
+
+class test_facts_cache(unittest.TestCase):
+    """
+    """
+
+    @classmethod
+    def setUpClass(self):
+        """
+        Runs once before any tests start
+        """
+        self.test_start_time = datetime.now()
+        self.logger = CyLogger()
+        self.logger.initializeLogs(syslog=False, myconsole=False)
+
+    def setUp(self):
+        """
+        This method runs before each test run.
+        """
+        self.tmpdir = tempfile.mkdtemp(prefix="facts_cache_test_")
+        self.path = os.path.join(self.tmpdir, "facts.json")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def rewrite(self, change):
+        """
+        Edit the cache file as another boot or host would have written it.
+        """
+        with open(self.path) as cacheFile:
+            data = json.load(cacheFile)
+        change(data)
+        with open(self.path, "w") as cacheFile:
+            json.dump(data, cacheFile)
+
+###############################################################################
+##### Method Tests
+
+    def test_put_and_get(self):
+        """
+        """
+        FactsCache(self.path).put("os", {"osfamily" : "linux"})
+        self.assertEqual(FactsCache(self.path).get("os"), {"osfamily" : "linux"})
+        self.assertEqual(FactsCache(self.path).get("network"), None)
+
+    def test_missing_or_corrupt_file(self):
+        """
+        """
+        self.assertEqual(FactsCache(self.path).get("os"), None)
+        with open(self.path, "w") as cacheFile:
+            cacheFile.write("{not json")
+        self.assertEqual(FactsCache(self.path).get("os"), None)
+
+    def test_new_boot_invalidates(self):
+        """
+        """
+        FactsCache(self.path).put("os", {"osfamily" : "linux"})
+        self.rewrite(lambda data: data.update(bootId="another-boot"))
+        self.assertEqual(FactsCache(self.path).get("os"), None)
+
+    def test_hostname_change_invalidates(self):
+        """
+        """
+        FactsCache(self.path).put("os", {"osfamily" : "linux"})
+        self.rewrite(lambda data: data.update(hostname="renamed.example.com"))
+        self.assertEqual(FactsCache(self.path).get("os"), None)
+
+    def test_ttl(self):
+        """
+        """
+        FactsCache(self.path).put("os", {"osfamily" : "linux"})
+        def age(data):
+            data["groups"]["os"]["written"] = time.time() - 120
+        self.rewrite(age)
+        self.assertEqual(FactsCache(self.path, ttl=60).get("os"), None)
+        self.assertEqual(FactsCache(self.path, ttl=600).get("os"),
+                         {"osfamily" : "linux"})
+
+    def test_clear(self):
+        """
+        """
+        cache = FactsCache(self.path)
+        cache.put("os", {"osfamily" : "linux"})
+        cache.clear()
+        self.assertFalse(os.path.exists(self.path))
+        self.assertEqual(cache.get("os"), None)
+
+###############################################################################
+##### Functional Tests
+
+    def test_environment_uses_cache(self):
+        """
+        """
+        first = Environment(FactsCache(self.path))
+        osType = first.getostype()
+        self.assertTrue(os.path.exists(self.path))
+
+        second = Environment(FactsCache(self.path))
+        second.discoveros = lambda: self.fail("probed despite a warm cache")
+        self.assertEqual(second.getostype(), osType)
+        self.assertEqual(second.getosfamily(), first.getosfamily())
+
+###############################################################################
+##### unittest Tear down
+    @classmethod
+    def tearDownClass(self):
+        """
+        Final cleanup actions...
+        """
+        test_time = (datetime.now() - self.test_start_time)
+        self.logger.log(lp.INFO, self.__module__ + " took " + str(test_time) + " time to complete...")
+
+###############################################################################
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,173 @@
+#!/usr/bin/python -u
+"""
+Test of the import profiler, and that the entry points don't load the
+heavy optional libraries until they're used.
+
+"""
+from __future__ import absolute_import
+#--- Native python libraries
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+import subprocess
+import __builtin__
+from StringIO import StringIO
+from datetime import datetime
+
+#--- non-native python libraries in this source tree
+sys.path.append("..")
+from lib.loggers import CyLogger
+from lib.loggers import LogPriority as lp
+from lib.import_profiler import ImportProfiler, installFromEnvironment, ENV_VAR
+
+TOP = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+#####
+# Only to be loaded when they're used
+DEFERRED = ["PyQt5", "OpenSSL", "urllib2", "httplib", "pylint"]
+
+
+class test_import_profiler(unittest.TestCase):
+    """
+    """
+
+    @classmethod
+    def setUpClass(self):
+        """
+        Runs once before any tests start
+        """
+        self.test_start_time = datetime.now()
+        self.logger = CyLogger()
+        self.logger.initializeLogs(syslog=False, myconsole=False)
+
+    def setUp(self):
+        """
+        This method runs before each test run.
+        """
+        self.tmpdir = tempfile.mkdtemp(prefix="import_profiler_test_")
+        sys.path.insert(0, self.tmpdir)
+        self.profiler = ImportProfiler()
+
+    def tearDown(self):
+        self.profiler.uninstall()
+        sys.path.remove(self.tmpdir)
+        for name in ["profiled_outer", "profiled_inner"]:
+            sys.modules.pop(name, None)
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def writeModule(self, name, source=""):
+        with open(os.path.join(self.tmpdir, name + ".py"), "w") as moduleFile:
+            moduleFile.write(source)
+
+    def profiledModules(self, *args):
+        """
+        Run python with the profiler on, returning the modules it loaded.
+        """
+        reportPath = os.path.join(self.tmpdir, "imports.txt")
+        environ = os.environ.copy()
+        environ[ENV_VAR] = reportPath
+        proc = subprocess.Popen([sys.executable] + list(args), cwd=TOP, env=environ,
+                                stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        proc.communicate()
+        self.assertEqual(proc.returncode, 0)
+        with open(reportPath) as reportFile:
+            lines = reportFile.readlines()[1:-1]
+        return [line.split()[-1] for line in lines]
+
+    def assertNotDeferred(self, modules):
+        for name in DEFERRED:
+            loaded = [module for module in modules
+                      if module == name or module.startswith(name + ".")]
+            self.assertEqual(loaded, [], name + " loaded at startup")
+
+###############################################################################
+##### Method Tests
+
+    def test_records_nested_imports(self):
+        """
+        """
+        self.writeModule("profiled_inner", "import time\ntime.sleep(0.05)\n")
+        self.writeModule("profiled_outer", "import profiled_inner\n")
+        self.profiler.install()
+        import profiled_outer
+        import profiled_outer
+        self.profiler.uninstall()
+
+        timings = dict([(name, (cumulative, own))
+                        for name, cumulative, own in self.profiler.getTimings()])
+        self.assertEqual(sorted(timings.keys()), ["profiled_inner", "profiled_outer"])
+        self.assertTrue(timings["profiled_inner"][0] >= 0.05)
+        self.assertTrue(timings["profiled_outer"][0] >= timings["profiled_inner"][0])
+        self.assertTrue(timings["profiled_outer"][1] < 0.05)
+        self.assertTrue(self.profiler.isLoaded("profiled_inner"))
+        self.assertFalse(self.profiler.isLoaded("profiled"))
+
+    def test_uninstall(self):
+        """
+        """
+        realImport = __builtin__.__import__
+        self.profiler.install()
+        self.assertTrue(self.profiler.isInstalled())
+        self.assertNotEqual(__builtin__.__import__, realImport)
+        self.profiler.uninstall()
+        self.assertEqual(__builtin__.__import__, realImport)
+        self.writeModule("profiled_inner")
+        import profiled_inner
+        self.assertEqual(self.profiler.getTimings(), [])
+
+    def test_report(self):
+        """
+        """
+        self.writeModule("profiled_inner")
+        self.profiler.install()
+        import profiled_inner
+        self.profiler.uninstall()
+        report = StringIO()
+        self.profiler.report(report)
+        lines = report.getvalue().splitlines()
+        self.assertEqual(len(lines), 3)
+        self.assertTrue(lines[1].endswith("profiled_inner"))
+        self.assertTrue(lines[2].endswith("total for 1 modules"))
+
+    def test_off_by_default(self):
+        """
+        """
+        self.assertEqual(installFromEnvironment({}), None)
+        self.assertEqual(installFromEnvironment({ENV_VAR : "0"}), None)
+
+###############################################################################
+##### Functional Tests
+
+    def test_cli_startup(self):
+        """
+        """
+        modules = self.profiledModules("ClockworkVMsCli.py", "--help")
+        self.assertTrue("lib.program_options" in modules)
+        self.assertNotDeferred(modules)
+
+    def test_library_imports(self):
+        """
+        """
+        modules = self.profiledModules("-c", "from lib.import_profiler import installFromEnvironment;" + \
+                                             "installFromEnvironment();" + \
+                                             "import lib.Connectivity, lib.create_self_signed_cert")
+        self.assertTrue("lib.Connectivity" in modules)
+        self.assertNotDeferred(modules)
+
+###############################################################################
+##### unittest Tear down
+    @classmethod
+    def tearDownClass(self):
+        """
+        Final cleanup actions...
+        """
+        test_time = (datetime.now() - self.test_start_time)
+        self.logger.log(lp.INFO, self.__module__ + " took " + str(test_time) + " time to complete...")
+
+###############################################################################
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,84 @@
+#!/usr/bin/python -u
+"""
+launcher test.
+
+"""
+from __future__ import absolute_import
+#--- Native python libraries
+import os
+import sys
+import unittest
+import tempfile
+from datetime import datetime
+
+#--- non-native python libraries in this source tree
+sys.path.append("..")
+from lib.loggers import CyLogger
+from lib.loggers import LogPriority as lp
+from lib.launcher import launch
+
+
+class test_launcher(unittest.TestCase):
+    """
+    """
+
+    @classmethod
+    def setUpClass(self):
+        """
+        Runs once before any tests start
+        """
+        self.test_start_time = datetime.now()
+        self.logger = CyLogger()
+        self.logger.initializeLogs(syslog=False, myconsole=False)
+
+###############################################################################
+##### Method Tests
+
+    def test_list_command_never_uses_shell(self):
+        """
+        """
+        proc = launch(["/bin/echo", "$HOME"], shell=True)
+        output, error = proc.communicate()
+        self.assertEqual(output.strip(), "$HOME")
+
+###############################################################################
+##### Functional Tests
+
+    def test_fds_not_inherited(self):
+        """
+        """
+        fd = os.open(os.devnull, os.O_RDONLY)
+        try:
+            check = ["/bin/sh", "-c", "test -e /dev/fd/" + str(fd)]
+            self.assertEqual(launch(check, closeFds=True).wait(), 1)
+            self.assertEqual(launch(check).wait(), 0)
+        finally:
+            os.close(fd)
+
+    def test_cwd_and_process_group(self):
+        """
+        """
+        tmpdir = os.path.realpath(tempfile.mkdtemp())
+        proc = launch(["/bin/sh", "-c", "pwd; ps -o pgid= -p $$"], cwd=tmpdir,
+                      newProcessGroup=True)
+        output, error = proc.communicate()
+        os.rmdir(tmpdir)
+        pwd, pgid = output.split()
+        self.assertEqual(pwd, tmpdir)
+        self.assertEqual(int(pgid), proc.pid)
+
+###############################################################################
+##### unittest Tear down
+    @classmethod
+    def tearDownClass(self):
+        """
+        Final cleanup actions...
+        """
+        test_time = (datetime.now() - self.test_start_time)
+        self.logger.log(lp.INFO, self.__module__ + " took " + str(test_time) + " time to complete...")
+
+###############################################################################
+
+
+if __name__ == "__main__":
+    unittest.main()
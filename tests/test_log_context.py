@@ -0,0 +1,128 @@
+#!/usr/bin/python -u
+"""
+Log context and JsonFormatter test.
+
+"""
+from __future__ import absolute_import
+#--- Native python libraries
+import sys
+import json
+import logging
+import unittest
+from datetime import datetime
+
+#--- non-native python libraries in this source tree
+sys.path.append("..")
+from lib.loggers import CyLogger
+from lib.loggers import LogPriority as lp
+from lib.run_commands import RunWith
+from lib.command_pool import WorkerPool
+from lib.log_context import JsonFormatter, logContext, getLogContext
+
+
+class JsonCollector(logging.Handler):
+    """
+    Handler keeping its records formatted as JSON.
+    """
+    def __init__(self):
+        logging.Handler.__init__(self)
+        self.setFormatter(JsonFormatter())
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(json.loads(self.format(record)))
+
+
+class test_log_context(unittest.TestCase):
+    """
+    """
+
+    @classmethod
+    def setUpClass(self):
+        """
+        Runs once before any tests start
+        """
+        self.test_start_time = datetime.now()
+        self.logger = CyLogger()
+        self.logger.initializeLogs(syslog=False, myconsole=False)
+
+    def setUp(self):
+        """
+        This method runs before each test run.
+        """
+        self.collector = JsonCollector()
+        self.logger.logr.addHandler(self.collector)
+        self.level = self.logger.logr.level
+        self.logger.logr.setLevel(lp.DEBUG)
+
+    def tearDown(self):
+        self.logger.logr.removeHandler(self.collector)
+        self.logger.logr.setLevel(self.level)
+
+###############################################################################
+##### Method Tests
+
+    def test_json_fields(self):
+        """
+        """
+        with logContext(buildId="b1", provider="vmware-iso"):
+            self.logger.log(lp.WARNING, "hello")
+        record = self.collector.records[0]
+        self.assertEqual(record["message"], "hello")
+        self.assertEqual(record["level"], "WARNING")
+        self.assertEqual(record["module"], "test_log_context")
+        self.assertEqual(record["function"], "test_json_fields")
+        self.assertEqual(record["buildId"], "b1")
+        self.assertEqual(record["provider"], "vmware-iso")
+        self.assertEqual(record["commandId"], None)
+
+    def test_context_nests_and_restores(self):
+        """
+        """
+        with logContext(buildId="outer"):
+            with logContext(commandId="cmd-x", buildId=None):
+                self.assertEqual(getLogContext(), {"commandId" : "cmd-x"})
+            self.assertEqual(getLogContext(), {"buildId" : "outer"})
+        self.assertEqual(getLogContext(), {})
+
+###############################################################################
+##### Functional Tests
+
+    def test_pool_carries_context(self):
+        """
+        """
+        pool = WorkerPool(self.logger, workers=2)
+        try:
+            with logContext(buildId="pooled"):
+                future = pool.submit(getLogContext)
+            self.assertEqual(future.getResult(5), {"buildId" : "pooled"})
+        finally:
+            pool.shutdown()
+
+    def test_runwith_command_id(self):
+        """
+        """
+        rw = RunWith(self.logger)
+        rw.setCommand(["/bin/echo", "one"])
+        with logContext(buildId="b2"):
+            rw.communicate()
+        ids = set(record["commandId"] for record in self.collector.records)
+        self.assertEqual(ids, set([rw.commandId]))
+        self.assertTrue(all(record["buildId"] == "b2" \
+                            for record in self.collector.records))
+
+###############################################################################
+##### unittest Tear down
+    @classmethod
+    def tearDownClass(self):
+        """
+        Final cleanup actions...
+        """
+        test_time = (datetime.now() - self.test_start_time)
+        self.logger.log(lp.INFO, self.__module__ + " took " + str(test_time) + " time to complete...")
+
+###############################################################################
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,152 @@
+#!/usr/bin/python -u
+"""
+RateLimitFilter test.
+
+"""
+from __future__ import absolute_import
+#--- Native python libraries
+import sys
+import logging
+import unittest
+from datetime import datetime
+
+#--- non-native python libraries in this source tree
+sys.path.append("..")
+from lib.loggers import CyLogger
+from lib.loggers import LogPriority as lp
+from lib.log_filters import RateLimitFilter, IDLE_SECONDS
+from lib.log_context import logContext
+
+
+class RecordCollector(logging.Handler):
+    """
+    Handler keeping the messages it was given.
+    """
+    def __init__(self):
+        logging.Handler.__init__(self)
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+
+class test_log_filters(unittest.TestCase):
+    """
+    """
+
+    @classmethod
+    def setUpClass(self):
+        """
+        Runs once before any tests start
+        """
+        self.test_start_time = datetime.now()
+        self.logger = CyLogger()
+        self.logger.initializeLogs(syslog=False, myconsole=False)
+
+    def setUp(self):
+        """
+        This method runs before each test run.
+        """
+        self.collector = RecordCollector()
+        self.logr = logging.getLogger("test_log_filters")
+        self.logr.propagate = False
+        self.logr.setLevel(logging.DEBUG)
+        self.logr.addHandler(self.collector)
+        self.filter = RateLimitFilter(rate=0.0001, burst=5, sampleEvery=10)
+        self.logr.addFilter(self.filter)
+
+    def tearDown(self):
+        self.logr.removeHandler(self.collector)
+        self.logr.removeFilter(self.filter)
+
+    def flood(self, count, level=logging.INFO):
+        for index in range(count):
+            self.logr.log(level, "line %d", index)
+
+###############################################################################
+##### Method Tests
+
+    def test_burst_then_sampled(self):
+        """
+        """
+        self.flood(30)
+        messages = self.collector.messages
+        self.assertEqual(messages[:5], ["line %d" % index for index in range(5)])
+        self.assertEqual(messages[5], "line 14 [9 lines suppressed]")
+        self.assertEqual(messages[6], "line 24 [9 lines suppressed]")
+        self.assertEqual(len(messages), 7)
+        self.assertEqual(self.filter.getTotalSuppressed(), 23)
+
+    def test_warnings_never_dropped(self):
+        """
+        """
+        self.flood(30, logging.WARNING)
+        self.assertEqual(len(self.collector.messages), 30)
+
+    def test_sources_limited_separately(self):
+        """
+        """
+        with logContext(commandId="cmd-a"):
+            self.flood(10)
+        with logContext(commandId="cmd-b"):
+            self.flood(10)
+        self.assertEqual(len(self.collector.messages), 10)
+
+    def test_summary_when_closed(self):
+        """
+        """
+        with logContext(commandId="cmd-a"):
+            self.flood(12)
+        self.assertEqual(len(self.collector.messages), 5)
+        self.filter.closeSource("cmd-a")
+        self.assertEqual(self.collector.messages[-1], "[7 lines suppressed]")
+        self.filter.closeSource("cmd-a")
+        self.assertEqual(len(self.collector.messages), 6)
+
+    def test_summary_when_swept(self):
+        """
+        """
+        with logContext(commandId="cmd-a"):
+            self.flood(12)
+        self.filter.buckets["cmd-a"].updated -= IDLE_SECONDS + 1
+        self.filter.lastSweep -= IDLE_SECONDS + 1
+        with logContext(commandId="cmd-b"):
+            self.flood(1)
+        self.assertEqual(self.collector.messages[-2:],
+                         ["[7 lines suppressed]", "line 0"])
+        self.assertFalse("cmd-a" in self.filter.buckets)
+
+    def test_cylogger_rate_limit(self):
+        """
+        """
+        self.logger.initializeLogs(syslog=False, myconsole=False,
+                                   rateLimit=0.0001, rateBurst=3,
+                                   sampleEvery=0)
+        collector = RecordCollector()
+        self.logger.logr.addHandler(collector)
+        level = self.logger.logr.level
+        self.logger.logr.setLevel(lp.DEBUG)
+        try:
+            for index in range(10):
+                self.logger.log(lp.DEBUG, "noisy %d", index)
+        finally:
+            self.logger.logr.removeHandler(collector)
+            self.logger.logr.removeFilter(self.logger.rateLimitFilter)
+            self.logger.logr.setLevel(level)
+        self.assertEqual(len(collector.messages), 3)
+
+###############################################################################
+##### unittest Tear down
+    @classmethod
+    def tearDownClass(self):
+        """
+        Final cleanup actions...
+        """
+        test_time = (datetime.now() - self.test_start_time)
+        self.logger.log(lp.INFO, self.__module__ + " took " + str(test_time) + " time to complete...")
+
+###############################################################################
+
+
+if __name__ == "__main__":
+    unittest.main()
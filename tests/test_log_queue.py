@@ -0,0 +1,130 @@
+#!/usr/bin/python -u
+"""
+Queue backed logging test.
+
+"""
+from __future__ import absolute_import
+#--- Native python libraries
+import sys
+import time
+import Queue
+import logging
+import unittest
+import threading
+from datetime import datetime
+from StringIO import StringIO
+
+#--- non-native python libraries in this source tree
+sys.path.append("..")
+from lib.loggers import CyLogger
+from lib.loggers import LogPriority as lp
+from lib.log_queue import QueueHandler, QueueListener
+
+
+class CountingStreamHandler(logging.StreamHandler):
+    """
+    StreamHandler counting how often it is flushed.
+    """
+    def __init__(self, stream):
+        logging.StreamHandler.__init__(self, stream)
+        self.flushes = 0
+
+    def flush(self):
+        self.flushes += 1
+        logging.StreamHandler.flush(self)
+
+
+class test_log_queue(unittest.TestCase):
+    """
+    """
+
+    @classmethod
+    def setUpClass(self):
+        """
+        Runs once before any tests start
+        """
+        self.test_start_time = datetime.now()
+        self.logger = CyLogger()
+        self.logger.initializeLogs(syslog=False, myconsole=False)
+
+    def setUp(self):
+        """
+        This method runs before each test run.
+        """
+        self.stream = StringIO()
+        self.handler = CountingStreamHandler(self.stream)
+        self.queue = Queue.Queue(maxsize=10)
+        self.listener = QueueListener(self.queue)
+        self.listener.addHandler(self.handler)
+        self.logr = logging.getLogger("test_log_queue")
+        self.logr.propagate = False
+        self.logr.setLevel(logging.DEBUG)
+        self.queueHandler = QueueHandler(self.queue)
+        self.logr.addHandler(self.queueHandler)
+
+    def tearDown(self):
+        self.logr.removeHandler(self.queueHandler)
+        self.listener.stop()
+
+###############################################################################
+##### Method Tests
+
+    def test_stop_flushes_everything(self):
+        """
+        """
+        self.listener.start()
+        for index in range(100):
+            self.logr.info("line %d", index)
+        self.listener.stop()
+        lines = self.stream.getvalue().splitlines()
+        self.assertEqual(lines, ["line %d" % index for index in range(100)])
+
+    def test_batches_flush_once(self):
+        """
+        """
+        for index in range(10):
+            self.logr.info("queued before start %d", index)
+        self.listener.start()
+        self.listener.stop()
+        self.assertEqual(len(self.stream.getvalue().splitlines()), 10)
+        self.assertEqual(self.handler.flushes, 1)
+
+    def test_full_queue_blocks_producer(self):
+        """
+        """
+        for index in range(10):
+            self.logr.info("filling %d", index)
+        producer = threading.Thread(target=self.logr.info, args=("blocked",))
+        producer.daemon = True
+        producer.start()
+        time.sleep(0.2)
+        self.assertTrue(producer.isAlive())
+        self.listener.start()
+        producer.join(5)
+        self.assertFalse(producer.isAlive())
+
+    def test_handler_level_respected(self):
+        """
+        """
+        self.handler.setLevel(logging.WARNING)
+        self.listener.start()
+        self.logr.info("dropped")
+        self.logr.warning("kept")
+        self.listener.stop()
+        self.assertEqual(self.stream.getvalue().splitlines(), ["kept"])
+
+###############################################################################
+##### unittest Tear down
+    @classmethod
+    def tearDownClass(self):
+        """
+        Final cleanup actions...
+        """
+        test_time = (datetime.now() - self.test_start_time)
+        self.logger.log(lp.INFO, self.__module__ + " took " + str(test_time) + " time to complete...")
+
+###############################################################################
+
+
+if __name__ == "__main__":
+    unittest.main()
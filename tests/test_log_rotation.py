@@ -0,0 +1,183 @@
+#!/usr/bin/python -u
+"""
+CompressingRotatingFileHandler test.
+
+"""
+from __future__ import absolute_import
+#--- Native python libraries
+import os
+import sys
+import gzip
+import shutil
+import logging
+import unittest
+import tempfile
+import StringIO
+import subprocess
+from datetime import datetime
+
+#--- non-native python libraries in this source tree
+sys.path.append("..")
+from lib.loggers import CyLogger
+from lib.loggers import LogPriority as lp
+from lib.log_rotation import CompressingRotatingFileHandler
+
+
+class test_log_rotation(unittest.TestCase):
+    """
+    """
+
+    @classmethod
+    def setUpClass(self):
+        """
+        Runs once before any tests start
+        """
+        self.test_start_time = datetime.now()
+        self.logger = CyLogger()
+        self.logger.initializeLogs(syslog=False, myconsole=False)
+
+    def setUp(self):
+        """
+        This method runs before each test run.
+        """
+        self.tmpdir = tempfile.mkdtemp()
+        self.logfile = os.path.join(self.tmpdir, "build.log")
+        self.logr = logging.getLogger("test_log_rotation")
+        self.logr.propagate = False
+        self.logr.setLevel(logging.DEBUG)
+
+    def tearDown(self):
+        for handler in self.logr.handlers[:]:
+            self.logr.removeHandler(handler)
+            handler.close()
+        shutil.rmtree(self.tmpdir)
+
+    def attach(self, **kwargs):
+        handler = CompressingRotatingFileHandler(self.logfile, **kwargs)
+        self.logr.addHandler(handler)
+        return handler
+
+###############################################################################
+##### Method Tests
+
+    def test_segments_are_compressed(self):
+        """
+        """
+        handler = self.attach(maxBytes=1000, totalBytes=0)
+        for index in range(200):
+            self.logr.info("line %04d of a fairly repetitive build log", index)
+        handler.close()
+        segments = handler.getSegments()
+        self.assertTrue(len(segments) > 3)
+        self.assertTrue(all(segment.endswith(".gz") for segment in segments))
+        lines = []
+        for segment in segments:
+            lines.extend(gzip.open(segment).read().splitlines())
+        lines.extend(open(self.logfile).read().splitlines())
+        self.assertEqual(len(lines), 200)
+        self.assertTrue(lines[0].startswith("line 0000"))
+        self.assertTrue(lines[-1].startswith("line 0199"))
+
+    def test_budget_drops_oldest(self):
+        """
+        """
+        handler = self.attach(maxBytes=500, totalBytes=1500, compressLevel=1)
+        for index in range(400):
+            self.logr.info("%04d %s", index, os.urandom(8).encode("hex"))
+        handler.close()
+        segments = handler.getSegments()
+        self.assertTrue(sum(os.path.getsize(segment) for segment in segments) <= 1500)
+        self.assertTrue(segments)
+        newest = gzip.open(segments[-1]).read()
+        self.assertTrue(newest)
+
+    def test_budget_leaves_plain_segments(self):
+        """
+        """
+        handler = self.attach(maxBytes=0, totalBytes=100)
+        plain = self.logfile + ".20000101-000000.1.1"
+        with open(plain, "w") as segment:
+            segment.write("x" * 1000)
+        with gzip.open(self.logfile + ".20000101-000000.1.2.gz", "wb") as segment:
+            segment.write(os.urandom(1000))
+        handler.enforceBudget()
+        self.assertEqual(handler.getSegments(), [plain])
+
+    def test_budget_counts_orphaned_plain_segments(self):
+        """
+        """
+        handler = self.attach(maxBytes=0, totalBytes=1500)
+        plain = self.logfile + ".20000101-000000." + str(os.getpid()) + ".1"
+        with open(plain, "w") as segment:
+            segment.write("x" * 1000)
+        compressed = self.logfile + ".20000101-000001.1.2.gz"
+        with gzip.open(compressed, "wb") as segment:
+            segment.write(os.urandom(1000))
+        handler.enforceBudget()
+        self.assertEqual(handler.getSegments(), [compressed])
+
+    def test_orphaned_segments_compressed_at_start(self):
+        """
+        """
+        exited = subprocess.Popen(["/bin/true"])
+        exited.wait()
+        names = [".20000101-000000." + str(exited.pid) + ".1", ".20000101-000000.2"]
+        for name in names:
+            with open(self.logfile + name, "w") as segment:
+                segment.write("left behind " + name + "\n")
+        handler = self.attach(maxBytes=0, totalBytes=0)
+        handler.close()
+        self.assertEqual(handler.getSegments(),
+                         [self.logfile + name + ".gz" for name in names])
+        self.assertEqual(gzip.open(self.logfile + names[1] + ".gz").read(),
+                         "left behind " + names[1] + "\n")
+
+    def test_segment_names_unique(self):
+        """
+        """
+        first = CompressingRotatingFileHandler(self.logfile, maxBytes=0, totalBytes=0)
+        second = CompressingRotatingFileHandler(self.logfile, maxBytes=0, totalBytes=0)
+        try:
+            for handler in [first, second, first, second]:
+                handler.stream.write("rolled over by " + str(id(handler)) + "\n")
+                handler.stream.flush()
+                handler.doRollover()
+        finally:
+            first.close()
+            second.close()
+        segments = first.getSegments()
+        self.assertEqual(len(segments), 4)
+        self.assertTrue(all(("." + str(os.getpid()) + ".") in segment for segment in segments))
+
+    def test_failure_reported_once(self):
+        """
+        """
+        handler = self.attach(maxBytes=0, totalBytes=0)
+        stderr = sys.stderr
+        sys.stderr = StringIO.StringIO()
+        try:
+            for name in ["gone.1", "gone.2"]:
+                handler.segments.put(self.logfile + "." + name)
+            handler.startCompressor()
+            handler.close()
+            reported = sys.stderr.getvalue()
+        finally:
+            sys.stderr = stderr
+        self.assertEqual(len(reported.splitlines()), 1)
+        self.assertTrue("gone.1" in reported)
+
+###############################################################################
+##### unittest Tear down
+    @classmethod
+    def tearDownClass(self):
+        """
+        Final cleanup actions...
+        """
+        test_time = (datetime.now() - self.test_start_time)
+        self.logger.log(lp.INFO, self.__module__ + " took " + str(test_time) + " time to complete...")
+
+###############################################################################
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,163 @@
+#!/usr/bin/python -u
+"""
+CyLogger test.
+
+"""
+from __future__ import absolute_import
+#--- Native python libraries
+import sys
+import logging
+import unittest
+from datetime import datetime
+
+#--- non-native python libraries in this source tree
+sys.path.append("..")
+from lib.loggers import CyLogger
+from lib.loggers import getSubsystemLogger
+from lib.loggers import DEFAULT_LEVEL
+from lib.loggers import LogPriority as lp
+
+
+class RecordCollector(logging.Handler):
+    """
+    Handler keeping the messages it was given.
+    """
+    def __init__(self):
+        logging.Handler.__init__(self)
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+
+class test_loggers(unittest.TestCase):
+    """
+    """
+
+    @classmethod
+    def setUpClass(self):
+        """
+        Runs once before any tests start
+        """
+        self.test_start_time = datetime.now()
+        self.logger = CyLogger()
+        self.logger.initializeLogs(syslog=False, myconsole=False)
+
+    def setUp(self):
+        """
+        This method runs before each test run.
+        """
+        self.collector = RecordCollector()
+        self.logger.logr.addHandler(self.collector)
+        self.level = self.logger.logr.level
+        self.logger.logr.setLevel(lp.DEBUG)
+
+    def tearDown(self):
+        self.logger.logr.removeHandler(self.collector)
+        self.logger.logr.setLevel(self.level)
+
+###############################################################################
+##### Method Tests
+
+    def test_deferred_formatting(self):
+        """
+        """
+        self.logger.log(lp.INFO, "%s of %d", "one", 2)
+        self.logger.log(lp.INFO, lambda: "from a callable")
+        self.assertTrue(self.collector.messages[0].endswith("one of 2"))
+        self.assertTrue(self.collector.messages[1].endswith("from a callable"))
+
+    def test_disabled_level_does_no_work(self):
+        """
+        """
+        calls = []
+        self.logger.logr.setLevel(lp.WARNING)
+        self.logger.log(lp.DEBUG, lambda: calls.append(1) or "expensive")
+        self.assertEqual(calls, [])
+        self.assertEqual(self.collector.messages, [])
+
+    def test_default_level_logs_everything(self):
+        """
+        """
+        level = self.logger.getLevel()
+        self.logger.setLevel(DEFAULT_LEVEL)
+        try:
+            self.logger.log(lp.DEBUG, "command output")
+        finally:
+            self.logger.setLevel(level)
+        self.assertEqual(self.collector.messages, ["command output"])
+
+    def test_caller_in_prefix(self):
+        """
+        """
+        level = self.logger.getLevel()
+        self.logger.setInitialLoggingLevel(lp.DEBUG)
+        try:
+            self.logger.log(lp.WARNING, "where")
+        finally:
+            self.logger.setInitialLoggingLevel(level)
+        self.assertTrue("test_caller_in_prefix" in self.collector.messages[0])
+        self.assertTrue("test_loggers.py" in self.collector.messages[0])
+
+    def test_string_priority(self):
+        """
+        """
+        self.logger.log("20", "as text")
+        self.assertEqual(len(self.collector.messages), 1)
+
+    def test_multiline_message(self):
+        """
+        """
+        self.logger.log(lp.INFO, "first\nsecond")
+        self.assertEqual(len(self.collector.messages), 2)
+
+    def test_reinitialize_adds_no_handlers(self):
+        """
+        """
+        handlers = list(self.logger.logr.handlers)
+        self.logger.initializeLogs(syslog=False, myconsole=False)
+        self.logger.logr.setLevel(lp.DEBUG)
+        self.assertEqual(self.logger.logr.handlers, handlers)
+        self.logger.log(lp.INFO, "once")
+        self.assertEqual(len(self.collector.messages), 1)
+
+    def test_child_levels_are_independent(self):
+        """
+        """
+        packer = self.logger.getChild("packer", lp.DEBUG)
+        git = self.logger.getChild("git", lp.WARNING)
+        self.logger.setLevel(lp.ERROR)
+        packer.log(lp.DEBUG, "packer debug")
+        git.log(lp.DEBUG, "git debug")
+        git.log(lp.WARNING, "git warning")
+        self.logger.log(lp.WARNING, "root warning")
+        self.assertEqual(len(self.collector.messages), 2)
+        self.assertTrue(self.collector.messages[0].endswith("packer debug"))
+        self.assertTrue(self.collector.messages[1].endswith("git warning"))
+        self.assertEqual(packer.getLevel(), lp.DEBUG)
+
+    def test_subsystem_logger(self):
+        """
+        """
+        packer = self.logger.getChild("packer")
+        self.assertTrue(self.logger.getChild("packer") is packer)
+        self.assertTrue(getSubsystemLogger(packer, "net") is \
+                        self.logger.getChild("net"))
+        self.assertTrue(isinstance(packer, CyLogger))
+        self.assertEqual(packer.logr.name, "vmbuilder.packer")
+
+###############################################################################
+##### unittest Tear down
+    @classmethod
+    def tearDownClass(self):
+        """
+        Final cleanup actions...
+        """
+        test_time = (datetime.now() - self.test_start_time)
+        self.logger.log(lp.INFO, self.__module__ + " took " + str(test_time) + " time to complete...")
+
+###############################################################################
+
+
+if __name__ == "__main__":
+    unittest.main()
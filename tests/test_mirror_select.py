@@ -0,0 +1,274 @@
+#!/usr/bin/python -u
+"""
+Test of the mirror selector, against local http servers of different speeds.
+
+"""
+from __future__ import absolute_import
+#--- Native python libraries
+import os
+import re
+import sys
+import json
+import time
+import shutil
+import tempfile
+import unittest
+import threading
+import SocketServer
+import BaseHTTPServer
+from datetime import datetime
+
+#--- non-native python libraries in this source tree
+sys.path.append("..")
+from lib.loggers import CyLogger
+from lib.loggers import LogPriority as lp
+from lib.packerJsonHandler import PackerJsonHandler
+from lib.mirror_select import MirrorSelector, MirrorCache, readMirrorsFile
+
+PROTO_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "proto")
+
+ISO_SIZE = 256 * 1024
+CHUNK = 16 * 1024
+
+
+class MirrorHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """
+    Serves an iso of ISO_SIZE zeros under any path ending .iso, waiting
+    server.delay seconds before each chunk.  Paths under /norange/ ignore
+    the Range header, /moved/ redirects to the same iso.
+    """
+    protocol_version = "HTTP/1.1"
+
+    def do_HEAD(self):
+        self.answer(False)
+
+    def do_GET(self):
+        self.answer(True)
+
+    def answer(self, body):
+        self.server.requests.append((self.command, self.path))
+        if self.path.startswith("/moved/"):
+            self.send_response(302)
+            self.send_header("Location", self.path[len("/moved"):])
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        if not self.path.endswith(".iso"):
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        size = ISO_SIZE
+        match = re.match("bytes=0-(\d+)$", self.headers.getheader("Range") or "")
+        if match and not self.path.startswith("/norange/"):
+            size = min(size, int(match.group(1)) + 1)
+            self.send_response(206)
+            self.send_header("Content-Range", "bytes 0-%d/%d" % (size - 1, ISO_SIZE))
+        else:
+            self.send_response(200)
+        self.send_header("Content-Length", str(size))
+        self.end_headers()
+        if not body:
+            return
+        try:
+            for _ in range(0, size, CHUNK):
+                time.sleep(self.server.delay)
+                self.wfile.write("\0" * CHUNK)
+        except Exception:
+            pass
+
+    def log_message(self, *args):
+        pass
+
+
+class MirrorServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+    def __init__(self, delay):
+        BaseHTTPServer.HTTPServer.__init__(self, ("127.0.0.1", 0), MirrorHandler)
+        self.delay = delay
+        self.requests = []
+        self.base = "http://127.0.0.1:" + str(self.server_address[1]) + "/"
+        thread = threading.Thread(target=self.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+    def handle_error(self, request, client_address):
+        """
+        Clients hang up mid download on purpose, don't print it.
+        """
+        pass
+
+
+class test_mirror_select(unittest.TestCase):
+    """
+    """
+
+    @classmethod
+    def setUpClass(self):
+        """
+        Runs once before any tests start
+        """
+        self.test_start_time = datetime.now()
+        self.logger = CyLogger()
+        self.logger.initializeLogs(syslog=False, myconsole=False)
+        self.slow = MirrorServer(0.02)
+        self.fast = MirrorServer(0)
+
+    def setUp(self):
+        """
+        This method runs before each test run.
+        """
+        self.tmpdir = tempfile.mkdtemp(prefix="mirror_select_test_")
+        self.slow.requests = []
+        self.fast.requests = []
+        self.cache = MirrorCache(os.path.join(self.tmpdir, "mirrors.json"))
+        self.selector = MirrorSelector(self.logger, cache=self.cache, timeout=5,
+                                       sampleSize=64 * 1024,
+                                       mirrors={"testos" : [self.slow.base, self.fast.base]})
+
+    def tearDown(self):
+        self.selector.close()
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+###############################################################################
+##### Method Tests
+
+    def test_candidates(self):
+        """
+        """
+        isoUrl = self.slow.base + "16.04/testos.iso"
+        self.assertEqual(self.selector.getCandidates(isoUrl),
+                         [isoUrl, self.fast.base + "16.04/testos.iso"])
+        self.assertEqual(self.selector.getCandidates("http://elsewhere/testos.iso"),
+                         ["http://elsewhere/testos.iso"])
+        self.assertEqual(self.selector.getCandidates("http://releases.ubuntu.com/16.04/x.iso")[1],
+                         "http://mirrors.kernel.org/ubuntu-releases/16.04/x.iso")
+
+    def test_candidates_of_proto_varfiles(self):
+        """
+        """
+        isoUrls = []
+        for name in sorted(os.listdir(PROTO_DIR)):
+            if not name.endswith(".json"):
+                continue
+            with open(os.path.join(PROTO_DIR, name)) as varFile:
+                data = json.load(varFile)
+            isoUrl = data.get("variables", data).get("iso_url", "")
+            if isoUrl.startswith("http"):
+                isoUrls.append(isoUrl)
+        self.assertTrue(isoUrls)
+        for isoUrl in isoUrls:
+            self.assertTrue(len(self.selector.getCandidates(isoUrl)) > 1, isoUrl)
+
+    def test_measure_ranged(self):
+        """
+        """
+        measurement = self.selector.measure(self.fast.base + "testos.iso")
+        self.assertTrue(measurement.ok())
+        self.assertEqual(measurement.status, 206)
+        self.assertEqual(measurement.bytes, 64 * 1024)
+        self.assertTrue(measurement.throughput > 0)
+        self.assertEqual(self.fast.requests, [("GET", "/testos.iso")])
+
+    def test_measure_without_range(self):
+        """
+        """
+        measurement = self.selector.measure(self.fast.base + "norange/testos.iso")
+        self.assertEqual(measurement.status, 200)
+        self.assertEqual(measurement.bytes, 64 * 1024)
+
+    def test_measure_redirect(self):
+        """
+        """
+        measurement = self.selector.measure(self.fast.base + "moved/testos.iso")
+        self.assertTrue(measurement.ok())
+        self.assertEqual(measurement.location, self.fast.base + "testos.iso")
+
+    def test_mirrors_file(self):
+        """
+        """
+        path = os.path.join(self.tmpdir, "mirrors.json")
+        with open(path, "w") as mirrorsFile:
+            json.dump({"testos" : ["http://a/", "http://b/"]}, mirrorsFile)
+        self.assertEqual(readMirrorsFile(path), {"testos" : ["http://a/", "http://b/"]})
+        with open(path, "w") as mirrorsFile:
+            json.dump({"testos" : "http://a/"}, mirrorsFile)
+        self.assertRaises(ValueError, readMirrorsFile, path)
+
+    def test_cache_stamp(self):
+        """
+        """
+        self.cache.put("http://a/x.iso", {"url" : "http://b/x.iso"})
+        self.assertEqual(MirrorCache(self.cache.getPath()).get("http://a/x.iso"),
+                         {"url" : "http://b/x.iso"})
+        moved = MirrorCache(self.cache.getPath())
+        moved.stamp = dict(moved.getStamp(), gateway="198.51.100.7")
+        self.assertEqual(moved.get("http://a/x.iso"), None)
+
+    def test_set_iso_url(self):
+        """
+        """
+        pjh = PackerJsonHandler(self.logger)
+        pjh.setIsoUrl("http://a/x.iso")
+        self.assertEqual(pjh.getIsoUrl(), "http://a/x.iso")
+        self.assertEqual(pjh.variables, {"iso_url" : "http://a/x.iso"})
+
+###############################################################################
+##### Functional Tests
+
+    def test_select_fastest(self):
+        """
+        """
+        isoUrl = self.slow.base + "16.04/testos.iso"
+        self.assertEqual(self.selector.select(isoUrl), self.fast.base + "16.04/testos.iso")
+        self.assertEqual(self.cache.get(isoUrl)["url"], self.fast.base + "16.04/testos.iso")
+
+        #####
+        # Cached now, nothing is measured again
+        self.selector.measure = None
+        self.slow.requests = []
+        self.assertEqual(self.selector.select(isoUrl), self.fast.base + "16.04/testos.iso")
+        self.assertEqual(self.slow.requests, [])
+
+    def test_select_skips_dead(self):
+        """
+        """
+        selector = MirrorSelector(self.logger, cache=False, timeout=5,
+                                  mirrors={"testos" : [self.fast.base + "gone/",
+                                                       self.slow.base]})
+        isoUrl = self.fast.base + "gone/testos.txt"
+        self.assertEqual(selector.select(isoUrl), isoUrl)
+        self.assertEqual([request for request in self.slow.requests
+                          if request[0] == "GET"], [])
+        selector.close()
+
+    def test_apply_to(self):
+        """
+        """
+        varFile = os.path.join(self.tmpdir, "testos1604.json")
+        with open(varFile, "w") as jsonFile:
+            json.dump({"iso_url" : self.slow.base + "testos.iso"}, jsonFile)
+        pjh = PackerJsonHandler(self.logger)
+        variables = pjh.readExistingJsonVarfile(varFile)
+        self.assertEqual(self.selector.applyTo(pjh), self.fast.base + "testos.iso")
+        self.assertEqual(variables["iso_url"], self.fast.base + "testos.iso")
+
+###############################################################################
+##### unittest Tear down
+    @classmethod
+    def tearDownClass(self):
+        """
+        Final cleanup actions...
+        """
+        for server in [self.slow, self.fast]:
+            server.shutdown()
+            server.server_close()
+        test_time = (datetime.now() - self.test_start_time)
+        self.logger.log(lp.INFO, self.__module__ + " took " + str(test_time) + " time to complete...")
+
+###############################################################################
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,102 @@
+#!/usr/bin/python -u
+"""
+netinfo test, Linux only.
+
+"""
+from __future__ import absolute_import
+#--- Native python libraries
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+from datetime import datetime
+
+#--- non-native python libraries in this source tree
+sys.path.append("..")
+from lib.loggers import CyLogger
+from lib.loggers import LogPriority as lp
+from lib import netinfo
+
+ROUTES = """Iface\tDestination\tGateway \tFlags\tRefCnt\tUse\tMetric\tMask\t\tMTU\tWindow\tIRTT
+eth1\t0000FEA9\t00000000\t0001\t0\t0\t1002\t0000FFFF\t0\t0\t0
+eth0\t00000000\t010200C0\t0003\t0\t0\t0\t00000000\t0\t0\t0
+eth0\t000200C0\t00000000\t0001\t0\t0\t0\t00FFFFFF\t0\t0\t0
+"""
+
+
+@unittest.skipUnless(netinfo.isAvailable(), "needs /proc and /sys")
+class test_netinfo(unittest.TestCase):
+    """
+    """
+
+    @classmethod
+    def setUpClass(self):
+        """
+        Runs once before any tests start
+        """
+        self.test_start_time = datetime.now()
+        self.logger = CyLogger()
+        self.logger.initializeLogs(syslog=False, myconsole=False)
+
+    def setUp(self):
+        """
+        This method runs before each test run.
+        """
+        self.tmpdir = tempfile.mkdtemp(prefix="netinfo_test_")
+        self.procNetRoute = netinfo.PROC_NET_ROUTE
+
+    def tearDown(self):
+        netinfo.PROC_NET_ROUTE = self.procNetRoute
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def useRoutes(self, routes):
+        netinfo.PROC_NET_ROUTE = os.path.join(self.tmpdir, "route")
+        with open(netinfo.PROC_NET_ROUTE, "w") as routeFile:
+            routeFile.write(routes)
+
+###############################################################################
+##### Method Tests
+
+    def test_default_route(self):
+        """
+        """
+        self.useRoutes(ROUTES)
+        self.assertEqual(netinfo.getDefaultRoute(), ("eth0", "192.0.2.1"))
+
+    def test_no_default_route(self):
+        """
+        """
+        self.useRoutes("\n".join(ROUTES.splitlines()[:2]) + "\n")
+        self.assertEqual(netinfo.getDefaultRoute(), (None, None))
+
+    def test_loopback(self):
+        """
+        """
+        self.assertTrue("lo" in netinfo.getInterfaces())
+        self.assertEqual(netinfo.getInterfaceAddress("lo"), "127.0.0.1")
+        self.assertEqual(netinfo.getMacAddress("lo"), "00:00:00:00:00:00")
+        self.assertEqual(netinfo.getInterfaceFor("127.0.0.1"), "lo")
+
+    def test_unknown_interface(self):
+        """
+        """
+        self.assertEqual(netinfo.getMacAddress("nosuchif0"), None)
+        self.assertEqual(netinfo.getInterfaceAddress("nosuchif0"), None)
+        self.assertEqual(netinfo.getInterfaceAddress("x" * 20), None)
+
+###############################################################################
+##### unittest Tear down
+    @classmethod
+    def tearDownClass(self):
+        """
+        Final cleanup actions...
+        """
+        test_time = (datetime.now() - self.test_start_time)
+        self.logger.log(lp.INFO, self.__module__ + " took " + str(test_time) + " time to complete...")
+
+###############################################################################
+
+
+if __name__ == "__main__":
+    unittest.main()
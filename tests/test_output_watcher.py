@@ -0,0 +1,161 @@
+#!/usr/bin/python -u
+"""
+OutputWatcher test.
+
+"""
+from __future__ import absolute_import
+#--- Native python libraries
+import sys
+import signal
+import unittest
+import threading
+from datetime import datetime
+
+#--- non-native python libraries in this source tree
+sys.path.append("..")
+from lib.loggers import CyLogger
+from lib.loggers import LogPriority as lp
+from lib.run_commands import RunWith
+from lib.output_watcher import OutputWatcher, PACKER_PATTERNS
+
+
+class test_output_watcher(unittest.TestCase):
+    """
+    """
+
+    @classmethod
+    def setUpClass(self):
+        """
+        Runs once before any tests start
+        """
+        self.test_start_time = datetime.now()
+        self.logger = CyLogger()
+        self.logger.initializeLogs(syslog=False, myconsole=False)
+
+    def setUp(self):
+        """
+        This method runs before each test run.
+        """
+        self.fired = []
+        self.watcher = OutputWatcher()
+        for name in ["ssh_wait", "provisioning", "build_finished", "errored"]:
+            self.watcher.addTrigger(PACKER_PATTERNS[name], self.record,
+                                    name=name)
+
+    def record(self, name, line, match):
+        self.fired.append((name, match.groupdict()))
+
+###############################################################################
+##### Method Tests
+
+    def test_dispatches_to_matching_trigger(self):
+        """
+        """
+        self.assertFalse(self.watcher.scan("==> vmware-iso: Starting HTTP server"))
+        self.watcher.scan("==> vmware-iso: Waiting for SSH to become available...")
+        self.watcher.scan("==> vmware-iso: Provisioning with shell script: script/update.sh")
+        self.watcher.scan("Build 'vmware-iso' finished.")
+        self.assertEqual([name for name, groups in self.fired],
+                         ["ssh_wait", "provisioning", "build_finished"])
+        self.assertEqual(self.fired[1][1]["provisioner"], "shell")
+        self.assertEqual(self.fired[2][1]["build"], "vmware-iso")
+        self.assertEqual(self.watcher.getHits("ssh_wait"), 1)
+
+    def test_stop_trigger(self):
+        """
+        """
+        self.watcher.addTrigger("FATAL", name="fatal", stop=True)
+        self.assertFalse(self.watcher.scan("Waiting for SSH"))
+        self.assertTrue(self.watcher.scan("FATAL: out of disk"))
+
+    def test_callback_can_request_stop(self):
+        """
+        """
+        self.watcher.addTrigger("abort me", lambda name, line, match: True)
+        self.assertTrue(self.watcher.scan("please abort me now"))
+
+    def test_remove_and_copy(self):
+        """
+        """
+        copied = self.watcher.copy()
+        self.watcher.removeTrigger("ssh_wait")
+        self.watcher.scan("Waiting for SSH")
+        self.assertEqual(self.fired, [])
+        copied.scan("Waiting for SSH")
+        self.assertEqual(len(self.fired), 1)
+
+    def test_bad_pattern_fails_early(self):
+        """
+        """
+        import re
+        self.assertRaises(re.error, self.watcher.addTrigger, "(unclosed")
+
+###############################################################################
+##### Functional Tests
+
+    def test_chk_string_list_stops_reading(self):
+        """
+        """
+        rw = RunWith(self.logger)
+        rw.setCommand(["/bin/sh", "-c", "echo one; echo two; echo three"])
+        output, error, retcode = rw.waitNpassThruStdout(chk_string=["nomatch", "tw."])
+        self.assertTrue("two" in output)
+        self.assertFalse("three" in output)
+
+    def test_stop_drains_output(self):
+        """
+        """
+        rw = RunWith(self.logger)
+        rw.setCommand(["/bin/sh", "-c", "echo MARK; head -c 400000 /dev/zero; " + \
+                       "head -c 400000 /dev/zero 1>&2; exit 3"])
+        results = []
+        thread = threading.Thread(target=lambda: results.append(
+                                  rw.waitNpassThruStdout(chk_string="MARK")))
+        thread.daemon = True
+        thread.start()
+        thread.join(30)
+        self.assertFalse(thread.is_alive())
+        output, error, retcode = results[0]
+        self.assertEqual(output, "MARK\n")
+        self.assertEqual(retcode, str(-signal.SIGTERM))
+
+    def test_stop_aborts_command(self):
+        """
+        """
+        rw = RunWith(self.logger)
+        rw.setCommand(["/bin/sh", "-c", "echo MARK; while true; do echo more; done"])
+        results = []
+        thread = threading.Thread(target=lambda: results.append(
+                                  rw.waitNpassThruStdout(chk_string="MARK")))
+        thread.daemon = True
+        thread.start()
+        thread.join(30)
+        self.assertFalse(thread.is_alive())
+        output, error, retcode = results[0]
+        self.assertEqual(output, "MARK\n")
+        self.assertTrue(int(retcode) < 0)
+
+    def test_watcher_sees_stderr(self):
+        """
+        """
+        rw = RunWith(self.logger)
+        rw.setCommand(["/bin/sh", "-c", "echo \"Build 'vbox' errored: boom\" 1>&2"])
+        rw.waitNpassThruStdout(watcher=self.watcher)
+        self.assertEqual([name for name, groups in self.fired], ["errored"])
+        self.assertEqual(self.fired[0][1]["failed"], "vbox")
+
+###############################################################################
+##### unittest Tear down
+    @classmethod
+    def tearDownClass(self):
+        """
+        Final cleanup actions...
+        """
+        test_time = (datetime.now() - self.test_start_time)
+        self.logger.log(lp.INFO, self.__module__ + " took " + str(test_time) + " time to complete...")
+
+###############################################################################
+
+
+if __name__ == "__main__":
+    unittest.main()
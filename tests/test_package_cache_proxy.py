@@ -0,0 +1,341 @@
+#!/usr/bin/python -u
+"""
+Test of the package caching proxy, against a local http repository.
+
+"""
+from __future__ import absolute_import
+#--- Native python libraries
+import os
+import sys
+import json
+import shutil
+import socket
+import urllib2
+import tempfile
+import unittest
+import threading
+import SocketServer
+import BaseHTTPServer
+from datetime import datetime
+
+#--- non-native python libraries in this source tree
+sys.path.append("..")
+from lib.conf import Conf
+from lib.loggers import CyLogger
+from lib.loggers import LogPriority as lp
+from lib.packer_runner import PackerRunner
+from lib.build_context import BuildContext
+from lib.package_cache_proxy import PackageCacheProxy, PackageStore, isPackageUrl
+from lib.package_cache_proxy import inNetworks, parseNetwork, parseIfconfig
+
+
+class RepoHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """
+    A package repository - every path ending .deb is a package of 1000
+    bytes, /dists/Release changes on every request.
+    """
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self.server.requests.append(self.path)
+        if self.path.endswith(".deb"):
+            body = (self.path + "\n") * (1000 / (len(self.path) + 1))
+            body += "x" * (1000 - len(body))
+        elif self.path == "/dists/Release":
+            body = "Release " + str(len(self.server.requests))
+        else:
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class RepoServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+    def __init__(self):
+        BaseHTTPServer.HTTPServer.__init__(self, ("127.0.0.1", 0), RepoHandler)
+        self.requests = []
+        self.address = "127.0.0.1:" + str(self.server_address[1])
+        thread = threading.Thread(target=self.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+
+class test_package_cache_proxy(unittest.TestCase):
+    """
+    """
+
+    @classmethod
+    def setUpClass(self):
+        """
+        Runs once before any tests start
+        """
+        self.test_start_time = datetime.now()
+        self.logger = CyLogger()
+        self.logger.initializeLogs(syslog=False, myconsole=False)
+        self.repo = RepoServer()
+        self.base = "http://" + self.repo.address
+
+    def setUp(self):
+        """
+        This method runs before each test run.
+        """
+        self.tmpdir = tempfile.mkdtemp(prefix="package_cache_test_")
+        self.store = PackageStore(os.path.join(self.tmpdir, "packages"), maxBytes=2500)
+        #####
+        # The repository is on loopback, which the proxy refuses by default
+        self.proxy = PackageCacheProxy(self.logger, self.store, host="127.0.0.1",
+                                       guestAddress="127.0.0.1", timeout=5,
+                                       connectPorts=[self.repo.server_address[1]],
+                                       blockedNetworks=[])
+        self.proxy.start()
+        self.opener = urllib2.build_opener(urllib2.ProxyHandler({"http" : self.proxy.getUrl()}))
+        self.repo.requests = []
+
+    def tearDown(self):
+        self.proxy.stop()
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def fetch(self, path):
+        response = self.opener.open(self.base + path, timeout=5)
+        try:
+            return response.read(), response.info().getheader("X-Cache")
+        finally:
+            response.close()
+
+###############################################################################
+##### Method Tests
+
+    def test_is_package_url(self):
+        """
+        """
+        self.assertTrue(isPackageUrl("http://archive.ubuntu.com/pool/main/c/curl/curl_7.47.0_amd64.deb"))
+        self.assertTrue(isPackageUrl("http://mirror.centos.org/centos/7/os/x86_64/Packages/curl-7.29.0.rpm"))
+        self.assertFalse(isPackageUrl("http://archive.ubuntu.com/ubuntu/dists/xenial/Release"))
+        self.assertFalse(isPackageUrl("http://mirror.centos.org/centos/7/os/x86_64/repodata/repomd.xml"))
+        self.assertFalse(isPackageUrl("http://example.com/download?file=curl.deb"))
+
+    def test_networks(self):
+        """
+        """
+        self.assertEqual(parseNetwork("10.0.2.7/24"), (0x0a000200, 0xffffff00))
+        self.assertEqual(parseNetwork("10.0.2.7"), (0x0a000207, 0xffffffff))
+        self.assertRaises(ValueError, parseNetwork, "10.0.2.0/33")
+        self.assertRaises(ValueError, parseNetwork, "example.com")
+        self.assertTrue(inNetworks("172.16.5.128", ["127.0.0.0/8", "172.16.5.0/24"]))
+        self.assertFalse(inNetworks("172.16.6.128", ["127.0.0.0/8", "172.16.5.0/24"]))
+        self.assertFalse(inNetworks("::1", ["127.0.0.0/8"]))
+
+    def test_parse_ifconfig(self):
+        """
+        """
+        macos = "lo0: flags=8049<UP,LOOPBACK,RUNNING,MULTICAST> mtu 16384\n" + \
+                "\tinet 127.0.0.1 netmask 0xff000000\n" + \
+                "\tinet6 ::1 prefixlen 128\n" + \
+                "en0: flags=8863<UP,BROADCAST,SMART,RUNNING,SIMPLEX,MULTICAST> mtu 1500\n" + \
+                "\tether 8c:85:90:00:00:01\n" + \
+                "\tinet 10.1.2.3 netmask 0xfffffc00 broadcast 10.1.3.255\n" + \
+                "vmnet8: flags=8863<UP,BROADCAST,SMART,RUNNING,SIMPLEX,MULTICAST> mtu 1500\n" + \
+                "\tinet 172.16.5.1 netmask 0xffffff00 broadcast 172.16.5.255\n" + \
+                "bridge100: flags=8a63<UP,BROADCAST,SMART,RUNNING,ALLMULTI,SIMPLEX,MULTICAST> mtu 1500\n"
+        self.assertEqual(parseIfconfig(macos),
+                         [("lo0", "127.0.0.1", "255.0.0.0"),
+                          ("en0", "10.1.2.3", "255.255.252.0"),
+                          ("vmnet8", "172.16.5.1", "255.255.255.0")])
+        linux = "vboxnet0  Link encap:Ethernet  HWaddr 0a:00:27:00:00:00\n" + \
+                "          inet addr:192.168.56.1  Bcast:192.168.56.255  Mask:255.255.255.0\n" + \
+                "\n" + \
+                "virbr0: flags=4099<UP,BROADCAST,MULTICAST>  mtu 1500\n" + \
+                "        inet 192.168.122.1  netmask 255.255.255.0  broadcast 192.168.122.255\n"
+        self.assertEqual(parseIfconfig(linux),
+                         [("vboxnet0", "192.168.56.1", "255.255.255.0"),
+                          ("virbr0", "192.168.122.1", "255.255.255.0")])
+
+    def test_store_evicts_least_recently_used(self):
+        """
+        """
+        for name in ["a", "b", "c"]:
+            writer = self.store.create("http://repo/" + name + ".deb")
+            writer.write("x" * 1000)
+            writer.commit()
+        self.assertEqual(self.store.getStats()["packages"], 2)
+        self.assertEqual(self.store.open("http://repo/a.deb"), None)
+
+        #####
+        # Using b makes c the one to go
+        self.store.open("http://repo/b.deb")[0].close()
+        writer = self.store.create("http://repo/d.deb")
+        writer.write("x" * 1000)
+        writer.commit()
+        self.assertEqual(self.store.open("http://repo/c.deb"), None)
+        cached, size = self.store.open("http://repo/b.deb")
+        cached.close()
+        self.assertEqual(size, 1000)
+        self.assertTrue(self.store.getStats()["bytes"] <= 2500)
+
+    def test_store_reload(self):
+        """
+        """
+        writer = self.store.create("http://repo/a.deb")
+        writer.write("x" * 1000)
+        writer.commit()
+        writer = self.store.create("http://repo/b.deb")
+        writer.write("x" * 500)
+        writer.abort()
+        self.store.create("http://repo/c.deb")
+        store = PackageStore(self.store.root, maxBytes=2500)
+        self.assertEqual(store.getStats()["packages"], 1)
+        self.assertEqual(store.getStats()["bytes"], 1000)
+        cached, _ = store.open("http://repo/a.deb")
+        self.assertEqual(cached.read(), "x" * 1000)
+        cached.close()
+
+###############################################################################
+##### Functional Tests
+
+    def test_package_cached(self):
+        """
+        """
+        body, cache = self.fetch("/pool/curl.deb")
+        self.assertEqual(len(body), 1000)
+        self.assertEqual(cache, None)
+        again, cache = self.fetch("/pool/curl.deb")
+        self.assertEqual(again, body)
+        self.assertEqual(cache, "HIT")
+        self.assertEqual(self.repo.requests, ["/pool/curl.deb"])
+        self.assertEqual(self.store.getStats()["hits"], 1)
+
+    def test_metadata_not_cached(self):
+        """
+        """
+        first, _ = self.fetch("/dists/Release")
+        second, _ = self.fetch("/dists/Release")
+        self.assertNotEqual(first, second)
+        self.assertEqual(self.repo.requests, ["/dists/Release", "/dists/Release"])
+
+    def test_missing_not_cached(self):
+        """
+        """
+        for _ in range(2):
+            try:
+                self.fetch("/pool/missing.rpm")
+                self.fail("Expected a 404")
+            except urllib2.HTTPError, err:
+                self.assertEqual(err.code, 404)
+        self.assertEqual(self.repo.requests, ["/pool/missing.rpm", "/pool/missing.rpm"])
+
+    def test_connect_tunnel(self):
+        """
+        """
+        sock = socket.create_connection(("127.0.0.1", self.proxy.server_address[1]), 5)
+        try:
+            sock.sendall("CONNECT " + self.repo.address + " HTTP/1.1\r\n\r\n")
+            answer = ""
+            while "\r\n\r\n" not in answer:
+                data = sock.recv(1)
+                self.assertTrue(data)
+                answer += data
+            self.assertTrue(answer.startswith("HTTP/1.1 200"))
+            sock.sendall("GET /dists/Release HTTP/1.1\r\nHost: x\r\nConnection: close\r\n\r\n")
+            response = ""
+            while True:
+                data = sock.recv(4096)
+                if not data:
+                    break
+                response += data
+        finally:
+            sock.close()
+        self.assertTrue(response.startswith("HTTP/1.1 200"))
+        self.assertTrue(response.endswith("Release 1"))
+
+    def test_refused(self):
+        """
+        """
+        proxy = PackageCacheProxy(self.logger, self.store, host="127.0.0.1",
+                                  guestAddress="127.0.0.1", timeout=5)
+        proxy.start()
+        try:
+            opener = urllib2.build_opener(urllib2.ProxyHandler({"http" : proxy.getUrl()}))
+            try:
+                opener.open(self.base + "/pool/curl.deb", timeout=5)
+                self.fail("Expected a 403")
+            except urllib2.HTTPError, err:
+                self.assertEqual(err.code, 403)
+
+            sock = socket.create_connection(("127.0.0.1", proxy.server_address[1]), 5)
+            try:
+                sock.sendall("CONNECT " + self.repo.address + " HTTP/1.1\r\n\r\n")
+                self.assertTrue(sock.recv(4096).startswith("HTTP/1.1 403"))
+            finally:
+                sock.close()
+        finally:
+            proxy.stop()
+        self.assertEqual(self.repo.requests, [])
+
+        #####
+        # Clients from outside the allowed networks get no answer at all
+        proxy = PackageCacheProxy(self.logger, self.store, host="127.0.0.1",
+                                  guestAddress="127.0.0.1", timeout=5,
+                                  allowedClients=["10.0.0.0/8"], blockedNetworks=[])
+        proxy.start()
+        try:
+            sock = socket.create_connection(("127.0.0.1", proxy.server_address[1]), 5)
+            try:
+                sock.sendall("GET " + self.base + "/pool/curl.deb HTTP/1.1\r\n\r\n")
+                self.assertEqual(sock.recv(4096), "")
+            finally:
+                sock.close()
+        finally:
+            proxy.stop()
+        self.assertEqual(self.repo.requests, [])
+
+    def test_packer_runner(self):
+        """
+        """
+        template = os.path.join(self.tmpdir, "ubuntu.json")
+        with open(template, "w") as jsonFile:
+            json.dump({"variables" : {"http_proxy" : "{{env `http_proxy`}}"}}, jsonFile)
+        conf = Conf()
+        conf.setLogger(self.logger)
+        conf.packageCache = True
+        conf.packageCacheProxy = self.proxy
+        runner = PackerRunner(conf)
+        context = BuildContext.create(conf, self.tmpdir, "ubuntu.json", "ubuntu1604.json",
+                                      "vmware-iso")
+        cmd = runner.buildCommand(context)
+        self.assertEqual(cmd[-2:], ["-var=http_proxy=" + self.proxy.getUrl(), "ubuntu.json"])
+        #####
+        # Only the guests use the cache, not packer's own downloads
+        environ = runner.buildEnviron(context)
+        for name in ["http_proxy", "https_proxy", "HTTP_PROXY", "HTTPS_PROXY"]:
+            self.assertNotEqual(environ.get(name), self.proxy.getUrl())
+
+        conf.setPackageCache(False)
+        self.assertFalse("-var=http_proxy=" + self.proxy.getUrl() in
+                         runner.buildCommand(context))
+
+###############################################################################
+##### unittest Tear down
+    @classmethod
+    def tearDownClass(self):
+        """
+        Final cleanup actions...
+        """
+        self.repo.shutdown()
+        self.repo.server_close()
+        test_time = (datetime.now() - self.test_start_time)
+        self.logger.log(lp.INFO, self.__module__ + " took " + str(test_time) + " time to complete...")
+
+###############################################################################
+
+
+if __name__ == "__main__":
+    unittest.main()
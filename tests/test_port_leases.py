@@ -0,0 +1,162 @@
+#!/usr/bin/python -u
+"""
+Test of the port lease manager handing concurrent builds their own ports.
+
+"""
+from __future__ import absolute_import
+#--- Native python libraries
+import os
+import sys
+import json
+import shutil
+import socket
+import tempfile
+import unittest
+import subprocess
+from datetime import datetime
+
+#--- non-native python libraries in this source tree
+sys.path.append("..")
+from lib.conf import Conf
+from lib.loggers import CyLogger
+from lib.loggers import LogPriority as lp
+from lib.packer_runner import PackerRunner
+from lib.build_context import BuildContext
+from lib.port_leases import PortLeaseManager, NoFreePortsError
+
+RANGES = {"http" : (46000, 46029),
+          "vnc" : (46100, 46119),
+          "ssh" : (46200, 46219)}
+
+
+class test_port_leases(unittest.TestCase):
+    """
+    """
+
+    @classmethod
+    def setUpClass(self):
+        """
+        Runs once before any tests start
+        """
+        self.test_start_time = datetime.now()
+        self.logger = CyLogger()
+        self.logger.initializeLogs(syslog=False, myconsole=False)
+
+    def setUp(self):
+        """
+        This method runs before each test run.
+        """
+        self.tmpdir = tempfile.mkdtemp(prefix="port_leases_test_")
+        self.path = os.path.join(self.tmpdir, "port_leases.json")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def makeManager(self):
+        return PortLeaseManager(self.logger, self.path, blockSize=10, ranges=RANGES)
+
+###############################################################################
+##### Method Tests
+
+    def test_disjoint(self):
+        """
+        """
+        first = self.makeManager().lease("build1")
+        second = self.makeManager().lease("build2")
+        self.assertEqual(first.getRange("http"), [46000, 46009])
+        self.assertEqual(second.getRange("http"), [46010, 46019])
+        self.assertEqual(second.getVariables()["vnc_port_min"], 46110)
+        self.assertEqual(second.getVariables()["ssh_host_port_max"], 46219)
+        self.assertRaises(NoFreePortsError, self.makeManager().lease, "build3")
+        self.assertEqual(sorted(self.makeManager().getLeases().keys()), ["build1", "build2"])
+
+        first.release()
+        with self.makeManager().lease("build3", kinds=["http"]) as third:
+            self.assertEqual(third.getRange("http"), [46000, 46009])
+            self.assertEqual(third.getVariables().keys(), ["http_port_min", "http_port_max"])
+        self.assertEqual(self.makeManager().getLeases().keys(), ["build2"])
+
+    def test_dead_process(self):
+        """
+        """
+        proc = subprocess.Popen(["true"])
+        proc.wait()
+        with open(self.path, "w") as jsonFile:
+            json.dump({"gone" : {"hostname" : socket.gethostname(), "pid" : proc.pid,
+                                 "ranges" : {"http" : [46000, 46009]}},
+                       "elsewhere" : {"hostname" : "otherhost", "pid" : 1,
+                                      "ranges" : {"http" : [46010, 46019]}}},
+                      jsonFile)
+        lease = self.makeManager().lease("build1", kinds=["http"])
+        self.assertEqual(lease.getRange("http"), [46000, 46009])
+        self.assertEqual(sorted(self.makeManager().getLeases().keys()), ["build1", "elsewhere"])
+
+    def test_port_in_use(self):
+        """
+        """
+        sock = socket.socket()
+        sock.bind(("", 46005))
+        sock.listen(1)
+        try:
+            lease = self.makeManager().lease("build1", kinds=["http"])
+        finally:
+            sock.close()
+        self.assertEqual(lease.getRange("http"), [46010, 46019])
+
+    def test_apply_to_template(self):
+        """
+        """
+        lease = self.makeManager().lease("build1")
+        data = {"builders" : [{"type" : "vmware-iso", "http_port_min" : 8000},
+                              {"type" : "virtualbox-iso"},
+                              {"type" : "docker"}]}
+        self.assertTrue(lease.applyToTemplate(data))
+        self.assertEqual(data["builders"][0], {"type" : "vmware-iso",
+                                               "http_port_min" : 46000, "http_port_max" : 46009,
+                                               "vnc_port_min" : 46100, "vnc_port_max" : 46109})
+        self.assertEqual(data["builders"][1]["ssh_host_port_min"], 46200)
+        self.assertFalse("vnc_port_min" in data["builders"][1])
+        self.assertEqual(data["builders"][2], {"type" : "docker"})
+        self.assertFalse(lease.applyToTemplate(data))
+
+###############################################################################
+##### Functional Tests
+
+    def test_packer_runner(self):
+        """
+        """
+        with open(os.path.join(self.tmpdir, "ubuntu.json"), "w") as jsonFile:
+            json.dump({"variables" : {"http_port_min" : "8000", "cpus" : "1"},
+                       "builders" : [{"type" : "vmware-iso"}]}, jsonFile)
+        conf = Conf()
+        conf.setLogger(self.logger)
+        conf.portLeaseManager = self.makeManager()
+        runner = PackerRunner(conf)
+        context = BuildContext.create(conf, self.tmpdir, "ubuntu.json", "ubuntu1604.json",
+                                      "vmware-iso", buildId="ubuntu1604")
+
+        with conf.getPortLeaseManager().lease(context.buildId) as lease:
+            buildContext = runner.prepareTemplate(context, lease)
+            buildTemplate = os.path.join(self.tmpdir, ".ubuntu1604-ubuntu.json")
+            self.assertEqual(buildContext.templateFile, buildTemplate)
+            with open(buildTemplate) as jsonFile:
+                builder = json.load(jsonFile)["builders"][0]
+            self.assertEqual(builder["vnc_port_max"], 46109)
+            cmd = runner.buildCommand(buildContext, lease)
+            self.assertEqual(cmd[-2:], ["-var=http_port_min=46000", buildTemplate])
+
+###############################################################################
+##### unittest Tear down
+    @classmethod
+    def tearDownClass(self):
+        """
+        Final cleanup actions...
+        """
+        test_time = (datetime.now() - self.test_start_time)
+        self.logger.log(lp.INFO, self.__module__ + " took " + str(test_time) + " time to complete...")
+
+###############################################################################
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,110 @@
+#!/usr/bin/python -u
+"""
+ProgressLineSplitter test.
+
+"""
+from __future__ import absolute_import
+#--- Native python libraries
+import sys
+import unittest
+from datetime import datetime
+
+#--- non-native python libraries in this source tree
+sys.path.append("..")
+from lib.loggers import CyLogger
+from lib.loggers import LogPriority as lp
+from lib.run_commands import RunWith
+from lib.progress_lines import ProgressLineSplitter, parseProgress
+
+
+class test_progress_lines(unittest.TestCase):
+    """
+    """
+
+    @classmethod
+    def setUpClass(self):
+        """
+        Runs once before any tests start
+        """
+        self.test_start_time = datetime.now()
+        self.logger = CyLogger()
+        self.logger.initializeLogs(syslog=False, myconsole=False)
+
+    def setUp(self):
+        """
+        This method runs before each test run.
+        """
+        self.events = []
+        self.splitter = ProgressLineSplitter(self.events.append)
+
+###############################################################################
+##### Method Tests
+
+    def test_redraws_collapse_to_last_state(self):
+        """
+        """
+        lines = self.splitter.feed("start\n10%\r50%\r100%\ndone\n")
+        self.assertEqual(lines, ["start", "100%", "done"])
+        self.assertEqual([event.percent for event in self.events],
+                         [10.0, 50.0, 100.0])
+
+    def test_crlf_split_across_chunks(self):
+        """
+        """
+        lines = self.splitter.feed("one\r")
+        lines += self.splitter.feed("\ntwo")
+        lines += self.splitter.flush()
+        self.assertEqual(lines, ["one", "two"])
+        self.assertEqual(self.splitter.redraws, 0)
+
+    def test_strips_terminal_escapes(self):
+        """
+        """
+        lines = self.splitter.feed("\x1b[32mgreen\x1b[0m\x1b[K\n")
+        self.assertEqual(lines, ["green"])
+
+    def test_parse_packer_progress(self):
+        """
+        """
+        event = parseProgress("    vmware-iso: 12.50 MiB / 100.00 MiB [===>----] 12.50% 1m2s")
+        self.assertEqual(event.bytes, int(12.5 * 1024 ** 2))
+        self.assertEqual(event.total, 100 * 1024 ** 2)
+        self.assertEqual(event.percent, 12.5)
+
+    def test_parse_git_progress(self):
+        """
+        """
+        event = parseProgress("Receiving objects:  45% (450/1000), 1.20 MiB | 600.00 KiB/s")
+        self.assertEqual(event.percent, 45.0)
+        self.assertEqual(event.bytes, int(1.2 * 1024 ** 2))
+        self.assertEqual(event.rate, 600 * 1024)
+        self.assertEqual(parseProgress("Cloning into 'debian'..."), None)
+
+###############################################################################
+##### Functional Tests
+
+    def test_runwith_captures_final_state(self):
+        """
+        """
+        rw = RunWith(self.logger)
+        rw.setCommand(["/usr/bin/printf", "a\\n1%%\\r2%%\\r3%%\\nb\\n"])
+        output, error, retcode = rw.waitNpassThruStdout(progress=self.events.append)
+        self.assertEqual(output.splitlines(), ["a", "3%", "b"])
+        self.assertEqual(len(self.events), 3)
+        self.assertEqual(retcode, "0")
+
+###############################################################################
+##### unittest Tear down
+    @classmethod
+    def tearDownClass(self):
+        """
+        Final cleanup actions...
+        """
+        test_time = (datetime.now() - self.test_start_time)
+        self.logger.log(lp.INFO, self.__module__ + " took " + str(test_time) + " time to complete...")
+
+###############################################################################
+
+
+if __name__ == "__main__":
+    unittest.main()
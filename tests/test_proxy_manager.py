@@ -0,0 +1,249 @@
+#!/usr/bin/python -u
+"""
+Test of proxy health checking and failover, against local http servers.
+
+"""
+from __future__ import absolute_import
+#--- Native python libraries
+import os
+import sys
+import json
+import time
+import shutil
+import socket
+import tempfile
+import unittest
+import threading
+import SocketServer
+import BaseHTTPServer
+from datetime import datetime
+
+#--- non-native python libraries in this source tree
+sys.path.append("..")
+from lib.conf import Conf
+from lib.loggers import CyLogger
+from lib.loggers import LogPriority as lp
+from lib.url_probe import DnsCache
+from lib.proxy_manager import ProxyManager, parseProxy, isNoProxy
+from lib.packer_runner import PackerRunner
+from lib.build_context import BuildContext
+
+
+class AnswerHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """
+    Answers every HEAD with a 200 after server.delay seconds, whether asked
+    as a proxy or as the server.
+    """
+    protocol_version = "HTTP/1.1"
+
+    def do_HEAD(self):
+        self.server.requests.append(self.path)
+        time.sleep(self.server.delay)
+        self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+class AnswerServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+    def __init__(self, delay=0):
+        BaseHTTPServer.HTTPServer.__init__(self, ("127.0.0.1", 0), AnswerHandler)
+        self.delay = delay
+        self.requests = []
+        self.address = "127.0.0.1:" + str(self.server_address[1])
+        thread = threading.Thread(target=self.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+
+def deadAddress():
+    """
+    Address nothing is listening on.
+    """
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    address = "127.0.0.1:" + str(sock.getsockname()[1])
+    sock.close()
+    return address
+
+
+class test_proxy_manager(unittest.TestCase):
+    """
+    """
+
+    @classmethod
+    def setUpClass(self):
+        """
+        Runs once before any tests start
+        """
+        self.test_start_time = datetime.now()
+        self.logger = CyLogger()
+        self.logger.initializeLogs(syslog=False, myconsole=False)
+        self.proxy = AnswerServer(delay=0.2)
+        self.site = AnswerServer()
+        self.dead = deadAddress()
+
+    def setUp(self):
+        """
+        This method runs before each test run.
+        """
+        self.now = [1000.0]
+        self.conf = Conf()
+        self.proxy.requests = []
+        self.site.requests = []
+
+    def makeManager(self, **kwargs):
+        return ProxyManager(self.conf, checkTimeout=2, dnsCache=DnsCache(),
+                            timer=lambda: self.now[0], **kwargs)
+
+###############################################################################
+##### Method Tests
+
+    def test_parse_proxy(self):
+        """
+        """
+        self.assertEqual(parseProxy("http://proxy.example.com:8080"), ("proxy.example.com", 8080))
+        self.assertEqual(parseProxy("http://proxy.example.com/"), ("proxy.example.com", 80))
+        self.assertEqual(parseProxy("proxy.example.com:3128"), ("proxy.example.com", 3128))
+        self.assertEqual(parseProxy("proxy.example.com"), ("proxy.example.com", 1080))
+
+    def test_no_proxy(self):
+        """
+        """
+        self.assertTrue(isNoProxy("www.example.com", "localhost,.example.com"))
+        self.assertTrue(isNoProxy("example.com", "example.com"))
+        self.assertTrue(isNoProxy("anything", "*"))
+        self.assertFalse(isNoProxy("badexample.com", "example.com"))
+        self.assertFalse(isNoProxy("example.com", ""))
+
+    def test_candidates(self):
+        """
+        """
+        self.conf.setProxy("http://general:3128")
+        self.conf.setHttpsProxy("http://secure:3128")
+        manager = self.makeManager()
+        self.assertEqual(manager.getCandidates("https"), ["http://secure:3128", "http://general:3128"])
+        self.assertEqual(manager.getCandidates("http"), ["http://general:3128"])
+        self.assertEqual(manager.getCandidates("gopher"), [])
+        self.assertEqual(manager.getConfiguredProxies()["rsync"], "http://general:3128")
+
+    def test_health_cached(self):
+        """
+        """
+        manager = self.makeManager()
+        proxy = "http://" + self.proxy.address
+        self.assertTrue(manager.isProxyAlive(proxy))
+        self.assertFalse(manager.isProxyAlive("http://" + self.dead))
+        manager.markDead(proxy)
+        self.assertFalse(manager.isProxyAlive(proxy))
+        self.now[0] += 31
+        self.assertTrue(manager.isProxyAlive(proxy))
+
+###############################################################################
+##### Functional Tests
+
+    def test_environ_failover(self):
+        """
+        """
+        self.conf.setHttpProxy("http://" + self.dead)
+        self.conf.setProxy("http://" + self.proxy.address)
+        self.conf.setNoProxy("localhost")
+        environ = self.makeManager().buildEnviron({"PATH" : "/bin"})
+        self.assertEqual(environ["http_proxy"], "http://" + self.proxy.address)
+        self.assertEqual(environ["HTTP_PROXY"], "http://" + self.proxy.address)
+        self.assertEqual(environ["rsync_proxy"], "http://" + self.proxy.address)
+        self.assertEqual(environ["no_proxy"], "localhost")
+        self.assertEqual(environ["PATH"], "/bin")
+
+    def test_environ_all_dead(self):
+        """
+        """
+        self.conf.setHttpsProxy("http://" + self.dead)
+        environ = self.makeManager().buildEnviron({"https_proxy" : "http://" + self.dead,
+                                                   "ftp_proxy" : "http://elsewhere:21"})
+        self.assertFalse("https_proxy" in environ)
+        self.assertFalse("HTTPS_PROXY" in environ)
+        self.assertEqual(environ["ftp_proxy"], "http://elsewhere:21")
+
+    def test_route(self):
+        """
+        """
+        self.conf.setProxy("http://" + self.proxy.address)
+        self.conf.setNoProxy(".example.com")
+        manager = self.makeManager()
+        url = "http://" + self.site.address + "/ubuntu.iso"
+        self.assertEqual(manager.route(url), "http://" + self.proxy.address)
+        self.assertEqual(manager.route("http://www.example.com/"), "")
+        self.assertEqual(manager.route("file:///isos/ubuntu.iso"), "")
+        self.assertEqual(self.proxy.requests, [])
+
+    def test_route_compare(self):
+        """
+        """
+        self.conf.setProxy("http://" + self.proxy.address)
+        manager = self.makeManager(compare=True)
+        url = "http://" + self.site.address + "/ubuntu.iso"
+        self.assertEqual(manager.route(url), "")
+        self.assertEqual(self.proxy.requests, [url])
+        self.assertEqual(self.site.requests, ["/ubuntu.iso"])
+
+        #####
+        # Decided once per host
+        self.assertEqual(manager.route("http://" + self.site.address + "/other.iso"), "")
+        self.assertEqual(len(self.site.requests), 1)
+
+        environ = manager.buildEnviron({}, urls=[url])
+        self.assertEqual(environ["http_proxy"], "http://" + self.proxy.address)
+        self.assertEqual(environ["no_proxy"], "127.0.0.1")
+
+    def test_packer_runner(self):
+        """
+        """
+        tmpdir = tempfile.mkdtemp(prefix="proxy_manager_test_")
+        try:
+            with open(os.path.join(tmpdir, "ubuntu.json"), "w") as jsonFile:
+                json.dump({"variables" : {"iso_url" : "http://elsewhere/ubuntu.iso"},
+                           "builders" : [{"iso_url" : "{{user `iso_url`}}"}]}, jsonFile)
+            with open(os.path.join(tmpdir, "ubuntu1604.json"), "w") as jsonFile:
+                json.dump({"iso_url" : "http://" + self.site.address + "/ubuntu.iso"}, jsonFile)
+            self.conf.setLogger(self.logger)
+            self.conf.setProxy("http://" + self.proxy.address)
+            self.conf.proxyManager = self.makeManager(compare=True)
+            context = BuildContext.create(self.conf, tmpdir, "ubuntu.json", "ubuntu1604.json")
+            environ = PackerRunner(self.conf).buildEnviron(context)
+        finally:
+            shutil.rmtree(tmpdir, ignore_errors=True)
+        self.assertEqual(environ["http_proxy"], "http://" + self.proxy.address)
+        self.assertEqual(environ["no_proxy"], "127.0.0.1")
+        self.assertEqual(self.site.requests, ["/ubuntu.iso"])
+
+    def test_route_compare_direct_fails(self):
+        """
+        """
+        self.conf.setProxy("http://" + self.proxy.address)
+        manager = self.makeManager(compare=True)
+        url = "http://" + self.dead + "/ubuntu.iso"
+        self.assertEqual(manager.route(url), "http://" + self.proxy.address)
+
+###############################################################################
+##### unittest Tear down
+    @classmethod
+    def tearDownClass(self):
+        """
+        Final cleanup actions...
+        """
+        for server in [self.proxy, self.site]:
+            server.shutdown()
+            server.server_close()
+        test_time = (datetime.now() - self.test_start_time)
+        self.logger.log(lp.INFO, self.__module__ + " took " + str(test_time) + " time to complete...")
+
+###############################################################################
+
+
+if __name__ == "__main__":
+    unittest.main()
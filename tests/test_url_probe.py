@@ -0,0 +1,246 @@
+#!/usr/bin/python -u
+"""
+Test of the concurrent url prober, against a local http server.
+
+"""
+from __future__ import absolute_import
+#--- Native python libraries
+import os
+import sys
+import json
+import shutil
+import socket
+import tempfile
+import unittest
+import threading
+import subprocess
+import SocketServer
+import BaseHTTPServer
+from datetime import datetime
+
+#--- non-native python libraries in this source tree
+sys.path.append("..")
+from lib.loggers import CyLogger
+from lib.loggers import LogPriority as lp
+from lib.url_probe import DnsCache, UrlProber, ProbeResult, formatReport, findIsoUrls
+from lib.url_probe import getIsoUrls
+
+CLI = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                   "ClockworkVMsCli.py")
+
+
+class MirrorHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """
+    Keep-alive server with a couple of isos.
+    """
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        BaseHTTPServer.BaseHTTPRequestHandler.setup(self)
+        self.server.connections += 1
+
+    def do_HEAD(self):
+        if self.path.endswith(".iso"):
+            self.send_response(200)
+        elif self.path == "/moved":
+            self.send_response(302)
+            self.send_header("Location", "/ubuntu.iso")
+        else:
+            self.send_response(404)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+class MirrorServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+    connections = 0
+
+
+class test_url_probe(unittest.TestCase):
+    """
+    """
+
+    @classmethod
+    def setUpClass(self):
+        """
+        Runs once before any tests start
+        """
+        self.test_start_time = datetime.now()
+        self.logger = CyLogger()
+        self.logger.initializeLogs(syslog=False, myconsole=False)
+        self.server = MirrorServer(("127.0.0.1", 0), MirrorHandler)
+        self.base = "http://127.0.0.1:" + str(self.server.server_address[1])
+        self.serverThread = threading.Thread(target=self.server.serve_forever)
+        self.serverThread.daemon = True
+        self.serverThread.start()
+
+    def setUp(self):
+        """
+        This method runs before each test run.
+        """
+        self.tmpdir = tempfile.mkdtemp(prefix="url_probe_test_")
+        self.server.connections = 0
+        self.prober = UrlProber(self.logger, timeout=5, dnsCache=DnsCache())
+
+    def tearDown(self):
+        self.prober.close()
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def writeJson(self, name, data):
+        path = os.path.join(self.tmpdir, name)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, "w") as jsonFile:
+            json.dump(data, jsonFile)
+        return path
+
+###############################################################################
+##### Method Tests
+
+    def test_dns_cache(self):
+        """
+        """
+        now = [0]
+        cache = DnsCache(ttl=10, negativeTtl=5, timer=lambda: now[0])
+        addresses = cache.resolve("localhost", 80)
+        self.assertTrue(addresses)
+        self.assertTrue(cache.resolve("localhost", 80) is addresses)
+        now[0] = 11
+        self.assertFalse(cache.resolve("localhost", 80) is addresses)
+
+        self.assertRaises(socket.gaierror, cache.resolve, "nosuchhost.invalid", 80)
+        error = cache.entries[("nosuchhost.invalid", 80)][1]
+        try:
+            cache.resolve("nosuchhost.invalid", 80)
+        except socket.gaierror, err:
+            self.assertTrue(err is error)
+
+    def test_probe(self):
+        """
+        """
+        result = self.prober.probe(self.base + "/ubuntu.iso")
+        self.assertTrue(result.ok())
+        self.assertEqual(result.status, 200)
+        self.assertTrue(result.latency >= 0)
+
+        result = self.prober.probe(self.base + "/moved")
+        self.assertTrue(result.ok())
+        self.assertTrue(result.location.endswith("/ubuntu.iso"))
+
+        result = self.prober.probe(self.base + "/missing")
+        self.assertFalse(result.ok())
+        self.assertEqual(result.status, 404)
+
+        result = self.prober.probe("ftp://127.0.0.1/ubuntu.iso")
+        self.assertFalse(result.ok())
+        self.assertTrue(result.error)
+
+    def test_probe_refused(self):
+        """
+        """
+        sock = socket.socket()
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+        sock.close()
+        result = self.prober.probe("http://127.0.0.1:" + str(port) + "/ubuntu.iso")
+        self.assertFalse(result.ok())
+        self.assertEqual(result.status, None)
+        self.assertTrue(result.error)
+
+    def test_report(self):
+        """
+        """
+        fast = ProbeResult("http://fast/a.iso")
+        fast.status, fast.latency = 200, 0.01
+        slow = ProbeResult("http://slow/a.iso")
+        slow.status, slow.latency = 200, 2.5
+        dead = ProbeResult("http://dead/a.iso")
+        dead.error, dead.latency = "timed out", 10
+        lines = formatReport([fast, slow, dead]).splitlines()
+        self.assertTrue(lines[1].startswith("-") and "http://dead/a.iso" in lines[1])
+        self.assertTrue("2500.0" in lines[2])
+        self.assertTrue("http://fast/a.iso" in lines[3])
+        self.assertEqual(dead.toDict()["ok"], False)
+
+    def test_get_iso_urls(self):
+        """
+        """
+        template = {"variables" : {"iso_url" : "http://mirror/ubuntu.iso",
+                                   "local_iso" : "file:///isos/ubuntu.iso"},
+                    "builders" : [{"iso_url" : "{{user `iso_url`}}"},
+                                  {"iso_urls" : ["{{user `local_iso`}}",
+                                                 "https://backup/ubuntu.iso"]}]}
+        self.assertEqual(getIsoUrls(template),
+                         ["http://mirror/ubuntu.iso", "https://backup/ubuntu.iso"])
+        self.assertEqual(getIsoUrls(template, {"iso_url" : "http://near/ubuntu.iso"}),
+                         ["http://near/ubuntu.iso", "https://backup/ubuntu.iso"])
+        self.assertEqual(getIsoUrls({"iso_url" : "http://mirror/ubuntu.iso"}),
+                         ["http://mirror/ubuntu.iso"])
+        self.assertEqual(getIsoUrls(None), [])
+
+    def test_find_iso_urls(self):
+        """
+        """
+        varFile = self.writeJson("ubuntu/ubuntu1604.json",
+                                 {"iso_url" : "http://mirror/ubuntu.iso"})
+        template = self.writeJson("ubuntu/ubuntu.json",
+                                  {"variables" : {"iso_url" : "http://mirror/ubuntu.iso"}})
+        self.writeJson("ubuntu/local.json", {"iso_url" : "file:///isos/ubuntu.iso"})
+        self.writeJson(".git/config.json", {"iso_url" : "http://hidden/x.iso"})
+        with open(os.path.join(self.tmpdir, "ubuntu", "broken.json"), "w") as broken:
+            broken.write("{")
+        urls = findIsoUrls(self.tmpdir)
+        self.assertEqual(urls.keys(), ["http://mirror/ubuntu.iso"])
+        self.assertEqual(sorted(urls["http://mirror/ubuntu.iso"]), sorted([varFile, template]))
+
+###############################################################################
+##### Functional Tests
+
+    def test_probe_all_reuses_connections(self):
+        """
+        """
+        prober = UrlProber(self.logger, workers=4, timeout=5, maxPerHost=1)
+        urls = [self.base + "/" + str(number) + ".iso" for number in range(6)]
+        results = prober.probeAll(urls + [self.base + "/missing", urls[0]])
+        prober.close()
+        self.assertEqual([result.url for result in results],
+                         urls + [self.base + "/missing", urls[0]])
+        self.assertEqual([result.ok() for result in results], [True] * 6 + [False, True])
+        self.assertTrue(results[0] is results[-1])
+        self.assertEqual(self.server.connections, 1)
+
+    def test_cli_check_iso_urls(self):
+        """
+        """
+        self.writeJson("ubuntu/ubuntu1604.json", {"iso_url" : self.base + "/ubuntu.iso"})
+        os.mkdir(os.path.join(self.tmpdir, "logs"))
+        cmd = [sys.executable, CLI, "--repo-root", self.tmpdir,
+               "-l", os.path.join(self.tmpdir, "logs"), "-f", "ubuntu",
+               "--check-iso-urls"]
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        output, _ = proc.communicate()
+        self.assertEqual(proc.returncode, 0)
+        results = json.loads(output)
+        self.assertTrue(results["succeeded"])
+        self.assertEqual(results["isoUrls"][0]["status"], 200)
+
+###############################################################################
+##### unittest Tear down
+    @classmethod
+    def tearDownClass(self):
+        """
+        Final cleanup actions...
+        """
+        self.server.shutdown()
+        self.server.server_close()
+        test_time = (datetime.now() - self.test_start_time)
+        self.logger.log(lp.INFO, self.__module__ + " took " + str(test_time) + " time to complete...")
+
+###############################################################################
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,139 @@
+#!/usr/bin/python -u
+"""
+DeadlineWatchdog test.
+
+"""
+from __future__ import absolute_import
+#--- Native python libraries
+import os
+import sys
+import time
+import signal
+import unittest
+from datetime import datetime
+from subprocess import Popen, PIPE
+
+#--- non-native python libraries in this source tree
+sys.path.append("..")
+from lib.loggers import CyLogger
+from lib.loggers import LogPriority as lp
+from lib.run_commands import RunWith
+from lib.watchdog import DeadlineWatchdog
+
+
+class test_watchdog(unittest.TestCase):
+    """
+    """
+
+    @classmethod
+    def setUpClass(self):
+        """
+        Runs once before any tests start
+        """
+        self.test_start_time = datetime.now()
+        self.logger = CyLogger()
+        self.logger.initializeLogs(syslog=False, myconsole=False)
+
+    def setUp(self):
+        """
+        This method runs before each test run.
+        """
+        self.watchdog = DeadlineWatchdog(self.logger, grace=0.5)
+
+    def tearDown(self):
+        self.watchdog.stop()
+
+    def start(self, script):
+        return Popen(["/bin/sh", "-c", script], stdout=PIPE, stderr=PIPE,
+                     preexec_fn=os.setsid)
+
+###############################################################################
+##### Method Tests
+
+    def test_cancelled_deadline_does_not_fire(self):
+        """
+        """
+        proc = self.start("exit 0")
+        handle = self.watchdog.watch(proc, 0.2, label="quick")
+        proc.communicate()
+        handle.cancel()
+        time.sleep(0.4)
+        self.assertFalse(handle.fired)
+        self.assertEqual(handle.getSignals(), [])
+        self.assertEqual(self.watchdog.getPending(), 0)
+
+    def test_deadlines_fire_in_order(self):
+        """
+        """
+        slow = self.start("exec sleep 10")
+        fast = self.start("exec sleep 10")
+        fired = []
+        slowHandle = self.watchdog.watch(slow, 0.6, "slow", fired.append)
+        fastHandle = self.watchdog.watch(fast, 0.2, "fast", fired.append)
+        fast.communicate()
+        slow.communicate()
+        self.assertEqual([handle.label for handle in fired], ["fast", "slow"])
+        self.assertEqual(fast.returncode, -signal.SIGTERM)
+
+    def test_escalates_to_sigkill(self):
+        """
+        """
+        proc = self.start("trap '' TERM; sleep 10 & wait; sleep 10")
+        handle = self.watchdog.watch(proc, 0.2, label="stubborn")
+        start = time.time()
+        proc.communicate()
+        self.assertTrue(time.time() - start < 5)
+        self.assertEqual(handle.getSignals(), [signal.SIGTERM, signal.SIGKILL])
+
+    def test_no_sigkill_once_reaped(self):
+        """
+        The group of a reaped leader may have been reused by the time the
+        grace period is over.
+        """
+        proc = self.start("(trap '' TERM; sleep 2) >/dev/null 2>&1 & exec sleep 10")
+        handle = self.watchdog.watch(proc, 0.1, label="reaped")
+        proc.communicate()
+        time.sleep(0.8)
+        self.assertEqual(proc.returncode, -signal.SIGTERM)
+        self.assertEqual(handle.getSignals(), [signal.SIGTERM])
+
+###############################################################################
+##### Functional Tests
+
+    def test_whole_group_is_killed(self):
+        """
+        A grandchild holding the output pipe open must not keep
+        communicate() waiting.
+        """
+        proc = self.start("sleep 10 & sleep 10")
+        handle = self.watchdog.watch(proc, 0.2, label="group")
+        start = time.time()
+        proc.communicate()
+        self.assertTrue(handle.fired)
+        self.assertTrue(time.time() - start < 5)
+
+    def test_runwith_timeout(self):
+        """
+        """
+        rw = RunWith(self.logger)
+        rw.setCommand(["/bin/sleep", "10"])
+        self.assertTrue(rw.timeout(0.3))
+        rw.setCommand(["/bin/echo", "hello"])
+        self.assertFalse(rw.timeout(5))
+        self.assertEqual(rw.getStdout().strip(), "hello")
+
+###############################################################################
+##### unittest Tear down
+    @classmethod
+    def tearDownClass(self):
+        """
+        Final cleanup actions...
+        """
+        test_time = (datetime.now() - self.test_start_time)
+        self.logger.log(lp.INFO, self.__module__ + " took " + str(test_time) + " time to complete...")
+
+###############################################################################
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -20,8 +20,6 @@ from lib.loggers import CyLogger
 from lib.loggers import LogPriority as lp
 from tests.PylintIface import PylintIface, processFile
 
-from pylint import epylint
-
 dirPkgRoot = '..'
 logger = CyLogger()
 logger.initializeLogs()
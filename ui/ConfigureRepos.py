@@ -4,9 +4,7 @@ import os
 import re
 import sys
 import time
-import urllib
 import shutil
-import httplib
 import traceback
 from subprocess import Popen, PIPE
 from ConfigParser import SafeConfigParser
@@ -20,8 +18,11 @@ from PyQt5 import QtWidgets, QtCore, QtGui
 from lib.get_libc import getLibc
 from lib.loggers import CyLogger
 from lib.run_commands import RunWith
+from lib.command_pool import CommandPool
+from lib.bandwidth import GIT
 from lib.Connectivity import Connectivity
 from lib.loggers import LogPriority as lp
+from lib.loggers import getSubsystemLogger
 from lib.CheckApplicable import CheckApplicable
 from lib.environment import Environment
 from lib.libHelperFunctions import isSaneFilePath
@@ -33,6 +34,10 @@ from ui.PrepareIso import PrepareIso
 #from ui.Work import Work
 
 
+#####
+# Where the boxcutter repos are cloned from
+BOXCUTTER_URL = "https://github.com/boxcutter/"
+
 #####
 # Exception for when the conf file can't be grokked.
 class ConfusingConfigurationError(Exception):
@@ -71,10 +76,11 @@ class ConfigureRepos(QtWidgets.QDialog):
         self.conf = conf
         self.environ = Environment()
         self.conf.loggerSelf()
-        self.logger = self.conf.getLogger()
+        self.logger = getSubsystemLogger(self.conf.getLogger(), "git")
         #self.logger = self.conf.get_logger()
         self.logger.log(lp.DEBUG, str(self.logger))
         self.runWith = RunWith(self.logger)
+        self.commandPool = CommandPool(self.logger, workers=4)
         self.libc = getLibc(self.logger)
         self.chkApp = CheckApplicable(self.environ, self.logger)
         macOsWhiteListApplicable = {'type': 'white', 'os': {'Mac OS X': ['10.0.0', 'r', '20.12.10']}}
@@ -142,6 +148,7 @@ class ConfigureRepos(QtWidgets.QDialog):
     def getSelected(self):
         '''
         '''
+        self.repos2process = []
         if self.ui.debianCheckBox.isChecked():
             self.repos2process.append("debian")
         if self.ui.ubuntuCheckBox.isChecked():
@@ -209,64 +216,53 @@ class ConfigureRepos(QtWidgets.QDialog):
                 raise(err)
 
         #####
-        # Get and set the proxy if there is one
-        shellEnviron = os.environ.copy()
-        proxy = self.conf.getProxy()
-        httpsProxy = self.conf.getHttpsProxy()
-        httpProxy = self.conf.getHttpProxy()
-        ftpProxy = self.conf.getFtpProxy()
-        rsyncProxy = self.conf.getRsyncProxy()
-        noProxy = self.conf.getNoProxy()
-
-        if proxy and isinstance(proxy, basestring):
-            shellEnviron['http_proxy'] = proxy
-            shellEnviron['https_proxy'] = proxy
-            shellEnviron['ftp_proxy'] = proxy
-            shellEnviron['rsync_proxy'] = proxy
-        if httpProxy and isinstance(httpProxy, basestring):
-            shellEnviron['http_proxy'] = httpProxy
-        if httpsProxy and isinstance(httpsProxy, basestring):
-            shellEnviron['https_proxy'] = httpsProxy
-        if ftpProxy and isinstance(ftpProxy, basestring):
-            shellEnviron['ftp_proxy'] = ftpProxy
-        if rsyncProxy and isinstance(rsyncProxy, basestring):
-            shellEnviron['rsync_proxy'] = rsyncProxy
-        if noProxy and isinstance(noProxy, basestring):
-            shellEnviron['no_proxy'] = noProxy
+        # Get and set the proxy if there is one, and it is up
+        shellEnviron = self.conf.getProxyManager().buildEnviron(urls=[BOXCUTTER_URL])
 
         #####
-        # loop through repos and download the ones that have been checked.
+        # Build one git command per checked repo.  Each command carries its
+        # own working directory, so they can all run at the same time.
+        commands = []
         for repo in self.repos2process:
+            repoSubcommand = subcommand
             if not os.path.exists(self.reposRoot + "/" + repo):
-                subcommand = "clone"
-            returnDir = os.getcwd()
-            if not 'clone' == subcommand:
-                os.chdir(self.reposRoot + "/" + repo)
+                repoSubcommand = "clone"
+            if not 'clone' == repoSubcommand:
+                workingDir = self.reposRoot + "/" + repo
             else:
-                os.chdir(self.reposRoot)
-            self.logger.log(lp.DEBUG, str(os.getcwd()))
-            
+                workingDir = self.reposRoot
+            self.logger.log(lp.DEBUG, str(workingDir))
+
             #####
             # Assign the right "subcommand" to the command to be processed
-            if isinstance(subcommand, basestring) and subcommand:
-                if re.match("clone", subcommand):
-                    cmd = [self.git, subcommand, "https://github.com/boxcutter/" + repo +".git"]
+            if isinstance(repoSubcommand, basestring) and repoSubcommand:
+                if re.match("clone", repoSubcommand):
+                    cmd = [self.git, repoSubcommand, BOXCUTTER_URL + repo +".git"]
                 else:
-                    cmd = [self.git, subcommand]
-            if isinstance(subcommand, list) and subcommand:
-                cmd = [self.git] + subcommand
+                    cmd = [self.git, repoSubcommand]
+            elif isinstance(repoSubcommand, list) and repoSubcommand:
+                cmd = [self.git] + repoSubcommand
+            else:
+                continue
 
             #####
-            # Set and execute the built command
-            self.runWith.setCommand(cmd, env=shellEnviron)
-            output, error, retcode = self.runWith.communicate()
+            # Syncs take turns with the other downloads, see lib.bandwidth
+            commands.append({"command" : cmd,
+                             "env" : shellEnviron,
+                             "cwd" : workingDir,
+                             "label" : repo,
+                             "gate" : self.conf.getBandwidthScheduler().slot(GIT)})
 
-            self.logger.log(lp.DEBUG, "OUT: " + str(output))
+        #####
+        # Execute the built commands and collect the results
+        batch = self.commandPool.runBatch(commands)
+        for result in batch.getResults():
+            output, error, retcode = result.getReturns()
+            self.logger.log(lp.DEBUG, "REPO: " + str(result.label))
+            self.logger.log(lp.DEBUG, "OUT: %s", output)
             self.logger.log(lp.DEBUG, "ERR: " + str(error))
             self.logger.log(lp.DEBUG, "RETCODE: " + str(retcode))
 
-            os.chdir(returnDir)
-
     def prepareIso(self):
         '''
         
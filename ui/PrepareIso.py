@@ -4,9 +4,7 @@ import os
 import re
 import sys
 import time
-import urllib
 import shutil
-import httplib
 import traceback
 import subprocess
 
@@ -21,6 +19,7 @@ from lib.loggers import CyLogger
 from lib.run_commands import RunWith
 from lib.Connectivity import Connectivity
 from lib.loggers import LogPriority as lp
+from lib.loggers import getSubsystemLogger
 from lib.libHelperFunctions import isSaneFilePath
 from lib.run_commands import runMyThreadCommand
 from lib.packerJsonHandler import PackerJsonHandler
@@ -50,7 +49,7 @@ class PrepareIso(QtWidgets.QDialog):
         # initialization of class variables.
         self.conf = conf
         self.conf.loggerSelf()
-        self.logger = self.conf.getLogger()
+        self.logger = getSubsystemLogger(self.conf.getLogger(), "ui")
         #self.logger = self.conf.get_logger()
         self.logger.log(lp.DEBUG, str(self.logger))
         self.runWith = RunWith(self.logger)
@@ -142,11 +141,10 @@ class PrepareIso(QtWidgets.QDialog):
 
         compile_dmg_name = re.compile(".*(OSX_InstallESD_[\d+\.]+_\w+\.dmg).*")
         #dmgName = ""
-        if not re.search("\n", output):
-            matcher = "\r"
-        else:
-            matcher = "\n"
-        for line in output.split(matcher):
+        #####
+        # RunWith collapses carriage return redraws, so the output is
+        # already split into plain lines.
+        for line in output.splitlines():
             try:
                 if not line:
                     continue
@@ -159,11 +157,7 @@ class PrepareIso(QtWidgets.QDialog):
                 # self.logger.log(lp.DEBUG, traceback.format_exc(err))
         if not dmgName:
             compile_dmg_name = re.compile(".*_(InstallESD_[\d+\.]+_\w+\.dmg).*")
-            if not re.search("\n", error):
-                matcher = "\r"
-            else:
-                matcher = "\n"
-            for line in error.split(matcher):
+            for line in error.splitlines():
                 try:
                     print str(line)
                     if not line:
@@ -3,9 +3,7 @@ from __future__ import absolute_import
 import os
 import sys
 import time
-import urllib
 import shutil
-import httplib
 import traceback
 from subprocess import Popen, PIPE
 from ConfigParser import SafeConfigParser
@@ -20,8 +18,10 @@ from lib.loggers import CyLogger
 from lib.run_commands import RunWith
 from lib.Connectivity import Connectivity
 from lib.loggers import LogPriority as lp
+from lib.loggers import getSubsystemLogger
 from lib.packerJsonHandler import PackerJsonHandler
 from lib.packer_runner import PackerRunner
+from lib.build_context import BuildContext
 from lib.libHelperFunctions import isSaneFilePath
 
 #####
@@ -50,10 +50,12 @@ class SettingsOk(QtWidgets.QDialog):
 
     @author: Roy Nielsen
     """
-    def __init__(self, conf, parent=None):
+    def __init__(self, conf, context, parent=None):
         """
         Initialization method...
 
+        @param: context - lib.build_context.BuildContext of the build to run
+
         @author: Roy Nielsen
         """
         super(SettingsOk, self).__init__(parent)
@@ -64,8 +66,9 @@ class SettingsOk(QtWidgets.QDialog):
         #####
         # initialization of class variables.
         self.conf = conf
+        self.context = context
         self.conf.loggerSelf()
-        self.logger = self.conf.getLogger()
+        self.logger = getSubsystemLogger(self.conf.getLogger(), "ui")
         #self.logger = self.conf.get_logger()
         self.logger.log(lp.DEBUG, str(self.logger))
         self.runWith = RunWith(self.logger)
@@ -84,11 +87,11 @@ class SettingsOk(QtWidgets.QDialog):
 
         #####
         # Acquire current json varfile data and print it.
-        self.varFilePath = self.conf.getCurrentVarFilePath()
+        self.varFilePath = self.context.getVarFilePath()
         if self.varFilePath and isSaneFilePath(self.varFilePath):
             try:
                 self.pjh = PackerJsonHandler(self.logger)
-                jsonData = self.pjh.readExistingJsonVarfile(self.conf.getCurrentVarFilePath())
+                jsonData = self.pjh.readExistingJsonVarfile(self.varFilePath)
             except Exception, err:
                 QtWidgets.QMessageBox.critical(self, "Error", "...Exception trying to read packer json...", QtWidgets.QMessageBox.Ok)
                 self.logger.log(lp.WARNING, traceback.format_exc())
@@ -109,10 +112,14 @@ class SettingsOk(QtWidgets.QDialog):
         
         @author: Roy Nielsen
         '''
+        #####
+        # A new build id and directories for every run
+        context = BuildContext.create(self.conf, self.context.repo,
+                                      self.context.templateFile,
+                                      self.context.varFile,
+                                      self.context.vmImage)
         pr = PackerRunner(self.conf)
-        pr.runPackerBoxcutter(self.conf.getCurrentTemplateFilePath(),
-                              self.conf.getCurrentVarFilePath(),
-                              self.conf.getOnlyVmImage())
+        pr.runBuild(context)
 
     def deltaVmSettings(self):
         '''
@@ -122,7 +129,7 @@ class SettingsOk(QtWidgets.QDialog):
         QtWidgets.QMessageBox.information(self, "Information", "...Change VM settings...", QtWidgets.QMessageBox.Ok)
         #####
         # Set up dialog
-        vmSettings = VirtualMachineSettings(self.conf)
+        vmSettings = VirtualMachineSettings(self.conf, self.context)
         vmSettings.setWindowTitle("Configure Repos")
         #workConfig.show()
         vmSettings.exec_()
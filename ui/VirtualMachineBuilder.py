@@ -4,9 +4,7 @@ import os
 import re
 import sys
 import time
-import urllib
 import shutil
-import httplib
 import traceback
 from subprocess import Popen, PIPE
 from ConfigParser import SafeConfigParser
@@ -21,9 +19,12 @@ from lib.loggers import CyLogger
 from lib.run_commands import RunWith
 from lib.Connectivity import Connectivity
 from lib.loggers import LogPriority as lp
+from lib.loggers import getSubsystemLogger
 from lib.environment import Environment
 from lib.CheckApplicable import CheckApplicable
 from lib.libHelperFunctions import isSaneFilePath
+from lib.packerJsonHandler import PackerJsonHandler
+from lib.build_context import BuildContext
 
 #####
 # Import pyuic5 compiled PyQt ui files
@@ -67,7 +68,7 @@ class VirtualMachineBuilder(QtWidgets.QMainWindow):
         # initialization of class variables.
         self.conf = conf
         self.conf.loggerSelf()
-        self.logger = self.conf.getLogger()
+        self.logger = getSubsystemLogger(self.conf.getLogger(), "ui")
         self.environ = Environment()
         #self.logger = self.conf.get_logger()
         self.logger.log(lp.DEBUG, str(self.logger))
@@ -266,22 +267,16 @@ class VirtualMachineBuilder(QtWidgets.QMainWindow):
         varFileFullPath = self.conf.getRepoRoot() + "/" + currentOs + "/" + currentVarFile
         repo = self.conf.getRepoRoot() + "/" + currentOs
 
-        if not re.match("^ol", currentVarFile):
-            templateFileRegex = re.match("^([A-Za-z_\-]+)\d+.*\.json$", currentVarFile)
-            templateFile = templateFileRegex.group(1) + ".json"
-        else:
-            templateFile = "oraclelinux.json"
+        templateFile = PackerJsonHandler(self.logger).getTemplateNameForVarFile(currentVarFile)
 
         templateFilePath = self.conf.getRepoRoot() + "/" + currentOs + "/" + templateFile
         self.logger.log(lp.DEBUG, "TemplateFilePath: " + str(templateFilePath))
 
-        self.conf.setCurrentVarFilePath(varFileFullPath)
-        self.conf.setCurrentTemplateFilePath(templateFilePath)
-        self.conf.setCurrentRepo(repo)
+        context = BuildContext.create(self.conf, repo, templateFilePath, varFileFullPath)
 
         #####
         # Set up dialog
-        vmSettings = VirtualMachineSettings(self.conf)
+        vmSettings = VirtualMachineSettings(self.conf, context)
         vmSettings.setWindowTitle("Configure Repos")
         #workConfig.show()
         vmStngRetval = vmSettings.exec_()
@@ -6,9 +6,7 @@ import sys
 import copy
 import json
 import time
-import urllib
 import shutil
-import httplib
 import traceback
 import tempfile
 from subprocess import Popen, PIPE
@@ -25,10 +23,12 @@ from lib.loggers import CyLogger
 from lib.run_commands import RunWith
 from lib.Connectivity import Connectivity
 from lib.loggers import LogPriority as lp
+from lib.loggers import getSubsystemLogger
 
 from lib.libHelperFunctions import isSaneFilePath
 from lib.packerJsonHandler import PackerJsonHandler
 from lib.packer_runner import PackerRunner
+from lib.build_context import BuildContext, makeBuildId
 
 #####
 # Import pyuic5 compiled PyQt ui files
@@ -55,10 +55,13 @@ class VirtualMachineSettings(QtWidgets.QDialog):
 
     @author: Roy Nielsen
     """
-    def __init__(self, conf, parent=None):
+    def __init__(self, conf, context, parent=None):
         """
         Initialization method...
 
+        @param: context - lib.build_context.BuildContext of the repo,
+                          template and varfile to configure
+
         @author: Roy Nielsen
         """
         super(VirtualMachineSettings, self).__init__(parent)
@@ -69,8 +72,9 @@ class VirtualMachineSettings(QtWidgets.QDialog):
         #####
         # initialization of class variables.
         self.conf = conf
+        self.context = context
         self.conf.loggerSelf()
-        self.logger = self.conf.getLogger()
+        self.logger = getSubsystemLogger(self.conf.getLogger(), "ui")
         #self.logger = self.conf.get_logger()
         self.logger.log(lp.DEBUG, str(self.logger))
         self.runWith = RunWith(self.logger)
@@ -115,9 +119,9 @@ class VirtualMachineSettings(QtWidgets.QDialog):
 
         #####
         # Acquire current json varfile data and print it.
-        self.varFilePath = self.conf.getCurrentVarFilePath()
+        self.varFilePath = self.context.getVarFilePath()
         self.templateFilePath = ""
-        self.workingDir = os.path.abspath(os.path.dirname(self.varFilePath))
+        self.workingDir = self.context.repo
         self.logger.log(lp.DEBUG, ".")
         self.logger.log(lp.DEBUG, ".")
         self.logger.log(lp.DEBUG, ".")
@@ -161,7 +165,7 @@ class VirtualMachineSettings(QtWidgets.QDialog):
         if self.varFilePath and isSaneFilePath(self.varFilePath):
             try:
                 self.vJsonData = self.vPjh.readExistingJsonVarfile(loadfile)
-                self.logger.log(lp.DEBUG, "JSON loaded: " + str(self.jsonData))
+                self.logger.log(lp.DEBUG, "JSON loaded: %s", self.jsonData)
             except Exception, err:
                 QtWidgets.QMessageBox.critical(self, "Error", "...Exception trying to read packer json...", QtWidgets.QMessageBox.Ok)
                 self.logger.log(lp.WARNING, traceback.format_exc())
@@ -174,7 +178,7 @@ class VirtualMachineSettings(QtWidgets.QDialog):
                 templateFile = comment.split()[-1].strip('`')
                 templateDir = os.path.dirname(self.varFilePath)
                 self.templateFilePath = templateDir + "/" + templateFile
-                self.conf.setCurrentTemplateFilePath(self.templateFilePath)
+                self.context = self.context.replace(templateFile=self.templateFilePath)
                 self.tJsonData = self.tPjh.readExistingJsonTemplateFile(self.templateFilePath)
                 #####
                 # Turn of checkbox tri-state
@@ -437,7 +441,7 @@ class VirtualMachineSettings(QtWidgets.QDialog):
         self.jsonVariables["rsync_proxy"] = self.ui.leRsyncProxy.text().strip()
         self.jsonVariables["no_proxy"] = self.ui.leNoProxy.text().strip()
 
-        self.logger.log(lp.DEBUG, "JSON data: " + str(self.jsonData))
+        self.logger.log(lp.DEBUG, "JSON data: %s", self.jsonData)
 
     def mergeIfaceVarsWithVarFile(self):
         '''
@@ -445,7 +449,7 @@ class VirtualMachineSettings(QtWidgets.QDialog):
         
         @author: Roy Nielsen
         '''
-        loadFile = self.conf.getCurrentVarFilePath()
+        loadFile = self.context.getVarFilePath()
         self.jsonVariables = self.vPjh.readExistingJsonVarfile(loadFile)
         self.vPjh.printVariables()
         self.getVarsFromIface()
@@ -459,7 +463,7 @@ class VirtualMachineSettings(QtWidgets.QDialog):
         
         @author: Roy Nielsen
         '''
-        templateFile = self.conf.getCurrentTemplateFilePath()
+        templateFile = self.context.getTemplatePath()
         vmtypes = []
         includeVagrant = False
 
@@ -480,56 +484,11 @@ class VirtualMachineSettings(QtWidgets.QDialog):
 
             if templateFile and isinstance(templateFile, basestring):
                 data = self.tPjh.readExistingJsonTemplateFile(templateFile)
-                print str(json.dumps(data, ensure_ascii=False, indent=3))
-                newJson = {}
-
-                try:
-                    newJson['_comment'] = data["_comment"]
-                except KeyError, err:
-                    #print traceback.format_exc()
-                    try:
-                        newJson['_comment'] = data['_command']
-                    except KeyError:
-                        pass
-
-                newJson['variables'] = copy.deepcopy(data['variables'])
-
-                print "."
-                print "."
-                print "."
-                print "."
-                for key, value in newJson['variables'].iteritems():
-                    print str(key) + " = " + str(value)
-                print "."
-                print "."
-                print "."
-                print "."
 
                 self.mergeIfaceVarsWithVarFile()
 
-                for key, value in self.jsonVariables.iteritems():
-                    newJson['variables'][key] = value
-
-                newJson['provisioners'] = copy.deepcopy(data['provisioners'])
-                newJson['post-processors'] = copy.deepcopy(data['post-processors'])
-                newJson['post-processors'][0]['keep_input_artifact'] = True
-                newJson['builders'] = []
-
-                #vmtypes = ['vmware-iso', 'virtualbox-iso', 'parallels-iso']
-                #includeVagrant = False
+                newJson = self.tPjh.mergeTemplate(data, self.jsonVariables, vmtypes)
 
-                for key, values in data.iteritems():
-                    if re.match("builders", key):
-                        #print str(values)
-                        for item in values:
-                            print item['type']
-                            if item['type'] in vmtypes:
-                                newJson['builders'].append(copy.deepcopy(item))
-
-                    #elif re.match("post-processors", key) and includeVagrant:
-                    #    newJson[key] = data[key]
-
-                print str(json.dumps(newJson, ensure_ascii=False, indent=3))
                 self.tPjh.saveJsonTemplateFile(filename, newJson)
                 self.libc.sync()
                 time.sleep(1)
@@ -590,7 +549,7 @@ class VirtualMachineSettings(QtWidgets.QDialog):
         else:
             self.clearJsonVariables()
             QtWidgets.QMessageBox.critical(self, "Error", "...Password mis-match, please re-enter passwords...", QtWidgets.QMessageBox.Ok)
-            self.logger.log(lp.DEBUG, "JSON data: " + str(self.jsonVariables))
+            self.logger.log(lp.DEBUG, "JSON data: %s", self.jsonVariables)
 
         ##############################################
         # stacked widget[4] - proxies
@@ -621,7 +580,7 @@ class VirtualMachineSettings(QtWidgets.QDialog):
 
         #####
         # Save temp template file
-        templateFileFullPath = self.conf.getCurrentTemplateFilePath()
+        templateFileFullPath = self.context.getTemplatePath()
         partial_prefix = templateFileFullPath.split("/")[-1]
         prefix = ".".join(partial_prefix.split('.')[:-1])
         tmpTemplateFile = tempfile.mkstemp(".json", prefix)[1]
@@ -630,7 +589,7 @@ class VirtualMachineSettings(QtWidgets.QDialog):
         '''
         #####
         # Save temp variables file
-        varFileFullPath = self.conf.getCurrentVarFilePath()
+        varFileFullPath = self.context.getVarFilePath()
         partial_prefix = varFileFullPath.split("/")[-1]
         prefix = ".".join(partial_prefix.split('.')[:-1])
         tmpVarFile = tempfile.mkstemp(".json", prefix)[1]
@@ -652,16 +611,13 @@ class VirtualMachineSettings(QtWidgets.QDialog):
             only = 'parallels-iso'
 
         if self.vmSelected:
-            oldWorkingDir = os.getcwd()
-            newWorkingDir = os.chdir(self.workingDir)
             #####
-            # Run packer
+            # Run packer, in the repo, with a context of its own for this run
+            buildId = makeBuildId(self.context.templateFile, self.context.varFile, only or "")
+            context = BuildContext.create(self.conf, self.context.repo, tmpTemplateFile,
+                                          vmImage=only or "", buildId=buildId)
             pr = PackerRunner(self.conf)
-            if only or self.only:
-                pr.runPackerBoxcutter(tmpTemplateFile, vmImage=only)
-            else:
-                pr.runPackerBoxcutter(tmpTemplateFile)
-            os.chdir(oldWorkingDir)
+            pr.runBuild(context)
 
     def saveForLater(self):
         '''
@@ -674,7 +630,7 @@ class VirtualMachineSettings(QtWidgets.QDialog):
         filename, _ = QtWidgets.QFileDialog.getSaveFileName(self, 'Save File', '.')
         self.getVarsFromIface()
         self.saveTemporaryTemplateFile(filename)
-        templateFile = self.conf.getCurrentTemplateFilePath()
+        templateFile = self.context.getTemplatePath()
         dotFile = "." + filename.split("/")[-1] + "_templateFile"
         dirPath = os.path.dirname(filename)
         shutil.copy(templateFile, dirPath + "/" + dotFile)
@@ -689,7 +645,7 @@ class VirtualMachineSettings(QtWidgets.QDialog):
         self.loadGuiFromPjh(pjh)
         dotFile = "." + filename.split("/")[-1] + "_templateFile"
         dirPath = os.path.dirname(filename)
-        self.conf.setCurrentTemplateFilePath(dirPath + "/" + dotFile)
+        self.context = self.context.replace(templateFile=dirPath + "/" + dotFile)
 
     def resetToDefault(self):
         '''
@@ -697,6 +653,6 @@ class VirtualMachineSettings(QtWidgets.QDialog):
         '''
         #####
         # Acquire current json varfile data and print it.
-        self.varFilePath = self.conf.getCurrentVarFilePath()
+        self.varFilePath = self.context.getVarFilePath()
 
         self.loadValuesToUI(self.varFilePath)
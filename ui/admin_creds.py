@@ -55,6 +55,7 @@ from admin_credentials_ui import Ui_AdministratorCredentials
 from lib.run_commands import RunWith, RunThread, runMyThreadCommand
 from lib.loggers import CyLogger
 from lib.loggers import LogPriority as lp
+from lib.loggers import getSubsystemLogger
 from lib.manage_user.manage_user import ManageUser
 
 class AdministratorCredentials(QtWidgets.QDialog) :
@@ -78,7 +79,7 @@ class AdministratorCredentials(QtWidgets.QDialog) :
         self.ui.setupUi(self)
         self.conf = conf
         
-        self.logger = self.conf.getLogger()
+        self.logger = getSubsystemLogger(self.conf.getLogger(), "ui")
         self.mu = ManageUser(logger=self.logger)
         self.rw = RunWith(self.logger)
 